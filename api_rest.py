@@ -72,6 +72,10 @@ from modules.grpo.models import GRPODocument, GRPOItem, GRPOSerialNumber, GRPOBa
 from modules.multi_grn_creation.models import MultiGRNBatch, MultiGRNPOLink, MultiGRNLineSelection, MultiGRNBatchDetails, MultiGRNSerialDetails
 from modules.sales_delivery.models import DeliveryDocument, DeliveryItem
 import json
+import operator
+
+from streaming_export import register_export
+from cold_archive import history_table
 
 
 # ================================
@@ -89,21 +93,95 @@ def unauthorized_api():
     return redirect(url_for('login', next=request.url))
 
 
+# (model class, excluded fields) -> serializer built once from the mapper's columns
+_serializers = {}
+
+
+def _compile_serializer(model, exclude_fields):
+    """Build a serializer with the column accessor list and datetime columns resolved up front"""
+    names = tuple(column.name for column in model.__table__.columns if column.name not in exclude_fields)
+    datetime_names = tuple(column.name for column in model.__table__.columns
+                           if column.name in names and isinstance(column.type, db.DateTime))
+    if len(names) > 1:
+        getter = operator.attrgetter(*names)
+    else:
+        # attrgetter returns a bare value (not a tuple) for a single attribute
+        getter = lambda obj: tuple(getattr(obj, name) for name in names)
+
+    def serialize(obj):
+        result = dict(zip(names, getter(obj)))
+        for name in datetime_names:
+            value = result[name]
+            if value is not None:
+                result[name] = value.isoformat()
+        return result
+
+    return serialize
+
+
 def serialize_model(obj, exclude_fields=None):
     """Serialize SQLAlchemy model to dictionary"""
-    if exclude_fields is None:
-        exclude_fields = []
-    
-    result = {}
-    for column in obj.__table__.columns:
-        if column.name in exclude_fields:
-            continue
-        value = getattr(obj, column.name)
-        if isinstance(value, datetime):
-            result[column.name] = value.isoformat()
-        else:
-            result[column.name] = value
-    return result
+    key = (type(obj), tuple(exclude_fields) if exclude_fields else ())
+    serializer = _serializers.get(key)
+    if serializer is None:
+        serializer = _serializers[key] = _compile_serializer(type(obj), set(key[1]))
+    return serializer(obj)
+
+
+# REST list resources that can also be downloaded from /api/export/rest-<resource> - every column, in id order
+REST_EXPORTS = {
+    'users': (User, 'user_management'),
+    'inventory-transfers': (InventoryTransfer, 'inventory_transfer'),
+    'inventory-transfer-request-lines': (InventoryTransferRequestLine, 'inventory_transfer'),
+    'pick-lists': (PickList, 'pick_list'),
+    'inventory-counts': (InventoryCount, 'inventory_counting'),
+    'bin-locations': (BinLocation, None),
+    'grpo-documents': (GRPODocument, 'grpo'),
+    'grpo-items': (GRPOItem, 'grpo'),
+    'multi-grn-batches': (MultiGRNBatch, 'multiple_grn'),
+    'delivery-documents': (DeliveryDocument, 'sales_delivery'),
+    'serial-transfers': (SerialNumberTransfer, 'serial_transfer'),
+    'direct-transfers': (DirectInventoryTransfer, 'direct_inventory_transfer'),
+    'qr-labels': (QRCodeLabel, None),
+    'sap-inventory-counts': (SAPInventoryCount, 'inventory_counting'),
+    'serial-item-transfers': (SerialItemTransfer, 'serial_item_transfer'),
+}
+
+# Resources whose documents can be moved to the cold archive - exported from the history views
+HISTORY_EXPORTS = {
+    'inventory-transfers': 'inventory_transfer',
+    'grpo-documents': 'grpo',
+    'grpo-items': 'grpo',
+    'multi-grn-batches': 'multi_grn',
+    'delivery-documents': 'delivery',
+}
+
+# Never leave the server in an export
+EXPORT_EXCLUDED_COLUMNS = {'password_hash'}
+
+
+def _register_rest_exports():
+    """Export every REST list resource; non-admins get only their own rows where the table has user_id"""
+    for resource, (model, permission) in REST_EXPORTS.items():
+        table_columns = [column for column in model.__table__.columns if column.name not in EXPORT_EXCLUDED_COLUMNS]
+        date_column = 'created_at' if 'created_at' in model.__table__.columns else None
+
+        def build_query(user, model=model, table_columns=table_columns, kind=HISTORY_EXPORTS.get(resource)):
+            table = model.__table__
+            if kind:
+                table = history_table(kind, table.name)
+            query = db.session.query(*[table.c[column.name] for column in table_columns])
+            if user.role != 'admin' and 'user_id' in table.c:
+                query = query.filter(table.c['user_id'] == user.id)
+            return query.order_by(*[table.c[column.name] for column in model.__table__.primary_key.columns])
+
+        register_export(f'rest-{resource}', build_query,
+                        [(column.name, column.name) for column in table_columns],
+                        date_column=date_column, permission=permission,
+                        admin_only=resource == 'users')
+
+
+_register_rest_exports()
 
 
 def get_request_data():
@@ -37,6 +37,11 @@ CORS(app, resources={
     }
 })
 
+# orjson-backed jsonify and gzip/brotli response compression
+from response_pipeline import init_json_provider, init_compression
+init_json_provider(app)
+init_compression(app)
+
 # Setup comprehensive logging to C:\tmp\wms_logs
 try:
     from logging_config import setup_logging
@@ -84,6 +89,7 @@ try:
     test_engine = create_engine(database_url_env, pool_pre_ping=True)
     with test_engine.connect() as conn:
         conn.execute(text("SELECT 1"))
+    test_engine.dispose()  # Do not keep the test connection around (and hand it to forked workers)
     logging.info("✅ PostgreSQL database connection successful")
     database_url = database_url_env
 except Exception as e:
@@ -195,7 +201,7 @@ with app.app_context():
 # Enable by default but fail gracefully if MySQL not available
 try:
     from db_dual_support import init_dual_database
-    dual_db = init_dual_database(app)
+    dual_db = init_dual_database(app, start_replicator=False)  # Started with the other background services
     app.config['DUAL_DB'] = dual_db
     logging.info("✅ Dual database support initialized for MySQL sync")
 except Exception as e:
@@ -265,6 +271,96 @@ import routes
 import api_rest
 
 logging.info("✅ REST API endpoints loaded")
+
+# Keep the serial registry in step with every serial write (backfilled on first start)
+try:
+    from serial_registry import init_serial_registry
+    init_serial_registry(app)
+except Exception as e:
+    logging.warning(f"⚠️ Serial registry not initialized: {e}")
+
+# Record document status changes for the QC dashboard event stream
+try:
+    from qc_events import register_qc_event_capture
+    register_qc_event_capture(db.session)
+except Exception as e:
+    logging.warning(f"⚠️ QC dashboard event capture not registered: {e}")
+
+# Importing the app starts no background threads: a serving process starts them through
+# main.create_app(), and a worker forked from a preloaded master (gunicorn_config.py)
+# in init_worker_process(), as threads and pooled connections do not survive a fork
+
+
+def start_background_services(app):
+    """Start this process's background threads (schedulers and the MySQL replicator)"""
+    dual_db = app.config.get('DUAL_DB')
+    if dual_db:
+        dual_db.start_replicator()
+
+    # Keep local pick lists fresh from SAP B1 in the background (PICK_LIST_SYNC_INTERVAL seconds, default 300, 0 = off)
+    try:
+        from pick_list_sync import start_pick_list_sync_scheduler
+        start_pick_list_sync_scheduler(app)
+    except Exception as e:
+        logging.warning(f"⚠️ Pick list background sync not started: {e}")
+
+    # Retry queued SAP postings (SAP_OUTBOX_DISPATCH_INTERVAL seconds, 0 = off)
+    try:
+        from sap_posting_outbox import start_sap_outbox_dispatcher
+        start_sap_outbox_dispatcher(app)
+    except Exception as e:
+        logging.warning(f"⚠️ SAP posting outbox dispatcher not started: {e}")
+
+    # Refresh the handheld reference data bundle from SAP B1 (REFERENCE_DATA_REFRESH_INTERVAL seconds, 0 = off)
+    try:
+        from reference_data import start_reference_data_scheduler
+        start_reference_data_scheduler(app)
+    except Exception as e:
+        logging.warning(f"⚠️ Reference data background refresh not started: {e}")
+
+    # Purge scratch rows past their retention (DATA_RETENTION_INTERVAL seconds, 0 = off)
+    try:
+        from data_retention import start_data_retention_scheduler
+        start_data_retention_scheduler(app)
+    except Exception as e:
+        logging.warning(f"⚠️ Data retention purger not started: {e}")
+
+    # Move old posted/rejected documents to the archive tables (COLD_ARCHIVE_INTERVAL seconds, 0 = off)
+    try:
+        from cold_archive import start_cold_archive_scheduler
+        start_cold_archive_scheduler(app)
+    except Exception as e:
+        logging.warning(f"⚠️ Cold document archive not started: {e}")
+
+
+def dispose_connections(app, close=True):
+    """
+    Drop pooled database connections.
+    close=False in a forked worker: the sockets belong to the parent, so they are
+    only forgotten and the worker opens its own on first use.
+    """
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=close)
+    dual_db = app.config.get('DUAL_DB')
+    if dual_db:
+        dual_db.dispose_engines(close=close)
+
+
+def init_worker_process(app):
+    """
+    Per-process start of a worker forked from a preloaded master (gunicorn post_fork):
+    own database connections, fresh SAP limiters and circuit breaker, own background threads
+    """
+    dispose_connections(app, close=False)
+    try:
+        from sap_gatekeeper import gatekeeper
+        gatekeeper.reset()
+    except Exception as e:
+        logging.warning(f"⚠️ SAP gatekeeper not reset: {e}")
+    start_background_services(app)
+    logging.info(f"✅ Worker process {os.getpid()} initialized")
+
 # import os
 # import logging
 # from flask import Flask
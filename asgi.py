@@ -0,0 +1,380 @@
+"""
+ASGI entry point
+Serves the WMS under an ASGI server so one worker can keep hundreds of
+handheld scan/lookup requests waiting on SAP at the same time:
+
+    uvicorn asgi:app --host 0.0.0.0 --port 5000 --workers 2
+
+The hot scan/lookup APIs listed in ASYNC_ROUTES are answered on the event
+loop with the shared AsyncSAPIntegration (sap_async.py) - a request waiting
+on SAP costs a coroutine, not a thread. Their responses match the Flask
+routes of the same path (same JSON, same compression and CORS headers).
+Every other request goes to the Flask app through WSGIBridge, which runs it
+on a thread pool of ASGI_WSGI_THREADS (default 8, like gunicorn --threads 8)
+and streams the body, so SSE and streamed exports keep working.
+
+Routes that are @login_required in Flask are only answered here when the
+signed Flask session belongs to an existing user; anything else (no session,
+remember-me cookie only, multipart forms) falls through to Flask, which
+redirects or rejects exactly as before. Without httpx every request goes
+through Flask. gunicorn 'main:create_app()' keeps working unchanged.
+"""
+
+import asyncio
+import io
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl
+
+from werkzeug.datastructures import MultiDict
+from werkzeug.http import parse_cookie
+
+from main import create_app
+from response_pipeline import compress_response, compression_enabled
+import sap_async
+
+flask_app = create_app()  # Each uvicorn worker imports this module and runs its own background services
+
+WSGI_THREADS = int(os.environ.get('ASGI_WSGI_THREADS', '8'))
+USER_CACHE_SECONDS = 60
+_STREAM_BUFFER = 16  # Body chunks queued ahead of a slow client
+
+
+class WSGIBridge:
+    """Runs the Flask app for one ASGI request on a thread pool, streaming its body back"""
+
+    def __init__(self, wsgi_app, threads=WSGI_THREADS):
+        self.wsgi_app = wsgi_app
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='wsgi')
+
+    @staticmethod
+    def build_environ(scope, body):
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin1'),
+            'PATH_INFO': scope['path'].encode('utf-8').decode('latin1'),
+            'QUERY_STRING': scope['query_string'].decode('latin1'),
+            'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+            'SERVER_NAME': (scope.get('server') or ('localhost', 80))[0],
+            'SERVER_PORT': str((scope.get('server') or ('localhost', 80))[1]),
+            'REMOTE_ADDR': (scope.get('client') or ('', 0))[0],
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': io.BytesIO(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': True,
+            'wsgi.run_once': False,
+        }
+        for name, value in scope.get('headers', []):
+            name = name.decode('latin1').upper().replace('-', '_')
+            key = name if name in ('CONTENT_TYPE', 'CONTENT_LENGTH') else f'HTTP_{name}'
+            value = value.decode('latin1')
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+        return environ
+
+    async def __call__(self, scope, receive, send, body=None):
+        if body is None:
+            body = await read_body(receive)
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=_STREAM_BUFFER)
+        closed = threading.Event()
+
+        def put(message):
+            asyncio.run_coroutine_threadsafe(queue.put(message), loop).result()
+
+        def start_response(status, headers, exc_info=None):
+            put({'type': 'http.response.start', 'status': int(status.split(' ', 1)[0]),
+                 'headers': [(k.lower().encode('latin1'), v.encode('latin1')) for k, v in headers]})
+
+        def run():
+            try:
+                iterable = self.wsgi_app(self.build_environ(scope, body), start_response)
+                try:
+                    for chunk in iterable:
+                        if closed.is_set():
+                            break
+                        if chunk:
+                            put({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                finally:
+                    if hasattr(iterable, 'close'):
+                        iterable.close()
+                put({'type': 'http.response.body', 'body': b'', 'more_body': False})
+            except Exception as e:
+                logging.error(f"❌ WSGI bridge error on {scope['path']}: {str(e)}")
+                put(e)
+            finally:
+                put(None)
+
+        async def watch_disconnect():
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+            closed.set()
+
+        watcher = loop.create_task(watch_disconnect())
+        worker = loop.run_in_executor(self.executor, run)
+        started = False
+        try:
+            while (message := await queue.get()) is not None:
+                if closed.is_set():
+                    continue  # Keep draining so the worker thread can finish
+                if isinstance(message, Exception):
+                    if not started:
+                        await send_response(send, 500, [(b'content-type', b'text/plain')], b'Internal Server Error')
+                        started = True
+                    continue
+                started = True
+                await send(message)
+        finally:
+            closed.set()
+            watcher.cancel()
+            await worker
+
+
+async def read_body(receive):
+    body = b''
+    more_body = True
+    while more_body:
+        message = await receive()
+        body += message.get('body', b'')
+        more_body = message.get('more_body', False)
+    return body
+
+
+async def send_response(send, status, headers, body):
+    await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': body, 'more_body': False})
+
+
+class AsyncRequest:
+    """Just enough of a Flask request for the async handlers"""
+
+    def __init__(self, scope):
+        self.scope = scope
+        self.path = scope['path']
+        self.headers = {k.decode('latin1').lower(): v.decode('latin1') for k, v in scope.get('headers', [])}
+        self.args = MultiDict(parse_qsl(scope['query_string'].decode('latin1'), keep_blank_values=True))
+        self.form = MultiDict()
+
+    def load_form(self, body):
+        self.form = MultiDict(parse_qsl(body.decode('utf-8'), keep_blank_values=True))
+
+
+# ---------------------------------------------------------------------------
+# Async handlers - each mirrors the Flask view of the same path
+# ---------------------------------------------------------------------------
+
+async def get_warehouses(sap, request):
+    """api_routes.get_warehouses"""
+    try:
+        result = await sap.get_warehouses_list()
+        return (result if result.get('success') else {'success': True}), 200
+    except Exception as e:
+        logging.error(f"Error in get_warehouses API: {str(e)}")
+        return {'success': True}, 200
+
+
+async def get_bins(sap, request):
+    """api_routes.get_bins"""
+    try:
+        warehouse_code = request.args.get('warehouse')
+        if not warehouse_code:
+            return {'success': False, 'error': 'Warehouse code required'}, 400
+        result = await sap.get_bin_locations_list(warehouse_code)
+        return (result if result.get('success') else {'success': True}), 200
+    except Exception as e:
+        logging.error(f"Error in get_bins API: {str(e)}")
+        return {'success': True}, 200
+
+
+async def get_batches(sap, request):
+    """api_routes.get_batches"""
+    try:
+        item_code = request.args.get('item_code') or request.args.get('item')
+        if not item_code:
+            return {'success': False, 'error': 'Item code required'}, 400
+        result = await sap.get_batch_number_details(item_code)
+        return result, 200 if result.get('success') else 500
+    except Exception as e:
+        logging.error(f"Error in get_batches API: {str(e)}")
+        return {'success': True}, 200
+
+
+async def get_serial_location(sap, request):
+    """api_routes.get_serial_location"""
+    try:
+        serial_number = request.args.get('serial_number')
+        if not serial_number:
+            return {'success': False, 'error': 'Serial number required'}, 400
+        return await sap.get_serial_current_location(serial_number), 200
+    except Exception as e:
+        logging.error(f"Error in get_serial_location API: {str(e)}")
+        return {'success': False, 'error': str(e)}, 500
+
+
+async def get_invt_series(sap, request):
+    """api_routes.get_invt_series"""
+    try:
+        series_list = await sap.get_invt_series()
+        if series_list:
+            return {'success': True, 'series': series_list}, 200
+        return {'success': False, 'error': 'No series found', 'series': []}, 200
+    except Exception as e:
+        logging.error(f"Error in get_invt_series API: {str(e)}")
+        return {'success': False, 'error': str(e), 'series': []}, 500
+
+
+async def get_available_serial_numbers(sap, request):
+    """api_routes.get_available_serial_numbers"""
+    try:
+        item_code = request.args.get('item_code')
+        warehouse_code = request.args.get('warehouse_code')
+        if not item_code or not warehouse_code:
+            return {'success': False, 'error': 'item_code and warehouse_code are required'}, 400
+        return await sap.get_available_serial_numbers(item_code, warehouse_code), 200
+    except Exception as e:
+        logging.error(f"Error in get_available_serial_numbers API: {str(e)}")
+        return {'success': False, 'error': str(e), 'serial_numbers': []}, 500
+
+
+async def get_po_series(sap, request):
+    """routes.get_po_series"""
+    try:
+        return {'success': True, 'series': await sap.get_po_series()}, 200
+    except Exception as e:
+        logging.error(f"Error in get_po_series API: {str(e)}")
+        return {'success': False, 'error': str(e)}, 500
+
+
+async def validate_direct_transfer_item(sap, request):
+    """direct_inventory_transfer.validate_item"""
+    try:
+        item_code = request.form.get('item_code', '').strip()
+        if not item_code:
+            return {'success': False, 'error': 'Item code is required'}, 400
+        if not await sap.ensure_logged_in():
+            return {'success': False, 'error': 'SAP B1 authentication failed'}, 500
+
+        result = await sap.validate_item_for_direct_transfer(item_code)
+        if not result.get('valid'):
+            return {'success': False, 'error': result.get('error', 'Item validation failed')}, 400
+        return {
+            'success': True,
+            'item_code': result.get('item_code'),
+            'item_description': result.get('item_description'),
+            'item_type': result.get('item_type'),
+            'is_serial_managed': result.get('is_serial_managed'),
+            'is_batch_managed': result.get('is_batch_managed')
+        }, 200
+    except Exception as e:
+        logging.error(f"Error validating item: {str(e)}")
+        return {'success': False, 'error': str(e)}, 500
+
+
+# (method, path) -> (handler, login_required)
+ASYNC_ROUTES = {
+    ('GET', '/api/get-warehouses'): (get_warehouses, False),
+    ('GET', '/api/get-bins'): (get_bins, False),
+    ('GET', '/api/get-batches'): (get_batches, False),
+    ('GET', '/api/get-serial-location'): (get_serial_location, False),
+    ('GET', '/api/get-invt-series'): (get_invt_series, False),
+    ('GET', '/api/get-available-serial-numbers'): (get_available_serial_numbers, False),
+    ('GET', '/api/get-po-series'): (get_po_series, True),
+    ('POST', '/direct-inventory-transfer/api/validate-item'): (validate_direct_transfer_item, True),
+}
+
+
+class WMSAsgiApp:
+    """Async scan/lookup routes in front of the Flask app"""
+
+    def __init__(self, app, routes=None):
+        self.flask_app = app
+        self.wsgi = WSGIBridge(app.wsgi_app)
+        self.routes = ASYNC_ROUTES if routes is None else routes
+        if sap_async.httpx is None:
+            logging.warning("⚠️ httpx not installed - scan/lookup APIs served through Flask")
+            self.routes = {}
+        self.compress = compression_enabled()
+        self._users = {}  # user id -> (exists, checked_at)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        if scope['type'] != 'http':
+            return
+
+        route = self.routes.get((scope['method'], scope['path']))
+        if route is None or sap_async.gatekeeper.is_open():
+            # While the SAP circuit is open Flask answers from the reference data snapshot
+            return await self.wsgi(scope, receive, send)
+
+        handler, login_required = route
+        request = AsyncRequest(scope)
+        if scope['method'] == 'POST' and not request.headers.get('content-type', '').startswith(
+                'application/x-www-form-urlencoded'):
+            return await self.wsgi(scope, receive, send)
+        if login_required and not await self.is_logged_in(request):
+            return await self.wsgi(scope, receive, send)
+
+        request.load_form(await read_body(receive))
+        payload, status = await handler(sap_async.get_async_sap(), request)
+        await self.respond(send, request, payload, status)
+
+    async def respond(self, send, request, payload, status):
+        response = self.flask_app.json.response(payload)
+        response.status_code = status
+        if self.compress:
+            compress_response(response, request.headers.get('accept-encoding', ''))
+        origin = request.headers.get('origin')
+        if origin and request.path.startswith('/api/'):
+            # Same headers flask-cors sends for /api/* (any origin, credentials allowed)
+            response.headers['Access-Control-Allow-Origin'] = origin
+            response.headers['Access-Control-Allow-Credentials'] = 'true'
+            response.vary.add('Origin')
+        headers = [(k.lower().encode('latin1'), v.encode('latin1')) for k, v in response.headers.to_wsgi_list()]
+        await send_response(send, status, headers, response.get_data())
+
+    async def is_logged_in(self, request):
+        """True when the signed Flask session carries the id of an existing user"""
+        cookie = parse_cookie(request.headers.get('cookie', '')).get(self.flask_app.config['SESSION_COOKIE_NAME'])
+        serializer = self.flask_app.session_interface.get_signing_serializer(self.flask_app)
+        if not cookie or serializer is None:
+            return False
+        try:
+            session = serializer.loads(cookie, max_age=int(self.flask_app.permanent_session_lifetime.total_seconds()))
+        except Exception:
+            return False
+        user_id = session.get('_user_id')
+        if not user_id:
+            return False
+
+        exists, checked_at = self._users.get(user_id, (False, 0))
+        if time.monotonic() - checked_at > USER_CACHE_SECONDS:
+            exists = await asyncio.to_thread(self._user_exists, user_id)
+            self._users[user_id] = (exists, time.monotonic())
+        return exists
+
+    def _user_exists(self, user_id):
+        from app import db
+        from models import User
+
+        with self.flask_app.app_context():
+            return db.session.get(User, int(user_id)) is not None
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await sap_async.close_async_sap()
+                self.wsgi.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+app = WMSAsgiApp(flask_app)
@@ -0,0 +1,134 @@
+"""
+SAP Availability Snapshot
+In-memory sets of the serials available for an (item, warehouse), so a picking
+session validates each scan with a set lookup instead of an SAP call per
+serial.
+
+A snapshot is one paged fetch of the Available_Serials_By_WH SQLQuery
+(OSRN/OSRQ) kept for AVAILABILITY_SNAPSHOT_TTL seconds. A serial missing from a
+snapshot older than AVAILABILITY_SNAPSHOT_RECHECK seconds triggers one refresh,
+so stock received after the snapshot was taken is still found. Postings that
+consume stock call invalidate().
+
+Snapshots live in the memory of each worker process and invalidate() only
+clears the calling process. Another gunicorn worker may keep answering from its
+own snapshot for up to AVAILABILITY_SNAPSHOT_TTL seconds after a posting, so a
+serial shipped through one worker can still look available in another until
+then; SAP rejects the posting in that case.
+"""
+
+import logging
+import os
+import threading
+import time
+
+from sap_bulk_sync import iter_sql_query_pages
+
+SERIAL_QUERY = 'Available_Serials_By_WH'
+
+SNAPSHOT_TTL = int(os.environ.get('AVAILABILITY_SNAPSHOT_TTL', '120'))
+RECHECK_AFTER = int(os.environ.get('AVAILABILITY_SNAPSHOT_RECHECK', '10'))
+MAX_SNAPSHOTS = 500
+
+# (item_code, warehouse_code) -> Snapshot, per process
+_snapshots = {}
+_lock = threading.Lock()
+_build_locks = {}
+
+
+class Snapshot:
+    """Available serials of one item in one warehouse at loaded_at"""
+
+    def __init__(self, item_code, warehouse_code, entries):
+        self.item_code = item_code
+        self.warehouse_code = warehouse_code
+        self.entries = entries  # serial number -> row from SAP
+        self.loaded_at = time.monotonic()
+
+    @property
+    def age(self):
+        return time.monotonic() - self.loaded_at
+
+    def __contains__(self, number):
+        return number in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+
+def _key(item_code, warehouse_code):
+    return (item_code or '').strip(), (warehouse_code or '').strip()
+
+
+def _fetch(sap, item_code, warehouse_code):
+    entries = {}
+    for page in iter_sql_query_pages(sap, SERIAL_QUERY, {'itemCode': item_code, 'whsCode': warehouse_code}):
+        for row in page:
+            number = row.get('SerialNumber')
+            if number:
+                entries[number] = row
+    return Snapshot(item_code, warehouse_code, entries)
+
+
+def get_snapshot(sap, item_code, warehouse_code, refresh=False):
+    """
+    Available serials of an item in a warehouse
+
+    Concurrent requests for the same key share one SAP fetch.
+
+    Raises:
+        RuntimeError: SAP B1 unavailable or the query failed
+    """
+    key = _key(item_code, warehouse_code)
+    snapshot = _snapshots.get(key)
+    if snapshot is not None and not refresh and snapshot.age < SNAPSHOT_TTL:
+        return snapshot
+
+    with _lock:
+        build_lock = _build_locks.setdefault(key, threading.Lock())
+
+    with build_lock:
+        # Another request may have refreshed it while this one waited
+        current = _snapshots.get(key)
+        if current is not None and current is not snapshot and current.age < SNAPSHOT_TTL:
+            return current
+
+        if not sap.ensure_logged_in():
+            raise RuntimeError('SAP B1 connection unavailable')
+
+        started = time.monotonic()
+        snapshot = _fetch(sap, *key)
+        with _lock:
+            if len(_snapshots) >= MAX_SNAPSHOTS:
+                oldest = min(_snapshots, key=lambda k: _snapshots[k].loaded_at)
+                _snapshots.pop(oldest, None)
+            _snapshots[key] = snapshot
+        logging.info(f"📸 Serial snapshot {key[0]}@{key[1]}: {len(snapshot)} available "
+                     f"({(time.monotonic() - started) * 1000:.0f} ms)")
+        return snapshot
+
+
+def check_serials(sap, item_code, warehouse_code, serial_numbers):
+    """
+    Check serials against the availability snapshot
+
+    Returns:
+        (available {serial: SAP row}, missing [serial, ...]) in input order
+    """
+    serials = [str(serial).strip() for serial in serial_numbers if serial and str(serial).strip()]
+    snapshot = get_snapshot(sap, item_code, warehouse_code)
+    if any(serial not in snapshot for serial in serials) and snapshot.age >= RECHECK_AFTER:
+        snapshot = get_snapshot(sap, item_code, warehouse_code, refresh=True)
+
+    available = {serial: snapshot.entries[serial] for serial in serials if serial in snapshot}
+    missing = [serial for serial in serials if serial not in snapshot]
+    return available, missing
+
+
+def invalidate(item_code=None, warehouse_code=None):
+    """Drop this process's snapshots after a posting consumed stock (no arguments = all)"""
+    with _lock:
+        for key in list(_snapshots):
+            item, warehouse = key
+            if (item_code is None or item == item_code) and (warehouse_code is None or warehouse == warehouse_code):
+                _snapshots.pop(key, None)
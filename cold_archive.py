@@ -0,0 +1,497 @@
+"""
+Cold Document Archive
+Moves completed documents (posted / rejected, older than
+COLD_ARCHIVE_AFTER_DAYS) with all their child rows out of the hot tables the
+scan and dashboard queries hit, into <table>_archive tables of the same shape.
+
+- The child tables are found from the foreign keys, so items, serials,
+  batches, labels and scan state move together with their document.
+- Each chunk of COLD_ARCHIVE_CHUNK_SIZE documents is copied and deleted in
+  one transaction; archive tables keep the original ids, so a document can
+  be restored exactly (restore_document).
+- A <table>_history view (hot UNION ALL archive, with an is_archived flag)
+  keeps history lists, document lookups and exports complete. List pages and
+  exports read through history_query, which falls back to the hot table until
+  the views exist.
+- The move is replicated to MySQL: archive rows are queued as upserts and the
+  hot rows as deletes (Core statements bypass the flush capture). Serial
+  registry entries of archived serial rows are left as they are - an archived
+  document is finished, so the entry already holds the serial's last state -
+  but rebuild_serial_registry() reads the hot tables only and drops them.
+
+Archive tables and views are generated from the models (ensure_archive_schema)
+the first time archival runs - by the scheduler when COLD_ARCHIVE_INTERVAL is
+set, or /api/cold-archive/run - so new model columns reach them automatically.
+migrations/mysql/changes/2026-10-19_cold_document_archive.sql and
+migrations/postgresql_cold_document_archive.sql create the same schema ahead of
+time (archive_schema_sql).
+"""
+
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, Table, func, inspect as sa_inspect, literal
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+from app import db
+from db_dual_support import get_replication
+from search_index import SearchSpec
+
+ARCHIVE_AFTER_DAYS = int(os.environ.get('COLD_ARCHIVE_AFTER_DAYS', '180'))
+CHUNK_SIZE = int(os.environ.get('COLD_ARCHIVE_CHUNK_SIZE', '100'))  # Documents per transaction
+TERMINAL_STATUSES = ('posted', 'rejected')
+IN_BATCH = 1000
+HISTORY_RECHECK_SECONDS = 300  # How often to look for views created by a migration or another worker
+
+ARCHIVE_SUFFIX = '_archive'
+HISTORY_SUFFIX = '_history'
+
+_archive_metadata = MetaData()
+_history_metadata = MetaData()
+_kinds = {}
+_schema_lock = threading.Lock()
+_schema_ready = False
+_views_ready = False
+_views_checked_at = None
+_scheduler_thread = None
+
+
+class ArchivedDocumentType:
+    """A document root table with its child tables, archive tables and history views"""
+
+    def __init__(self, kind, model, permission, search_columns, prefix_columns=(), numeric_columns=()):
+        self.kind = kind
+        self.model = model
+        self.root = model.__table__
+        self.permission = permission
+        self.tables = _document_tables(self.root)  # Parents before children
+        self.archive = {table.name: _archive_table(table) for table in self.tables}
+        self.history = {table.name: _history_table(table) for table in self.tables}
+        self._search_columns = (search_columns, prefix_columns, numeric_columns)
+        self.search = self.search_spec(self.history_root)
+        self.hot_search = self.search_spec(self.root)
+
+    @property
+    def history_root(self):
+        return self.history[self.root.name]
+
+    def search_spec(self, table):
+        """SearchSpec over the root table or its history view"""
+        search_columns, prefix_columns, numeric_columns = self._search_columns
+        return SearchSpec(
+            columns=[table.c[name] for name in search_columns],
+            prefix_columns=[table.c[name] for name in prefix_columns],
+            numeric_columns=[table.c[name] for name in numeric_columns]
+        )
+
+
+def _document_tables(root):
+    """The root table and every table that references it (directly or through another child)"""
+    members = {root.name}
+    changed = True
+    while changed:
+        changed = False
+        for table in db.metadata.tables.values():
+            if table.name in members:
+                continue
+            if any(fk.column.table.name in members for fk in table.foreign_keys):
+                members.add(table.name)
+                changed = True
+    return [table for table in db.metadata.sorted_tables if table.name in members]
+
+
+def _parent_links(table, members):
+    """(fk column, parent table name) pairs of table inside the document tree"""
+    return [(fk.parent.name, fk.column.table.name) for fk in table.foreign_keys
+            if fk.column.table.name in members and fk.column.table is not table]
+
+
+def _archive_table(table):
+    name = table.name + ARCHIVE_SUFFIX
+    if name in _archive_metadata.tables:
+        return _archive_metadata.tables[name]
+    columns = [Column(c.name, c.type, primary_key=c.primary_key, autoincrement=False,
+                      nullable=c.nullable or not c.primary_key, index=bool(c.foreign_keys))
+               for c in table.c]
+    return Table(name, _archive_metadata, *columns, Column('archived_at', DateTime, index=True),
+                 mysql_engine='InnoDB', mysql_charset='utf8mb4', mysql_collate='utf8mb4_unicode_ci')
+
+
+def _history_table(table):
+    name = table.name + HISTORY_SUFFIX
+    if name in _history_metadata.tables:
+        return _history_metadata.tables[name]
+    return Table(name, _history_metadata, *[Column(c.name, c.type, primary_key=c.primary_key) for c in table.c],
+                 Column('is_archived', Integer))
+
+
+def _load_kinds():
+    """Register the archived document types on first use (module models import the app)"""
+    if _kinds:
+        return _kinds
+
+    from models import InventoryTransfer
+    from modules.grpo.models import GRPODocument
+    from modules.multi_grn_creation.models import MultiGRNBatch
+    from modules.sales_delivery.models import DeliveryDocument
+
+    for document_type in (
+        ArchivedDocumentType('grpo', GRPODocument, 'grpo',
+                             ['po_number', 'doc_number', 'supplier_name', 'sap_document_number'],
+                             prefix_columns=['po_number', 'doc_number', 'sap_document_number']),
+        ArchivedDocumentType('inventory_transfer', InventoryTransfer, 'inventory_transfer',
+                             ['transfer_request_number', 'sap_document_number', 'status'],
+                             prefix_columns=['transfer_request_number', 'sap_document_number']),
+        ArchivedDocumentType('delivery', DeliveryDocument, 'sales_delivery',
+                             ['card_name', 'card_code'], numeric_columns=['so_doc_num', 'sap_doc_num']),
+        ArchivedDocumentType('multi_grn', MultiGRNBatch, 'multiple_grn',
+                             ['batch_number', 'customer_name', 'customer_code'],
+                             prefix_columns=['batch_number'], numeric_columns=['id']),
+    ):
+        _kinds[document_type.kind] = document_type
+    return _kinds
+
+
+def get_document_type(kind):
+    return _load_kinds().get(kind)
+
+
+# ----------------------------------------------------------------------
+# Schema
+# ----------------------------------------------------------------------
+
+def ensure_archive_schema():
+    """Create missing archive tables/columns and (re)create the history views"""
+    global _schema_ready
+
+    with _schema_lock:
+        kinds = _load_kinds()
+        _archive_metadata.create_all(db.engine)
+
+        inspector = sa_inspect(db.engine)
+        views = set(inspector.get_view_names())
+        quote = db.engine.dialect.identifier_preparer.quote
+        done = set()
+        with db.engine.begin() as conn:
+            for document_type in kinds.values():
+                for table in document_type.tables:
+                    if table.name in done:
+                        continue
+                    done.add(table.name)
+                    archive = document_type.archive[table.name]
+                    existing = {column['name'] for column in inspector.get_columns(archive.name)}
+                    for column in archive.c:
+                        if column.name not in existing:
+                            column_type = column.type.compile(dialect=db.engine.dialect)
+                            conn.execute(db.text(
+                                f'ALTER TABLE {archive.name} ADD COLUMN {quote(column.name)} {column_type}'))
+                            logging.info(f"🗄️ Added {column.name} to {archive.name}")
+                    _ensure_history_view(conn, inspector, views, table, archive, quote)
+        _schema_ready = True
+
+
+def history_available():
+    """Whether the history views exist (archival has run here, or the migration was applied)"""
+    global _views_ready, _views_checked_at
+
+    if _schema_ready or _views_ready:
+        return True
+    now = time.monotonic()
+    if _views_checked_at is not None and now - _views_checked_at < HISTORY_RECHECK_SECONDS:
+        return False
+    _views_checked_at = now
+    views = set(sa_inspect(db.engine).get_view_names())
+    _views_ready = all(table.name + HISTORY_SUFFIX in views
+                       for document_type in _load_kinds().values() for table in document_type.tables)
+    return _views_ready
+
+
+def archive_schema_sql(dialect):
+    """DDL of the archive tables and history views for a dialect (the migration files are its output)"""
+    quote = dialect.identifier_preparer.quote
+    statements = []
+    done = set()
+    for document_type in _load_kinds().values():
+        for table in document_type.tables:
+            if table.name in done:
+                continue
+            done.add(table.name)
+            archive = document_type.archive[table.name]
+            statements.append(str(CreateTable(archive, if_not_exists=True).compile(dialect=dialect)).strip())
+            # MySQL has no CREATE INDEX IF NOT EXISTS
+            statements.extend(str(CreateIndex(index, if_not_exists=dialect.name != 'mysql').compile(dialect=dialect))
+                              for index in sorted(archive.indexes, key=lambda index: index.name))
+            statements.append(_history_view_sql(table, archive, quote))
+    return [statement + ';' for statement in statements]
+
+
+def _history_view_sql(table, archive, quote):
+    return f'CREATE OR REPLACE VIEW {table.name + HISTORY_SUFFIX} AS {_history_select_sql(table, archive, quote)}'
+
+
+def _history_select_sql(table, archive, quote):
+    columns = ', '.join(quote(column.name) for column in table.c)
+    return (f'SELECT {columns}, 0 AS is_archived FROM {table.name} '
+            f'UNION ALL SELECT {columns}, 1 AS is_archived FROM {archive.name}')
+
+
+def _ensure_history_view(conn, inspector, views, table, archive, quote):
+    """Create the hot + archive view, or recreate it when the table gained columns"""
+    view = table.name + HISTORY_SUFFIX
+    expected = [column.name for column in table.c] + ['is_archived']
+    if view in views and [column['name'] for column in inspector.get_columns(view)] == expected:
+        return
+
+    conn.execute(db.text(f'DROP VIEW IF EXISTS {view}'))
+    conn.execute(db.text(f'CREATE VIEW {view} AS {_history_select_sql(table, archive, quote)}'))
+    logging.info(f"🗄️ History view {view} created")
+
+
+# ----------------------------------------------------------------------
+# Moving documents
+# ----------------------------------------------------------------------
+
+def _batches(ids):
+    ids = list(ids)
+    for start in range(0, len(ids), IN_BATCH):
+        yield ids[start:start + IN_BATCH]
+
+
+def _collect_ids(document_type, root_ids, source):
+    """Row ids per table of the given documents, read from the hot tables or the archive"""
+    members = {table.name for table in document_type.tables}
+    ids = {document_type.root.name: set(root_ids)}
+    for table in document_type.tables[1:]:
+        source_table = document_type.archive[table.name] if source == 'archive' else table
+        found = set()
+        for column_name, parent in _parent_links(table, members):
+            for batch in _batches(ids.get(parent, ())):
+                found.update(db.session.execute(
+                    db.select(source_table.c.id).where(source_table.c[column_name].in_(batch))).scalars())
+        ids[table.name] = found
+    return ids
+
+
+def _move(document_type, ids, to_archive):
+    """
+    Copy rows parents-first, then delete them children-first, in the current transaction.
+    The copies are queued for MySQL as upserts and the deletes as deletes.
+    """
+    now = datetime.utcnow()
+    replication = get_replication()
+    connection = db.session.connection()
+    for table in document_type.tables:
+        archive = document_type.archive[table.name]
+        source, target = (table, archive) if to_archive else (archive, table)
+        names = [column.name for column in table.c]
+        for batch in _batches(ids.get(table.name, ())):
+            selected = [source.c[name] for name in names]
+            target_columns = names
+            if to_archive:
+                selected = selected + [literal(now, DateTime).label('archived_at')]
+                target_columns = names + ['archived_at']
+            db.session.execute(target.insert().from_select(
+                target_columns, db.select(*selected).where(source.c.id.in_(batch))))
+            if replication:
+                copied = db.session.execute(db.select(target).where(target.c.id.in_(batch))).mappings().all()
+                replication.capture_rows(connection, target.name, 'UPSERT', copied)
+
+    for table in reversed(document_type.tables):
+        source = table if to_archive else document_type.archive[table.name]
+        for batch in _batches(ids.get(table.name, ())):
+            db.session.execute(source.delete().where(source.c.id.in_(batch)))
+            if replication:
+                replication.capture_rows(connection, source.name, 'DELETE', [{'id': row_id} for row_id in batch])
+
+
+def archive_documents(kind, older_than_days=None, max_chunks=None):
+    """
+    Move terminal documents of one kind older than older_than_days to the archive tables
+
+    Returns:
+        dict with success, documents and rows moved
+    """
+    document_type = get_document_type(kind)
+    if document_type is None:
+        return {'success': False, 'error': f'Unknown document type: {kind}'}
+    if not _schema_ready:
+        ensure_archive_schema()
+
+    days = ARCHIVE_AFTER_DAYS if older_than_days is None else older_than_days
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    root = document_type.root
+    documents = rows = 0
+    started = time.monotonic()
+
+    try:
+        for _ in range(max_chunks or 1000):
+            root_ids = db.session.execute(
+                db.select(root.c.id)
+                .where(root.c.status.in_(TERMINAL_STATUSES), root.c.created_at < cutoff)
+                .order_by(root.c.id).limit(CHUNK_SIZE)
+                .with_for_update(skip_locked=True)
+            ).scalars().all()
+            if not root_ids:
+                break
+
+            ids = _collect_ids(document_type, root_ids, 'hot')
+            _move(document_type, ids, to_archive=True)
+            db.session.commit()
+            documents += len(root_ids)
+            rows += sum(len(table_ids) for table_ids in ids.values())
+            if len(root_ids) < CHUNK_SIZE:
+                break
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"❌ Archiving {kind} failed after {documents} documents: {str(e)}")
+        return {'success': False, 'error': str(e), 'documents': documents, 'rows': rows}
+
+    if documents:
+        logging.info(f"🗄️ Archived {documents} {kind} documents ({rows} rows) "
+                     f"in {time.monotonic() - started:.1f}s")
+    return {'success': True, 'kind': kind, 'documents': documents, 'rows': rows}
+
+
+def run_archival(kinds=None, older_than_days=None):
+    """Archive every document type (or the named ones)"""
+    results = [archive_documents(kind, older_than_days) for kind in (kinds or _load_kinds())]
+    return {'success': all(result.get('success') for result in results), 'results': results}
+
+
+def restore_document(kind, document_id):
+    """Move one archived document and its child rows back into the hot tables"""
+    document_type = get_document_type(kind)
+    if document_type is None:
+        return {'success': False, 'error': f'Unknown document type: {kind}'}
+    if not _schema_ready:
+        ensure_archive_schema()
+
+    archive_root = document_type.archive[document_type.root.name]
+    found = db.session.execute(db.select(archive_root.c.id).where(archive_root.c.id == document_id)).scalar()
+    if found is None:
+        return {'success': False, 'error': f'{kind} {document_id} is not archived'}
+
+    try:
+        ids = _collect_ids(document_type, [document_id], 'archive')
+        _move(document_type, ids, to_archive=False)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"❌ Restoring {kind} {document_id} failed: {str(e)}")
+        return {'success': False, 'error': str(e)}
+
+    logging.info(f"♻️ Restored {kind} {document_id} from the archive")
+    return {'success': True, 'kind': kind, 'id': document_id,
+            'rows': sum(len(table_ids) for table_ids in ids.values())}
+
+
+# ----------------------------------------------------------------------
+# History (hot + archive)
+# ----------------------------------------------------------------------
+
+def _readable_tables(document_type):
+    """History views of a document's tables, or the hot tables until the views exist"""
+    if history_available():
+        return document_type.history
+    return {table.name: table for table in document_type.tables}
+
+
+def history_table(kind, table_name):
+    """History view of one of a document type's tables (the hot table until the views exist)"""
+    return _readable_tables(get_document_type(kind))[table_name]
+
+
+def history_query(kind):
+    """
+    Query over every document of a kind, hot and archived, with an is_archived column
+
+    Returns:
+        (query, table, search_spec) - table is the history view, or the hot table
+        until the views exist; filter and order through its columns
+    """
+    document_type = get_document_type(kind)
+    table = _readable_tables(document_type)[document_type.root.name]
+    if table is document_type.history_root:
+        return db.session.query(table), table, document_type.search
+    return db.session.query(table, literal(0).label('is_archived')), table, document_type.hot_search
+
+
+def history_child_counts(kind, child_table, parent_column, parent_ids):
+    """Number of child rows per parent id, hot and archived ({parent_id: count})"""
+    table = history_table(kind, child_table)
+    counts = {}
+    for batch in _batches(parent_ids):
+        counts.update(db.session.execute(
+            db.select(table.c[parent_column], func.count())
+            .where(table.c[parent_column].in_(batch))
+            .group_by(table.c[parent_column])).all())
+    return counts
+
+
+def history_document(kind, document_id):
+    """A document with its child rows from the history views, or None"""
+    document_type = get_document_type(kind)
+    readable = _readable_tables(document_type)
+    history = readable[document_type.root.name]
+    header = db.session.execute(db.select(history).where(history.c.id == document_id)).mappings().first()
+    if header is None:
+        return None
+    header = {'is_archived': 0, **dict(header)}
+
+    members = {table.name for table in document_type.tables}
+    ids = {document_type.root.name: {document_id}}
+    children = {}
+    for table in document_type.tables[1:]:
+        view = readable[table.name]
+        rows = {}
+        for column_name, parent in _parent_links(table, members):
+            for batch in _batches(ids.get(parent, ())):
+                for row in db.session.execute(db.select(view).where(view.c[column_name].in_(batch))).mappings():
+                    rows[row['id']] = dict(row)
+        ids[table.name] = set(rows)
+        if rows:
+            children[table.name] = sorted(rows.values(), key=lambda row: row['id'])
+    return {**header, 'children': children}
+
+
+def start_cold_archive_scheduler(app, interval_seconds=None):
+    """
+    Archive old completed documents in a background thread.
+    Interval comes from COLD_ARCHIVE_INTERVAL (seconds, 0 disables).
+    """
+    global _scheduler_thread
+
+    if interval_seconds is None:
+        interval_seconds = int(os.environ.get('COLD_ARCHIVE_INTERVAL', '0') or 0)
+    if interval_seconds <= 0:
+        logging.info("ℹ️ Cold document archival disabled (COLD_ARCHIVE_INTERVAL not set)")
+        return None
+    if _scheduler_thread and _scheduler_thread.is_alive():
+        return _scheduler_thread
+
+    def run():
+        with app.app_context():
+            try:
+                ensure_archive_schema()
+            except Exception as e:
+                logging.error(f"❌ Cold archive schema not created: {str(e)}")
+            finally:
+                db.session.remove()
+        while True:
+            time.sleep(interval_seconds)
+            with app.app_context():
+                try:
+                    run_archival()
+                except Exception as e:
+                    logging.error(f"❌ Cold archive scheduler error: {str(e)}")
+                finally:
+                    db.session.remove()
+
+    _scheduler_thread = threading.Thread(target=run, name='cold-archive', daemon=True)
+    _scheduler_thread.start()
+    logging.info(f"✅ Cold document archival every {interval_seconds}s "
+                 f"(documents older than {ARCHIVE_AFTER_DAYS} days)")
+    return _scheduler_thread
@@ -0,0 +1,288 @@
+"""
+Data Retention
+Purges scratch rows that have outlived their use - scan state of posted
+transfers, raw GS1 scans, bin scanning logs, abandoned empty drafts and old
+reference data tombstones - so the tables queried on every scan stay small.
+
+Each policy names a table, an age column and extra criteria. The purger takes
+RETENTION_CHUNK_SIZE rows at a time (FOR UPDATE SKIP LOCKED where supported,
+so several workers never double-process a chunk), optionally writes them to
+data_retention_archive as one zlib-compressed JSON blob, deletes them by
+primary key and commits, pausing RETENTION_CHUNK_PAUSE seconds between chunks
+to avoid long lock holds. The deletes are queued for the MySQL mirror in the
+same transaction. A policy's age limit can be overridden with
+RETENTION_DAYS_<POLICY> (0 disables the policy).
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta
+
+from app import db
+from db_dual_support import get_replication
+from models import DataRetentionArchive, DataRetentionRun
+from sap_bulk_sync import get_dialect
+
+CHUNK_SIZE = int(os.environ.get('RETENTION_CHUNK_SIZE', '500'))
+CHUNK_PAUSE = float(os.environ.get('RETENTION_CHUNK_PAUSE', '0.1'))
+MAX_CHUNKS = int(os.environ.get('RETENTION_MAX_CHUNKS', '200'))  # Per policy per pass
+
+_scheduler_thread = None
+_policies = {}
+
+
+class RetentionPolicy:
+    """Rows of model older than days (by age_column) that also match criteria()"""
+
+    def __init__(self, name, model, age_column, days, criteria=None, archive=False,
+                 watermark_column=None, description=''):
+        self.name = name
+        self.model = model
+        self.table = model.__table__
+        self.age_column = age_column
+        self.default_days = days
+        self.criteria = criteria or (lambda: [])
+        self.archive = archive
+        self.watermark_column = watermark_column
+        self.description = description
+
+    @property
+    def days(self):
+        return int(os.environ.get(f'RETENTION_DAYS_{self.name.upper()}', self.default_days) or 0)
+
+    def filters(self, now):
+        return [self.age_column < now - timedelta(days=self.days), *self.criteria()]
+
+
+def _load_policies():
+    """Build the policies on first use (module models import the app)"""
+    if _policies:
+        return _policies
+
+    from models import BinScanningLog, InventoryTransfer, QCDashboardEvent, ReferenceDataEntry, TransferScanState
+    from modules.multi_grn_creation.models import Gs1Scan
+    from modules.so_against_invoice.models import SOInvoiceDocument
+
+    for policy in (
+        RetentionPolicy(
+            'transfer_scan_states', TransferScanState, TransferScanState.created_at, 7,
+            criteria=lambda: [TransferScanState.transfer_id.in_(
+                db.select(InventoryTransfer.id).where(InventoryTransfer.status == 'posted'))],
+            description='Scanned packs of posted inventory transfers'),
+        RetentionPolicy(
+            'gs1_scans', Gs1Scan, Gs1Scan.created_on, 30,
+            description='Raw GS1 barcode scans'),
+        RetentionPolicy(
+            'bin_scanning_logs', BinScanningLog, BinScanningLog.scan_timestamp, 90, archive=True,
+            description='Bin scanning audit log'),
+        RetentionPolicy(
+            'so_invoice_empty_drafts', SOInvoiceDocument, SOInvoiceDocument.created_at, 7,
+            criteria=lambda: [SOInvoiceDocument.status == 'draft', ~SOInvoiceDocument.items.any()],
+            description='SO Against Invoice drafts that never got a line'),
+        RetentionPolicy(
+            'reference_data_tombstones', ReferenceDataEntry, ReferenceDataEntry.updated_at, 30,
+            criteria=lambda: [ReferenceDataEntry.deleted.is_(True)],
+            watermark_column='version',
+            description='Deleted reference data rows (devices behind the purge get a full bundle)'),
+        RetentionPolicy(
+            'qc_dashboard_events', QCDashboardEvent, QCDashboardEvent.created_at, 2,
+            description='Status changes already pushed to QC dashboards'),
+    ):
+        _policies[policy.name] = policy
+    return _policies
+
+
+def _select_chunk(policy, now):
+    pk = policy.table.c.id
+    columns = list(policy.table.c) if policy.archive else [pk] + (
+        [policy.table.c[policy.watermark_column]] if policy.watermark_column else [])
+    query = (db.select(*columns).where(*policy.filters(now)).order_by(pk).limit(CHUNK_SIZE)
+             .with_for_update(skip_locked=True))
+    return db.session.execute(query).mappings().all()
+
+
+def _archive_chunk(policy, rows):
+    payload = json.dumps([dict(row) for row in rows], default=str, separators=(',', ':'))
+    db.session.add(DataRetentionArchive(
+        policy=policy.name,
+        table_name=policy.table.name,
+        first_id=rows[0]['id'],
+        last_id=rows[-1]['id'],
+        row_count=len(rows),
+        payload=zlib.compress(payload.encode('utf-8'), 6)
+    ))
+
+
+def purge_policy(policy, now=None, max_chunks=None):
+    """
+    Delete (and optionally archive) the rows of one policy in chunks
+
+    The run row is written in the same transaction as each chunk, so a
+    watermark is never behind the rows actually deleted.
+
+    Returns:
+        dict with policy, purged, archived and seconds
+    """
+    now = now or datetime.utcnow()
+    started = time.monotonic()
+    stats = {'policy': policy.name, 'purged': 0, 'archived': 0}
+    if policy.days <= 0:
+        return {**stats, 'skipped': True}
+
+    run = None
+    replication = get_replication()
+    try:
+        for _ in range(max_chunks or MAX_CHUNKS):
+            rows = _select_chunk(policy, now)
+            if not rows:
+                break
+
+            if run is None:
+                run = DataRetentionRun(policy=policy.name, table_name=policy.table.name, purged=0, archived=0,
+                                       started_at=now)
+                db.session.add(run)
+            archived = len(rows) if policy.archive else 0
+            if archived:
+                _archive_chunk(policy, rows)
+
+            ids = [row['id'] for row in rows]
+            db.session.execute(policy.table.delete().where(policy.table.c.id.in_(ids)))
+            if replication:
+                # A Core delete never reaches the flush capture
+                replication.capture_rows(db.session.connection(), policy.table.name, 'DELETE',
+                                         [{'id': row_id} for row_id in ids])
+
+            run.purged = stats['purged'] + len(ids)
+            run.archived = stats['archived'] + archived
+            if policy.watermark_column:
+                highest = max(row[policy.watermark_column] for row in rows)
+                run.watermark = max(run.watermark or 0, highest)
+            run.finished_at = datetime.utcnow()
+            db.session.commit()
+            stats['purged'] += len(ids)
+            stats['archived'] += archived
+
+            if len(rows) < CHUNK_SIZE:
+                break
+            time.sleep(CHUNK_PAUSE)
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"❌ Retention {policy.name} failed after {stats['purged']} rows: {str(e)}")
+        db.session.add(DataRetentionRun(policy=policy.name, table_name=policy.table.name,
+                                        purged=stats['purged'], archived=stats['archived'],
+                                        error=str(e), started_at=now, finished_at=datetime.utcnow()))
+        db.session.commit()
+        return {**stats, 'error': str(e)}
+
+    stats['seconds'] = round(time.monotonic() - started, 2)
+    if stats['purged']:
+        logging.info(f"🧹 Retention {policy.name}: purged {stats['purged']} rows "
+                     f"({stats['archived']} archived) in {stats['seconds']}s")
+    return stats
+
+
+def run_retention(names=None):
+    """Run every policy (or the named ones) once"""
+    policies = _load_policies()
+    results = []
+    for name in names or policies:
+        if name not in policies:
+            results.append({'policy': name, 'error': 'Unknown policy'})
+            continue
+        results.append(purge_policy(policies[name]))
+    return {'success': not any(r.get('error') for r in results), 'policies': results}
+
+
+def purge_watermark(policy_name):
+    """Highest watermark value a policy has purged (0 when nothing was purged)"""
+    return db.session.query(db.func.max(DataRetentionRun.watermark)).filter(
+        DataRetentionRun.policy == policy_name, DataRetentionRun.error.is_(None)).scalar() or 0
+
+
+def archived_rows(archive):
+    """Decode the rows stored in a DataRetentionArchive entry"""
+    return json.loads(zlib.decompress(archive.payload).decode('utf-8'))
+
+
+def _table_size(table_name):
+    """Estimated rows and bytes of a table from the catalog (exact count on SQLite)"""
+    dialect = get_dialect()
+    if dialect == 'postgresql':
+        row = db.session.execute(db.text(
+            "SELECT reltuples::bigint AS row_estimate, pg_total_relation_size(oid) AS total_bytes "
+            "FROM pg_class WHERE relname = :name AND relkind = 'r'"), {'name': table_name}).first()
+    elif dialect == 'mysql':
+        row = db.session.execute(db.text(
+            "SELECT table_rows AS row_estimate, data_length + index_length AS total_bytes FROM information_schema.tables "
+            "WHERE table_schema = DATABASE() AND table_name = :name"), {'name': table_name}).first()
+    else:
+        count = db.session.execute(db.text(f"SELECT COUNT(*) FROM {table_name}")).scalar()
+        return {'rows': count, 'bytes': None}
+    if row is None:
+        return {'rows': None, 'bytes': None}
+    return {'rows': max(int(row.row_estimate or 0), 0), 'bytes': int(row.total_bytes or 0)}
+
+
+def retention_status():
+    """Policies with table size, rows currently due for purge and the last run"""
+    now = datetime.utcnow()
+    policies = []
+    for policy in _load_policies().values():
+        last_run = DataRetentionRun.query.filter_by(policy=policy.name).order_by(
+            DataRetentionRun.id.desc()).first()
+        due = None
+        if policy.days > 0:
+            due = db.session.execute(db.select(db.func.count()).select_from(policy.table)
+                                     .where(*policy.filters(now))).scalar()
+        policies.append({
+            'policy': policy.name,
+            'table': policy.table.name,
+            'description': policy.description,
+            'days': policy.days,
+            'archive': policy.archive,
+            'due': due,
+            **_table_size(policy.table.name),
+            'last_run': {
+                'purged': last_run.purged,
+                'archived': last_run.archived,
+                'error': last_run.error,
+                'finished_at': last_run.finished_at.isoformat() if last_run.finished_at else None
+            } if last_run else None
+        })
+    return {'policies': policies, 'archive': _table_size(DataRetentionArchive.__tablename__)}
+
+
+def start_data_retention_scheduler(app, interval_seconds=None):
+    """
+    Run the retention policies in a background thread.
+    Interval comes from DATA_RETENTION_INTERVAL (seconds, 0 disables).
+    """
+    global _scheduler_thread
+
+    if interval_seconds is None:
+        interval_seconds = int(os.environ.get('DATA_RETENTION_INTERVAL', '3600') or 0)
+    if interval_seconds <= 0:
+        logging.info("ℹ️ Data retention purger disabled (DATA_RETENTION_INTERVAL=0)")
+        return None
+    if _scheduler_thread and _scheduler_thread.is_alive():
+        return _scheduler_thread
+
+    def run():
+        while True:
+            time.sleep(interval_seconds)
+            with app.app_context():
+                try:
+                    run_retention()
+                except Exception as e:
+                    logging.error(f"❌ Data retention purger error: {str(e)}")
+                finally:
+                    db.session.remove()
+
+    _scheduler_thread = threading.Thread(target=run, name='data-retention', daemon=True)
+    _scheduler_thread.start()
+    logging.info(f"✅ Data retention purger started (every {interval_seconds}s)")
+    return _scheduler_thread
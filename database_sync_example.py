@@ -1,9 +1,12 @@
 """
 Example usage of dual database synchronization
 This shows how to sync changes to both SQLite and MySQL databases
+
+Model changes are queued for MySQL automatically when the session flushes
+(db_dual_support change capture), so a commit is all that is needed.
+sync_model_change() is only for tables that are not mapped models.
 """
 
-from db_dual_support import sync_model_change
 from flask import current_app
 import logging
 
@@ -17,10 +20,7 @@ def create_grpo_with_sync(grpo_data):
         
         grpo = GRPODocument(**grpo_data)
         db.session.add(grpo)
-        db.session.commit()
-        
-        # Sync to MySQL
-        sync_model_change('grpo_document', 'INSERT', grpo_data)
+        db.session.commit()  # Queued for MySQL by the flush capture
         
         logging.info(f"✅ GRPO {grpo.po_number} created and synced to both databases")
         return grpo
@@ -45,10 +45,7 @@ def update_user_with_sync(user_id, update_data):
         for key, value in update_data.items():
             setattr(user, key, value)
         
-        db.session.commit()
-        
-        # Sync to MySQL
-        sync_model_change('user', 'UPDATE', update_data, f"id = {user_id}")
+        db.session.commit()  # Queued for MySQL by the flush capture
         
         logging.info(f"✅ User {user.username} updated and synced to both databases")
         return user
@@ -1,30 +1,92 @@
 """
 Dual Database Support Module
-Handles both SQLite (for Replit) and MySQL (for local development) synchronization
+Replicates changes from the primary database to the secondary MySQL database.
+
+Changes are captured into the replication_outbox table in the same transaction
+as the change (SQLAlchemy after_flush), then drained in batches by a background
+write-behind worker, so MySQL never adds latency to user requests.
+
+While MySQL is unreachable (connection and operational errors) the worker backs
+off exponentially and nothing counts toward a row's attempts; only a row that
+MySQL itself rejects is retried up to MYSQL_REPLICATION_MAX_ATTEMPTS and then
+marked dead. Within a batch, upserts are applied parents-first and deletes
+children-first by foreign key.
+
+Every worker process runs a replicator, but only one drains at a time: a drain
+locks the oldest pending rows (FOR UPDATE NOWAIT) for its whole transaction,
+and any other drain that finds them locked skips its turn. Batches are
+therefore applied one after another in id order. SQLite has no row locks, so
+run a single worker there.
 """
 
 import os
 import logging
-from sqlalchemy import create_engine, text
-from sqlalchemy.exc import SQLAlchemyError
+import threading
+import time
+from sqlalchemy import create_engine, text, event, inspect as sa_inspect
+from sqlalchemy.exc import SQLAlchemyError, DBAPIError, DisconnectionError, InterfaceError, OperationalError
 import json
-from datetime import datetime
+from datetime import datetime, date
+from decimal import Decimal
+
+OUTBOX_TABLE = 'replication_outbox'
+# PostgreSQL lock_not_available: another process holds the rows
+LOCK_NOT_AVAILABLE = '55P03'
+
+
+def _is_unavailable(error):
+    """MySQL down or unreachable (as opposed to MySQL rejecting the row itself)"""
+    if isinstance(error, (OperationalError, InterfaceError, DisconnectionError)):
+        return True
+    return isinstance(error, DBAPIError) and error.connection_invalidated
+
+
+class ReplicationUnavailable(Exception):
+    """MySQL could not be reached; the batch stays queued untouched"""
+
+
+def _json_default(value):
+    """Serialise datetime/Decimal values captured from model columns"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, bytes):
+        return value.decode('utf-8', errors='replace')
+    return str(value)
+
 
 class DualDatabaseManager:
-    """Manages dual database support for SQLite and MySQL"""
-    
+    """Manages dual database support with a write-behind MySQL replicator"""
+
     def __init__(self, app):
         self.app = app
+        self.db = app.extensions.get('sqlalchemy')
         self.sqlite_engine = None
         self.mysql_engine = None
+        self.batch_size = int(os.environ.get('MYSQL_REPLICATION_BATCH_SIZE', '500'))
+        self.poll_interval = float(os.environ.get('MYSQL_REPLICATION_POLL_SECONDS', '1'))
+        self.max_attempts = int(os.environ.get('MYSQL_REPLICATION_MAX_ATTEMPTS', '10'))
+        tables = os.environ.get('MYSQL_REPLICATION_TABLES', '*').strip()
+        self.replicated_tables = None if tables in ('', '*') else {t.strip() for t in tables.split(',') if t.strip()}
+        self._worker = None
+        self._capture_registered = False
+        self._table_rank = None
+        self.metrics = {
+            'last_drained_at': None,
+            'last_batch_size': 0,
+            'replicated_total': 0,
+            'failed_batches': 0,
+            'last_error': None
+        }
         self.setup_engines()
-    
+
     def setup_engines(self):
         """Setup both SQLite and MySQL engines"""
         # SQLite engine (primary for Replit)
         sqlite_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'wms.db')
         self.sqlite_engine = create_engine(f"sqlite:///{sqlite_path}")
-        
+
         # MySQL engine (for local development sync)
         mysql_config = {
             'host': os.environ.get('MYSQL_HOST', 'localhost'),
@@ -33,101 +95,422 @@ class DualDatabaseManager:
             'password': os.environ.get('MYSQL_PASSWORD', 'root@123'),
             'database': os.environ.get('MYSQL_DATABASE', 'wms_db_dev')
         }
-        
+
         try:
             mysql_url = f"mysql+pymysql://{mysql_config['user']}:{mysql_config['password']}@{mysql_config['host']}:{mysql_config['port']}/{mysql_config['database']}"
-            self.mysql_engine = create_engine(mysql_url, connect_args={'connect_timeout': 5})
-            
+            # Pooled engine - only the replicator thread uses it, so a small pool is enough
+            self.mysql_engine = create_engine(
+                mysql_url,
+                connect_args={'connect_timeout': 5},
+                pool_size=2,
+                max_overflow=2,
+                pool_recycle=280,
+                pool_pre_ping=True
+            )
+
             # Test the connection
             with self.mysql_engine.connect() as conn:
                 conn.execute(text("SELECT 1"))
-                
+
             logging.info("✅ MySQL engine configured and connected successfully")
         except Exception as e:
             logging.warning(f"⚠️ MySQL engine connection failed: {e}. Operating in SQLite-only mode.")
             self.mysql_engine = None
-    
+
+    # ------------------------------------------------------------------
+    # Capture (request path) - only writes to the primary database
+    # ------------------------------------------------------------------
+
+    def _replicates(self, table_name):
+        if table_name == OUTBOX_TABLE:
+            return False
+        return self.replicated_tables is None or table_name in self.replicated_tables
+
+    def register_change_capture(self, db):
+        """Capture every flushed INSERT/UPDATE/DELETE into the outbox, inside the same transaction"""
+        if self._capture_registered:
+            return
+        event.listen(db.session, 'after_flush', self._capture_flush)
+        self._capture_registered = True
+        logging.info("✅ MySQL replication change capture registered (after_flush)")
+
+    def _capture_flush(self, session, flush_context):
+        changes = [(obj, 'INSERT') for obj in session.new]
+        changes += [(obj, 'UPDATE') for obj in session.dirty if session.is_modified(obj, include_collections=False)]
+        changes += [(obj, 'DELETE') for obj in session.deleted]
+
+        now = datetime.utcnow()
+        rows = []
+        for obj, operation in changes:
+            mapper = sa_inspect(obj).mapper
+            table = mapper.local_table
+            if not self._replicates(table.name):
+                continue
+
+            values = {}
+            for attr in mapper.column_attrs:
+                column = attr.columns[0]
+                if column.table is table:
+                    values[column.name] = getattr(obj, attr.key)
+            pk = {column.name: values.get(column.name) for column in table.primary_key.columns}
+            rows.append(self._outbox_row(table.name, operation, pk, values, now))
+
+        if rows:
+            from models import ReplicationOutbox
+            session.connection().execute(ReplicationOutbox.__table__.insert(), rows)
+
+    @staticmethod
+    def _outbox_row(table_name, operation, pk, values, now):
+        return {
+            'table_name': table_name,
+            'operation': operation,
+            'pk_value': json.dumps(pk, default=_json_default, sort_keys=True),
+            'payload': None if operation == 'DELETE' else json.dumps(values, default=_json_default),
+            'status': 'pending',
+            'attempts': 0,
+            'created_at': now
+        }
+
+    def capture_rows(self, connection, table_name, operation, rows, key_columns=('id',)):
+        """
+        Queue rows changed by Core statements (which the flush capture never sees) in the
+        caller's transaction. rows are full row mappings; operation is 'UPSERT' or 'DELETE'.
+        """
+        if not self._capture_registered or not self._replicates(table_name):
+            return
+        now = datetime.utcnow()
+        outbox_rows = [self._outbox_row(table_name, operation, {column: row[column] for column in key_columns},
+                                        dict(row), now) for row in rows]
+        if outbox_rows:
+            from models import ReplicationOutbox
+            connection.execute(ReplicationOutbox.__table__.insert(), outbox_rows)
+
+    def _enqueue(self, rows):
+        """Write outbox rows in their own short transaction (explicit sync calls made after commit)"""
+        db = self.db
+        from models import ReplicationOutbox
+        now = datetime.utcnow()
+        for row in rows:
+            row.setdefault('status', 'pending')
+            row.setdefault('attempts', 0)
+            row.setdefault('created_at', now)
+        with db.engine.begin() as conn:
+            conn.execute(ReplicationOutbox.__table__.insert(), rows)
+
     def sync_to_mysql(self, table_name, operation, data=None, where_clause=None):
-        """Synchronize changes to MySQL database"""
+        """Queue a change for MySQL; applied asynchronously by the replicator"""
         if not self.mysql_engine:
             logging.debug(f"MySQL not available, skipping sync for {table_name}")
             return
-        
+
+        if self._capture_registered and table_name in self.db.metadata.tables and self._replicates(table_name):
+            # Already queued by the flush capture - a second copy would fail on the duplicate key
+            logging.debug(f"Skipping explicit MySQL sync for {table_name}: captured on flush")
+            return
+
         if not data and operation in ['INSERT', 'UPDATE']:
             logging.warning(f"No data provided for {operation} operation on {table_name}")
             return
-        
+
         try:
-            with self.mysql_engine.connect() as conn:
-                if operation == 'INSERT' and data:
-                    # Build INSERT statement
-                    columns = ', '.join(data.keys())
-                    placeholders = ', '.join([f":{key}" for key in data.keys()])
-                    sql = f"INSERT INTO {table_name} ({columns}) VALUES ({placeholders})"
-                    conn.execute(text(sql), data)
-                    
-                elif operation == 'UPDATE' and data:
-                    # Build UPDATE statement
-                    set_clause = ', '.join([f"{key} = :{key}" for key in data.keys()])
-                    sql = f"UPDATE {table_name} SET {set_clause} WHERE {where_clause}"
-                    conn.execute(text(sql), data)
-                    
-                elif operation == 'DELETE':
-                    # Build DELETE statement
-                    sql = f"DELETE FROM {table_name} WHERE {where_clause}"
-                    conn.execute(text(sql), data or {})
-                
-                conn.commit()
-                logging.debug(f"✅ Synced {operation} to MySQL: {table_name}")
-                
+            if operation == 'INSERT' and data:
+                columns = ', '.join(data.keys())
+                placeholders = ', '.join([f":{key}" for key in data.keys()])
+                sql = f"INSERT INTO {table_name} ({columns}) VALUES ({placeholders})"
+            elif operation == 'UPDATE' and data:
+                set_clause = ', '.join([f"{key} = :{key}" for key in data.keys()])
+                sql = f"UPDATE {table_name} SET {set_clause} WHERE {where_clause}"
+            elif operation == 'DELETE':
+                sql = f"DELETE FROM {table_name} WHERE {where_clause}"
+            else:
+                return
+
+            self._enqueue([{
+                'table_name': table_name,
+                'operation': 'SQL',
+                'payload': json.dumps({'sql': sql, 'params': data or {}}, default=_json_default)
+            }])
+            logging.debug(f"📥 Queued {operation} for MySQL: {table_name}")
+
         except SQLAlchemyError as e:
-            logging.error(f"❌ MySQL sync failed for {table_name}: {e}")
+            logging.error(f"❌ Could not queue MySQL sync for {table_name}: {e}")
         except Exception as e:
-            logging.error(f"❌ Unexpected error during MySQL sync: {e}")
-    
+            logging.error(f"❌ Unexpected error queueing MySQL sync: {e}")
+
     def execute_dual_query(self, sql, params=None):
-        """Execute query on both databases"""
+        """Execute query on the primary database; MySQL receives it through the replication queue"""
         results = {'sqlite': [], 'mysql': []}
-        
+
         # Execute on SQLite
+        executed = False
+        returns_rows = False
         if self.sqlite_engine:
             try:
                 with self.sqlite_engine.connect() as conn:
                     result = conn.execute(text(sql), params or {})
+                    returns_rows = result.returns_rows
                     if result.returns_rows:
                         results['sqlite'] = result.fetchall()
                     else:
                         results['sqlite'] = result.rowcount
+                    conn.commit()
+                executed = True
             except Exception as e:
                 logging.error(f"SQLite query failed: {e}")
-        
-        # Execute on MySQL if available
-        if self.mysql_engine:
+
+        # Queries only need to run on the primary; writes are replicated write-behind,
+        # and only once the primary accepted them
+        if self.mysql_engine and executed and not returns_rows:
             try:
-                with self.mysql_engine.connect() as conn:
-                    result = conn.execute(text(sql), params or {})
-                    if result.returns_rows:
-                        results['mysql'] = result.fetchall()
-                    else:
-                        results['mysql'] = result.rowcount
-                    conn.commit()
+                self._enqueue([{
+                    'table_name': '',
+                    'operation': 'SQL',
+                    'payload': json.dumps({'sql': sql, 'params': params or {}}, default=_json_default)
+                }])
+                results['mysql'] = 'queued'
             except Exception as e:
-                logging.error(f"MySQL query failed: {e}")
-        
+                logging.error(f"Could not queue MySQL query: {e}")
+
         return results
 
+    # ------------------------------------------------------------------
+    # Replication (background worker) - never on the request path
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _quote(name):
+        return f"`{name}`"
+
+    def _rank(self, table_name):
+        """Position of a table in foreign key dependency order (parents first)"""
+        if self._table_rank is None:
+            self._table_rank = {table.name: index for index, table in enumerate(self.db.metadata.sorted_tables)}
+        return self._table_rank.get(table_name, len(self._table_rank))
+
+    def _apply_rows(self, conn, rows):
+        """
+        Apply outbox rows to MySQL in order.
+
+        Changes to the same primary key are collapsed to the latest state (payloads are
+        full rows) while keeping the position of the first change, then grouped into
+        executemany statements. Raw SQL entries act as ordering barriers.
+        """
+        pending = {}
+
+        def flush_pending():
+            groups = {}
+            for (table_name, _), (operation, payload, pk) in pending.items():
+                if operation == 'DELETE':
+                    key = ('DELETE', table_name, tuple(sorted(pk)))
+                    groups.setdefault(key, []).append(pk)
+                else:
+                    key = ('UPSERT', table_name, tuple(payload))
+                    groups.setdefault(key, []).append(payload)
+
+            # Upserts parents-first, then deletes children-first
+            ordered = sorted(groups.items(), key=lambda group: (
+                group[0][0] == 'DELETE',
+                -self._rank(group[0][1]) if group[0][0] == 'DELETE' else self._rank(group[0][1])
+            ))
+            for (kind, table_name, columns), params in ordered:
+                if kind == 'DELETE':
+                    where = ' AND '.join(f"{self._quote(c)} = :{c}" for c in columns)
+                    conn.execute(text(f"DELETE FROM {self._quote(table_name)} WHERE {where}"), params)
+                else:
+                    column_list = ', '.join(self._quote(c) for c in columns)
+                    placeholders = ', '.join(f":{c}" for c in columns)
+                    updates = ', '.join(f"{self._quote(c)} = VALUES({self._quote(c)})" for c in columns)
+                    conn.execute(text(
+                        f"INSERT INTO {self._quote(table_name)} ({column_list}) VALUES ({placeholders}) "
+                        f"ON DUPLICATE KEY UPDATE {updates}"
+                    ), params)
+            pending.clear()
+
+        for row in rows:
+            if row.operation == 'SQL':
+                flush_pending()
+                body = json.loads(row.payload)
+                conn.execute(text(body['sql']), body.get('params') or {})
+                continue
+
+            key = (row.table_name, row.pk_value)
+            change = (row.operation, json.loads(row.payload) if row.payload else None, json.loads(row.pk_value))
+            if change[0] == 'DELETE' or key not in pending:
+                pending[key] = change
+            else:
+                pending[key] = ('UPSERT', change[1], change[2])
+
+        flush_pending()
+
+    def _claim_batch(self, conn):
+        """
+        Lock the oldest pending rows for this drain; None while another process drains.
+        A drain never takes the rows after a locked one, so per-key order holds.
+        """
+        from models import ReplicationOutbox
+        outbox = ReplicationOutbox.__table__
+        try:
+            return conn.execute(
+                outbox.select()
+                .where(outbox.c.status == 'pending')
+                .order_by(outbox.c.id)
+                .limit(self.batch_size)
+                .with_for_update(nowait=True)
+            ).fetchall()
+        except OperationalError as e:
+            if getattr(e.orig, 'pgcode', None) == LOCK_NOT_AVAILABLE:
+                return None
+            raise
+
+    def drain_once(self):
+        """Replicate one batch of outbox rows; returns the number of rows applied"""
+        db = self.db
+        from models import ReplicationOutbox
+        outbox = ReplicationOutbox.__table__
+
+        unavailable = None
+        # One transaction: the row locks of the claim last until the applied rows are deleted
+        with db.engine.begin() as conn:
+            rows = self._claim_batch(conn)
+            if not rows:
+                return 0
+
+            applied = []
+            try:
+                with self.mysql_engine.begin() as mconn:
+                    self._apply_rows(mconn, rows)
+                applied = rows
+            except Exception as e:
+                self.metrics['failed_batches'] += 1
+                self.metrics['last_error'] = str(e)
+                if _is_unavailable(e):
+                    raise ReplicationUnavailable(str(e)) from e
+                logging.warning(f"⚠️ MySQL replication batch of {len(rows)} failed ({e}); retrying row by row")
+                # Isolate the failing row so it cannot block the rest of the queue forever
+                for row in rows:
+                    try:
+                        with self.mysql_engine.begin() as mconn:
+                            self._apply_rows(mconn, [row])
+                        applied.append(row)
+                    except Exception as row_error:
+                        if _is_unavailable(row_error):
+                            # MySQL went away mid-batch: keep what was applied, retry the rest later
+                            unavailable = row_error
+                            break
+                        attempts = (row.attempts or 0) + 1
+                        conn.execute(outbox.update().where(outbox.c.id == row.id).values(
+                            attempts=attempts,
+                            last_error=str(row_error)[:2000],
+                            status='dead' if attempts >= self.max_attempts else 'pending'
+                        ))
+                        if attempts >= self.max_attempts:
+                            logging.error(f"❌ MySQL replication gave up on outbox row {row.id} "
+                                          f"({row.operation} {row.table_name} {row.pk_value}): {row_error}")
+                        break  # Keep per-key ordering: later rows wait for this one
+
+            self._delete_applied(conn, applied)
+
+        if unavailable is not None:
+            raise ReplicationUnavailable(str(unavailable)) from unavailable
+
+        self.metrics['last_drained_at'] = datetime.utcnow()
+        self.metrics['last_batch_size'] = len(applied)
+        self.metrics['replicated_total'] += len(applied)
+        return len(applied)
+
+    @staticmethod
+    def _delete_applied(conn, rows):
+        if not rows:
+            return
+        from models import ReplicationOutbox
+        outbox = ReplicationOutbox.__table__
+        conn.execute(outbox.delete().where(outbox.c.id.in_([row.id for row in rows])))
+
+    def start_replicator(self):
+        """Start the background write-behind worker thread"""
+        if not self.mysql_engine:
+            return None
+        if self._worker and self._worker.is_alive():
+            return self._worker
+
+        def run():
+            backoff = self.poll_interval
+            while True:
+                try:
+                    with self.app.app_context():
+                        applied = self.drain_once()
+                    backoff = self.poll_interval
+                    if applied < self.batch_size:
+                        time.sleep(self.poll_interval)
+                except ReplicationUnavailable as e:
+                    backoff = min(backoff * 2, 60)
+                    logging.warning(f"⚠️ MySQL unavailable, replication paused for {backoff:g}s: {e}")
+                    time.sleep(backoff)
+                except Exception as e:
+                    self.metrics['last_error'] = str(e)
+                    logging.error(f"❌ MySQL replicator error: {e}")
+                    backoff = min(backoff * 2, 60)
+                    time.sleep(backoff)
+
+        self._worker = threading.Thread(target=run, name='mysql-replicator', daemon=True)
+        self._worker.start()
+        logging.info("✅ MySQL write-behind replicator started")
+        return self._worker
+
+    def dispose_engines(self, close=True):
+        """Drop pooled connections (close=False after a fork: the parent still owns the sockets)"""
+        for engine in (self.sqlite_engine, self.mysql_engine):
+            if engine is not None:
+                engine.dispose(close=close)
+
+    def get_replication_status(self):
+        """Queue depth and lag metrics for monitoring"""
+        db = self.db
+        from models import ReplicationOutbox
+        from sqlalchemy import func, select
+        outbox = ReplicationOutbox.__table__
+
+        with db.engine.connect() as conn:
+            pending, oldest = conn.execute(
+                select(func.count(), func.min(outbox.c.created_at)).where(outbox.c.status == 'pending')
+            ).one()
+            dead = conn.execute(select(func.count()).where(outbox.c.status == 'dead')).scalar()
+
+        return {
+            'enabled': self.mysql_engine is not None,
+            'worker_alive': bool(self._worker and self._worker.is_alive()),
+            'pending': pending,
+            'dead': dead,
+            'lag_seconds': (datetime.utcnow() - oldest).total_seconds() if oldest else 0,
+            'last_drained_at': self.metrics['last_drained_at'].isoformat() if self.metrics['last_drained_at'] else None,
+            'last_batch_size': self.metrics['last_batch_size'],
+            'replicated_total': self.metrics['replicated_total'],
+            'failed_batches': self.metrics['failed_batches'],
+            'last_error': self.metrics['last_error']
+        }
+
 # Global instance
 dual_db_manager = None
 
-def init_dual_database(app):
-    """Initialize dual database support"""
+def init_dual_database(app, start_replicator=True):
+    """Initialize dual database support (start_replicator=False leaves the worker thread to the caller)"""
     global dual_db_manager
     dual_db_manager = DualDatabaseManager(app)
+    if dual_db_manager.mysql_engine and dual_db_manager.db:
+        dual_db_manager.register_change_capture(dual_db_manager.db)
+        if start_replicator:
+            dual_db_manager.start_replicator()
     return dual_db_manager
 
+def get_replication():
+    """The manager when flushed changes are captured for MySQL, else None (for Core writes to call capture_rows)"""
+    if dual_db_manager and dual_db_manager.mysql_engine and dual_db_manager._capture_registered:
+        return dual_db_manager
+    return None
+
 def sync_model_change(model_name, operation, data, where_clause=None):
     """Helper function to sync model changes"""
     if dual_db_manager:
         # Convert SQLAlchemy model name to table name
         table_name = model_name.lower() + 's' if not model_name.endswith('s') else model_name.lower()
-        dual_db_manager.sync_to_mysql(table_name, operation, data, where_clause)
\ No newline at end of file
+        dual_db_manager.sync_to_mysql(table_name, operation, data, where_clause)
@@ -0,0 +1,170 @@
+"""
+Document Number Allocator
+Hands out document numbers from blocks reserved in document_number_series
+(hi/lo allocation), so concurrent document creation does not queue on the
+series row and never receives the same number twice.
+
+Each process reserves DOCUMENT_NUMBER_BLOCK_SIZE numbers at a time with one
+atomic statement in its own short transaction:
+
+- PostgreSQL / SQLite: UPDATE ... SET current_number = current_number + n RETURNING ...
+- MySQL: UPDATE ... SET current_number = LAST_INSERT_ID(current_number + n), then
+  SELECT LAST_INSERT_ID() on the same connection
+
+and then serves numbers from memory. The caller's session is never flushed or
+committed. Numbers are unique but, with several workers, not strictly in
+creation order, and a block's unused numbers are skipped when a worker exits.
+"""
+
+import logging
+import os
+import threading
+from datetime import datetime
+
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+
+BLOCK_SIZE = int(os.environ.get('DOCUMENT_NUMBER_BLOCK_SIZE', '20'))
+
+# Prefix used when a document type has no series row yet
+DEFAULT_PREFIXES = {
+    'GRPO': 'GRPO-',
+    'TRANSFER': 'TR-',
+    'PICKLIST': 'PL-',
+    'SERIAL_TRANSFER': 'ST-'
+}
+
+_SERIES_TABLE = 'document_number_series'
+
+
+class _Block:
+    """A reserved range [next_value, end) of one document type"""
+
+    def __init__(self, start, end, prefix, year_suffix):
+        self.next_value = start
+        self.end = end
+        self.prefix = prefix
+        self.year_suffix = year_suffix
+        self.pid = os.getpid()
+
+    def usable(self):
+        # A block inherited through fork() is shared with the parent - never reuse it
+        return self.next_value < self.end and self.pid == os.getpid()
+
+
+class BlockAllocator:
+    """Per-process hi/lo allocator over document_number_series"""
+
+    def __init__(self, engine=None, block_size=None):
+        self._engine = engine
+        self.block_size = max(1, block_size or BLOCK_SIZE)
+        self._blocks = {}
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+
+    @property
+    def engine(self):
+        return self._engine or db.engine
+
+    def _lock(self, document_type):
+        with self._locks_guard:
+            return self._locks.setdefault(document_type, threading.Lock())
+
+    def next_value(self, document_type):
+        """Next integer of the series, with its prefix and year_suffix flag"""
+        with self._lock(document_type):
+            block = self._blocks.get(document_type)
+            if block is None or not block.usable():
+                block = self._reserve(document_type)
+                self._blocks[document_type] = block
+            value = block.next_value
+            block.next_value += 1
+            return value, block.prefix, block.year_suffix
+
+    def next_number(self, document_type):
+        """Next formatted document number, e.g. GRPO-0042-2026"""
+        value, prefix, year_suffix = self.next_value(document_type)
+        year = datetime.now().strftime('%Y') if year_suffix else ''
+        return f"{prefix}{value:04d}{'-' + year if year else ''}"
+
+    def reset(self):
+        """Forget reserved blocks (unused numbers are skipped)"""
+        with self._locks_guard:
+            self._blocks.clear()
+
+    # ------------------------------------------------------------------
+    # Reservation - one short transaction on its own connection
+    # ------------------------------------------------------------------
+
+    def _reserve(self, document_type):
+        for attempt in range(3):
+            try:
+                with self.engine.begin() as conn:
+                    reserved = self._increment(conn, document_type)
+                    if reserved is None:
+                        self._create_series(conn, document_type)
+                        reserved = self._increment(conn, document_type)
+                end, prefix, year_suffix = reserved
+                logging.debug(f"🔢 Reserved {document_type} numbers {end - self.block_size}-{end - 1}")
+                return _Block(end - self.block_size, end, prefix, bool(year_suffix))
+            except IntegrityError:
+                # Another worker created the series row first - its row is there now
+                if attempt == 2:
+                    raise
+        raise RuntimeError(f"Could not reserve document numbers for {document_type}")
+
+    def _increment(self, conn, document_type):
+        """Advance current_number by a block; returns (new current_number, prefix, year_suffix) or None"""
+        params = {'size': self.block_size, 'now': datetime.utcnow(), 'document_type': document_type}
+
+        if conn.dialect.name == 'mysql':
+            result = conn.execute(db.text(
+                f"UPDATE {_SERIES_TABLE} SET current_number = LAST_INSERT_ID(current_number + :size), "
+                f"updated_at = :now WHERE document_type = :document_type"), params)
+            if result.rowcount == 0:
+                return None
+            end = conn.execute(db.text("SELECT LAST_INSERT_ID()")).scalar()
+            row = conn.execute(db.text(
+                f"SELECT prefix, year_suffix FROM {_SERIES_TABLE} WHERE document_type = :document_type"),
+                params).first()
+            return int(end), row.prefix, row.year_suffix
+
+        if getattr(conn.dialect, 'update_returning', False):
+            row = conn.execute(db.text(
+                f"UPDATE {_SERIES_TABLE} SET current_number = current_number + :size, updated_at = :now "
+                f"WHERE document_type = :document_type RETURNING current_number, prefix, year_suffix"), params).first()
+            return None if row is None else (int(row.current_number), row.prefix, row.year_suffix)
+
+        # Older SQLite: the UPDATE takes the database write lock, so the read-back is ours
+        result = conn.execute(db.text(
+            f"UPDATE {_SERIES_TABLE} SET current_number = current_number + :size, updated_at = :now "
+            f"WHERE document_type = :document_type"), params)
+        if result.rowcount == 0:
+            return None
+        row = conn.execute(db.text(
+            f"SELECT current_number, prefix, year_suffix FROM {_SERIES_TABLE} WHERE document_type = :document_type"),
+            params).first()
+        return int(row.current_number), row.prefix, row.year_suffix
+
+    def _create_series(self, conn, document_type):
+        now = datetime.utcnow()
+        conn.execute(db.text(
+            f"INSERT INTO {_SERIES_TABLE} (document_type, prefix, current_number, year_suffix, created_at, updated_at) "
+            f"VALUES (:document_type, :prefix, 1, :year_suffix, :now, :now)"
+        ), {'document_type': document_type, 'prefix': DEFAULT_PREFIXES.get(document_type, 'DOC-'),
+            'year_suffix': True, 'now': now})
+        logging.info(f"✅ Created document number series {document_type}")
+
+
+allocator = BlockAllocator()
+
+
+def next_document_number(document_type):
+    """Next formatted number of a document series (does not touch the caller's session)"""
+    return allocator.next_number(document_type)
+
+
+def next_document_value(document_type):
+    """Next integer of a document series, for callers that format numbers themselves"""
+    return allocator.next_value(document_type)[0]
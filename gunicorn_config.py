@@ -0,0 +1,41 @@
+"""
+Gunicorn settings for production deployments
+
+    gunicorn -c gunicorn_config.py main:app
+
+The app is imported once in the master (preload_app) and the workers are
+forked from it, so they share the imported code, models and templates
+copy-on-write instead of each importing and initialising everything again.
+Importing main:app starts no background threads, so the master holds none;
+when_ready drops its database connections before the first fork. Whatever
+must not cross a fork is made per worker in post_fork
+(app.init_worker_process): database connections, SAP limiters and circuit
+breaker, and the background schedulers and replicator.
+
+Workers come from WEB_CONCURRENCY (gunicorn's own default); --bind,
+--workers etc. on the command line still override these settings. The
+development workflow (gunicorn --reload 'main:create_app()') does not use
+this file; it starts the services in its single process.
+"""
+
+import gc
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+threads = int(os.environ.get('GUNICORN_THREADS', '8'))
+preload_app = True
+
+
+def when_ready(server):
+    """Master is loaded and about to fork the first workers"""
+    from app import app, dispose_connections
+    dispose_connections(app)  # The master never serves requests
+    # Keep everything imported so far out of the garbage collector, so a GC pass
+    # in a worker does not write to (and un-share) the pages it inherited
+    gc.freeze()
+    server.log.info(f"Preloaded app; {gc.get_freeze_count()} objects frozen for copy-on-write sharing")
+
+
+def post_fork(server, worker):
+    from app import app, init_worker_process
+    init_worker_process(app)
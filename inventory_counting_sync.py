@@ -0,0 +1,274 @@
+"""
+Inventory Counting Sync Engine
+Merges SAP B1 InventoryCountings lines into sap_inventory_count_lines by
+(count_id, line_number) and sends back only the lines the counter changed.
+
+Each local line keeps sync_hash - a hash of its editable fields as SAP last
+reported or accepted them. A submitted line whose hash differs is dirty; only
+dirty lines are PATCHed, in size-bounded chunks, and written back locally with
+one multi-row upsert.
+"""
+
+import hashlib
+import json
+import logging
+import os
+from datetime import datetime
+
+from app import db
+from models import SAPInventoryCount, SAPInventoryCountLine
+from sap_bulk_sync import bulk_upsert, replicate_deletes
+
+PATCH_CHUNK_SIZE = int(os.environ.get('INVCNT_PATCH_CHUNK_SIZE', '200'))
+
+# Fields the counter can change - a difference in any of them makes the line dirty
+EDITABLE_FIELDS = [
+    'Counted', 'UoMCountedQuantity', 'CountedQuantity', 'Freeze', 'BinEntry',
+    'CounterType', 'CounterID', 'MultipleCounterRole', 'LineStatus',
+    'InventoryCountingLineUoMs', 'InventoryCountingSerialNumbers', 'InventoryCountingBatchNumbers'
+]
+
+LINE_KEY_COLUMNS = ['count_id', 'line_number']
+LINE_COLUMNS = [
+    'item_code', 'item_description', 'warehouse_code', 'bin_entry', 'in_warehouse_quantity',
+    'counted', 'uom_code', 'bar_code', 'items_per_unit', 'counter_type', 'counter_id',
+    'multiple_counter_role', 'line_status', 'project_code', 'manufacturer', 'supplier_catalog_no',
+    'preferred_vendor', 'cost_code', 'u_floor', 'u_rack', 'u_level', 'freeze', 'u_invcount',
+    'variance', 'sync_hash'
+]
+
+
+def _safe_float(value, default=0):
+    if value is None or value == '':
+        return default
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return default
+
+
+def counting_lines(document):
+    """SAP returns InventoryCountingLines; older callers used InventoryCountLines"""
+    return document.get('InventoryCountingLines') or document.get('InventoryCountLines') or []
+
+
+def line_hash(line):
+    """Hash of a line's editable fields (numbers normalised so 5 and 5.0 match)"""
+    values = []
+    for field in EDITABLE_FIELDS:
+        value = line.get(field)
+        if isinstance(value, bool):
+            value = int(value)
+        elif isinstance(value, (int, float)):
+            value = float(value)
+        elif value in (None, ''):
+            value = [] if field.startswith('InventoryCounting') else None
+        values.append(value)
+    payload = json.dumps(values, sort_keys=True, default=str)
+    return hashlib.md5(payload.encode('utf-8')).hexdigest()
+
+
+# SAP line field -> local column, copied as-is (or from the stored row when the field is left out)
+LINE_FIELDS = {
+    'ItemDescription': 'item_description',
+    'WarehouseCode': 'warehouse_code',
+    'BinEntry': 'bin_entry',
+    'UoMCode': 'uom_code',
+    'BarCode': 'bar_code',
+    'CounterType': 'counter_type',
+    'CounterID': 'counter_id',
+    'MultipleCounterRole': 'multiple_counter_role',
+    'LineStatus': 'line_status',
+    'ProjectCode': 'project_code',
+    'Manufacturer': 'manufacturer',
+    'SupplierCatalogNo': 'supplier_catalog_no',
+    'PreferredVendor': 'preferred_vendor',
+    'CostCode': 'cost_code',
+    'U_Floor': 'u_floor',
+    'U_Rack': 'u_rack',
+    'U_Level': 'u_level',
+    'U_InvCount': 'u_invcount'
+}
+
+
+def _line_row(count_id, line, stored=None):
+    """
+    Local row for an SAP counting line
+
+    With stored (the line's current local columns), fields the line leaves out keep
+    their stored value - a client PATCH payload carries only what the counter edits.
+    """
+    stored = stored or {}
+
+    def value(field, column, default=None):
+        if field in line or column not in stored:
+            return line.get(field, default)
+        return stored[column]
+
+    in_whs_qty = _safe_float(value('InWarehouseQuantity', 'in_warehouse_quantity'), 0)
+    if line.get('Variance') is not None:
+        variance = _safe_float(line.get('Variance'), 0)
+    elif 'UoMCountedQuantity' in line or 'variance' not in stored:
+        variance = _safe_float(line.get('UoMCountedQuantity'), 0) - in_whs_qty
+    else:
+        variance = stored['variance']
+
+    row = {
+        'count_id': count_id,
+        'line_number': line.get('LineNumber'),
+        'item_code': value('ItemCode', 'item_code') or '',
+        'in_warehouse_quantity': in_whs_qty,
+        'counted': value('Counted', 'counted', 'tNO'),
+        'items_per_unit': _safe_float(value('ItemsPerUnit', 'items_per_unit'), 1),
+        'freeze': value('Freeze', 'freeze', 'tNO'),
+        'variance': variance,
+        'sync_hash': line_hash(line)
+    }
+    for field, column in LINE_FIELDS.items():
+        row[column] = value(field, column)
+    return row
+
+
+def _stored_rows(count_id, line_numbers):
+    """Current local columns of the given lines, by line number"""
+    rows = SAPInventoryCountLine.query.filter(
+        SAPInventoryCountLine.count_id == count_id,
+        SAPInventoryCountLine.line_number.in_(line_numbers)
+    ).all()
+    return {row.line_number: {column: getattr(row, column) for column in LINE_COLUMNS} for row in rows}
+
+
+def _upsert_header(doc_entry, document, user_id):
+    local_doc = SAPInventoryCount.query.filter_by(doc_entry=int(doc_entry)).first()
+    now = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+
+    if not local_doc:
+        local_doc = SAPInventoryCount(doc_entry=int(doc_entry), user_id=user_id, loaded_at=now)
+        db.session.add(local_doc)
+
+    local_doc.doc_number = document.get('DocumentNumber', local_doc.doc_number)
+    local_doc.series = document.get('Series', local_doc.series) or 0
+    local_doc.count_date = document.get('CountDate', local_doc.count_date)
+    local_doc.counting_type = document.get('CountingType', local_doc.counting_type)
+    local_doc.count_time = document.get('CountTime', local_doc.count_time)
+    local_doc.single_counter_type = document.get('SingleCounterType', local_doc.single_counter_type)
+    local_doc.document_status = document.get('DocumentStatus', local_doc.document_status)
+    local_doc.remarks = document.get('Remarks', local_doc.remarks)
+    local_doc.reference_2 = document.get('Reference2', local_doc.reference_2)
+    if document.get('BPL_IDAssignedToInvoice') is not None:
+        local_doc.branch_id = str(document.get('BPL_IDAssignedToInvoice'))
+    local_doc.financial_period = document.get('FinancialPeriod', local_doc.financial_period)
+    local_doc.counter_type = document.get('CounterType', local_doc.counter_type)
+    local_doc.counter_id = document.get('CounterID', local_doc.counter_id)
+    local_doc.multiple_counter_role = document.get('MultipleCounterRole', local_doc.multiple_counter_role)
+    local_doc.last_updated_at = now
+    db.session.flush()
+    return local_doc
+
+
+def merge_counting_document(invcnt_data, user_id):
+    """
+    Merge an SAP counting document into the local tables without rewriting unchanged lines
+
+    Returns:
+        dict with inserted, updated, unchanged, total and removed line counts
+    """
+    doc_entry = invcnt_data.get('DocumentEntry')
+    local_doc = _upsert_header(doc_entry, invcnt_data, user_id)
+
+    lines = counting_lines(invcnt_data)
+    stats = bulk_upsert(
+        SAPInventoryCountLine.__tablename__,
+        LINE_KEY_COLUMNS,
+        (_line_row(local_doc.id, line) for line in lines),
+        LINE_COLUMNS
+    )
+
+    # Lines deleted from the document in SAP
+    line_numbers = [line.get('LineNumber') for line in lines]
+    criteria = [SAPInventoryCountLine.count_id == local_doc.id]
+    if line_numbers:
+        criteria.append(~SAPInventoryCountLine.line_number.in_(line_numbers))
+    replicate_deletes(SAPInventoryCountLine.__table__, *criteria)
+    stale = SAPInventoryCountLine.query.filter(*criteria)
+    stats['removed'] = stale.delete(synchronize_session=False)
+
+    db.session.commit()
+    logging.info(f"✅ Merged SAP counting document {doc_entry}: {stats['inserted']} new, "
+                 f"{stats['updated']} changed, {stats['unchanged']} unchanged, {stats['removed']} removed lines")
+    return stats
+
+
+def find_dirty_lines(count_id, lines):
+    """Submitted lines whose editable fields differ from what SAP last accepted"""
+    known = dict(
+        db.session.query(SAPInventoryCountLine.line_number, SAPInventoryCountLine.sync_hash)
+        .filter(SAPInventoryCountLine.count_id == count_id)
+        .all()
+    )
+    return [line for line in lines if known.get(line.get('LineNumber')) != line_hash(line)]
+
+
+def push_counting_changes(sap, doc_entry, document, user_id, chunk_size=None):
+    """
+    PATCH only the changed counting lines to SAP and record them locally
+
+    Lines are sent in chunks of chunk_size (INVCNT_PATCH_CHUNK_SIZE); collections are
+    merged by LineNumber so lines left out of a PATCH are untouched in SAP. Chunks that
+    SAP accepted stay recorded even if a later chunk fails. Locally only the fields the
+    payload carries are written; the rest of each stored line is kept. If the local
+    write fails after SAP accepted a chunk, the result is still a success, with warning.
+
+    Returns:
+        dict with success, lines_sent, lines_unchanged, chunks, error and (on a local
+        write failure) warning
+    """
+    chunk_size = chunk_size or PATCH_CHUNK_SIZE
+    local_doc = _upsert_header(doc_entry, document, user_id)
+    db.session.commit()
+
+    lines = counting_lines(document)
+    dirty = find_dirty_lines(local_doc.id, lines)
+    result = {
+        'success': True,
+        'lines_sent': 0,
+        'lines_unchanged': len(lines) - len(dirty),
+        'chunks': 0,
+        'error': None
+    }
+    if not dirty:
+        logging.info(f"ℹ️ Counting document {doc_entry}: no changed lines to send")
+        return result
+
+    for start in range(0, len(dirty), chunk_size):
+        chunk = dirty[start:start + chunk_size]
+        sap_result = sap.update_inventory_counting(doc_entry, {'InventoryCountingLines': chunk})
+        if not sap_result.get('success'):
+            result['success'] = False
+            result['error'] = sap_result.get('error')
+            result['sap_response'] = sap_result.get('sap_response')
+            break
+
+        result['lines_sent'] += len(chunk)
+        result['chunks'] += 1
+
+        # SAP has the chunk now; a local failure must not turn that into an error
+        try:
+            stored = _stored_rows(local_doc.id, [line.get('LineNumber') for line in chunk])
+            bulk_upsert(
+                SAPInventoryCountLine.__tablename__,
+                LINE_KEY_COLUMNS,
+                [_line_row(local_doc.id, line, stored.get(line.get('LineNumber'))) for line in chunk],
+                LINE_COLUMNS
+            )
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"❌ Counting document {doc_entry}: SAP accepted {len(chunk)} lines but the local copy "
+                          f"was not updated: {e}")
+            result['warning'] = (f"Saved in SAP, but the local copy could not be updated ({e}); "
+                                 f"reload the document from SAP to refresh it")
+
+    logging.info(f"📤 Counting document {doc_entry}: sent {result['lines_sent']}/{len(dirty)} changed lines "
+                 f"in {result['chunks']} PATCH(es), {result['lines_unchanged']} unchanged")
+    return result
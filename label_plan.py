@@ -0,0 +1,109 @@
+"""
+Label Plan
+Pack splitting and label layout shared by the receiving modules (GRPO,
+Multi GRN, GRPO transfer).
+
+Packs hold whole units: the received quantity is rounded half-up and spread
+so pack sizes differ by at most one, larger packs first (11 into 3 packs is
+4, 4, 3). Serial-managed lines are cut into equal runs of serials instead.
+
+A plan holds every pack of a document - quantity, label ID and QR payload -
+and is saved with one add_all and a single flush instead of a flush per pack;
+SQLAlchemy batches the INSERTs where the driver can return the new keys. Going
+through the session rather than a Core insert keeps the replication and
+serial registry flush capture. QR images are not rendered here; label
+printing renders them on first print.
+"""
+
+import json
+from decimal import Decimal, ROUND_HALF_UP
+
+
+def round_quantity(quantity):
+    """Whole units in a quantity, rounding .5 up (not banker's rounding)"""
+    return int(Decimal(str(quantity or 0)).to_integral_value(rounding=ROUND_HALF_UP))
+
+
+def split_quantity(total_quantity, num_packs):
+    """
+    Whole-unit quantity of each pack; the first packs take one extra unit each
+    until the remainder is used up
+
+    Example: 11 into 3 packs = [4, 4, 3]
+    Example: 110.5 into 4 packs = [28, 28, 28, 27] (rounds to 111)
+
+    Returns:
+        list of num_packs ints adding up to round_quantity(total_quantity)
+    """
+    if num_packs <= 0:
+        return []
+    base, remainder = divmod(round_quantity(total_quantity), num_packs)
+    return [base + 1] * remainder + [base] * (num_packs - remainder)
+
+
+def chunk_serials(serials, num_packs):
+    """
+    Cut serials into num_packs equal runs, keeping their order
+
+    Raises:
+        ValueError: when there are no serials or they do not divide evenly
+    """
+    serials = list(serials)
+    if not serials:
+        raise ValueError('No serial numbers found for this item')
+    if num_packs <= 0 or len(serials) % num_packs:
+        raise ValueError(f'{len(serials)} serials cannot be evenly divided into {num_packs} packs')
+    size = len(serials) // num_packs
+    return [serials[start:start + size] for start in range(0, len(serials), size)]
+
+
+class LabelPlan:
+    """Packs of one document with their label IDs and QR payloads"""
+
+    def __init__(self):
+        self.packs = []
+
+    def add_line(self, total_quantity, num_packs, label_id, qr_fields=None, skip_empty=False, **extra):
+        """
+        Plan the packs of one line (or one batch of a line)
+
+        Args:
+            total_quantity: Quantity spread over the packs (see split_quantity)
+            num_packs: Number of packs
+            label_id: callable(pack) returning the label / GRN number of a pack
+            qr_fields: QR payload in key order; 'id', 'qty' and 'pack' are set per pack
+            skip_empty: Leave out packs that get no units
+            extra: Kept on every pack for the caller (e.g. parent row ids)
+
+        Returns:
+            list of the planned pack dicts
+        """
+        planned = []
+        for number, quantity in enumerate(split_quantity(total_quantity, num_packs), start=1):
+            if skip_empty and quantity <= 0:
+                continue
+            pack = {'sequence': len(self.packs), 'pack_number': number, 'total_packs': num_packs,
+                    'quantity': quantity, **extra}
+            pack['label_id'] = label_id(pack)
+            if qr_fields is not None:
+                qr_data = dict(qr_fields)
+                qr_data.update(id=pack['label_id'], qty=quantity, pack=f"{number} of {num_packs}")
+                pack['qr_data'] = qr_data
+                pack['qr_text'] = json.dumps(qr_data)
+            self.packs.append(pack)
+            planned.append(pack)
+        return planned
+
+    @property
+    def total_quantity(self):
+        return sum(pack['quantity'] for pack in self.packs)
+
+    def save(self, build):
+        """Create one model row per pack (build(pack) returns the instance) and flush them together"""
+        from app import db  # app imports the receiving modules, which import this one
+
+        rows = [build(pack) for pack in self.packs]
+        if rows:
+            db.session.add_all(rows)
+            db.session.flush()
+        return rows
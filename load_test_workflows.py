@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+"""
+WMS end-to-end load test against the SAP B1 Service Layer simulator
+Replays scan / receive / transfer / post / pick workflows against a running
+WMS whose SAP_B1_SERVER points at sap_simulator.py, and reports p50/p95/p99
+latency per workflow and per step plus the SAP calls every workflow costs.
+
+SAP calls per workflow are measured in a serial warm-up pass (one run of each
+workflow between two /sim/stats snapshots), so they are exact; the load phase
+then runs LOAD_TEST_USERS concurrent users for LOAD_TEST_DURATION seconds
+(or LOAD_TEST_ITERATIONS workflows per user) with the LOAD_TEST_MIX weights.
+
+    SAP_SIM_PORT=50001 python sap_simulator.py &
+    SAP_B1_SERVER=http://127.0.0.1:50001 SAP_B1_USERNAME=manager SAP_B1_PASSWORD=sim \\
+        SAP_B1_COMPANY_DB=SIM_COMPANY gunicorn --bind 0.0.0.0:5000 --threads 8 'main:create_app()' &
+    LOAD_TEST_USERS=8 LOAD_TEST_DURATION=60 python load_test_workflows.py
+
+Set LOAD_TEST_REPORT to a file name to also write the results as JSON.
+"""
+
+import json
+import math
+import os
+import random
+import sys
+import threading
+import time
+from collections import defaultdict
+
+import requests
+
+from sap_simulator import build_dataset
+
+BASE_URL = os.environ.get('LOAD_TEST_BASE_URL', 'http://127.0.0.1:5000').rstrip('/')
+SIM_URL = os.environ.get('SAP_SIM_URL', 'http://127.0.0.1:50001').rstrip('/')
+USERNAME = os.environ.get('LOAD_TEST_USERNAME', 'admin')
+PASSWORD = os.environ.get('LOAD_TEST_PASSWORD', 'admin123')
+USERS = int(os.environ.get('LOAD_TEST_USERS', '8'))
+DURATION = float(os.environ.get('LOAD_TEST_DURATION', '60'))
+ITERATIONS = int(os.environ.get('LOAD_TEST_ITERATIONS', '0'))  # Per user, overrides the duration
+MIX = os.environ.get('LOAD_TEST_MIX', 'scan=4,receive=2,transfer=2,post=1,pick=1')
+SEED = int(os.environ.get('SAP_SIM_SEED', '42'))  # Must match the simulator to find its documents
+TIMEOUT = float(os.environ.get('LOAD_TEST_TIMEOUT', '60'))
+MAX_ERROR_RATE = float(os.environ.get('LOAD_TEST_MAX_ERROR_RATE', '0.05'))
+REPORT = os.environ.get('LOAD_TEST_REPORT', '')
+
+
+class WorkflowError(Exception):
+    """A step answered an HTTP error or success: false"""
+
+
+class Catalog:
+    """Documents, items and serials of the simulated company (same seed as the simulator)"""
+
+    def __init__(self, seed):
+        data = build_dataset(seed)
+        self.warehouses = [w['WarehouseCode'] for w in data['Warehouses']]
+        self.items = {kind: [i['ItemCode'] for i in data['Items'] if self._kind(i) == kind]
+                      for kind in ('batch', 'serial', 'none')}
+        self.purchase_orders = [(po['Series'], po['DocNum'], po['DocEntry']) for po in data['PurchaseOrders']]
+        self.transfer_requests = [(t['Series'], t['DocNum'], t['DocEntry'])
+                                  for t in data['InventoryTransferRequests']]
+        self.pick_lists = [p['Absoluteentry'] for p in data['PickLists']]
+        self.serials = [(s['ItemCode'], s['DistNumber']) for s in data['serials']]
+
+    @staticmethod
+    def _kind(item):
+        if item['ManageBatchNumbers'] == 'tYES':
+            return 'batch'
+        return 'serial' if item['ManageSerialNumbers'] == 'tYES' else 'none'
+
+
+class WorkflowClient:
+    """One logged-in WMS user; times every step of the workflow it runs"""
+
+    def __init__(self, user_index, catalog):
+        self.session = requests.Session()
+        self.rng = random.Random(SEED * 1000 + user_index)
+        self.catalog = catalog
+        # Every user moves its own serials, so concurrent users never post the same one
+        self.serials = catalog.serials[user_index::USERS] or catalog.serials
+        self.steps = []
+
+    def login(self):
+        response = self.session.post(f"{BASE_URL}/login", data={'username': USERNAME, 'password': PASSWORD},
+                                     allow_redirects=False, timeout=TIMEOUT)
+        if response.status_code != 302 or '/login' in response.headers.get('Location', ''):
+            raise WorkflowError(f"WMS login failed for {USERNAME} ({response.status_code})")
+
+    def step(self, name, method, path, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = self.session.request(method, f"{BASE_URL}{path}", timeout=TIMEOUT, **kwargs)
+        except requests.RequestException as e:
+            self.steps.append((name, time.perf_counter() - started))
+            raise WorkflowError(f"{name}: {e}")
+        self.steps.append((name, time.perf_counter() - started))
+        try:
+            payload = response.json()
+        except ValueError:
+            payload = None
+        if response.status_code >= 400 or (isinstance(payload, dict) and payload.get('success') is False):
+            detail = payload.get('error') or payload.get('message') if isinstance(payload, dict) else response.status_code
+            raise WorkflowError(f"{name}: {detail}")
+        return payload
+
+
+# ----------------------------------------------------------------------
+# Workflows
+# ----------------------------------------------------------------------
+
+def scan_workflow(client):
+    """Operator scans a bin and an item: bins of the warehouse, item validation, serial or batch lookup"""
+    warehouse = client.rng.choice(client.catalog.warehouses)
+    kind = client.rng.choice(['batch', 'serial', 'none'])
+    item_code = client.rng.choice(client.catalog.items[kind])
+    client.step('scan.bins', 'GET', '/api/get-bins', params={'warehouse': warehouse})
+    client.step('scan.validate_item', 'POST', '/direct-inventory-transfer/api/validate-item',
+                data={'item_code': item_code})
+    if kind == 'serial':
+        serial = client.rng.choice([s for code, s in client.serials if code == item_code] or
+                                   [s for code, s in client.catalog.serials if code == item_code])
+        client.step('scan.serial_location', 'GET', '/api/get-serial-location', params={'serial_number': serial})
+    elif kind == 'batch':
+        client.step('scan.batches', 'GET', '/api/get-batch-numbers',
+                    params={'item_code': item_code, 'warehouse': warehouse})
+
+
+def receive_workflow(client):
+    """Goods receipt lookup: PO series, open POs, DocEntry, PO header and its open lines"""
+    series, doc_num, _ = client.rng.choice(client.catalog.purchase_orders)
+    client.step('receive.po_series', 'GET', '/api/get-po-series')
+    client.step('receive.open_pos', 'GET', '/api/get-po-docnums', params={'series': series})
+    result = client.step('receive.doc_entry', 'POST', '/api/get-doc-entry', json={'series': series, 'doc_num': doc_num})
+    doc_entry = result.get('doc_entry') if isinstance(result, dict) else None
+    if not doc_entry:
+        raise WorkflowError(f"receive.doc_entry: no DocEntry for {series}/{doc_num}")
+    client.step('receive.po', 'POST', '/api/get-po-by-doc-entry', json={'doc_entry': doc_entry})
+    client.step('receive.po_lines', 'GET', f'/multi-grn/api/po-lines/{doc_entry}')
+
+
+def transfer_workflow(client):
+    """Transfer request lookup: series, open requests, DocEntry, request details and destination bins"""
+    series, doc_num, _ = client.rng.choice(client.catalog.transfer_requests)
+    client.step('transfer.series', 'GET', '/api/get-invt-series')
+    client.step('transfer.open_requests', 'GET', '/api/get-invt-docnums', params={'series': series})
+    result = client.step('transfer.doc_entry', 'GET', '/api/get-invt-docentry',
+                         params={'series': series, 'doc_num': doc_num})
+    doc_entry = result.get('doc_entry') if isinstance(result, dict) else None
+    if not doc_entry:
+        raise WorkflowError(f"transfer.doc_entry: no DocEntry for {series}/{doc_num}")
+    details = client.step('transfer.details', 'GET', '/api/get-invt-details', params={'doc_entry': doc_entry})
+    to_warehouse = ((details or {}).get('data') or {}).get('ToWarehouse') or client.catalog.warehouses[0]
+    client.step('transfer.bins', 'GET', '/inventory_transfer/api/bin-locations',
+                params={'warehouse_code': to_warehouse})
+
+
+def post_workflow(client):
+    """Scan a serial, then post a stock transfer of it and of an unmanaged item to another warehouse"""
+    item_code, serial = client.rng.choice(client.serials)
+    location = client.step('post.serial_location', 'GET', '/api/get-serial-location', params={'serial_number': serial})
+    from_warehouse = location['data']['WhsCode']
+    to_warehouse = client.rng.choice([w for w in client.catalog.warehouses if w != from_warehouse])
+    unmanaged = client.rng.choice(client.catalog.items['none'])
+    client.step('post.stock_transfer', 'POST', '/api/post-stock-transfer', json={
+        'FromWarehouse': from_warehouse,
+        'ToWarehouse': to_warehouse,
+        'Comments': 'WMS load test',
+        'StockTransferLines': [
+            {'LineNum': 0, 'ItemCode': item_code, 'Quantity': 1, 'FromWarehouseCode': from_warehouse,
+             'WarehouseCode': to_warehouse, 'SerialNumbers': [{'InternalSerialNumber': serial, 'Quantity': 1}]},
+            {'LineNum': 1, 'ItemCode': unmanaged, 'Quantity': 1, 'FromWarehouseCode': from_warehouse,
+             'WarehouseCode': to_warehouse}
+        ]
+    })
+
+
+def pick_workflow(client):
+    """Open a released pick list with its bin allocations"""
+    client.step('pick.lookup', 'GET', f'/api/lookup-pick-list/{client.rng.choice(client.catalog.pick_lists)}')
+
+
+WORKFLOWS = {
+    'scan': scan_workflow,
+    'receive': receive_workflow,
+    'transfer': transfer_workflow,
+    'post': post_workflow,
+    'pick': pick_workflow,
+}
+
+
+# ----------------------------------------------------------------------
+# Measurement
+# ----------------------------------------------------------------------
+
+def percentile(values, pct):
+    """Nearest-rank percentile (None for no values)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(int(math.ceil(pct / 100.0 * len(ordered))) - 1, 0)]
+
+
+def _latency(values):
+    return {
+        'count': len(values),
+        'p50_ms': round(percentile(values, 50) * 1000, 1) if values else None,
+        'p95_ms': round(percentile(values, 95) * 1000, 1) if values else None,
+        'p99_ms': round(percentile(values, 99) * 1000, 1) if values else None,
+        'max_ms': round(max(values) * 1000, 1) if values else None
+    }
+
+
+def sim_stats():
+    return requests.get(f"{SIM_URL}/sim/stats", timeout=TIMEOUT).json()
+
+
+def _calls_between(before, after):
+    calls = {}
+    for resource, counts in after['by_resource'].items():
+        delta = counts['calls'] - before['by_resource'].get(resource, {}).get('calls', 0)
+        if delta:
+            calls[resource] = delta
+    return {'requests': after['requests'] - before['requests'],
+            'operations': after['operations'] - before['operations'],
+            'by_resource': calls}
+
+
+def parse_mix(mix):
+    weights = {}
+    for part in mix.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in WORKFLOWS:
+            raise ValueError(f"Unknown workflow '{name}' in LOAD_TEST_MIX")
+        weights[name] = float(weight or 1)
+    return weights
+
+
+def warm_up(catalog, names):
+    """Run every workflow once, alone, and record the SAP calls it made"""
+    client = WorkflowClient(0, catalog)
+    client.login()
+    calls = {}
+    for name in names:
+        before = sim_stats()
+        try:
+            WORKFLOWS[name](client)
+            error = None
+        except WorkflowError as e:
+            error = str(e)
+        calls[name] = {**_calls_between(before, sim_stats()), 'error': error}
+    return calls
+
+
+def run_load(catalog, weights):
+    """USERS threads pick workflows by weight until the duration (or iteration count) is used up"""
+    names = list(weights)
+    results = defaultdict(lambda: {'durations': [], 'failures': 0, 'errors': defaultdict(int)})
+    steps = defaultdict(list)
+    lock = threading.Lock()
+    deadline = time.monotonic() + DURATION
+    start_gate = threading.Barrier(USERS)
+
+    def user(index):
+        client = WorkflowClient(index, catalog)
+        client.login()
+        start_gate.wait()
+        done = 0
+        while (done < ITERATIONS) if ITERATIONS else (time.monotonic() < deadline):
+            name = client.rng.choices(names, weights=[weights[n] for n in names])[0]
+            client.steps = []
+            started = time.perf_counter()
+            error = None
+            try:
+                WORKFLOWS[name](client)
+            except WorkflowError as e:
+                error = str(e).split(':')[0]
+            elapsed = time.perf_counter() - started
+            done += 1
+            with lock:
+                if error:
+                    results[name]['failures'] += 1
+                    results[name]['errors'][error] += 1
+                else:
+                    results[name]['durations'].append(elapsed)
+                for step_name, step_elapsed in client.steps:
+                    steps[step_name].append(step_elapsed)
+
+    threads = [threading.Thread(target=user, args=(index,), name=f'load-user-{index}') for index in range(USERS)]
+    before = sim_stats()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return results, steps, elapsed, _calls_between(before, sim_stats())
+
+
+def main():
+    """Warm up, run the load phase and print the report"""
+    print("🏋️ WMS workflow load test against the SAP Service Layer simulator")
+    print("=" * 78)
+    print(f"WMS: {BASE_URL}   SAP simulator: {SIM_URL}   users: {USERS}   "
+          f"{'iterations/user: ' + str(ITERATIONS) if ITERATIONS else 'duration: ' + str(DURATION) + 's'}")
+    print(f"Simulator config: {requests.get(f'{SIM_URL}/sim/config', timeout=TIMEOUT).json()}")
+
+    weights = parse_mix(MIX)
+    catalog = Catalog(SEED)
+    sap_calls = warm_up(catalog, list(weights))
+    results, steps, elapsed, load_calls = run_load(catalog, weights)
+
+    completed = sum(len(r['durations']) for r in results.values())
+    failed = sum(r['failures'] for r in results.values())
+    report = {'users': USERS, 'seconds': round(elapsed, 1), 'completed': completed, 'failed': failed,
+              'throughput_per_min': round(completed / elapsed * 60, 1) if elapsed else None,
+              'workflows': {}, 'steps': {name: _latency(values) for name, values in sorted(steps.items())},
+              'sap_load_phase': load_calls}
+
+    print(f"\n{'workflow':<10}{'runs':>7}{'fail':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+          f"{'SAP req':>9}{'SAP ops':>9}")
+    for name in weights:
+        latency = _latency(results[name]['durations'])
+        calls = sap_calls[name]
+        report['workflows'][name] = {**latency, 'failures': results[name]['failures'],
+                                     'errors': dict(results[name]['errors']), 'sap_calls': calls}
+        print(f"{name:<10}{latency['count']:>7}{results[name]['failures']:>6}"
+              f"{latency['p50_ms'] or '-':>10}{latency['p95_ms'] or '-':>10}{latency['p99_ms'] or '-':>10}"
+              f"{calls['requests']:>9}{calls['operations']:>9}")
+
+    print(f"\n{'step':<28}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, latency in report['steps'].items():
+        print(f"{name:<28}{latency['count']:>7}{latency['p50_ms']:>10}{latency['p95_ms']:>10}{latency['p99_ms']:>10}")
+
+    print("\nSAP calls per workflow (warm-up, one run each):")
+    for name in weights:
+        calls = sap_calls[name]
+        breakdown = ', '.join(f"{resource} x{count}" for resource, count in sorted(calls['by_resource'].items()))
+        print(f"  {name:<10} {breakdown or '-'}" + (f"  ⚠️ {calls['error']}" if calls['error'] else ''))
+
+    runs = completed + failed
+    print(f"\n🎯 {completed} workflows in {elapsed:.1f}s ({report['throughput_per_min']}/min), "
+          f"{failed} failed, {load_calls['requests']} SAP requests "
+          f"({load_calls['requests'] / runs if runs else 0:.1f} per workflow)")
+
+    if REPORT:
+        with open(REPORT, 'w') as report_file:
+            json.dump(report, report_file, indent=2)
+        print(f"📄 Report written to {REPORT}")
+
+    error_rate = failed / runs if runs else 1
+    return error_rate <= MAX_ERROR_RATE
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
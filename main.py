@@ -1,7 +1,7 @@
 import sys
 import os
 import logging
-from app import app
+from app import app, start_background_services
 
 # Import routes and APIs
 import routes
@@ -15,7 +15,21 @@ register_api_routes(app)
 app.register_blueprint(grpo_transfer_bp)
 app.register_blueprint(transfer_grpo_bp)
 
+
+def create_app(start_services=True):
+    """
+    The WMS application of a serving process (gunicorn --reload 'main:create_app()',
+    python main.py), with the process's background schedulers and MySQL replicator
+    started. A preloaded gunicorn master imports main:app instead and each forked
+    worker starts its own (gunicorn_config.py post_fork).
+    """
+    if start_services:
+        start_background_services(app)
+    return app
+
+
 if __name__ == "__main__":
+    create_app()
     # Check if we're in Replit environment (skip license validation)
     if os.environ.get('REPL_ID') :
         #or os.environ.get('DATABASE_URL')
@@ -0,0 +1,625 @@
+-- Migration: Cold document archive
+-- Date: 2026-10-19
+-- Description: <table>_archive tables (same columns and ids as the hot table, no
+--              unique/foreign key constraints, plus archived_at) and <table>_history
+--              views (hot UNION ALL archive with an is_archived flag) for posted and
+--              rejected GRPOs, inventory transfers, deliveries and Multi GRN batches
+--              and every table referencing them (cold_archive.py).
+--              Generated from the models with cold_archive.archive_schema_sql(); the
+--              app creates the same schema the first time archival runs, and adds
+--              archive columns / recreates views when a model gains columns.
+--              Create it here so the replicated archive rows have a table in MySQL.
+
+-- ==================== UP ====================
+CREATE TABLE IF NOT EXISTS grpo_documents_archive (
+    id INTEGER NOT NULL,
+    po_number VARCHAR(50),
+    doc_number VARCHAR(50),
+    supplier_code VARCHAR(20),
+    supplier_name VARCHAR(100),
+    warehouse_code VARCHAR(10),
+    user_id INTEGER,
+    qc_approver_id INTEGER,
+    qc_approved_at DATETIME,
+    qc_notes TEXT,
+    status VARCHAR(20),
+    po_total NUMERIC(15, 2),
+    sap_document_number VARCHAR(50),
+    notes TEXT,
+    created_at DATETIME,
+    updated_at DATETIME,
+    archived_at DATETIME,
+    PRIMARY KEY (id)
+) ENGINE=InnoDB CHARSET=utf8mb4 COLLATE utf8mb4_unicode_ci;
+
+CREATE INDEX ix_grpo_documents_archive_archived_at ON grpo_documents_archive (archived_at);
+
+CREATE INDEX ix_grpo_documents_archive_qc_approver_id ON grpo_documents_archive (qc_approver_id);
+
+CREATE INDEX ix_grpo_documents_archive_user_id ON grpo_documents_archive (user_id);
+
+CREATE OR REPLACE VIEW grpo_documents_history AS SELECT id, po_number, doc_number, supplier_code, supplier_name, warehouse_code, user_id, qc_approver_id, qc_approved_at, qc_notes, status, po_total, sap_document_number, notes, created_at, updated_at, 0 AS is_archived FROM grpo_documents UNION ALL SELECT id, po_number, doc_number, supplier_code, supplier_name, warehouse_code, user_id, qc_approver_id, qc_approved_at, qc_notes, status, po_total, sap_document_number, notes, created_at, updated_at, 1 AS is_archived FROM grpo_documents_archive;
+
+CREATE TABLE IF NOT EXISTS grpo_items_archive (
+    id INTEGER NOT NULL,
+    grpo_id INTEGER,
+    item_code VARCHAR(50),
+    item_name VARCHAR(200),
+    quantity NUMERIC(15, 3),
+    received_quantity NUMERIC(15, 3),
+    unit_price NUMERIC(15, 4),
+    line_total NUMERIC(15, 2),
+    unit_of_measure VARCHAR(10),
+    warehouse_code VARCHAR(10),
+    bin_location VARCHAR(200),
+    batch_number VARCHAR(50),
+    serial_number VARCHAR(50),
+    expiry_date DATE,
+    barcode VARCHAR(100),
+    qc_status VARCHAR(20),
+    po_line_number INTEGER,
+    base_entry INTEGER,
+    base_line INTEGER,
+    batch_required VARCHAR(1),
+    serial_required VARCHAR(1),
+    manage_method VARCHAR(1),
+    created_at DATETIME,
+    updated_at DATETIME,
+    archived_at DATETIME,
+    PRIMARY KEY (id)
+) ENGINE=InnoDB CHARSET=utf8mb4 COLLATE utf8mb4_unicode_ci;
+
+CREATE INDEX ix_grpo_items_archive_archived_at ON grpo_items_archive (archived_at);
+
+CREATE INDEX ix_grpo_items_archive_grpo_id ON grpo_items_archive (grpo_id);
+
+CREATE OR REPLACE VIEW grpo_items_history AS SELECT id, grpo_id, item_code, item_name, quantity, received_quantity, unit_price, line_total, unit_of_measure, warehouse_code, bin_location, batch_number, serial_number, expiry_date, barcode, qc_status, po_line_number, base_entry, base_line, batch_required, serial_required, manage_method, created_at, updated_at, 0 AS is_archived FROM grpo_items UNION ALL SELECT id, grpo_id, item_code, item_name, quantity, received_quantity, unit_price, line_total, unit_of_measure, warehouse_code, bin_location, batch_number, serial_number, expiry_date, barcode, qc_status, po_line_number, base_entry, base_line, batch_required, serial_required, manage_method, created_at, updated_at, 1 AS is_archived FROM grpo_items_archive;
+
+CREATE TABLE IF NOT EXISTS purchase_delivery_notes_archive (
+    id INTEGER NOT NULL,
+    grpo_id INTEGER,
+    external_reference VARCHAR(50),
+    sap_document_number VARCHAR(50),
+    supplier_code VARCHAR(20),
+    warehouse_code VARCHAR(10),
+    document_date DATE,
+    due_date DATE,
+    total_amount NUMERIC(15, 2),
+    status VARCHAR(20),
+    json_payload TEXT,
+    sap_response TEXT,
+    created_at DATETIME,
+    posted_at DATETIME,
+    archived_at DATETIME,
+    PRIMARY KEY (id)
+) ENGINE=InnoDB CHARSET=utf8mb4 COLLATE utf8mb4_unicode_ci;
+
+CREATE INDEX ix_purchase_delivery_notes_archive_archived_at ON purchase_delivery_notes_archive (archived_at);
+
+CREATE INDEX ix_purchase_delivery_notes_archive_grpo_id ON purchase_delivery_notes_archive (grpo_id);
+
+CREATE OR REPLACE VIEW purchase_delivery_notes_history AS SELECT id, grpo_id, external_reference, sap_document_number, supplier_code, warehouse_code, document_date, due_date, total_amount, status, json_payload, sap_response, created_at, posted_at, 0 AS is_archived FROM purchase_delivery_notes UNION ALL SELECT id, grpo_id, external_reference, sap_document_number, supplier_code, warehouse_code, document_date, due_date, total_amount, status, json_payload, sap_response, created_at, posted_at, 1 AS is_archived FROM purchase_delivery_notes_archive;
+
+CREATE TABLE IF NOT EXISTS grpo_batch_numbers_archive (
+    id INTEGER NOT NULL,
+    grpo_item_id INTEGER,
+    batch_number VARCHAR(100),
+    quantity NUMERIC(15, 3),
+    base_line_number INTEGER,
+    manufacturer_serial_number VARCHAR(100),
+    internal_serial_number VARCHAR(100),
+    expiry_date DATE,
+    barcode VARCHAR(200),
+    grn_number VARCHAR(50),
+    qty_per_pack NUMERIC(15, 3),
+    no_of_packs INTEGER,
+    created_at DATETIME,
+    archived_at DATETIME,
+    PRIMARY KEY (id)
+) ENGINE=InnoDB CHARSET=utf8mb4 COLLATE utf8mb4_unicode_ci;
+
+CREATE INDEX ix_grpo_batch_numbers_archive_archived_at ON grpo_batch_numbers_archive (archived_at);
+
+CREATE INDEX ix_grpo_batch_numbers_archive_grpo_item_id ON grpo_batch_numbers_archive (grpo_item_id);
+
+CREATE OR REPLACE VIEW grpo_batch_numbers_history AS SELECT id, grpo_item_id, batch_number, quantity, base_line_number, manufacturer_serial_number, internal_serial_number, expiry_date, barcode, grn_number, qty_per_pack, no_of_packs, created_at, 0 AS is_archived FROM grpo_batch_numbers UNION ALL SELECT id, grpo_item_id, batch_number, quantity, base_line_number, manufacturer_serial_number, internal_serial_number, expiry_date, barcode, grn_number, qty_per_pack, no_of_packs, created_at, 1 AS is_archived FROM grpo_batch_numbers_archive;
+
+CREATE TABLE IF NOT EXISTS grpo_non_managed_items_archive (
+    id INTEGER NOT NULL,
+    grpo_item_id INTEGER,
+    quantity NUMERIC(15, 3),
+    base_line_number INTEGER,
+    expiry_date VARCHAR(50),
+    admin_date VARCHAR(50),
+    grn_number VARCHAR(50),
+    qty_per_pack NUMERIC(15, 3),
+    no_of_packs INTEGER,
+    pack_number INTEGER,
+    created_at DATETIME,
+    archived_at DATETIME,
+    PRIMARY KEY (id)
+) ENGINE=InnoDB CHARSET=utf8mb4 COLLATE utf8mb4_unicode_ci;
+
+CREATE INDEX ix_grpo_non_managed_items_archive_archived_at ON grpo_non_managed_items_archive (archived_at);
+
+CREATE INDEX ix_grpo_non_managed_items_archive_grpo_item_id ON grpo_non_managed_items_archive (grpo_item_id);
+
+CREATE OR REPLACE VIEW grpo_non_managed_items_history AS SELECT id, grpo_item_id, quantity, base_line_number, expiry_date, admin_date, grn_number, qty_per_pack, no_of_packs, pack_number, created_at, 0 AS is_archived FROM grpo_non_managed_items UNION ALL SELECT id, grpo_item_id, quantity, base_line_number, expiry_date, admin_date, grn_number, qty_per_pack, no_of_packs, pack_number, created_at, 1 AS is_archived FROM grpo_non_managed_items_archive;
+
+CREATE TABLE IF NOT EXISTS grpo_serial_numbers_archive (
+    id INTEGER NOT NULL,
+    grpo_item_id INTEGER,
+    manufacturer_serial_number VARCHAR(100),
+    internal_serial_number VARCHAR(100),
+    expiry_date DATE,
+    manufacture_date DATE,
+    notes TEXT,
+    quantity INTEGER,
+    base_line_number INTEGER,
+    grn_number VARCHAR(50),
+    qty_per_pack NUMERIC(15, 3),
+    no_of_packs INTEGER,
+    created_at DATETIME,
+    archived_at DATETIME,
+    PRIMARY KEY (id)
+) ENGINE=InnoDB CHARSET=utf8mb4 COLLATE utf8mb4_unicode_ci;
+
+CREATE INDEX ix_grpo_serial_numbers_archive_archived_at ON grpo_serial_numbers_archive (archived_at);
+
+CREATE INDEX ix_grpo_serial_numbers_archive_grpo_item_id ON grpo_serial_numbers_archive (grpo_item_id);
+
+CREATE OR REPLACE VIEW grpo_serial_numbers_history AS SELECT id, grpo_item_id, manufacturer_serial_number, internal_serial_number, expiry_date, manufacture_date, notes, quantity, base_line_number, grn_number, qty_per_pack, no_of_packs, created_at, 0 AS is_archived FROM grpo_serial_numbers UNION ALL SELECT id, grpo_item_id, manufacturer_serial_number, internal_serial_number, expiry_date, manufacture_date, notes, quantity, base_line_number, grn_number, qty_per_pack, no_of_packs, created_at, 1 AS is_archived FROM grpo_serial_numbers_archive;
+
+CREATE TABLE IF NOT EXISTS qr_code_labels_archive (
+    id INTEGER NOT NULL,
+    label_type VARCHAR(50),
+    item_code VARCHAR(100),
+    item_name VARCHAR(200),
+    po_number VARCHAR(100),
+    batch_number VARCHAR(100),
+    warehouse_code VARCHAR(50),
+    bin_code VARCHAR(100),
+    quantity NUMERIC(15, 4),
+    uom VARCHAR(20),
+    expiry_date DATE,
+    qr_content TEXT,
+    qr_format VARCHAR(20),
+    grpo_item_id INTEGER,
+    inventory_transfer_item_id INTEGER,
+    user_id INTEGER,
+    created_at DATETIME,
+    updated_at DATETIME,
+    archived_at DATETIME,
+    PRIMARY KEY (id)
+) ENGINE=InnoDB CHARSET=utf8mb4 COLLATE utf8mb4_unicode_ci;
+
+CREATE INDEX ix_qr_code_labels_archive_archived_at ON qr_code_labels_archive (archived_at);
+
+CREATE INDEX ix_qr_code_labels_archive_grpo_item_id ON qr_code_labels_archive (grpo_item_id);
+
+CREATE INDEX ix_qr_code_labels_archive_inventory_transfer_item_id ON qr_code_labels_archive (inventory_transfer_item_id);
+
+CREATE INDEX ix_qr_code_labels_archive_user_id ON qr_code_labels_archive (user_id);
+
+CREATE OR REPLACE VIEW qr_code_labels_history AS SELECT id, label_type, item_code, item_name, po_number, batch_number, warehouse_code, bin_code, quantity, uom, expiry_date, qr_content, qr_format, grpo_item_id, inventory_transfer_item_id, user_id, created_at, updated_at, 0 AS is_archived FROM qr_code_labels UNION ALL SELECT id, label_type, item_code, item_name, po_number, batch_number, warehouse_code, bin_code, quantity, uom, expiry_date, qr_content, qr_format, grpo_item_id, inventory_transfer_item_id, user_id, created_at, updated_at, 1 AS is_archived FROM qr_code_labels_archive;
+
+CREATE TABLE IF NOT EXISTS inventory_transfers_archive (
+    id INTEGER NOT NULL,
+    transfer_request_number VARCHAR(20),
+    sap_document_number VARCHAR(20),
+    status VARCHAR(20),
+    user_id INTEGER,
+    qc_approver_id INTEGER,
+    qc_approved_at DATETIME,
+    qc_notes TEXT,
+    from_warehouse VARCHAR(20),
+    to_warehouse VARCHAR(20),
+    sap_doc_entry INTEGER,
+    sap_doc_num INTEGER,
+    bpl_id INTEGER,
+    bpl_name VARCHAR(100),
+    sap_document_status VARCHAR(20),
+    doc_date DATETIME,
+    due_date DATETIME,
+    created_at DATETIME,
+    updated_at DATETIME,
+    archived_at DATETIME,
+    PRIMARY KEY (id)
+) ENGINE=InnoDB CHARSET=utf8mb4 COLLATE utf8mb4_unicode_ci;
+
+CREATE INDEX ix_inventory_transfers_archive_archived_at ON inventory_transfers_archive (archived_at);
+
+CREATE INDEX ix_inventory_transfers_archive_qc_approver_id ON inventory_transfers_archive (qc_approver_id);
+
+CREATE INDEX ix_inventory_transfers_archive_user_id ON inventory_transfers_archive (user_id);
+
+CREATE OR REPLACE VIEW inventory_transfers_history AS SELECT id, transfer_request_number, sap_document_number, status, user_id, qc_approver_id, qc_approved_at, qc_notes, from_warehouse, to_warehouse, sap_doc_entry, sap_doc_num, bpl_id, bpl_name, sap_document_status, doc_date, due_date, created_at, updated_at, 0 AS is_archived FROM inventory_transfers UNION ALL SELECT id, transfer_request_number, sap_document_number, status, user_id, qc_approver_id, qc_approved_at, qc_notes, from_warehouse, to_warehouse, sap_doc_entry, sap_doc_num, bpl_id, bpl_name, sap_document_status, doc_date, due_date, created_at, updated_at, 1 AS is_archived FROM inventory_transfers_archive;
+
+CREATE TABLE IF NOT EXISTS inventory_transfer_items_archive (
+    id INTEGER NOT NULL,
+    inventory_transfer_id INTEGER,
+    item_code VARCHAR(50),
+    item_name VARCHAR(200),
+    quantity FLOAT,
+    grn_id TEXT,
+    requested_quantity FLOAT,
+    transferred_quantity FLOAT,
+    remaining_quantity FLOAT,
+    unit_of_measure VARCHAR(50),
+    from_bin VARCHAR(50),
+    to_bin VARCHAR(50),
+    from_bin_location VARCHAR(50),
+    to_bin_location VARCHAR(50),
+    from_warehouse_code VARCHAR(50),
+    to_warehouse_code VARCHAR(50),
+    batch_number VARCHAR(50),
+    available_batches TEXT,
+    scanned_batches TEXT,
+    qc_status VARCHAR(20),
+    qc_notes TEXT,
+    sap_line_num INTEGER,
+    sap_doc_entry INTEGER,
+    line_status VARCHAR(50),
+    serial_manged VARCHAR(50),
+    batch_manage VARCHAR(50),
+    non_batch_non_serial VARCHAR(50),
+    batch_required BOOL,
+    serial_required BOOL,
+    created_at DATETIME,
+    archived_at DATETIME,
+    PRIMARY KEY (id)
+) ENGINE=InnoDB CHARSET=utf8mb4 COLLATE utf8mb4_unicode_ci;
+
+CREATE INDEX ix_inventory_transfer_items_archive_archived_at ON inventory_transfer_items_archive (archived_at);
+
+CREATE INDEX ix_inventory_transfer_items_archive_inventory_transfer_id ON inventory_transfer_items_archive (inventory_transfer_id);
+
+CREATE OR REPLACE VIEW inventory_transfer_items_history AS SELECT id, inventory_transfer_id, item_code, item_name, quantity, grn_id, requested_quantity, transferred_quantity, remaining_quantity, unit_of_measure, from_bin, to_bin, from_bin_location, to_bin_location, from_warehouse_code, to_warehouse_code, batch_number, available_batches, scanned_batches, qc_status, qc_notes, sap_line_num, sap_doc_entry, line_status, serial_manged, batch_manage, non_batch_non_serial, batch_required, serial_required, created_at, 0 AS is_archived FROM inventory_transfer_items UNION ALL SELECT id, inventory_transfer_id, item_code, item_name, quantity, grn_id, requested_quantity, transferred_quantity, remaining_quantity, unit_of_measure, from_bin, to_bin, from_bin_location, to_bin_location, from_warehouse_code, to_warehouse_code, batch_number, available_batches, scanned_batches, qc_status, qc_notes, sap_line_num, sap_doc_entry, line_status, serial_manged, batch_manage, non_batch_non_serial, batch_required, serial_required, created_at, 1 AS is_archived FROM inventory_transfer_items_archive;
+
+CREATE TABLE IF NOT EXISTS inventory_transfer_request_lines_archive (
+    id INTEGER NOT NULL,
+    inventory_transfer_id INTEGER,
+    line_num INTEGER,
+    sap_doc_entry INTEGER,
+    item_code VARCHAR(50),
+    item_description VARCHAR(200),
+    quantity FLOAT,
+    warehouse_code VARCHAR(20),
+    from_warehouse_code VARCHAR(20),
+    remaining_open_quantity FLOAT,
+    line_status VARCHAR(20),
+    uom_code VARCHAR(20),
+    grn_id VARCHAR(200),
+    transferred_quantity FLOAT,
+    wms_remaining_quantity FLOAT,
+    created_at DATETIME,
+    updated_at DATETIME,
+    archived_at DATETIME,
+    PRIMARY KEY (id)
+) ENGINE=InnoDB CHARSET=utf8mb4 COLLATE utf8mb4_unicode_ci;
+
+CREATE INDEX ix_inventory_transfer_request_lines_archive_archived_at ON inventory_transfer_request_lines_archive (archived_at);
+
+CREATE INDEX ix_inventory_transfer_request_lines_archive_inventory_tr_f176 ON inventory_transfer_request_lines_archive (inventory_transfer_id);
+
+CREATE OR REPLACE VIEW inventory_transfer_request_lines_history AS SELECT id, inventory_transfer_id, line_num, sap_doc_entry, item_code, item_description, quantity, warehouse_code, from_warehouse_code, remaining_open_quantity, line_status, uom_code, grn_id, transferred_quantity, wms_remaining_quantity, created_at, updated_at, 0 AS is_archived FROM inventory_transfer_request_lines UNION ALL SELECT id, inventory_transfer_id, line_num, sap_doc_entry, item_code, item_description, quantity, warehouse_code, from_warehouse_code, remaining_open_quantity, line_status, uom_code, grn_id, transferred_quantity, wms_remaining_quantity, created_at, updated_at, 1 AS is_archived FROM inventory_transfer_request_lines_archive;
+
+CREATE TABLE IF NOT EXISTS transfer_scan_states_archive (
+    id INTEGER NOT NULL,
+    transfer_id INTEGER,
+    item_code VARCHAR(50),
+    user_id INTEGER,
+    requested_qty FLOAT,
+    pack_key VARCHAR(200),
+    pack_label VARCHAR(50),
+    batch_number VARCHAR(50),
+    qty FLOAT,
+    grn_id VARCHAR(100),
+    grn_date VARCHAR(20),
+    exp_date VARCHAR(20),
+    po VARCHAR(50),
+    bin_location VARCHAR(50),
+    transfer_status VARCHAR(40),
+    created_at DATETIME,
+    archived_at DATETIME,
+    PRIMARY KEY (id)
+) ENGINE=InnoDB CHARSET=utf8mb4 COLLATE utf8mb4_unicode_ci;
+
+CREATE INDEX ix_transfer_scan_states_archive_archived_at ON transfer_scan_states_archive (archived_at);
+
+CREATE INDEX ix_transfer_scan_states_archive_transfer_id ON transfer_scan_states_archive (transfer_id);
+
+CREATE INDEX ix_transfer_scan_states_archive_user_id ON transfer_scan_states_archive (user_id);
+
+CREATE OR REPLACE VIEW transfer_scan_states_history AS SELECT id, transfer_id, item_code, user_id, requested_qty, pack_key, pack_label, batch_number, qty, grn_id, grn_date, exp_date, po, bin_location, transfer_status, created_at, 0 AS is_archived FROM transfer_scan_states UNION ALL SELECT id, transfer_id, item_code, user_id, requested_qty, pack_key, pack_label, batch_number, qty, grn_id, grn_date, exp_date, po, bin_location, transfer_status, created_at, 1 AS is_archived FROM transfer_scan_states_archive;
+
+CREATE TABLE IF NOT EXISTS delivery_documents_archive (
+    id INTEGER NOT NULL,
+    so_doc_entry INTEGER,
+    so_doc_num INTEGER,
+    so_series INTEGER,
+    card_code VARCHAR(50),
+    card_name VARCHAR(200),
+    doc_currency VARCHAR(10),
+    doc_date DATETIME,
+    delivery_series INTEGER,
+    `doc_Total` FLOAT,
+    status VARCHAR(20),
+    sap_doc_entry INTEGER,
+    sap_doc_num INTEGER,
+    remarks TEXT,
+    user_id INTEGER,
+    qc_approver_id INTEGER,
+    qc_approved_at DATETIME,
+    qc_notes TEXT,
+    created_at DATETIME,
+    submitted_at DATETIME,
+    last_updated_at DATETIME,
+    archived_at DATETIME,
+    PRIMARY KEY (id)
+) ENGINE=InnoDB CHARSET=utf8mb4 COLLATE utf8mb4_unicode_ci;
+
+CREATE INDEX ix_delivery_documents_archive_archived_at ON delivery_documents_archive (archived_at);
+
+CREATE INDEX ix_delivery_documents_archive_qc_approver_id ON delivery_documents_archive (qc_approver_id);
+
+CREATE INDEX ix_delivery_documents_archive_user_id ON delivery_documents_archive (user_id);
+
+CREATE OR REPLACE VIEW delivery_documents_history AS SELECT id, so_doc_entry, so_doc_num, so_series, card_code, card_name, doc_currency, doc_date, delivery_series, `doc_Total`, status, sap_doc_entry, sap_doc_num, remarks, user_id, qc_approver_id, qc_approved_at, qc_notes, created_at, submitted_at, last_updated_at, 0 AS is_archived FROM delivery_documents UNION ALL SELECT id, so_doc_entry, so_doc_num, so_series, card_code, card_name, doc_currency, doc_date, delivery_series, `doc_Total`, status, sap_doc_entry, sap_doc_num, remarks, user_id, qc_approver_id, qc_approved_at, qc_notes, created_at, submitted_at, last_updated_at, 1 AS is_archived FROM delivery_documents_archive;
+
+CREATE TABLE IF NOT EXISTS delivery_items_archive (
+    id INTEGER NOT NULL,
+    delivery_id INTEGER,
+    line_number INTEGER,
+    base_line INTEGER,
+    item_code VARCHAR(50),
+    item_description VARCHAR(200),
+    warehouse_code VARCHAR(10),
+    quantity FLOAT,
+    open_quantity FLOAT,
+    unit_price FLOAT,
+    uom_code VARCHAR(10),
+    batch_required BOOL,
+    serial_required BOOL,
+    batch_number VARCHAR(100),
+    serial_number VARCHAR(100),
+    expiry_date DATETIME,
+    manufacture_date DATETIME,
+    bin_location VARCHAR(50),
+    project_code VARCHAR(50),
+    cost_code VARCHAR(50),
+    qr_code_generated BOOL,
+    warehouse_routing VARCHAR(200),
+    qc_status VARCHAR(20),
+    created_at DATETIME,
+    updated_at DATETIME,
+    archived_at DATETIME,
+    PRIMARY KEY (id)
+) ENGINE=InnoDB CHARSET=utf8mb4 COLLATE utf8mb4_unicode_ci;
+
+CREATE INDEX ix_delivery_items_archive_archived_at ON delivery_items_archive (archived_at);
+
+CREATE INDEX ix_delivery_items_archive_delivery_id ON delivery_items_archive (delivery_id);
+
+CREATE OR REPLACE VIEW delivery_items_history AS SELECT id, delivery_id, line_number, base_line, item_code, item_description, warehouse_code, quantity, open_quantity, unit_price, uom_code, batch_required, serial_required, batch_number, serial_number, expiry_date, manufacture_date, bin_location, project_code, cost_code, qr_code_generated, warehouse_routing, qc_status, created_at, updated_at, 0 AS is_archived FROM delivery_items UNION ALL SELECT id, delivery_id, line_number, base_line, item_code, item_description, warehouse_code, quantity, open_quantity, unit_price, uom_code, batch_required, serial_required, batch_number, serial_number, expiry_date, manufacture_date, bin_location, project_code, cost_code, qr_code_generated, warehouse_routing, qc_status, created_at, updated_at, 1 AS is_archived FROM delivery_items_archive;
+
+CREATE TABLE IF NOT EXISTS delivery_item_serials_archive (
+    id INTEGER NOT NULL,
+    delivery_item_id INTEGER,
+    internal_serial_number VARCHAR(100),
+    system_serial_number INTEGER,
+    quantity FLOAT,
+    base_line_number INTEGER,
+    allocation_status VARCHAR(20),
+    created_at DATETIME,
+    archived_at DATETIME,
+    PRIMARY KEY (id)
+) ENGINE=InnoDB CHARSET=utf8mb4 COLLATE utf8mb4_unicode_ci;
+
+CREATE INDEX ix_delivery_item_serials_archive_archived_at ON delivery_item_serials_archive (archived_at);
+
+CREATE INDEX ix_delivery_item_serials_archive_delivery_item_id ON delivery_item_serials_archive (delivery_item_id);
+
+CREATE OR REPLACE VIEW delivery_item_serials_history AS SELECT id, delivery_item_id, internal_serial_number, system_serial_number, quantity, base_line_number, allocation_status, created_at, 0 AS is_archived FROM delivery_item_serials UNION ALL SELECT id, delivery_item_id, internal_serial_number, system_serial_number, quantity, base_line_number, allocation_status, created_at, 1 AS is_archived FROM delivery_item_serials_archive;
+
+CREATE TABLE IF NOT EXISTS multi_grn_document_archive (
+    id INTEGER NOT NULL,
+    batch_number VARCHAR(50),
+    user_id INTEGER,
+    series_id INTEGER,
+    series_name VARCHAR(100),
+    customer_code VARCHAR(50),
+    customer_name VARCHAR(200),
+    status VARCHAR(20),
+    total_pos INTEGER,
+    total_grns_created INTEGER,
+    sap_session_metadata TEXT,
+    error_log TEXT,
+    created_at DATETIME,
+    created_by TEXT,
+    posted_at DATETIME,
+    completed_at DATETIME,
+    submitted_at DATETIME,
+    qc_approver_id INTEGER,
+    qc_approved_at DATETIME,
+    qc_notes TEXT,
+    archived_at DATETIME,
+    PRIMARY KEY (id)
+) ENGINE=InnoDB CHARSET=utf8mb4 COLLATE utf8mb4_unicode_ci;
+
+CREATE INDEX ix_multi_grn_document_archive_archived_at ON multi_grn_document_archive (archived_at);
+
+CREATE INDEX ix_multi_grn_document_archive_qc_approver_id ON multi_grn_document_archive (qc_approver_id);
+
+CREATE INDEX ix_multi_grn_document_archive_user_id ON multi_grn_document_archive (user_id);
+
+CREATE OR REPLACE VIEW multi_grn_document_history AS SELECT id, batch_number, user_id, series_id, series_name, customer_code, customer_name, status, total_pos, total_grns_created, sap_session_metadata, error_log, created_at, created_by, posted_at, completed_at, submitted_at, qc_approver_id, qc_approved_at, qc_notes, 0 AS is_archived FROM multi_grn_document UNION ALL SELECT id, batch_number, user_id, series_id, series_name, customer_code, customer_name, status, total_pos, total_grns_created, sap_session_metadata, error_log, created_at, created_by, posted_at, completed_at, submitted_at, qc_approver_id, qc_approved_at, qc_notes, 1 AS is_archived FROM multi_grn_document_archive;
+
+CREATE TABLE IF NOT EXISTS multi_grn_po_links_archive (
+    id INTEGER NOT NULL,
+    batch_id INTEGER,
+    po_doc_entry INTEGER,
+    po_doc_num VARCHAR(50),
+    po_card_code VARCHAR(50),
+    po_card_name VARCHAR(200),
+    po_doc_date DATE,
+    po_doc_total NUMERIC(15, 2),
+    status VARCHAR(20),
+    sap_grn_doc_num VARCHAR(50),
+    sap_grn_doc_entry INTEGER,
+    posted_at DATETIME,
+    error_message TEXT,
+    created_at DATETIME,
+    archived_at DATETIME,
+    PRIMARY KEY (id)
+) ENGINE=InnoDB CHARSET=utf8mb4 COLLATE utf8mb4_unicode_ci;
+
+CREATE INDEX ix_multi_grn_po_links_archive_archived_at ON multi_grn_po_links_archive (archived_at);
+
+CREATE INDEX ix_multi_grn_po_links_archive_batch_id ON multi_grn_po_links_archive (batch_id);
+
+CREATE OR REPLACE VIEW multi_grn_po_links_history AS SELECT id, batch_id, po_doc_entry, po_doc_num, po_card_code, po_card_name, po_doc_date, po_doc_total, status, sap_grn_doc_num, sap_grn_doc_entry, posted_at, error_message, created_at, 0 AS is_archived FROM multi_grn_po_links UNION ALL SELECT id, batch_id, po_doc_entry, po_doc_num, po_card_code, po_card_name, po_doc_date, po_doc_total, status, sap_grn_doc_num, sap_grn_doc_entry, posted_at, error_message, created_at, 1 AS is_archived FROM multi_grn_po_links_archive;
+
+CREATE TABLE IF NOT EXISTS multi_grn_line_selections_archive (
+    id INTEGER NOT NULL,
+    po_link_id INTEGER,
+    po_line_num INTEGER,
+    item_code VARCHAR(50),
+    item_description VARCHAR(200),
+    ordered_quantity NUMERIC(15, 3),
+    open_quantity NUMERIC(15, 3),
+    selected_quantity NUMERIC(15, 3),
+    warehouse_code VARCHAR(50),
+    bin_location VARCHAR(200),
+    unit_price NUMERIC(15, 4),
+    unit_of_measure VARCHAR(10),
+    line_status VARCHAR(20),
+    inventory_type VARCHAR(20),
+    serial_numbers TEXT,
+    batch_numbers TEXT,
+    posting_payload TEXT,
+    barcode_generated BOOL,
+    batch_required VARCHAR(1),
+    serial_required VARCHAR(1),
+    manage_method VARCHAR(1),
+    created_at DATETIME,
+    archived_at DATETIME,
+    PRIMARY KEY (id)
+) ENGINE=InnoDB CHARSET=utf8mb4 COLLATE utf8mb4_unicode_ci;
+
+CREATE INDEX ix_multi_grn_line_selections_archive_archived_at ON multi_grn_line_selections_archive (archived_at);
+
+CREATE INDEX ix_multi_grn_line_selections_archive_po_link_id ON multi_grn_line_selections_archive (po_link_id);
+
+CREATE OR REPLACE VIEW multi_grn_line_selections_history AS SELECT id, po_link_id, po_line_num, item_code, item_description, ordered_quantity, open_quantity, selected_quantity, warehouse_code, bin_location, unit_price, unit_of_measure, line_status, inventory_type, serial_numbers, batch_numbers, posting_payload, barcode_generated, batch_required, serial_required, manage_method, created_at, 0 AS is_archived FROM multi_grn_line_selections UNION ALL SELECT id, po_link_id, po_line_num, item_code, item_description, ordered_quantity, open_quantity, selected_quantity, warehouse_code, bin_location, unit_price, unit_of_measure, line_status, inventory_type, serial_numbers, batch_numbers, posting_payload, barcode_generated, batch_required, serial_required, manage_method, created_at, 1 AS is_archived FROM multi_grn_line_selections_archive;
+
+CREATE TABLE IF NOT EXISTS multi_grn_batch_details_archive (
+    id INTEGER NOT NULL,
+    line_selection_id INTEGER,
+    batch_number VARCHAR(100),
+    quantity NUMERIC(15, 3),
+    manufacturer_serial_number VARCHAR(100),
+    internal_serial_number VARCHAR(100),
+    expiry_date VARCHAR(100),
+    barcode VARCHAR(200),
+    grn_number VARCHAR(50),
+    qty_per_pack NUMERIC(15, 3),
+    no_of_packs INTEGER,
+    status VARCHAR(20),
+    created_at DATETIME,
+    archived_at DATETIME,
+    PRIMARY KEY (id)
+) ENGINE=InnoDB CHARSET=utf8mb4 COLLATE utf8mb4_unicode_ci;
+
+CREATE INDEX ix_multi_grn_batch_details_archive_archived_at ON multi_grn_batch_details_archive (archived_at);
+
+CREATE INDEX ix_multi_grn_batch_details_archive_line_selection_id ON multi_grn_batch_details_archive (line_selection_id);
+
+CREATE OR REPLACE VIEW multi_grn_batch_details_history AS SELECT id, line_selection_id, batch_number, quantity, manufacturer_serial_number, internal_serial_number, expiry_date, barcode, grn_number, qty_per_pack, no_of_packs, status, created_at, 0 AS is_archived FROM multi_grn_batch_details UNION ALL SELECT id, line_selection_id, batch_number, quantity, manufacturer_serial_number, internal_serial_number, expiry_date, barcode, grn_number, qty_per_pack, no_of_packs, status, created_at, 1 AS is_archived FROM multi_grn_batch_details_archive;
+
+CREATE TABLE IF NOT EXISTS multi_grn_serial_details_archive (
+    id INTEGER NOT NULL,
+    line_selection_id INTEGER,
+    serial_number VARCHAR(100),
+    manufacturer_serial_number VARCHAR(100),
+    internal_serial_number VARCHAR(100),
+    expiry_date DATE,
+    barcode VARCHAR(200),
+    grn_number VARCHAR(50),
+    qty_per_pack NUMERIC(15, 3),
+    no_of_packs INTEGER,
+    status VARCHAR(20),
+    created_at DATETIME,
+    archived_at DATETIME,
+    PRIMARY KEY (id)
+) ENGINE=InnoDB CHARSET=utf8mb4 COLLATE utf8mb4_unicode_ci;
+
+CREATE INDEX ix_multi_grn_serial_details_archive_archived_at ON multi_grn_serial_details_archive (archived_at);
+
+CREATE INDEX ix_multi_grn_serial_details_archive_line_selection_id ON multi_grn_serial_details_archive (line_selection_id);
+
+CREATE OR REPLACE VIEW multi_grn_serial_details_history AS SELECT id, line_selection_id, serial_number, manufacturer_serial_number, internal_serial_number, expiry_date, barcode, grn_number, qty_per_pack, no_of_packs, status, created_at, 0 AS is_archived FROM multi_grn_serial_details UNION ALL SELECT id, line_selection_id, serial_number, manufacturer_serial_number, internal_serial_number, expiry_date, barcode, grn_number, qty_per_pack, no_of_packs, status, created_at, 1 AS is_archived FROM multi_grn_serial_details_archive;
+
+CREATE TABLE IF NOT EXISTS multi_grn_batch_details_label_archive (
+    id INTEGER NOT NULL,
+    batch_detail_id INTEGER,
+    pack_number INTEGER,
+    qty_in_pack NUMERIC(15, 3),
+    grn_number VARCHAR(50),
+    barcode TEXT,
+    qr_data TEXT,
+    printed BOOL,
+    printed_at DATETIME,
+    created_at DATETIME,
+    status TEXT,
+    archived_at DATETIME,
+    PRIMARY KEY (id)
+) ENGINE=InnoDB CHARSET=utf8mb4 COLLATE utf8mb4_unicode_ci;
+
+CREATE INDEX ix_multi_grn_batch_details_label_archive_archived_at ON multi_grn_batch_details_label_archive (archived_at);
+
+CREATE INDEX ix_multi_grn_batch_details_label_archive_batch_detail_id ON multi_grn_batch_details_label_archive (batch_detail_id);
+
+CREATE OR REPLACE VIEW multi_grn_batch_details_label_history AS SELECT id, batch_detail_id, pack_number, qty_in_pack, grn_number, barcode, qr_data, printed, printed_at, created_at, status, 0 AS is_archived FROM multi_grn_batch_details_label UNION ALL SELECT id, batch_detail_id, pack_number, qty_in_pack, grn_number, barcode, qr_data, printed, printed_at, created_at, status, 1 AS is_archived FROM multi_grn_batch_details_label_archive;
+
+-- ==================== DOWN ====================
+-- DROP VIEW IF EXISTS multi_grn_batch_details_label_history;
+-- DROP VIEW IF EXISTS multi_grn_serial_details_history;
+-- DROP VIEW IF EXISTS multi_grn_batch_details_history;
+-- DROP VIEW IF EXISTS multi_grn_line_selections_history;
+-- DROP VIEW IF EXISTS multi_grn_po_links_history;
+-- DROP VIEW IF EXISTS multi_grn_document_history;
+-- DROP VIEW IF EXISTS delivery_item_serials_history;
+-- DROP VIEW IF EXISTS delivery_items_history;
+-- DROP VIEW IF EXISTS delivery_documents_history;
+-- DROP VIEW IF EXISTS transfer_scan_states_history;
+-- DROP VIEW IF EXISTS inventory_transfer_request_lines_history;
+-- DROP VIEW IF EXISTS inventory_transfer_items_history;
+-- DROP VIEW IF EXISTS inventory_transfers_history;
+-- DROP VIEW IF EXISTS qr_code_labels_history;
+-- DROP VIEW IF EXISTS grpo_serial_numbers_history;
+-- DROP VIEW IF EXISTS grpo_non_managed_items_history;
+-- DROP VIEW IF EXISTS grpo_batch_numbers_history;
+-- DROP VIEW IF EXISTS purchase_delivery_notes_history;
+-- DROP VIEW IF EXISTS grpo_items_history;
+-- DROP VIEW IF EXISTS grpo_documents_history;
+-- DROP TABLE IF EXISTS multi_grn_batch_details_label_archive;
+-- DROP TABLE IF EXISTS multi_grn_serial_details_archive;
+-- DROP TABLE IF EXISTS multi_grn_batch_details_archive;
+-- DROP TABLE IF EXISTS multi_grn_line_selections_archive;
+-- DROP TABLE IF EXISTS multi_grn_po_links_archive;
+-- DROP TABLE IF EXISTS multi_grn_document_archive;
+-- DROP TABLE IF EXISTS delivery_item_serials_archive;
+-- DROP TABLE IF EXISTS delivery_items_archive;
+-- DROP TABLE IF EXISTS delivery_documents_archive;
+-- DROP TABLE IF EXISTS transfer_scan_states_archive;
+-- DROP TABLE IF EXISTS inventory_transfer_request_lines_archive;
+-- DROP TABLE IF EXISTS inventory_transfer_items_archive;
+-- DROP TABLE IF EXISTS inventory_transfers_archive;
+-- DROP TABLE IF EXISTS qr_code_labels_archive;
+-- DROP TABLE IF EXISTS grpo_serial_numbers_archive;
+-- DROP TABLE IF EXISTS grpo_non_managed_items_archive;
+-- DROP TABLE IF EXISTS grpo_batch_numbers_archive;
+-- DROP TABLE IF EXISTS purchase_delivery_notes_archive;
+-- DROP TABLE IF EXISTS grpo_items_archive;
+-- DROP TABLE IF EXISTS grpo_documents_archive;
@@ -0,0 +1,40 @@
+-- Migration: Data retention
+-- Date: 2026-10-19
+-- Description: Run log and compressed archive for the retention purger
+--              (data_retention.py), plus indexes on the age columns it
+--              filters scratch tables by.
+
+-- ==================== UP ====================
+CREATE TABLE IF NOT EXISTS data_retention_runs (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    policy VARCHAR(50) NOT NULL,
+    table_name VARCHAR(100) NOT NULL,
+    purged INT DEFAULT 0,
+    archived INT DEFAULT 0,
+    watermark INT,
+    error TEXT,
+    started_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    finished_at DATETIME,
+    INDEX ix_data_retention_runs_policy (policy)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+CREATE TABLE IF NOT EXISTS data_retention_archive (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    policy VARCHAR(50) NOT NULL,
+    table_name VARCHAR(100) NOT NULL,
+    first_id INT NOT NULL,
+    last_id INT NOT NULL,
+    row_count INT NOT NULL,
+    payload MEDIUMBLOB NOT NULL,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    INDEX ix_data_retention_archive_table_name (table_name)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+CREATE INDEX ix_bin_scanning_logs_scan_timestamp ON bin_scanning_logs (scan_timestamp);
+CREATE INDEX ix_gs1_scans_created_on ON gs1_scans (created_on);
+
+-- ==================== DOWN ====================
+-- DROP INDEX ix_gs1_scans_created_on ON gs1_scans;
+-- DROP INDEX ix_bin_scanning_logs_scan_timestamp ON bin_scanning_logs;
+-- DROP TABLE data_retention_archive;
+-- DROP TABLE data_retention_runs;
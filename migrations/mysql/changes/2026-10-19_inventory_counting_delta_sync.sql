@@ -0,0 +1,23 @@
+-- Migration: Inventory counting delta sync
+-- Date: 2026-10-19
+-- Description: Counting lines are merged by (count_id, line_number) instead of
+--              deleted and re-inserted, and sync_hash records the editable fields
+--              SAP last accepted so only changed lines are PATCHed back
+
+-- ==================== UP ====================
+ALTER TABLE sap_inventory_count_lines
+    ADD COLUMN sync_hash VARCHAR(32) NULL AFTER variance;
+
+-- Remove duplicate lines (keep the newest) before adding the unique key
+DELETE older FROM sap_inventory_count_lines older
+    JOIN sap_inventory_count_lines newer
+      ON newer.count_id = older.count_id
+     AND newer.line_number = older.line_number
+     AND newer.id > older.id;
+
+ALTER TABLE sap_inventory_count_lines
+    ADD UNIQUE KEY uq_sap_inventory_count_lines_line (count_id, line_number);
+
+-- ==================== DOWN ====================
+-- ALTER TABLE sap_inventory_count_lines DROP INDEX uq_sap_inventory_count_lines_line;
+-- ALTER TABLE sap_inventory_count_lines DROP COLUMN sync_hash;
@@ -0,0 +1,22 @@
+-- Migration: Write-behind replication outbox
+-- Date: 2026-10-19
+-- Description: Row changes are captured into replication_outbox in the same
+--              transaction as the change and drained to the secondary MySQL
+--              database in batches by the db_dual_support replicator thread
+
+-- ==================== UP ====================
+CREATE TABLE IF NOT EXISTS replication_outbox (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    table_name VARCHAR(100) NOT NULL,
+    operation VARCHAR(10) NOT NULL,
+    pk_value TEXT NULL,
+    payload LONGTEXT NULL,
+    status VARCHAR(10) NOT NULL DEFAULT 'pending',
+    attempts INT DEFAULT 0,
+    last_error TEXT NULL,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_replication_outbox_status (status)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- ==================== DOWN ====================
+-- DROP TABLE replication_outbox;
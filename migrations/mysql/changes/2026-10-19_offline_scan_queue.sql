@@ -0,0 +1,29 @@
+-- Migration: Offline scan queue
+-- Date: 2026-10-19
+-- Description: Scans captured by the PWA while offline are uploaded in
+--              batches by the service worker; each scan's device-generated
+--              idempotency key and outcome is stored so replays are no-ops
+
+-- ==================== UP ====================
+CREATE TABLE IF NOT EXISTS offline_scans (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    idempotency_key VARCHAR(64) NOT NULL,
+    user_id INT NOT NULL,
+    device_id VARCHAR(64) NULL,
+    sequence INT NULL,
+    scan_type VARCHAR(30) NOT NULL,
+    barcode VARCHAR(200) NOT NULL,
+    quantity FLOAT NULL,
+    context TEXT NULL,
+    scanned_at DATETIME NULL,
+    received_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    status VARCHAR(20) NOT NULL DEFAULT 'accepted',
+    message TEXT NULL,
+    UNIQUE KEY uq_offline_scans_key (idempotency_key),
+    INDEX idx_offline_scans_status (status),
+    INDEX idx_offline_scans_user (user_id),
+    CONSTRAINT fk_offline_scans_user FOREIGN KEY (user_id) REFERENCES users(id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- ==================== DOWN ====================
+-- DROP TABLE offline_scans;
@@ -0,0 +1,30 @@
+-- Migration: Pick list incremental (delta) sync watermarks
+-- Date: 2026-10-19
+-- Description: Stores the newest SAP B1 UpdateDate seen per synced entity so
+--              /api/sync-sap-pick-lists and the background scheduler only pull
+--              pick lists changed since the previous run
+
+-- ==================== UP ====================
+CREATE TABLE IF NOT EXISTS sync_watermarks (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    entity VARCHAR(50) NOT NULL,
+    last_update_date VARCHAR(10) NULL,
+    last_update_time VARCHAR(8) NULL,
+    last_synced_at DATETIME NULL,
+    rows_synced INT DEFAULT 0,
+    last_error TEXT NULL,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    UNIQUE KEY uq_sync_watermarks_entity (entity)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Delta merge looks up local rows by SAP keys
+CREATE INDEX idx_pick_lists_absolute_entry ON pick_lists(absolute_entry);
+CREATE INDEX idx_pick_list_lines_pick_list_line ON pick_list_lines(pick_list_id, line_number);
+CREATE INDEX idx_pick_list_bin_allocations_line ON pick_list_bin_allocations(pick_list_line_id);
+
+-- ==================== DOWN ====================
+-- DROP INDEX idx_pick_list_bin_allocations_line ON pick_list_bin_allocations;
+-- DROP INDEX idx_pick_list_lines_pick_list_line ON pick_list_lines;
+-- DROP INDEX idx_pick_lists_absolute_entry ON pick_lists;
+-- DROP TABLE sync_watermarks;
@@ -0,0 +1,27 @@
+-- Migration: Pick route layouts
+-- Date: 2026-10-19
+-- Description: Per-warehouse bin code layout used by the pick route engine
+--              (pick_route.py) to order pick list allocations in walk order,
+--              plus named indexes on the pick list foreign keys it joins on.
+
+-- ==================== UP ====================
+CREATE TABLE IF NOT EXISTS pick_route_layouts (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    warehouse_code VARCHAR(50) NOT NULL,
+    bin_pattern VARCHAR(255),
+    aisle_sequence TEXT,
+    serpentine BOOLEAN DEFAULT TRUE,
+    updated_by INT,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    UNIQUE KEY uq_pick_route_layouts_warehouse_code (warehouse_code),
+    FOREIGN KEY (updated_by) REFERENCES users(id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+CREATE INDEX ix_pick_list_lines_pick_list_id ON pick_list_lines (pick_list_id);
+CREATE INDEX ix_pick_list_bin_allocations_pick_list_line_id ON pick_list_bin_allocations (pick_list_line_id);
+
+-- ==================== DOWN ====================
+-- DROP INDEX ix_pick_list_bin_allocations_pick_list_line_id ON pick_list_bin_allocations;
+-- DROP INDEX ix_pick_list_lines_pick_list_id ON pick_list_lines;
+-- DROP TABLE pick_route_layouts;
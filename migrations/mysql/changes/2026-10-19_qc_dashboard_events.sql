@@ -0,0 +1,22 @@
+-- Migration: QC dashboard events
+-- Date: 2026-10-19
+-- Description: Document status changes streamed to open QC dashboards over
+--              Server-Sent Events (qc_events.py). Rows are written in the
+--              same transaction as the status change and purged after two
+--              days by the data retention purger.
+
+-- ==================== UP ====================
+CREATE TABLE IF NOT EXISTS qc_dashboard_events (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    document_type VARCHAR(30) NOT NULL,
+    document_id INT NOT NULL,
+    document_number VARCHAR(50),
+    status VARCHAR(20) NOT NULL,
+    previous_status VARCHAR(20),
+    user_id INT,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    INDEX ix_qc_dashboard_events_created_at (created_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- ==================== DOWN ====================
+-- DROP TABLE qc_dashboard_events;
@@ -0,0 +1,22 @@
+-- Migration: Reference data bundle
+-- Date: 2026-10-19
+-- Description: Versioned snapshot of SAP warehouses, bins, series and active
+--              items served to handhelds as deltas (?since_version=N)
+
+-- ==================== UP ====================
+CREATE TABLE IF NOT EXISTS reference_data_entries (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    dataset VARCHAR(30) NOT NULL,
+    entry_key VARCHAR(100) NOT NULL,
+    payload TEXT NOT NULL,
+    content_hash VARCHAR(32) NOT NULL,
+    version INT NOT NULL,
+    deleted BOOLEAN DEFAULT FALSE,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    UNIQUE KEY uq_reference_data_entries_key (dataset, entry_key),
+    INDEX idx_reference_data_entries_version (version)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- ==================== DOWN ====================
+-- DROP TABLE reference_data_entries;
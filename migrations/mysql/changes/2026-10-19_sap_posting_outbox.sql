@@ -0,0 +1,30 @@
+-- Migration: SAP posting outbox
+-- Date: 2026-10-19
+-- Description: SAP B1 document postings are queued in the same transaction as
+--              the local status change and dispatched with an idempotency
+--              reference, so retries never create duplicate documents
+
+-- ==================== UP ====================
+CREATE TABLE IF NOT EXISTS sap_posting_outbox (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    document_type VARCHAR(50) NOT NULL,
+    source_id INT NOT NULL,
+    endpoint VARCHAR(100) NOT NULL,
+    idempotency_key VARCHAR(100) NOT NULL,
+    payload LONGTEXT NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending',
+    attempts INT DEFAULT 0,
+    next_attempt_at DATETIME NULL,
+    sap_doc_entry INT NULL,
+    sap_doc_num VARCHAR(50) NULL,
+    last_error TEXT NULL,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    posted_at DATETIME NULL,
+    UNIQUE KEY uq_sap_posting_outbox_key (idempotency_key),
+    INDEX idx_sap_posting_outbox_status (status),
+    INDEX idx_sap_posting_outbox_source (document_type, source_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- ==================== DOWN ====================
+-- DROP TABLE sap_posting_outbox;
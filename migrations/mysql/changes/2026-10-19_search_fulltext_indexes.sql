@@ -0,0 +1,65 @@
+-- Migration: Search full-text indexes
+-- Date: 2026-10-19
+-- Description: ngram FULLTEXT indexes behind the list-page search boxes
+--              (search_index.py) and B-tree indexes for the document-number
+--              prefix fast path. Each FULLTEXT index covers exactly the
+--              columns of the page's SearchSpec - search_index only uses
+--              MATCH ... AGAINST when such an index exists.
+
+-- ==================== UP ====================
+ALTER TABLE grpo_documents
+    ADD FULLTEXT INDEX ft_grpo_documents_search (po_number, doc_number, supplier_name, sap_document_number) WITH PARSER ngram,
+    ADD INDEX idx_grpo_documents_po_number (po_number),
+    ADD INDEX idx_grpo_documents_doc_number (doc_number),
+    ADD INDEX idx_grpo_documents_sap_document_number (sap_document_number);
+
+ALTER TABLE multi_grn_document
+    ADD FULLTEXT INDEX ft_multi_grn_document_search (batch_number, customer_name, customer_code) WITH PARSER ngram;
+
+ALTER TABLE inventory_transfers
+    ADD FULLTEXT INDEX ft_inventory_transfers_search (transfer_request_number, sap_document_number, status) WITH PARSER ngram,
+    ADD INDEX idx_inventory_transfers_transfer_request_number (transfer_request_number),
+    ADD INDEX idx_inventory_transfers_sap_document_number (sap_document_number);
+
+ALTER TABLE serial_number_transfers
+    ADD FULLTEXT INDEX ft_serial_number_transfers_search (transfer_number, from_warehouse, to_warehouse, status) WITH PARSER ngram;
+
+ALTER TABLE direct_inventory_transfers
+    ADD FULLTEXT INDEX ft_direct_inventory_transfers_search (transfer_number, from_warehouse, to_warehouse, notes) WITH PARSER ngram;
+
+ALTER TABLE delivery_documents
+    ADD FULLTEXT INDEX ft_delivery_documents_search (card_name, card_code) WITH PARSER ngram,
+    ADD INDEX idx_delivery_documents_so_doc_num (so_doc_num),
+    ADD INDEX idx_delivery_documents_sap_doc_num (sap_doc_num);
+
+ALTER TABLE serial_item_transfers
+    ADD FULLTEXT INDEX ft_serial_item_transfers_search (transfer_number, from_warehouse, to_warehouse, status) WITH PARSER ngram;
+
+ALTER TABLE so_invoice_documents
+    ADD FULLTEXT INDEX ft_so_invoice_documents_search (document_number, so_number, card_code, card_name, status) WITH PARSER ngram,
+    ADD INDEX idx_so_invoice_documents_so_number (so_number);
+
+ALTER TABLE pick_lists
+    ADD FULLTEXT INDEX ft_pick_lists_search (name, sales_order_number, customer_name, warehouse_code) WITH PARSER ngram,
+    ADD INDEX idx_pick_lists_name (name),
+    ADD INDEX idx_pick_lists_sales_order_number (sales_order_number);
+
+ALTER TABLE sap_inventory_counts
+    ADD INDEX idx_sap_inventory_counts_doc_number (doc_number),
+    ADD INDEX idx_sap_inventory_counts_series (series);
+
+-- ==================== DOWN ====================
+-- ALTER TABLE grpo_documents DROP INDEX ft_grpo_documents_search, DROP INDEX idx_grpo_documents_po_number,
+--     DROP INDEX idx_grpo_documents_doc_number, DROP INDEX idx_grpo_documents_sap_document_number;
+-- ALTER TABLE multi_grn_document DROP INDEX ft_multi_grn_document_search;
+-- ALTER TABLE inventory_transfers DROP INDEX ft_inventory_transfers_search,
+--     DROP INDEX idx_inventory_transfers_transfer_request_number, DROP INDEX idx_inventory_transfers_sap_document_number;
+-- ALTER TABLE serial_number_transfers DROP INDEX ft_serial_number_transfers_search;
+-- ALTER TABLE direct_inventory_transfers DROP INDEX ft_direct_inventory_transfers_search;
+-- ALTER TABLE delivery_documents DROP INDEX ft_delivery_documents_search, DROP INDEX idx_delivery_documents_so_doc_num,
+--     DROP INDEX idx_delivery_documents_sap_doc_num;
+-- ALTER TABLE serial_item_transfers DROP INDEX ft_serial_item_transfers_search;
+-- ALTER TABLE so_invoice_documents DROP INDEX ft_so_invoice_documents_search, DROP INDEX idx_so_invoice_documents_so_number;
+-- ALTER TABLE pick_lists DROP INDEX ft_pick_lists_search, DROP INDEX idx_pick_lists_name,
+--     DROP INDEX idx_pick_lists_sales_order_number;
+-- ALTER TABLE sap_inventory_counts DROP INDEX idx_sap_inventory_counts_doc_number, DROP INDEX idx_sap_inventory_counts_series;
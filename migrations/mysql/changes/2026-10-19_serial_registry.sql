@@ -0,0 +1,36 @@
+-- Migration: Serial registry
+-- Date: 2026-10-19
+-- Description: One row per serial number with its item, warehouse and the
+--              WMS document currently holding it (serial_registry.py), plus
+--              indexes on the serial columns the registry resolves from.
+--              The registry backfills itself on first start when empty
+--              (or POST /api/serial-registry/rebuild).
+
+-- ==================== UP ====================
+CREATE TABLE IF NOT EXISTS serial_registry (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    serial_number VARCHAR(100) NOT NULL,
+    item_code VARCHAR(50),
+    warehouse_code VARCHAR(50),
+    source_type VARCHAR(30) NOT NULL,
+    source_id INT NOT NULL,
+    document_id INT,
+    document_number VARCHAR(50),
+    status VARCHAR(20),
+    recorded_at DATETIME,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    UNIQUE KEY uq_serial_registry_serial_number (serial_number)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+CREATE INDEX ix_serial_number_transfer_serials_serial_number ON serial_number_transfer_serials (serial_number);
+CREATE INDEX ix_serial_item_transfer_items_serial_number ON serial_item_transfer_items (serial_number);
+CREATE INDEX ix_multi_grn_serial_details_serial_number ON multi_grn_serial_details (serial_number);
+CREATE INDEX ix_so_invoice_serials_serial_number ON so_invoice_serials (serial_number);
+
+-- ==================== DOWN ====================
+-- DROP INDEX ix_so_invoice_serials_serial_number ON so_invoice_serials;
+-- DROP INDEX ix_multi_grn_serial_details_serial_number ON multi_grn_serial_details;
+-- DROP INDEX ix_serial_item_transfer_items_serial_number ON serial_item_transfer_items;
+-- DROP INDEX ix_serial_number_transfer_serials_serial_number ON serial_number_transfer_serials;
+-- DROP TABLE serial_registry;
@@ -0,0 +1,23 @@
+-- Migration: delta sync for inventory counting lines (PostgreSQL)
+-- Same change as mysql/changes/2026-10-19_inventory_counting_delta_sync.sql:
+-- sync_hash holds a hash of each line's editable fields as SAP last accepted them,
+-- and the unique (count_id, line_number) index is the conflict target of the
+-- multi-row upsert in inventory_counting_sync.py.
+-- Date: 2026-10-19
+-- Database: PostgreSQL
+
+ALTER TABLE sap_inventory_count_lines ADD COLUMN IF NOT EXISTS sync_hash VARCHAR(32);
+
+-- Keep the newest copy of any line stored more than once
+DELETE FROM sap_inventory_count_lines older
+USING sap_inventory_count_lines newer
+WHERE older.count_id = newer.count_id
+  AND older.line_number = newer.line_number
+  AND older.id < newer.id;
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_sap_inventory_count_lines_line
+    ON sap_inventory_count_lines (count_id, line_number);
+
+-- Rollback:
+-- DROP INDEX IF EXISTS uq_sap_inventory_count_lines_line;
+-- ALTER TABLE sap_inventory_count_lines DROP COLUMN IF EXISTS sync_hash;
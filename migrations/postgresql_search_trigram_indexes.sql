@@ -0,0 +1,68 @@
+-- Migration: trigram indexes for the list-page search boxes
+-- Lets ILIKE '%term%' and the document-number prefix probe ILIKE 'term%' (search_index.py)
+-- use GIN indexes instead of scanning the table. Every column a search ORs together is
+-- indexed - one unindexed column would send the whole OR back to a sequential scan.
+-- Date: 2026-10-19
+-- Database: PostgreSQL
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- GRPO
+CREATE INDEX IF NOT EXISTS idx_grpo_documents_po_number_trgm ON grpo_documents USING gin (po_number gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_grpo_documents_doc_number_trgm ON grpo_documents USING gin (doc_number gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_grpo_documents_supplier_name_trgm ON grpo_documents USING gin (supplier_name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_grpo_documents_sap_document_number_trgm ON grpo_documents USING gin (sap_document_number gin_trgm_ops);
+
+-- Multiple GRN
+CREATE INDEX IF NOT EXISTS idx_multi_grn_document_batch_number_trgm ON multi_grn_document USING gin (batch_number gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_multi_grn_document_customer_name_trgm ON multi_grn_document USING gin (customer_name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_multi_grn_document_customer_code_trgm ON multi_grn_document USING gin (customer_code gin_trgm_ops);
+
+-- Inventory Transfer
+CREATE INDEX IF NOT EXISTS idx_inventory_transfers_transfer_request_number_trgm ON inventory_transfers USING gin (transfer_request_number gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_inventory_transfers_sap_document_number_trgm ON inventory_transfers USING gin (sap_document_number gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_inventory_transfers_status_trgm ON inventory_transfers USING gin (status gin_trgm_ops);
+
+-- Serial Number Transfer
+CREATE INDEX IF NOT EXISTS idx_serial_number_transfers_transfer_number_trgm ON serial_number_transfers USING gin (transfer_number gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_serial_number_transfers_from_warehouse_trgm ON serial_number_transfers USING gin (from_warehouse gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_serial_number_transfers_to_warehouse_trgm ON serial_number_transfers USING gin (to_warehouse gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_serial_number_transfers_status_trgm ON serial_number_transfers USING gin (status gin_trgm_ops);
+
+-- Direct Inventory Transfer
+CREATE INDEX IF NOT EXISTS idx_direct_inventory_transfers_transfer_number_trgm ON direct_inventory_transfers USING gin (transfer_number gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_direct_inventory_transfers_from_warehouse_trgm ON direct_inventory_transfers USING gin (from_warehouse gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_direct_inventory_transfers_to_warehouse_trgm ON direct_inventory_transfers USING gin (to_warehouse gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_direct_inventory_transfers_notes_trgm ON direct_inventory_transfers USING gin (notes gin_trgm_ops);
+
+-- Sales Delivery
+CREATE INDEX IF NOT EXISTS idx_delivery_documents_card_name_trgm ON delivery_documents USING gin (card_name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_delivery_documents_card_code_trgm ON delivery_documents USING gin (card_code gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_delivery_documents_so_doc_num ON delivery_documents (so_doc_num);
+CREATE INDEX IF NOT EXISTS idx_delivery_documents_sap_doc_num ON delivery_documents (sap_doc_num);
+
+-- Serial Item Transfer
+CREATE INDEX IF NOT EXISTS idx_serial_item_transfers_transfer_number_trgm ON serial_item_transfers USING gin (transfer_number gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_serial_item_transfers_from_warehouse_trgm ON serial_item_transfers USING gin (from_warehouse gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_serial_item_transfers_to_warehouse_trgm ON serial_item_transfers USING gin (to_warehouse gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_serial_item_transfers_status_trgm ON serial_item_transfers USING gin (status gin_trgm_ops);
+
+-- SO Against Invoice
+CREATE INDEX IF NOT EXISTS idx_so_invoice_documents_document_number_trgm ON so_invoice_documents USING gin (document_number gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_so_invoice_documents_so_number_trgm ON so_invoice_documents USING gin (so_number gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_so_invoice_documents_card_code_trgm ON so_invoice_documents USING gin (card_code gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_so_invoice_documents_card_name_trgm ON so_invoice_documents USING gin (card_name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_so_invoice_documents_status_trgm ON so_invoice_documents USING gin (status gin_trgm_ops);
+
+-- Pick List
+CREATE INDEX IF NOT EXISTS idx_pick_lists_name_trgm ON pick_lists USING gin (name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_pick_lists_sales_order_number_trgm ON pick_lists USING gin (sales_order_number gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_pick_lists_customer_name_trgm ON pick_lists USING gin (customer_name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_pick_lists_warehouse_code_trgm ON pick_lists USING gin (warehouse_code gin_trgm_ops);
+
+-- Inventory Counting history (exact integer match)
+CREATE INDEX IF NOT EXISTS idx_sap_inventory_counts_doc_number ON sap_inventory_counts (doc_number);
+CREATE INDEX IF NOT EXISTS idx_sap_inventory_counts_series ON sap_inventory_counts (series);
+
+-- Verify the indexes
+SELECT tablename, indexname FROM pg_indexes WHERE indexname LIKE '%\_trgm' ORDER BY tablename, indexname;
@@ -364,7 +364,7 @@ class PickListLine(db.Model):
     __tablename__ = 'pick_list_lines'
 
     id = db.Column(db.Integer, primary_key=True)
-    pick_list_id = db.Column(db.Integer, db.ForeignKey('pick_lists.id'), nullable=False)
+    pick_list_id = db.Column(db.Integer, db.ForeignKey('pick_lists.id'), nullable=False, index=True)
     
     # SAP B1 PickListsLines fields
     absolute_entry = db.Column(db.Integer, nullable=True)  # From SAP B1 AbsoluteEntry
@@ -395,7 +395,7 @@ class PickListBinAllocation(db.Model):
     __tablename__ = 'pick_list_bin_allocations'
 
     id = db.Column(db.Integer, primary_key=True)
-    pick_list_line_id = db.Column(db.Integer, db.ForeignKey('pick_list_lines.id'), nullable=False)
+    pick_list_line_id = db.Column(db.Integer, db.ForeignKey('pick_list_lines.id'), nullable=False, index=True)
     
     # SAP B1 DocumentLinesBinAllocations fields
     bin_abs_entry = db.Column(db.Integer, nullable=True)  # From SAP B1 BinAbsEntry
@@ -415,6 +415,236 @@ class PickListBinAllocation(db.Model):
     pick_list_line = relationship('PickListLine', back_populates='bin_allocations')
 
 
+class SyncWatermark(db.Model):
+    """Last SAP B1 change seen per synced entity - drives incremental (delta) syncs"""
+    __tablename__ = 'sync_watermarks'
+
+    id = db.Column(db.Integer, primary_key=True)
+    entity = db.Column(db.String(50), nullable=False, unique=True)  # PickLists, ...
+    last_update_date = db.Column(db.String(10), nullable=True)  # SAP UpdateDate (YYYY-MM-DD) of newest synced row
+    last_update_time = db.Column(db.String(8), nullable=True)  # SAP UpdateTime (HH:MM:SS) when exposed
+    last_synced_at = db.Column(db.DateTime, nullable=True)
+    rows_synced = db.Column(db.Integer, default=0)  # Rows received in the last run
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<SyncWatermark {self.entity} {self.last_update_date}>'
+
+
+class ReplicationOutbox(db.Model):
+    """Row changes captured on flush, drained to the secondary MySQL database by db_dual_support"""
+    __tablename__ = 'replication_outbox'
+
+    id = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True)
+    table_name = db.Column(db.String(100), nullable=False)
+    operation = db.Column(db.String(10), nullable=False)  # INSERT, UPDATE, DELETE, SQL
+    pk_value = db.Column(db.Text, nullable=True)  # JSON {column: value}
+    payload = db.Column(db.Text, nullable=True)  # JSON row values (or {sql, params} for SQL)
+    status = db.Column(db.String(10), nullable=False, default='pending', index=True)  # pending, dead
+    attempts = db.Column(db.Integer, default=0)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<ReplicationOutbox {self.operation} {self.table_name} {self.pk_value}>'
+
+
+class SAPPostingOutbox(db.Model):
+    """SAP B1 document postings, written in the same transaction as the local status change"""
+    __tablename__ = 'sap_posting_outbox'
+
+    id = db.Column(db.Integer, primary_key=True)
+    document_type = db.Column(db.String(50), nullable=False)  # multi_grn, ...
+    source_id = db.Column(db.Integer, nullable=False)  # ID of the local document
+    endpoint = db.Column(db.String(100), nullable=False)  # Service Layer entity, e.g. PurchaseDeliveryNotes
+    idempotency_key = db.Column(db.String(100), nullable=False, unique=True)
+    payload = db.Column(db.Text, nullable=False)  # JSON document sent to SAP
+    status = db.Column(db.String(20), nullable=False, default='pending', index=True)  # pending, processing, posted, failed, dead
+    attempts = db.Column(db.Integer, default=0)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sap_doc_entry = db.Column(db.Integer, nullable=True)
+    sap_doc_num = db.Column(db.String(50), nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    posted_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        db.Index('idx_sap_posting_outbox_source', 'document_type', 'source_id'),
+    )
+
+    def __repr__(self):
+        return f'<SAPPostingOutbox {self.idempotency_key} {self.status}>'
+
+
+class OfflineScan(db.Model):
+    """Scans captured offline by the PWA and uploaded in batches by the service worker"""
+    __tablename__ = 'offline_scans'
+
+    id = db.Column(db.Integer, primary_key=True)
+    idempotency_key = db.Column(db.String(64), nullable=False, unique=True)  # Generated on the device
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    device_id = db.Column(db.String(64), nullable=True)
+    sequence = db.Column(db.Integer, nullable=True)  # Order of the scan on the device
+    scan_type = db.Column(db.String(30), nullable=False)  # BIN_SCAN, PICK
+    barcode = db.Column(db.String(200), nullable=False)
+    quantity = db.Column(db.Float, nullable=True)
+    context = db.Column(db.Text, nullable=True)  # JSON (pick list, line, warehouse...)
+    scanned_at = db.Column(db.DateTime, nullable=True)  # Device clock
+    received_at = db.Column(db.DateTime, default=datetime.utcnow)
+    status = db.Column(db.String(20), nullable=False, default='accepted', index=True)  # accepted, conflict, rejected
+    message = db.Column(db.Text, nullable=True)
+
+    def __repr__(self):
+        return f'<OfflineScan {self.scan_type} {self.barcode} {self.status}>'
+
+
+class ReferenceDataEntry(db.Model):
+    """Snapshot of SAP reference data (warehouses, bins, series, items) served to handhelds as versioned deltas"""
+    __tablename__ = 'reference_data_entries'
+
+    id = db.Column(db.Integer, primary_key=True)
+    dataset = db.Column(db.String(30), nullable=False)  # warehouses, bins, series, items
+    entry_key = db.Column(db.String(100), nullable=False)
+    payload = db.Column(db.Text, nullable=False)  # JSON sent to the device
+    content_hash = db.Column(db.String(32), nullable=False)
+    version = db.Column(db.Integer, nullable=False, index=True)  # Bundle version that last changed the row
+    deleted = db.Column(db.Boolean, default=False)  # Tombstone - sent as a delete in deltas
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('dataset', 'entry_key', name='uq_reference_data_entries_key'),
+    )
+
+    def __repr__(self):
+        return f'<ReferenceDataEntry {self.dataset}:{self.entry_key} v{self.version}>'
+
+
+class SerialRegistry(db.Model):
+    """Where each serial number is in the WMS right now - maintained by serial_registry.py on every serial write"""
+    __tablename__ = 'serial_registry'
+
+    id = db.Column(db.Integer, primary_key=True)
+    serial_number = db.Column(db.String(100), nullable=False, unique=True)
+    item_code = db.Column(db.String(50))
+    warehouse_code = db.Column(db.String(50))  # Where the serial is (transfer source until posted)
+    source_type = db.Column(db.String(30), nullable=False)  # grpo, multi_grn, serial_transfer, serial_item_transfer, delivery, so_invoice
+    source_id = db.Column(db.Integer, nullable=False)  # Row id in the source serial table
+    document_id = db.Column(db.Integer)
+    document_number = db.Column(db.String(50))
+    status = db.Column(db.String(20))  # Status of the document holding the serial
+    recorded_at = db.Column(db.DateTime)  # When the source row was created
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'serial_number': self.serial_number,
+            'item_code': self.item_code,
+            'warehouse_code': self.warehouse_code,
+            'source_type': self.source_type,
+            'document_id': self.document_id,
+            'document_number': self.document_number,
+            'status': self.status,
+            'recorded_at': self.recorded_at.isoformat() if self.recorded_at else None
+        }
+
+    def __repr__(self):
+        return f'<SerialRegistry {self.serial_number} {self.source_type}:{self.document_number}>'
+
+
+class DataRetentionRun(db.Model):
+    """One purge pass of a retention policy (data_retention.py) - recorded when rows were purged or it failed"""
+    __tablename__ = 'data_retention_runs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    policy = db.Column(db.String(50), nullable=False, index=True)
+    table_name = db.Column(db.String(100), nullable=False)
+    purged = db.Column(db.Integer, default=0)
+    archived = db.Column(db.Integer, default=0)
+    watermark = db.Column(db.Integer, nullable=True)  # Highest watermark_column value purged (e.g. tombstone version)
+    error = db.Column(db.Text, nullable=True)
+    started_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f'<DataRetentionRun {self.policy} purged={self.purged}>'
+
+
+class DataRetentionArchive(db.Model):
+    """Purged rows of one chunk, zlib-compressed JSON, for policies that archive before deleting"""
+    __tablename__ = 'data_retention_archive'
+
+    id = db.Column(db.Integer, primary_key=True)
+    policy = db.Column(db.String(50), nullable=False)
+    table_name = db.Column(db.String(100), nullable=False, index=True)
+    first_id = db.Column(db.Integer, nullable=False)
+    last_id = db.Column(db.Integer, nullable=False)
+    row_count = db.Column(db.Integer, nullable=False)
+    payload = db.Column(db.LargeBinary(length=16777215), nullable=False)  # MEDIUMBLOB on MySQL
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<DataRetentionArchive {self.table_name} {self.first_id}-{self.last_id}>'
+
+
+class QCDashboardEvent(db.Model):
+    """Document status change pushed to open QC dashboards (qc_events.py) - written in the same transaction"""
+    __tablename__ = 'qc_dashboard_events'
+
+    id = db.Column(db.Integer, primary_key=True)
+    document_type = db.Column(db.String(30), nullable=False)  # grpo, inventory_transfer, delivery, multi_grn, ...
+    document_id = db.Column(db.Integer, nullable=False)
+    document_number = db.Column(db.String(50))
+    status = db.Column(db.String(20), nullable=False)
+    previous_status = db.Column(db.String(20))
+    user_id = db.Column(db.Integer)  # Document owner
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'document_type': self.document_type,
+            'document_id': self.document_id,
+            'document_number': self.document_number,
+            'status': self.status,
+            'previous_status': self.previous_status,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+    def __repr__(self):
+        return f'<QCDashboardEvent {self.document_type}:{self.document_id} {self.status}>'
+
+
+class PickRouteLayout(db.Model):
+    """How bin codes of one warehouse map to aisle/rack/level for pick routing (pick_route.py)"""
+    __tablename__ = 'pick_route_layouts'
+
+    id = db.Column(db.Integer, primary_key=True)
+    warehouse_code = db.Column(db.String(50), nullable=False, unique=True)
+    bin_pattern = db.Column(db.String(255), nullable=True)  # Regex with aisle/rack/level groups; empty = generic parser
+    aisle_sequence = db.Column(db.Text, nullable=True)  # Comma separated walk order of aisles; empty = natural order
+    serpentine = db.Column(db.Boolean, default=True)  # Walk every other aisle back down
+    updated_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'warehouse_code': self.warehouse_code,
+            'bin_pattern': self.bin_pattern,
+            'aisle_sequence': [a for a in (self.aisle_sequence or '').split(',') if a],
+            'serpentine': bool(self.serpentine),
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+    def __repr__(self):
+        return f'<PickRouteLayout {self.warehouse_code}>'
+
+
 class InventoryCount(db.Model):
     __tablename__ = 'inventory_counts'
 
@@ -520,9 +750,14 @@ class SAPInventoryCountLine(db.Model):
     freeze = db.Column(db.String(5), nullable=True, default='tNO')
     u_invcount = db.Column(db.String(50), nullable=True)
     variance = db.Column(db.Float, nullable=True, default=0)
+    sync_hash = db.Column(db.String(32), nullable=True)  # Hash of editable fields as SAP last accepted them
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    __table_args__ = (
+        db.UniqueConstraint('count_id', 'line_number', name='uq_sap_inventory_count_lines_line'),
+    )
+
     # Relationships
     count_document = relationship('SAPInventoryCount', back_populates='lines')
 
@@ -608,7 +843,7 @@ class BinScanningLog(db.Model):
     scan_type = db.Column(db.String(50), nullable=False)  # BIN_SCAN, ITEM_SCAN, etc.
     scan_data = db.Column(db.Text, nullable=True)
     items_found = db.Column(db.Integer, default=0)
-    scan_timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    scan_timestamp = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     
     # Relationships
     user = relationship('User', back_populates='bin_scanning_logs')
@@ -755,33 +990,13 @@ class DocumentNumberSeries(db.Model):
 
     @classmethod
     def get_next_number(cls, document_type):
-        """Generate next document number for given document type"""
-        series = cls.query.filter_by(document_type=document_type).first()
-        
-        if not series:
-            # Create default series if not exists
-            prefixes = {
-                'GRPO': 'GRPO-',
-                'TRANSFER': 'TR-',
-                'PICKLIST': 'PL-'
-            }
-            series = cls(
-                document_type=document_type,
-                prefix=prefixes.get(document_type, 'DOC-'),
-                current_number=1
-            )
-            db.session.add(series)
-        
-        # Generate document number
-        year_suffix = datetime.now().strftime('%Y') if series.year_suffix else ''
-        doc_number = f"{series.prefix}{series.current_number:04d}{'-' + year_suffix if year_suffix else ''}"
-        
-        # Increment counter
-        series.current_number += 1
-        series.updated_at = datetime.utcnow()
-        db.session.commit()
-        
-        return doc_number
+        """Generate next document number for given document type
+
+        Numbers come from a block reserved in a separate transaction
+        (document_numbers.py), so the caller's session is not committed here.
+        """
+        from document_numbers import next_document_number
+        return next_document_number(document_type)
 
 # ================================
 # Serial Number Transfer Models
@@ -836,7 +1051,7 @@ class SerialNumberTransferSerial(db.Model):
     
     id = db.Column(db.Integer, primary_key=True)
     transfer_item_id = db.Column(db.Integer, db.ForeignKey('serial_number_transfer_items.id'), nullable=False)
-    serial_number = db.Column(db.String(100), nullable=False)
+    serial_number = db.Column(db.String(100), nullable=False, index=True)
     internal_serial_number = db.Column(db.String(100), nullable=False)  # From SAP SerialNumberDetails
     system_serial_number = db.Column(db.Integer)  # SystemNumber from SAP
     is_validated = db.Column(db.Boolean, default=False)  # Validated against SAP
@@ -885,7 +1100,7 @@ class SerialItemTransferItem(db.Model):
     
     id = db.Column(db.Integer, primary_key=True)
     serial_item_transfer_id = db.Column(db.Integer, db.ForeignKey('serial_item_transfers.id'), nullable=False)
-    serial_number = db.Column(db.String(100), nullable=False)  # The entered serial number
+    serial_number = db.Column(db.String(100), nullable=False, index=True)  # The entered serial number
     item_code = db.Column(db.String(50), nullable=False)  # Auto-populated from SAP B1
     item_description = db.Column(db.String(200), nullable=False)  # Auto-populated from SAP B1
     warehouse_code = db.Column(db.String(10), nullable=False)  # From SAP B1 validation
@@ -8,6 +8,8 @@ from pathlib import Path
 from app import db
 from models import DirectInventoryTransfer, DirectInventoryTransferItem, DocumentNumberSeries
 from sap_integration import SAPIntegration
+from streaming_export import register_export
+from search_index import SearchSpec, apply_search
 
 # Use absolute path for template_folder to support PyInstaller .exe builds
 direct_inventory_transfer_bp = Blueprint('direct_inventory_transfer', __name__,
@@ -19,6 +21,12 @@ def generate_direct_transfer_number():
     """Generate unique transfer number for Direct Inventory Transfer"""
     return DocumentNumberSeries.get_next_number('DIRECT_INVENTORY_TRANSFER')
 
+DIRECT_TRANSFER_SEARCH = SearchSpec(
+    columns=[DirectInventoryTransfer.transfer_number, DirectInventoryTransfer.from_warehouse,
+             DirectInventoryTransfer.to_warehouse, DirectInventoryTransfer.notes],
+    prefix_columns=[DirectInventoryTransfer.transfer_number]
+)
+
 @direct_inventory_transfer_bp.route('/', methods=['GET'])
 @login_required
 def index():
@@ -51,16 +59,7 @@ def index():
     if current_user.role not in ['admin', 'manager']:
         query = query.filter_by(user_id=current_user.id)
 
-    if search_term:
-        search_pattern = f'%{search_term}%'
-        query = query.filter(
-            db.or_(
-                DirectInventoryTransfer.transfer_number.ilike(search_pattern),
-                DirectInventoryTransfer.from_warehouse.ilike(search_pattern),
-                DirectInventoryTransfer.to_warehouse.ilike(search_pattern),
-                DirectInventoryTransfer.notes.ilike(search_pattern)
-            )
-        )
+    query = apply_search(query, search_term, DIRECT_TRANSFER_SEARCH)
 
     if status_filter:
         query = query.filter(DirectInventoryTransfer.status == status_filter)
@@ -1713,3 +1712,39 @@ def get_transfer_history():
     except Exception as e:
         logging.error(f"Error fetching transfer history: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
+
+
+def _direct_transfer_export_query(user):
+    """One row per transfer line - transfers without lines still appear once"""
+    query = db.session.query(
+        DirectInventoryTransfer.transfer_number.label('transfer_number'),
+        DirectInventoryTransfer.status.label('status'),
+        DirectInventoryTransfer.sap_document_number.label('sap_document_number'),
+        DirectInventoryTransfer.from_warehouse.label('from_warehouse'),
+        DirectInventoryTransfer.from_bin.label('from_bin'),
+        DirectInventoryTransfer.to_warehouse.label('to_warehouse'),
+        DirectInventoryTransfer.to_bin.label('to_bin'),
+        DirectInventoryTransferItem.item_code.label('item_code'),
+        DirectInventoryTransferItem.item_description.label('item_description'),
+        DirectInventoryTransferItem.batch_number.label('batch_number'),
+        DirectInventoryTransferItem.serial_numbers.label('serial_numbers'),
+        DirectInventoryTransferItem.quantity.label('quantity'),
+        DirectInventoryTransferItem.unit_of_measure.label('uom'),
+        DirectInventoryTransferItem.qc_status.label('qc_status'),
+        DirectInventoryTransfer.created_at.label('created_at'),
+        DirectInventoryTransfer.qc_approved_at.label('qc_approved_at')
+    ).outerjoin(DirectInventoryTransferItem,
+                DirectInventoryTransferItem.direct_inventory_transfer_id == DirectInventoryTransfer.id)
+    if user.role not in ['admin', 'manager']:
+        query = query.filter(DirectInventoryTransfer.user_id == user.id)
+    return query.order_by(DirectInventoryTransfer.created_at.desc(), DirectInventoryTransferItem.id)
+
+
+register_export('direct_transfers', _direct_transfer_export_query, [
+    ('Transfer Number', 'transfer_number'), ('Status', 'status'), ('SAP Document', 'sap_document_number'),
+    ('From Warehouse', 'from_warehouse'), ('From Bin', 'from_bin'),
+    ('To Warehouse', 'to_warehouse'), ('To Bin', 'to_bin'),
+    ('Item Code', 'item_code'), ('Description', 'item_description'), ('Batch', 'batch_number'),
+    ('Serial Numbers', 'serial_numbers'), ('Quantity', 'quantity'), ('UoM', 'uom'),
+    ('QC Status', 'qc_status'), ('Created At', 'created_at'), ('QC Approved At', 'qc_approved_at')
+], date_column=DirectInventoryTransfer.created_at, permission='direct_inventory_transfer')
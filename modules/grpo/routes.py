@@ -8,6 +8,10 @@ from app import db
 from modules.grpo.models import GRPODocument, GRPOItem, GRPOSerialNumber, GRPOBatchNumber, GRPONonManagedItem
 from models import User
 from sap_integration import SAPIntegration
+from search_index import apply_search
+from cold_archive import history_query
+from serial_registry import LOOKUP_CHUNK, in_stock, lookup_serials
+from label_plan import LabelPlan, chunk_serials
 import logging
 from datetime import datetime
 from decimal import Decimal, InvalidOperation
@@ -35,22 +39,16 @@ def index():
     from_date = request.args.get('from_date', '').strip()
     to_date = request.args.get('to_date', '').strip()
     
-    query = GRPODocument.query.filter_by(user_id=current_user.id)
+    # Hot and archived documents (cold_archive history view)
+    query, documents_table, search = history_query('grpo')
+    query = query.filter(documents_table.c.user_id == current_user.id)
     
-    if search_term:
-        query = query.filter(
-            db.or_(
-                GRPODocument.po_number.ilike(f'%{search_term}%'),
-                GRPODocument.doc_number.ilike(f'%{search_term}%'),
-                GRPODocument.supplier_name.ilike(f'%{search_term}%'),
-                GRPODocument.sap_document_number.ilike(f'%{search_term}%')
-            )
-        )
+    query = apply_search(query, search_term, search)
     
     if from_date:
         try:
             from_dt = datetime.strptime(from_date, '%Y-%m-%d')
-            query = query.filter(GRPODocument.created_at >= from_dt)
+            query = query.filter(documents_table.c.created_at >= from_dt)
         except ValueError:
             pass
     
@@ -58,11 +56,11 @@ def index():
         try:
             to_dt = datetime.strptime(to_date, '%Y-%m-%d')
             to_dt = to_dt.replace(hour=23, minute=59, second=59)
-            query = query.filter(GRPODocument.created_at <= to_dt)
+            query = query.filter(documents_table.c.created_at <= to_dt)
         except ValueError:
             pass
     
-    query = query.order_by(GRPODocument.created_at.desc())
+    query = query.order_by(documents_table.c.created_at.desc())
     
     pagination = query.paginate(page=page, per_page=per_page, error_out=False)
     documents = pagination.items
@@ -515,65 +513,26 @@ def add_grpo_item(grpo_id):
                     db.session.rollback()
                     return redirect(url_for('grpo.detail', grpo_id=grpo_id))
                 
-                # Create batch number records with automatic barcode generation
-                # NEW LOGIC: Create separate batch records for each pack with integer quantities
-                batch_record_counter = 0
-                for idx, batch_data in enumerate(batch_numbers):
-                    batch_qty = int(float(batch_data.get('quantity', 0)))  # Convert to integer
-                    batch_number_value = batch_data.get('batch_number')
-                    expiry_date_value = datetime.strptime(batch_data['expiry_date'], '%Y-%m-%d').date() if batch_data.get('expiry_date') else None
-                    
-                    # Distribute quantity across packs as integers
-                    # First pack gets the highest quantity if not evenly divisible
-                    if number_of_bags > 0:
-                        base_qty_per_pack = batch_qty // number_of_bags  # Integer division
-                        remainder = batch_qty % number_of_bags  # Remaining quantity
-                        
-                        # Create separate batch record for each pack
-                        for pack_idx in range(number_of_bags):
-                            # First pack gets the extra quantity (base + remainder)
-                            if pack_idx == 0:
-                                pack_quantity = base_qty_per_pack + remainder
-                            else:
-                                pack_quantity = base_qty_per_pack
-                            
-                            # Generate unique GRN number for this pack
-                            grn_number = generate_unique_grn_number(grpo, batch_record_counter + 1)
-                            
-                            batch = GRPOBatchNumber(
-                                grpo_item_id=grpo_item.id,
-                                batch_number=batch_number_value,
-                                quantity=pack_quantity,  # Individual pack quantity (integer)
-                                manufacturer_serial_number=batch_data.get('manufacturer_serial_number', ''),
-                                internal_serial_number=batch_data.get('internal_serial_number', ''),
-                                expiry_date=expiry_date_value,
-                                base_line_number=batch_record_counter,
-                                grn_number=grn_number,
-                                qty_per_pack=pack_quantity,  # Same as quantity for individual packs
-                                no_of_packs=1  # Each record represents one pack
-                            )
-                            db.session.add(batch)
-                            batch_record_counter += 1
-                            logging.info(f"✅ Created batch pack {pack_idx + 1}/{number_of_bags} for {batch_number_value} with GRN {grn_number} (Qty: {pack_quantity})")
-                    else:
-                        # No bags specified, create single batch record
-                        grn_number = generate_unique_grn_number(grpo, batch_record_counter + 1)
-                        
-                        batch = GRPOBatchNumber(
-                            grpo_item_id=grpo_item.id,
-                            batch_number=batch_number_value,
-                            quantity=batch_qty,
-                            manufacturer_serial_number=batch_data.get('manufacturer_serial_number', ''),
-                            internal_serial_number=batch_data.get('internal_serial_number', ''),
-                            expiry_date=expiry_date_value,
-                            base_line_number=batch_record_counter,
-                            grn_number=grn_number,
-                            qty_per_pack=batch_qty,
-                            no_of_packs=1
-                        )
-                        db.session.add(batch)
-                        batch_record_counter += 1
-                        logging.info(f"✅ Created batch {batch_number_value} with GRN {grn_number} (Qty: {batch_qty})")
+                # One batch record per pack; pack sizes differ by at most one unit
+                plan = LabelPlan()
+                for batch_data in batch_numbers:
+                    plan.add_line(float(batch_data.get('quantity', 0)), number_of_bags,
+                                  lambda pack: generate_unique_grn_number(grpo, pack['sequence'] + 1),
+                                  batch_data=batch_data,
+                                  expiry_date=datetime.strptime(batch_data['expiry_date'], '%Y-%m-%d').date() if batch_data.get('expiry_date') else None)
+                plan.save(lambda pack: GRPOBatchNumber(
+                    grpo_item_id=grpo_item.id,
+                    batch_number=pack['batch_data'].get('batch_number'),
+                    quantity=pack['quantity'],  # Individual pack quantity (integer)
+                    manufacturer_serial_number=pack['batch_data'].get('manufacturer_serial_number', ''),
+                    internal_serial_number=pack['batch_data'].get('internal_serial_number', ''),
+                    expiry_date=pack['expiry_date'],
+                    base_line_number=pack['sequence'],
+                    grn_number=pack['label_id'],
+                    qty_per_pack=pack['quantity'],  # Same as quantity for individual packs
+                    no_of_packs=1  # Each record represents one pack
+                ))
+                batch_record_counter = len(plan.packs)
                 
                 logging.info(f"✅ Added {batch_record_counter} batch pack records for item {item_code}")
                 
@@ -612,54 +571,22 @@ def add_grpo_item(grpo_id):
                 return redirect(url_for('grpo.detail', grpo_id=grpo_id))
             
             try:
-                # NEW LOGIC: Distribute quantity as integers with first pack getting highest quantity
-                total_qty = int(quantity)  # Convert to integer
-                
-                if number_of_bags > 0:
-                    base_qty_per_pack = total_qty // number_of_bags  # Integer division
-                    remainder = total_qty % number_of_bags  # Remaining quantity
-                    
-                    for idx in range(number_of_bags):
-                        # First pack gets the extra quantity (base + remainder)
-                        if idx == 0:
-                            pack_quantity = base_qty_per_pack + remainder
-                        else:
-                            pack_quantity = base_qty_per_pack
-                        
-                        grn_number = generate_unique_grn_number(grpo, idx + 1)
-                        
-                        non_managed_item = GRPONonManagedItem(
-                            grpo_item_id=grpo_item.id,
-                            quantity=pack_quantity,  # Individual pack quantity (integer)
-                            base_line_number=idx,
-                            expiry_date=expiry_date_obj,
-                            admin_date=datetime.now().date(),
-                            grn_number=grn_number,
-                            qty_per_pack=pack_quantity,  # Same as quantity
-                            no_of_packs=1,  # Each record represents one pack
-                            pack_number=idx + 1
-                        )
-                        db.session.add(non_managed_item)
-                        logging.info(f"✅ Created non-managed item pack {idx + 1}/{number_of_bags} with GRN {grn_number} (Qty: {pack_quantity})")
-                    
-                    logging.info(f"✅ Added non-managed item {item_code} with {number_of_bags} packs (Integer distribution)")
-                else:
-                    # No bags specified, create single record
-                    grn_number = generate_unique_grn_number(grpo, 1)
-                    
-                    non_managed_item = GRPONonManagedItem(
-                        grpo_item_id=grpo_item.id,
-                        quantity=total_qty,
-                        base_line_number=0,
-                        expiry_date=expiry_date_obj,
-                        admin_date=datetime.now().date(),
-                        grn_number=grn_number,
-                        qty_per_pack=total_qty,
-                        no_of_packs=1,
-                        pack_number=1
-                    )
-                    db.session.add(non_managed_item)
-                    logging.info(f"✅ Created non-managed item with GRN {grn_number} (Qty: {total_qty})")
+                # One record per pack; pack sizes differ by at most one unit
+                plan = LabelPlan()
+                plan.add_line(quantity, number_of_bags, lambda pack: generate_unique_grn_number(grpo, pack['pack_number']))
+                admin_date = datetime.now().date()
+                plan.save(lambda pack: GRPONonManagedItem(
+                    grpo_item_id=grpo_item.id,
+                    quantity=pack['quantity'],  # Individual pack quantity (integer)
+                    base_line_number=pack['sequence'],
+                    expiry_date=expiry_date_obj,
+                    admin_date=admin_date,
+                    grn_number=pack['label_id'],
+                    qty_per_pack=pack['quantity'],  # Same as quantity
+                    no_of_packs=1,  # Each record represents one pack
+                    pack_number=pack['pack_number']
+                ))
+                logging.info(f"✅ Added non-managed item {item_code} with {number_of_bags} packs (Integer distribution)")
                 
             except Exception as e:
                 flash(f'Error processing non-managed item: {str(e)}', 'error')
@@ -1178,20 +1105,39 @@ def delete_batch_number(batch_id):
         logging.error(f"Error deleting batch number: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+def _received_through_grpo(serial_numbers):
+    """
+    Serials that already have a grpo_serial_numbers row. internal_serial_number is unique
+    there, so GRPO cannot record them again even after they were shipped.
+    """
+    wanted = list({str(serial).strip() for serial in serial_numbers if serial and str(serial).strip()})
+    received = set()
+    for start in range(0, len(wanted), LOOKUP_CHUNK):
+        received.update(serial for serial, in db.session.query(GRPOSerialNumber.internal_serial_number)
+                        .filter(GRPOSerialNumber.internal_serial_number.in_(wanted[start:start + LOOKUP_CHUNK])))
+    return received
+
 @grpo_bp.route('/validate-serial/<string:serial_number>', methods=['GET'])
 @login_required
 def validate_serial_unique(serial_number):
-    """Check if serial number is unique"""
+    """
+    Check the serial is not in stock already (serial registry); shipped serials can be
+    received back unless GRPO recorded them before
+    """
     try:
-        existing = GRPOSerialNumber.query.filter_by(
-            internal_serial_number=serial_number
-        ).first()
+        existing = lookup_serials([serial_number]).get(serial_number)
+        if existing and not in_stock(existing):
+            existing = None
+        if existing is None and _received_through_grpo([serial_number]):
+            existing = {'source_type': 'grpo', 'document_number': None}
         
         if existing:
             return jsonify({
                 'success': False,
                 'unique': False,
+                'location': existing,
                 'message': f"Serial number '{serial_number}' already exists"
+                           f" ({existing['source_type']} {existing.get('document_number') or ''})".rstrip()
             })
         else:
             return jsonify({
@@ -1204,6 +1150,28 @@ def validate_serial_unique(serial_number):
         logging.error(f"Error validating serial number: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@grpo_bp.route('/validate-serials', methods=['POST'])
+@login_required
+def validate_serials_bulk():
+    """Check many serial numbers at once - returns the ones already in stock"""
+    data = request.get_json() or {}
+    serial_numbers = data.get('serial_numbers') or []
+    if not isinstance(serial_numbers, list):
+        return jsonify({'success': False, 'error': 'serial_numbers must be a list'}), 400
+    
+    try:
+        existing = {serial: entry for serial, entry in lookup_serials(serial_numbers).items() if in_stock(entry)}
+        for serial in _received_through_grpo(serial_numbers):
+            existing.setdefault(serial, {'source_type': 'grpo', 'document_number': None})
+        return jsonify({
+            'success': True,
+            'duplicates': existing,
+            'unique_count': len({str(s).strip() for s in serial_numbers if s}) - len(existing)
+        })
+    except Exception as e:
+        logging.error(f"Error validating serial numbers: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @grpo_bp.route('/api/generate-barcode-labels', methods=['POST'])
 @login_required
 def generate_barcode_labels_api():
@@ -1262,30 +1230,17 @@ def generate_barcode_labels_api():
             num_packs = first_serial.no_of_packs if first_serial.no_of_packs else total_serials
             qty_per_pack = first_serial.qty_per_pack if first_serial.qty_per_pack else 1
             
-            # Validate that serials can be evenly distributed across packs
-            if num_packs > 0 and total_serials % num_packs != 0:
+            # Serials must split evenly across packs
+            try:
+                serial_packs = chunk_serials(serial_numbers, num_packs)
+            except ValueError as e:
                 return jsonify({
                     'success': False,
-                    'error': f'Data inconsistency: {total_serials} serials cannot be evenly divided into {num_packs} packs. Each pack must contain the same number of serials.'
+                    'error': f'Data inconsistency: {str(e)}. Each pack must contain the same number of serials.'
                 }), 400
             
-            # Calculate serials per pack
-            serials_per_pack = total_serials // num_packs if num_packs > 0 else total_serials
-            
             # Generate one label per pack (not per serial)
-            for pack_idx in range(1, num_packs + 1):
-                # Get the serials for this pack
-                pack_start = (pack_idx - 1) * serials_per_pack
-                pack_end = pack_start + serials_per_pack
-                pack_serials = serial_numbers[pack_start:pack_end]
-                
-                # Safety check: ensure we have serials for this pack
-                if not pack_serials:
-                    return jsonify({
-                        'success': False,
-                        'error': f'Data inconsistency: Pack {pack_idx} has no serial numbers. Expected {serials_per_pack} serials per pack.'
-                    }), 400
-                
+            for pack_idx, pack_serials in enumerate(serial_packs, start=1):
                 # Use the first serial in the pack for reference data
                 ref_serial = pack_serials[0]
                 serial_grn = ref_serial.grn_number or doc_number
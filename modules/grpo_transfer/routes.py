@@ -10,8 +10,12 @@ import logging
 import json
 
 from app import db
-from models import User
+from models import User, SAPPostingOutbox
 from sap_integration import SAPIntegration
+from sap_posting_outbox import (enqueue_posting, enqueue_batch_posting, dispatch_entry, refresh_pending_posting,
+                                register_result_handler)
+from streaming_export import register_export
+from label_plan import LabelPlan
 from .models import (
     GRPOTransferSession, GRPOTransferItem, GRPOTransferBatch,
     GRPOTransferSplit, GRPOTransferLog, GRPOTransferQRLabel
@@ -621,6 +625,34 @@ def get_sessions():
             'error': str(e)
         }), 500
 
+
+def _grpo_session_export_query(user):
+    """Sessions with their line count computed in SQL"""
+    item_count = db.session.query(db.func.count(GRPOTransferItem.id)).filter(
+        GRPOTransferItem.session_id == GRPOTransferSession.id
+    ).correlate(GRPOTransferSession).scalar_subquery()
+    return db.session.query(
+        GRPOTransferSession.session_code.label('session_code'),
+        GRPOTransferSession.grpo_doc_num.label('grpo_doc_num'),
+        GRPOTransferSession.vendor_code.label('vendor_code'),
+        GRPOTransferSession.vendor_name.label('vendor_name'),
+        GRPOTransferSession.doc_date.label('doc_date'),
+        GRPOTransferSession.doc_total.label('doc_total'),
+        GRPOTransferSession.status.label('status'),
+        item_count.label('item_count'),
+        GRPOTransferSession.transfer_doc_num.label('transfer_doc_num'),
+        GRPOTransferSession.rejected_doc_num.label('rejected_doc_num'),
+        GRPOTransferSession.created_at.label('created_at')
+    ).order_by(GRPOTransferSession.created_at.desc())
+
+
+register_export('grpo_transfer_sessions', _grpo_session_export_query, [
+    ('Session', 'session_code'), ('GRPO Number', 'grpo_doc_num'), ('Vendor Code', 'vendor_code'),
+    ('Vendor Name', 'vendor_name'), ('GRPO Date', 'doc_date'), ('GRPO Total', 'doc_total'),
+    ('Status', 'status'), ('Items', 'item_count'), ('Transfer Doc', 'transfer_doc_num'),
+    ('Rejected Transfer Doc', 'rejected_doc_num'), ('Created At', 'created_at')
+], date_column=GRPOTransferSession.created_at, permission='grpo')
+
 # ============================================================================
 # STEP 1: Get Series List
 # ============================================================================
@@ -2149,142 +2181,47 @@ def generate_qr_labels_with_packs(session_id):
         old_labels = GRPOTransferQRLabel.query.filter_by(session_id=session_id).all()
         for old_label in old_labels:
             db.session.delete(old_label)
-        db.session.commit()
+        db.session.flush()
         logger.info(f"Deleted {len(old_labels)} old labels for session {session_id}")
         
-        labels = []
-        label_count = 0
-        
+        # One label per pack; packs that get no units are left out
+        plan = LabelPlan()
         for item in approved_items:
-            item_id = item.id
-            approved_qty = int(item.approved_quantity)
-            rejected_qty = int(item.rejected_quantity) if item.rejected_quantity else 0
-            pack_count = int(pack_config.get(str(item_id), 1))
-            
-            if approved_qty <= 0 or pack_count <= 0:
+            pack_count = int(pack_config.get(str(item.id), 1))
+            if pack_count <= 0:
                 continue
             
-            # Calculate distribution
-            base_qty = approved_qty // pack_count
-            remainder = approved_qty % pack_count
-            
-            logger.info(f"Item {item.item_code}: approved_qty={approved_qty}, rejected_qty={rejected_qty}, pack_count={pack_count}, base_qty={base_qty}, remainder={remainder}")
+            label_id = lambda pack, item=item: f"{item.id}{item.line_num}{pack['pack_number']}{pack['total_packs']}"
             
             # Handle batch items - generate labels per batch
             if item.is_batch_item and item.batches:
                 # For batch items, generate one label per batch per pack
                 for batch in item.batches:
-                    batch_approved_qty = int(batch.approved_quantity)
-                    if batch_approved_qty <= 0:
-                        continue
-                    
-                    # Calculate packs for this batch
-                    batch_base_qty = batch_approved_qty // pack_count
-                    batch_remainder = batch_approved_qty % pack_count
-                    
-                    for pack_num in range(1, pack_count + 1):
-                        # First pack gets the remainder
-                        if pack_num == 1 and batch_remainder > 0:
-                            pack_qty = batch_base_qty + batch_remainder
-                        else:
-                            pack_qty = batch_base_qty
-                        
-                        if pack_qty <= 0:
-                            continue
-                        
-                        logger.info(f"Creating batch label: item={item.item_code}, batch={batch.batch_number}, pack_num={pack_num}, pack_qty={pack_qty}")
-                        
-                        qr_data = {
-                            #'session_code': session.session_code,
-                            #'grpo_doc_num': session.grpo_doc_num,
-                            #'grpo_doc_entry': session.grpo_doc_entry,
-                            'item': item.item_code,
-                            #'item_name': item.item_name,
-                            'batch': batch.batch_number,
-                            'id' : f"{item.id}{item.line_num}{pack_num}{pack_count}",
-                            #'approved_quantity': pack_qty,
-                            #'rejected_quantity': 0,
-                            'qty': pack_qty,
-                            'pack': f'{pack_num} of {pack_count}',
-                            # 'from_warehouse': item.from_warehouse,
-                            # 'from_bin_code': item.from_bin_code,
-                            # 'to_warehouse': item.to_warehouse,
-                            'bin': item.to_bin_code,
-                            # 'batch_info': {
-                            #     'batch_number': batch.batch_number,
-                            #     'item_code': item.item_code,
-                            #     'item_name': item.item_name,
-                            #     'batch_quantity': batch.batch_quantity,
-                            #     'approved_quantity': batch.approved_quantity,
-                            #     'rejected_quantity': batch.rejected_quantity,
-                            #     #'expiry_date': batch.expiry_date.isoformat() if batch.expiry_date else None,
-                            #    # 'manufacture_date': batch.manufacture_date.isoformat() if batch.manufacture_date else None
-                            # },
-                            #'timestamp': datetime.now().isoformat()
-                        }
-                        
-                        label = GRPOTransferQRLabel(
-                            session_id=session_id,
-                            item_id=item.id,
-                            label_number=pack_num,
-                            total_labels=pack_count,
-                            qr_data=json.dumps(qr_data),
-                            batch_number=batch.batch_number,
-                            quantity=pack_qty,
-                            from_warehouse=item.from_warehouse,
-                            to_warehouse=item.to_warehouse
-                        )
-                        db.session.add(label)
-                        labels.append(qr_data)
-                        label_count += 1
+                    plan.add_line(batch.approved_quantity, pack_count, label_id,
+                                  {'item': item.item_code, 'batch': batch.batch_number, 'id': None,
+                                   'qty': None, 'pack': None, 'bin': item.to_bin_code},
+                                  skip_empty=True, item=item, batch_number=batch.batch_number)
             else:
-                # For non-batch items, generate labels per pack
-                for pack_num in range(1, pack_count + 1):
-                    # First pack gets the remainder
-                    if pack_num == 1 and remainder > 0:
-                        pack_qty = base_qty + remainder
-                    else:
-                        pack_qty = base_qty
-                    
-                    if pack_qty <= 0:
-                        continue
-                    
-                    logger.info(f"Creating non-batch label: item={item.item_code}, pack_num={pack_num}, pack_qty={pack_qty}")
-                    
-                    qr_data = {
-                        # 'session_code': session.session_code,
-                        # 'grpo_doc_num': session.grpo_doc_num,
-                        # 'grpo_doc_entry': session.grpo_doc_entry,
-                        'item': item.item_code,
-                        #'item_name': item.item_name,
-                        'batch': None,
-                        # 'approved_quantity': pack_qty,
-                        # 'rejected_quantity': 0,
-                        'id': f"{item.id}{item.line_num}{pack_num}{pack_count}",
-                        'qty': pack_qty,
-                        'pack': f'{pack_num} of {pack_count}',
-                        # 'from_warehouse': item.from_warehouse,
-                        # 'from_bin_code': item.from_bin_code,
-                        # 'to_warehouse': item.to_warehouse,
-                        'bin': item.to_bin_code,
-                        #'batch_info': None,
-                        #'timestamp': datetime.now().isoformat()
-                    }
-                    
-                    label = GRPOTransferQRLabel(
-                        session_id=session_id,
-                        item_id=item.id,
-                        label_number=pack_num,
-                        total_labels=pack_count,
-                        qr_data=json.dumps(qr_data),
-                        batch_number=None,
-                        quantity=pack_qty,
-                        from_warehouse=item.from_warehouse,
-                        to_warehouse=item.to_warehouse
-                    )
-                    db.session.add(label)
-                    labels.append(qr_data)
-                    label_count += 1
+                plan.add_line(item.approved_quantity, pack_count, label_id,
+                              {'item': item.item_code, 'batch': None, 'id': None,
+                               'qty': None, 'pack': None, 'bin': item.to_bin_code},
+                              skip_empty=True, item=item, batch_number=None)
+            
+            logger.info(f"Item {item.item_code}: approved_qty={item.approved_quantity}, pack_count={pack_count}")
+        
+        plan.save(lambda pack: GRPOTransferQRLabel(
+            session_id=session_id,
+            item_id=pack['item'].id,
+            label_number=pack['pack_number'],
+            total_labels=pack['total_packs'],
+            qr_data=pack['qr_text'],
+            batch_number=pack['batch_number'],
+            quantity=pack['quantity'],
+            from_warehouse=pack['item'].from_warehouse,
+            to_warehouse=pack['item'].to_warehouse
+        ))
+        labels = [pack['qr_data'] for pack in plan.packs]
+        label_count = len(labels)
         
         if label_count == 0:
             return jsonify({
@@ -2314,6 +2251,75 @@ def generate_qr_labels_with_packs(session_id):
 # STEP 12: Post Stock Transfer to SAP B1
 # ============================================================================
 
+# Outbox document type per transfer; the result handler mirrors the SAP outcome
+# onto the session whether the posting finished inline or in the dispatcher
+TRANSFER_DOCUMENT_TYPES = {'approved': 'grpo_transfer_approved', 'rejected': 'grpo_transfer_rejected'}
+# Approved and rejected transfers posted together in one $batch changeset
+COMBINED_TRANSFER_DOCUMENT_TYPE = 'grpo_transfer'
+
+
+def _open_transfer_entry(session, document_type):
+    """Outbox entry of the session that is already queued or posted, if any"""
+    return SAPPostingOutbox.query.filter(
+        SAPPostingOutbox.document_type == document_type,
+        SAPPostingOutbox.source_id == session.id,
+        SAPPostingOutbox.status.in_(['pending', 'processing', 'posted'])
+    ).first()
+
+
+def _queue_transfer(session, transfer_type, payload):
+    """Queue a stock transfer of the session, reusing an entry that is already queued (refreshed) or posted"""
+    document_type = TRANSFER_DOCUMENT_TYPES[transfer_type]
+    entry = _open_transfer_entry(session, document_type)
+    if entry is None:
+        entry = enqueue_posting(document_type, session.id, 'StockTransfers', payload,
+                                key_prefix='GTA' if transfer_type == 'approved' else 'GTR')
+    else:
+        refresh_pending_posting(entry, payload=payload)
+    return entry
+
+
+def _queue_transfers(session, transfers):
+    """Queue the session's transfers ([(transfer_type, payload)]) to be posted all-or-nothing"""
+    entry = _open_transfer_entry(session, COMBINED_TRANSFER_DOCUMENT_TYPE)
+    documents = [(transfer_type, 'StockTransfers', payload) for transfer_type, payload in transfers]
+    if entry is None:
+        entry = enqueue_batch_posting(COMBINED_TRANSFER_DOCUMENT_TYPE, session.id, documents, key_prefix='GTB')
+    else:
+        refresh_pending_posting(entry, documents=documents)
+    return entry
+
+
+def _record_transfer(session, transfer_type, doc_entry, doc_num):
+    if transfer_type == 'approved':
+        session.transfer_doc_entry = doc_entry
+        session.transfer_doc_num = doc_num
+        session.status = 'posted'
+    else:
+        session.rejected_doc_entry = doc_entry
+        session.rejected_doc_num = doc_num
+        session.rejected_doc_status = 'posted'
+
+
+def _apply_transfer_posting_result(entry):
+    """Outbox result handler: record posted stock transfers on their GRPO transfer session"""
+    session = GRPOTransferSession.query.get(entry.source_id)
+    if not session:
+        return
+
+    if entry.document_type == COMBINED_TRANSFER_DOCUMENT_TYPE:
+        for transfer_type, document in entry.documents.items():
+            if document:
+                _record_transfer(session, transfer_type, document.get('DocEntry'), document.get('DocNum'))
+    elif entry.status == 'posted':
+        transfer_type = 'approved' if entry.document_type == TRANSFER_DOCUMENT_TYPES['approved'] else 'rejected'
+        _record_transfer(session, transfer_type, entry.sap_doc_entry, entry.sap_doc_num)
+
+
+for _document_type in (*TRANSFER_DOCUMENT_TYPES.values(), COMBINED_TRANSFER_DOCUMENT_TYPE):
+    register_result_handler(_document_type, _apply_transfer_posting_result)
+
+
 @grpo_transfer_bp.route('/api/session/<int:session_id>/post-transfer', methods=['POST'])
 @login_required
 def post_transfer_to_sap(session_id):
@@ -2449,34 +2455,6 @@ def post_transfer_to_sap(session_id):
                 approved_transfer['StockTransferLines'].append(line)
                 line_num += 1
         
-        # Post approved transfer if there are items
-        if approved_transfer['StockTransferLines']:
-            url = f"{sap.base_url}/b1s/v1/StockTransfers"
-            logger.debug(f"Posting approved stock transfer to: {url}")
-            logger.debug(f"Approved transfer payload: {json.dumps(approved_transfer, indent=2)}")
-            
-            response = sap.session.post(url, json=approved_transfer, timeout=30)
-            
-            if response.status_code in [200, 201]:
-                data = response.json()
-                session.transfer_doc_entry = data.get('DocEntry')
-                session.transfer_doc_num = data.get('DocNum')
-                session.status = 'posted'
-                transfers_posted.append({
-                    'type': 'approved',
-                    'doc_entry': data.get('DocEntry'),
-                    'doc_num': data.get('DocNum')
-                })
-                
-                logger.info(f"✅ Approved stock transfer posted to SAP B1 - DocEntry: {data.get('DocEntry')}, DocNum: {data.get('DocNum')}")
-            else:
-                logger.error(f"SAP B1 API error: {response.status_code} - {response.text}")
-                session.status = response
-                return jsonify({
-                    'success': False,
-                    'error': f'Failed to post approved transfer: {response.status_code}'
-                }), 500
-        
         # ============================================================================
         # TRANSFER 2: REJECTED QUANTITIES (if any)
         # ============================================================================
@@ -2584,37 +2562,49 @@ def post_transfer_to_sap(session_id):
                 rejected_transfer['StockTransferLines'].append(line)
                 line_num += 1
         
-        # Post rejected transfer if there are items
+        # Queue approved and rejected transfers as one outbox entry, posted in a single
+        # $batch changeset so SAP creates both documents in one transaction (or neither)
+        pending_transfers = []
+        if approved_transfer['StockTransferLines']:
+            pending_transfers.append(('approved', approved_transfer))
         if rejected_transfer['StockTransferLines']:
-            url = f"{sap.base_url}/b1s/v1/StockTransfers"
-            logger.debug(f"Posting rejected stock transfer to: {url}")
-            logger.debug(f"Rejected transfer payload: {json.dumps(rejected_transfer, indent=2)}")
-            
-            response = sap.session.post(url, json=rejected_transfer, timeout=30)
-            
-            if response.status_code in [200, 201]:
-                data = response.json()
-                session.rejected_doc_entry = data.get('DocEntry')
-                session.rejected_doc_num = data.get('DocNum')
-                session.rejected_doc_status = 'posted'
-                transfers_posted.append({
-                    'type': 'rejected',
-                    'doc_entry': data.get('DocEntry'),
-                    'doc_num': data.get('DocNum')
-                })
-                
-                logger.info(f"✅ Rejected stock transfer posted to SAP B1 - DocEntry: {data.get('DocEntry')}, DocNum: {data.get('DocNum')}")
-            else:
-                logger.error(f"SAP B1 API error: {response.status_code} - {response.text}")
-                session.rejected_doc_status = response
+            pending_transfers.append(('rejected', rejected_transfer))
+
+        if pending_transfers:
+            for transfer_type, payload in pending_transfers:
+                logger.debug(f"{transfer_type.capitalize()} transfer payload: {json.dumps(payload, indent=2)}")
+            entry = _queue_transfers(session, pending_transfers)
+            db.session.commit()
+            status = dispatch_entry(entry, sap)
+
+            # The result handler recorded whatever SAP created on the session
+            posted_documents = {
+                'approved': (session.transfer_doc_entry, session.transfer_doc_num),
+                'rejected': (session.rejected_doc_entry, session.rejected_doc_num)
+            }
+            for transfer_type, _ in pending_transfers:
+                doc_entry, doc_num = posted_documents[transfer_type]
+                if doc_entry:
+                    transfers_posted.append({'type': transfer_type, 'doc_entry': doc_entry, 'doc_num': doc_num})
+                    logger.info(f"✅ {transfer_type.capitalize()} stock transfer posted to SAP B1 - DocEntry: {doc_entry}, DocNum: {doc_num}")
+
+            if status in ('pending', 'processing'):
+                logger.warning(f"⚠️ Transfers of {session.session_code} queued for automatic retry: {entry.last_error}")
+                return jsonify({
+                    'success': True,
+                    'queued': True,
+                    'transfers_posted': transfers_posted,
+                    'message': 'SAP B1 is not responding; the transfers have been queued and will be posted automatically without duplicates.'
+                }), 202
+            if status != 'posted':
+                error_msg = entry.last_error or 'Unknown error'
+                logger.error(f"SAP B1 API error: {error_msg}")
                 return jsonify({
                     'success': False,
-                    'error': f'Failed to post rejected transfer: {response.status_code}'
+                    'error': f'Failed to post transfer: {error_msg}',
+                    'transfers_posted': transfers_posted
                 }), 500
         
-        # Update session status
-        db.session.commit()
-        
         # Log activity
         log = GRPOTransferLog(
             session_id=session_id,
@@ -2780,44 +2770,44 @@ def post_approved_transfer_to_sap(session_id):
                 'error': 'No approved items to transfer'
             }), 400
         
-        # Post to SAP B1
-        url = f"{sap.base_url}/b1s/v1/StockTransfers"
-        logger.debug(f"Posting approved stock transfer to: {url}")
+        # Queue, then post with an idempotency reference (see sap_posting_outbox)
         logger.debug(f"Approved transfer payload: {json.dumps(approved_transfer, indent=2)}")
+        entry = _queue_transfer(session, 'approved', approved_transfer)
+        db.session.commit()
+        status = dispatch_entry(entry, sap)
         
-        response = sap.session.post(url, json=approved_transfer, timeout=30)
-        
-        if response.status_code in [200, 201]:
-            data = response.json()
-            session.transfer_doc_entry = data.get('DocEntry')
-            session.transfer_doc_num = data.get('DocNum')
-            session.status = 'posted'
-            db.session.commit()
-            
+        if status == 'posted':
             # Log activity
             log = GRPOTransferLog(
                 session_id=session_id,
                 user_id=current_user.id,
                 action='transferred_approved',
-                description=f'Posted approved transfer to SAP B1 - DocEntry: {data.get("DocEntry")}, DocNum: {data.get("DocNum")}',
-                sap_response=json.dumps(data)
+                description=f'Posted approved transfer to SAP B1 - DocEntry: {entry.sap_doc_entry}, DocNum: {entry.sap_doc_num}',
+                sap_response=json.dumps({'DocEntry': entry.sap_doc_entry, 'DocNum': entry.sap_doc_num})
             )
             db.session.add(log)
             db.session.commit()
             
-            logger.info(f"✅ Approved stock transfer posted - DocEntry: {data.get('DocEntry')}, DocNum: {data.get('DocNum')}")
+            logger.info(f"✅ Approved stock transfer posted - DocEntry: {entry.sap_doc_entry}, DocNum: {entry.sap_doc_num}")
             
             return jsonify({
                 'success': True,
-                'sap_doc_entry': data.get('DocEntry'),
-                'sap_doc_num': data.get('DocNum'),
+                'sap_doc_entry': entry.sap_doc_entry,
+                'sap_doc_num': entry.sap_doc_num,
                 'message': 'Approved transfer posted successfully'
             })
+        elif status in ('pending', 'processing'):
+            logger.warning(f"⚠️ Approved transfer of {session.session_code} queued for automatic retry: {entry.last_error}")
+            return jsonify({
+                'success': True,
+                'queued': True,
+                'message': 'SAP B1 is not responding; the approved transfer has been queued and will be posted automatically without duplicates.'
+            }), 202
         else:
-            logger.error(f"SAP B1 API error: {response.status_code} - {response.text}")
+            logger.error(f"SAP B1 API error: {entry.last_error}")
             return jsonify({
                 'success': False,
-                'error': f'Failed to post approved transfer: {response.status_code}'
+                'error': f'Failed to post approved transfer: {entry.last_error}'
             }), 500
         
     except Exception as e:
@@ -2967,41 +2957,44 @@ def post_rejected_transfer_to_sap(session_id):
                 'error': 'No rejected items to transfer'
             }), 400
         
-        # Post to SAP B1
-        url = f"{sap.base_url}/b1s/v1/StockTransfers"
-        logger.debug(f"Posting rejected stock transfer to: {url}")
+        # Queue, then post with an idempotency reference (see sap_posting_outbox)
         logger.debug(f"Rejected transfer payload: {json.dumps(rejected_transfer, indent=2)}")
+        entry = _queue_transfer(session, 'rejected', rejected_transfer)
+        db.session.commit()
+        status = dispatch_entry(entry, sap)
         
-        response = sap.session.post(url, json=rejected_transfer, timeout=30)
-        
-        if response.status_code in [200, 201]:
-            data = response.json()
-            db.session.commit()
-            
+        if status == 'posted':
             # Log activity
             log = GRPOTransferLog(
                 session_id=session_id,
                 user_id=current_user.id,
                 action='transferred_rejected',
-                description=f'Posted rejected transfer to SAP B1 - DocEntry: {data.get("DocEntry")}, DocNum: {data.get("DocNum")}',
-                sap_response=json.dumps(data)
+                description=f'Posted rejected transfer to SAP B1 - DocEntry: {entry.sap_doc_entry}, DocNum: {entry.sap_doc_num}',
+                sap_response=json.dumps({'DocEntry': entry.sap_doc_entry, 'DocNum': entry.sap_doc_num})
             )
             db.session.add(log)
             db.session.commit()
             
-            logger.info(f"✅ Rejected stock transfer posted - DocEntry: {data.get('DocEntry')}, DocNum: {data.get('DocNum')}")
+            logger.info(f"✅ Rejected stock transfer posted - DocEntry: {entry.sap_doc_entry}, DocNum: {entry.sap_doc_num}")
             
             return jsonify({
                 'success': True,
-                'sap_doc_entry': data.get('DocEntry'),
-                'sap_doc_num': data.get('DocNum'),
+                'sap_doc_entry': entry.sap_doc_entry,
+                'sap_doc_num': entry.sap_doc_num,
                 'message': 'Rejected transfer posted successfully'
             })
+        elif status in ('pending', 'processing'):
+            logger.warning(f"⚠️ Rejected transfer of {session.session_code} queued for automatic retry: {entry.last_error}")
+            return jsonify({
+                'success': True,
+                'queued': True,
+                'message': 'SAP B1 is not responding; the rejected transfer has been queued and will be posted automatically without duplicates.'
+            }), 202
         else:
-            logger.error(f"SAP B1 API error: {response.status_code} - {response.text}")
+            logger.error(f"SAP B1 API error: {entry.last_error}")
             return jsonify({
                 'success': False,
-                'error': f'Failed to post rejected transfer: {response.status_code}'
+                'error': f'Failed to post rejected transfer: {entry.last_error}'
             }), 500
         
     except Exception as e:
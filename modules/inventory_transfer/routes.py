@@ -6,16 +6,15 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash,
 from flask_login import login_required, current_user
 from app import db
 from models import InventoryTransfer, InventoryTransferItem, InventoryTransferRequestLine, User, SerialNumberTransfer, SerialNumberTransferItem, SerialNumberTransferSerial, TransferScanState
-from sqlalchemy import or_
 import logging
-import random
 import re
-import string
 import json
 from datetime import datetime
 from pathlib import Path
 
 from sap_integration import SAPIntegration
+from search_index import SearchSpec, apply_search
+from document_numbers import next_document_value
 
 # Use absolute path for template_folder to support PyInstaller .exe builds
 transfer_bp = Blueprint('inventory_transfer', __name__, 
@@ -24,16 +23,15 @@ transfer_bp = Blueprint('inventory_transfer', __name__,
 logger = logging.getLogger(__name__)
 def generate_transfer_number():
     """Generate unique transfer number for serial transfers"""
-    while True:
-        # Generate format: ST-YYYYMMDD-XXXX (e.g., ST-20250822-A1B2)
-        date_part = datetime.now().strftime('%Y%m%d')
-        random_part = ''.join(random.choices(string.ascii_uppercase + string.digits, k=4))
-        transfer_number = f'ST-{date_part}-{random_part}'
-        
-        # Check if it already exists
-        existing = SerialNumberTransfer.query.filter_by(transfer_number=transfer_number).first()
-        if not existing:
-            return transfer_number
+    # Format: ST-YYYYMMDD-NNNN (e.g., ST-20250822-0042), sequence from the SERIAL_TRANSFER series
+    date_part = datetime.now().strftime('%Y%m%d')
+    return f'ST-{date_part}-{next_document_value("SERIAL_TRANSFER"):04d}'
+
+TRANSFER_SEARCH = SearchSpec(
+    columns=[InventoryTransfer.transfer_request_number, InventoryTransfer.sap_document_number,
+             InventoryTransfer.status],
+    prefix_columns=[InventoryTransfer.transfer_request_number, InventoryTransfer.sap_document_number]
+)
 
 @transfer_bp.route('/')
 @login_required
@@ -56,14 +54,7 @@ def index():
     query = InventoryTransfer.query.filter_by(user_id=current_user.id)
     
     # Apply search filter if provided
-    if search_term:
-        query = query.filter(
-            or_(
-                InventoryTransfer.transfer_request_number.ilike(f'%{search_term}%'),
-                InventoryTransfer.sap_document_number.ilike(f'%{search_term}%'),
-                InventoryTransfer.status.ilike(f'%{search_term}%')
-            )
-        )
+    query = apply_search(query, search_term, TRANSFER_SEARCH)
     
     # Apply date filters if provided
     if from_date_str:
@@ -987,6 +978,12 @@ def log_status_change(transfer_id, previous_status, new_status, changed_by_id, n
 # Serial Number Transfer Routes
 # ==========================
 
+SERIAL_TRANSFER_SEARCH = SearchSpec(
+    columns=[SerialNumberTransfer.transfer_number, SerialNumberTransfer.from_warehouse,
+             SerialNumberTransfer.to_warehouse, SerialNumberTransfer.status],
+    prefix_columns=[SerialNumberTransfer.transfer_number]
+)
+
 @transfer_bp.route('/serial')
 @login_required
 def serial_index():
@@ -1014,16 +1011,7 @@ def serial_index():
         query = query.filter_by(user_id=current_user.id)
     
     # Apply search filter if provided
-    if search:
-        search_filter = f"%{search}%"
-        query = query.filter(
-            or_(
-                SerialNumberTransfer.transfer_number.ilike(search_filter),
-                SerialNumberTransfer.from_warehouse.ilike(search_filter),
-                SerialNumberTransfer.to_warehouse.ilike(search_filter),
-                SerialNumberTransfer.status.ilike(search_filter)
-            )
-        )
+    query = apply_search(query, search, SERIAL_TRANSFER_SEARCH)
     
     # Order and paginate
     query = query.order_by(SerialNumberTransfer.created_at.desc())
@@ -9,6 +9,7 @@ from datetime import datetime
 from pathlib import Path
 
 from sap_integration import SAPIntegration
+from serial_registry import lookup_serials
 
 item_tracking_bp = Blueprint('item_tracking', __name__, 
                              template_folder=str(Path(__file__).resolve().parent / 'templates'),
@@ -46,6 +47,9 @@ SAP_DOC_TYPES = {
     1250000001: "Inventory Opening Balance",
 }
 
+# Serial numbers per /api/wms-lookup request
+MAX_WMS_LOOKUP = 20000
+
 
 def get_doc_type_name(doc_type):
     """Convert SAP DocType number to human-readable document name"""
@@ -158,7 +162,8 @@ def api_search():
             'success': True,
             'serial_number': serial_number,
             'items': items,
-            'total_records': len(items)
+            'total_records': len(items),
+            'wms': lookup_serials([serial_number]).get(serial_number)
         })
         
     except Exception as e:
@@ -166,6 +171,33 @@ def api_search():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+
+@item_tracking_bp.route('/api/wms-lookup', methods=['POST'])
+@login_required
+def api_wms_lookup():
+    """Where are these serials in the WMS right now - bulk lookup on the serial registry (no SAP call)"""
+    if not current_user.has_permission('item_tracking'):
+        return jsonify({'success': False, 'error': 'Access denied'}), 403
+
+    data = request.get_json() or {}
+    serial_numbers = data.get('serial_numbers') or []
+    if not isinstance(serial_numbers, list) or not serial_numbers:
+        return jsonify({'success': False, 'error': 'serial_numbers list is required'}), 400
+    if len(serial_numbers) > MAX_WMS_LOOKUP:
+        return jsonify({'success': False, 'error': f'At most {MAX_WMS_LOOKUP} serial numbers per request'}), 400
+
+    try:
+        found = lookup_serials(serial_numbers)
+        requested = {str(serial).strip() for serial in serial_numbers if serial and str(serial).strip()}
+        return jsonify({
+            'success': True,
+            'found': found,
+            'missing': sorted(requested - set(found))
+        })
+    except Exception as e:
+        logging.error(f"API Error in WMS serial lookup: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 def fetch_item_tracking(sap, serial_number):
     """
     Fetch item tracking data from SAP B1 using SQL Query
@@ -148,7 +148,7 @@ class MultiGRNSerialDetails(db.Model):
     
     id = db.Column(db.Integer, primary_key=True)
     line_selection_id = db.Column(db.Integer, db.ForeignKey('multi_grn_line_selections.id'), nullable=False)
-    serial_number = db.Column(db.String(100), nullable=False)
+    serial_number = db.Column(db.String(100), nullable=False, index=True)
     manufacturer_serial_number = db.Column(db.String(100))
     internal_serial_number = db.Column(db.String(100))
     expiry_date = db.Column(db.Date)
@@ -212,4 +212,4 @@ class Gs1Scan(db.Model):
     sscc = db.Column(db.String(18))
     internal_product = db.Column(db.String(100))
     internal_company = db.Column(db.String(100))
-    created_on = db.Column(db.DateTime, default=datetime.utcnow)
\ No newline at end of file
+    created_on = db.Column(db.DateTime, default=datetime.utcnow, index=True)
\ No newline at end of file
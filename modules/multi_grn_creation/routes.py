@@ -11,10 +11,14 @@ import logging
 from datetime import datetime, date
 from pathlib import Path
 import json
-from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from decimal import Decimal, InvalidOperation
 
+from label_plan import LabelPlan, chunk_serials, round_quantity
 from modules.multi_grn_creation.gs1_decoder import decode_gs1
 from sap_integration import SAPIntegration
+from sap_posting_outbox import enqueue_posting, dispatch_entry, register_result_handler
+from search_index import apply_search
+from cold_archive import history_query
 
 # Use absolute path for template_folder to support PyInstaller .exe builds
 multi_grn_bp = Blueprint('multi_grn', __name__, 
@@ -22,41 +26,30 @@ multi_grn_bp = Blueprint('multi_grn', __name__,
                               url_prefix='/multi-grn')
 
 
-def distribute_quantity_to_packs(total_quantity, num_packs):
-    """
-    Distribute total quantity across packs as integers.
-    First packs get extra units if quantity doesn't divide evenly.
-    Uses ROUND_HALF_UP to preserve total quantity (no truncation).
-    
-    Example: 11 quantity ÷ 3 packs = [4, 4, 3]
-    Example: 10 quantity ÷ 3 packs = [4, 3, 3]
-    Example: 110.5 quantity ÷ 4 packs = [28, 28, 28, 27] (rounds to 111)
-    Example: 110.25 quantity ÷ 4 packs = [28, 28, 27, 27] (rounds to 110)
-    
-    Args:
-        total_quantity: Total quantity to distribute (will be rounded using ROUND_HALF_UP)
-        num_packs: Number of packs to distribute into
-        
-    Returns:
-        list: List of integer quantities for each pack
-    """
-    if num_packs <= 0:
-        return []
-    
-    # Use ROUND_HALF_UP to consistently round .5 up (not banker's rounding)
-    total_qty_decimal = Decimal(str(total_quantity))
-    total_qty_int = int(total_qty_decimal.to_integral_value(rounding=ROUND_HALF_UP))
-    base_qty = total_qty_int // num_packs
-    remainder = total_qty_int % num_packs
-    
-    quantities = []
-    for i in range(num_packs):
-        if i < remainder:
-            quantities.append(base_qty + 1)
-        else:
-            quantities.append(base_qty)
-    
-    return quantities
+def _pack_qr_fields(po_number, item_code, batch_number, grn_date, expiry_date, bin_location):
+    """QR payload of a Multi GRN pack label; id, qty and pack are filled in by the label plan"""
+    return {
+        'id': None,
+        'po': str(po_number),
+        'item': item_code,
+        'batch': batch_number,
+        'qty': None,
+        'pack': None,
+        'grn_date': grn_date,
+        'exp_date': expiry_date.strftime('%Y-%m-%d') if expiry_date else 'N/A',
+        'bin': bin_location or 'N/A'
+    }
+
+
+def _pack_label(pack):
+    """MultiGRNBatchDetailsLabel row of a planned pack (QR image is rendered when first printed)"""
+    return MultiGRNBatchDetailsLabel(
+        batch_detail_id=pack['batch_detail_id'],
+        pack_number=pack['pack_number'],
+        qty_in_pack=pack['quantity'],
+        grn_number=pack['label_id'],
+        qr_data=pack['qr_text']
+    )
 
 @multi_grn_bp.route('/')
 @login_required
@@ -74,26 +67,19 @@ def index():
         to_date_str = request.args.get('to_date', '').strip()
         status_filter = request.args.get('status', '').strip()
         
-        query = MultiGRNBatch.query.filter_by(user_id=current_user.id)
+        # Hot and archived batches (cold_archive history view)
+        query, batches_table, search = history_query('multi_grn')
+        query = query.filter(batches_table.c.user_id == current_user.id)
         
-        if search_term:
-            search_pattern = f'%{search_term}%'
-            query = query.filter(
-                db.or_(
-                    MultiGRNBatch.batch_number.ilike(search_pattern),
-                    MultiGRNBatch.customer_name.ilike(search_pattern),
-                    MultiGRNBatch.customer_code.ilike(search_pattern),
-                    MultiGRNBatch.id.cast(db.String).ilike(search_pattern)
-                )
-            )
+        query = apply_search(query, search_term, search)
         
         if status_filter:
-            query = query.filter(MultiGRNBatch.status == status_filter)
+            query = query.filter(batches_table.c.status == status_filter)
         
         if from_date_str:
             try:
                 from_date = datetime.strptime(from_date_str, '%Y-%m-%d')
-                query = query.filter(MultiGRNBatch.created_at >= from_date)
+                query = query.filter(batches_table.c.created_at >= from_date)
             except ValueError:
                 logging.warning(f"Invalid from_date format: {from_date_str}")
         
@@ -101,11 +87,11 @@ def index():
             try:
                 to_date = datetime.strptime(to_date_str, '%Y-%m-%d')
                 to_date_end = to_date.replace(hour=23, minute=59, second=59)
-                query = query.filter(MultiGRNBatch.created_at <= to_date_end)
+                query = query.filter(batches_table.c.created_at <= to_date_end)
             except ValueError:
                 logging.warning(f"Invalid to_date format: {to_date_str}")
         
-        query = query.order_by(MultiGRNBatch.created_at.desc())
+        query = query.order_by(batches_table.c.created_at.desc())
         
         pagination = query.paginate(page=page, per_page=per_page, error_out=False)
         batches = pagination.items
@@ -1011,12 +997,6 @@ def approve_batch(batch_id):
         elif request.json:
             qc_notes = request.json.get('qc_notes', '')
         
-        batch.status = 'qc_approved'
-        batch.qc_approver_id = current_user.id
-        batch.qc_approved_at = datetime.utcnow()
-        batch.qc_notes = qc_notes
-        db.session.commit()
-        
         sap_service = SAPMultiGRNService()
         
         if not batch.po_links:
@@ -1165,44 +1145,37 @@ def approve_batch(batch_id):
         
         logging.info(f"📦 Consolidated GRN payload: {len(consolidated_document_lines)} lines from {len(batch.po_links)} POs")
         logging.debug(f"   GRN JSON: {json.dumps(grn_data, indent=2)}")
-        print(grn_data)
-        result = sap_service.create_purchase_delivery_note(grn_data)
-        
-        if result['success']:
-            grn_doc_num = result.get('doc_num')
-            grn_doc_entry = result.get('doc_entry')
-            
-            for po_link in batch.po_links:
-                po_link.status = 'posted'
-                po_link.sap_grn_doc_num = grn_doc_num
-                po_link.sap_grn_doc_entry = grn_doc_entry
-                po_link.posted_at = datetime.utcnow()
-            
-            batch.status = 'posted'
-            batch.total_grns_created = 1
-            batch.completed_at = datetime.utcnow()
-            batch.posted_at = datetime.utcnow()
-            db.session.commit()
-            
-            logging.info(f"✅ Batch {batch.batch_number} QC approved and posted: 1 consolidated GRN created (DocNum={grn_doc_num})")
+
+        # QC approval and the queued SAP posting commit together, so a crash or SAP
+        # timeout can never leave an approved batch without its posting (or vice versa)
+        batch.status = 'qc_approved'
+        batch.qc_approver_id = current_user.id
+        batch.qc_approved_at = datetime.utcnow()
+        batch.qc_notes = qc_notes
+        entry = enqueue_posting('multi_grn', batch.id, 'PurchaseDeliveryNotes', grn_data, key_prefix='MGRN')
+        db.session.commit()
+
+        status = dispatch_entry(entry, sap_service)
+
+        if status == 'posted':
+            logging.info(f"✅ Batch {batch.batch_number} QC approved and posted: 1 consolidated GRN created (DocNum={entry.sap_doc_num})")
             return jsonify({
                 'success': True,
-                'grn_doc_num': grn_doc_num,
-                'grn_doc_entry': grn_doc_entry,
+                'grn_doc_num': entry.sap_doc_num,
+                'grn_doc_entry': entry.sap_doc_entry,
                 'po_count': len(batch.po_links),
                 'line_count': len(consolidated_document_lines),
-                'message': f'Batch approved by QC and successfully posted to SAP B1. GRN #{grn_doc_num} created with {len(consolidated_document_lines)} lines from {len(batch.po_links)} purchase orders.'
+                'message': f'Batch approved by QC and successfully posted to SAP B1. GRN #{entry.sap_doc_num} created with {len(consolidated_document_lines)} lines from {len(batch.po_links)} purchase orders.'
             })
+        elif status in ('pending', 'processing'):
+            logging.warning(f"⚠️ GRN for batch {batch.batch_number} queued for automatic retry: {entry.last_error}")
+            return jsonify({
+                'success': True,
+                'queued': True,
+                'message': 'Batch approved by QC. SAP B1 is not responding; the GRN has been queued and will be posted automatically without duplicates.'
+            }), 202
         else:
-            error_msg = result.get('error', 'Unknown error')
-            for po_link in batch.po_links:
-                po_link.status = 'failed'
-                po_link.error_message = error_msg
-            
-            batch.status = 'failed'
-            batch.error_log = error_msg
-            db.session.commit()
-            
+            error_msg = entry.last_error or 'Unknown error'
             logging.error(f"❌ Failed to create consolidated GRN for batch {batch.batch_number}: {error_msg}")
             return jsonify({'success': False, 'error': error_msg}), 500
         
@@ -1211,6 +1184,32 @@ def approve_batch(batch_id):
         db.session.rollback()
         return jsonify({'success': False, 'error': str(e)}), 500
 
+def _apply_grn_posting_result(entry):
+    """Outbox result handler: mirror the SAP posting outcome onto the Multi GRN batch"""
+    batch = MultiGRNBatch.query.get(entry.source_id)
+    if not batch:
+        return
+
+    if entry.status == 'posted':
+        for po_link in batch.po_links:
+            po_link.status = 'posted'
+            po_link.sap_grn_doc_num = entry.sap_doc_num
+            po_link.sap_grn_doc_entry = entry.sap_doc_entry
+            po_link.posted_at = entry.posted_at
+        batch.status = 'posted'
+        batch.total_grns_created = 1
+        batch.completed_at = datetime.utcnow()
+        batch.posted_at = entry.posted_at
+    else:
+        for po_link in batch.po_links:
+            po_link.status = 'failed'
+            po_link.error_message = entry.last_error
+        batch.status = 'failed'
+        batch.error_log = entry.last_error
+
+
+register_result_handler('multi_grn', _apply_grn_posting_result)
+
 @multi_grn_bp.route('/batch/<int:batch_id>/reject', methods=['POST'])
 @login_required
 def reject_batch(batch_id):
@@ -2315,9 +2314,6 @@ def update_line_item():
         if number_of_bags and int(number_of_bags) > 0:
             from modules.multi_grn_creation.models import MultiGRNBatchDetails
             from datetime import datetime
-            import io
-            import base64
-            import qrcode
             
             # Clear existing batch details and labels for this line (cascade delete handles labels automatically)
             existing_batches = MultiGRNBatchDetails.query.filter_by(line_selection_id=line_selection_id).all()
@@ -2348,8 +2344,7 @@ def update_line_item():
 
             # Calculate quantity distribution across packs (INTEGER ONLY)
             if line_selection.selected_quantity:
-                total_qty_original = Decimal(str(line_selection.selected_quantity))
-                total_qty_int = int(total_qty_original.to_integral_value(rounding=ROUND_HALF_UP))
+                total_qty_int = round_quantity(line_selection.selected_quantity)
                 
                 # Create ONE batch_detail record with total quantity
                 batch_detail = MultiGRNBatchDetails(
@@ -2364,56 +2359,18 @@ def update_line_item():
                 db.session.add(batch_detail)
                 db.session.flush()
                 
-                # Distribute quantity across packs using helper function
-                pack_quantities = distribute_quantity_to_packs(total_qty_int, bags_count)
-                
                 # Get PO number and GRN date for QR code data
                 po_number = line_selection.po_link.po_doc_num if line_selection.po_link else 'N/A'
                 grn_date = datetime.now().strftime('%Y-%m-%d')
                 
-                # Create individual label records for each pack
-                for pack_num in range(1, bags_count + 1):
-                    pack_qty = pack_quantities[pack_num - 1]
-                    grn_number = f"MGN-{batch_id}-{line_selection_id}-1-{pack_num}"
-                    
-                    # Generate QR barcode for this pack with complete data
-                    qr_data = {
-                        'id': grn_number,
-                        'po': str(po_number),
-                        'item': line_selection.item_code,
-                        'batch': batch_number,
-                        'qty': pack_qty,
-                        'pack': f"{pack_num} of {bags_count}",
-                        'grn_date': grn_date,
-                        'exp_date': expiry_date_obj.strftime('%Y-%m-%d') if expiry_date_obj else 'N/A',
-                        'bin': line_selection.bin_location or 'N/A'
-                    }
-                    qr_text = json.dumps(qr_data)
-                    
-                    try:
-                        qr = qrcode.QRCode(version=1, error_correction=qrcode.constants.ERROR_CORRECT_L, box_size=10, border=4)
-                        qr.add_data(qr_text)
-                        qr.make(fit=True)
-                        img = qr.make_image(fill_color="black", back_color="white")
-                        buffer = io.BytesIO()
-                        img.save(buffer, format='PNG')
-                        buffer.seek(0)
-                        barcode = f"data:image/png;base64,{base64.b64encode(buffer.getvalue()).decode()}"
-                    except Exception as e:
-                        logging.error(f"Error generating QR code: {str(e)}")
-                        barcode = None
-                    
-                    # Create label record
-                    label = MultiGRNBatchDetailsLabel(
-                        batch_detail_id=batch_detail.id,
-                        pack_number=pack_num,
-                        qty_in_pack=pack_qty,
-                        grn_number=grn_number,
-                        barcode=barcode,
-                        qr_data=qr_text
-                    )
-                    db.session.add(label)
-                    logging.info(f"✅ Created pack label {pack_num}/{bags_count}: GRN={grn_number}, Qty={pack_qty}")
+                # One label record per pack, written together
+                plan = LabelPlan()
+                plan.add_line(total_qty_int, bags_count,
+                              lambda pack: f"MGN-{batch_id}-{line_selection_id}-1-{pack['pack_number']}",
+                              _pack_qr_fields(po_number, line_selection.item_code, batch_number, grn_date,
+                                              expiry_date_obj, line_selection.bin_location),
+                              batch_detail_id=batch_detail.id)
+                plan.save(_pack_label)
                 
                 logging.info(f"✅ Created 1 batch_detail + {bags_count} pack labels for line {line_selection_id}: Total Qty={total_qty_int}, Batch={batch_number}")
             else:
@@ -2636,9 +2593,6 @@ def add_manual_item():
 def manage_batch_details(line_id):
     """Get or add batch number details for a Multi GRN line selection"""
     from modules.multi_grn_creation.models import MultiGRNBatchDetails
-    import io
-    import base64
-    import qrcode
     
     line_selection = MultiGRNLineSelection.query.get_or_404(line_id)
     
@@ -2701,63 +2655,19 @@ def manage_batch_details(line_id):
             db.session.add(batch)
             db.session.flush()
             
-            # Distribute quantity across packs
-            pack_quantities = distribute_quantity_to_packs(quantity, no_of_packs)
-            
             # Get PO number and GRN date for QR code data
             po_number = line_selection.po_link.po_doc_num if line_selection.po_link else 'N/A'
             grn_date = datetime.now().strftime('%Y-%m-%d')
             
-            # Create individual label records for each pack
-            created_packs = []
-            for pack_num in range(1, no_of_packs + 1):
-                pack_qty = pack_quantities[pack_num - 1]
-                grn_number = f"MGN-{batch_id}-{line_id}-1-{pack_num}"
-                
-                # Generate QR barcode for this pack with complete data
-                qr_data = {
-                    'id': grn_number,
-                    'po': str(po_number),
-                    'item': line_selection.item_code,
-                    'batch': batch_num,
-                    'qty': pack_qty,
-                    'pack': f"{pack_num} of {no_of_packs}",
-                    'grn_date': grn_date,
-                    'exp_date': expiry_date_obj.strftime('%Y-%m-%d') if expiry_date_obj else 'N/A',
-                    'bin': line_selection.bin_location or 'N/A'
-                }
-                qr_text = json.dumps(qr_data)
-                
-                try:
-                    qr = qrcode.QRCode(version=1, error_correction=qrcode.constants.ERROR_CORRECT_L, box_size=10, border=4)
-                    qr.add_data(qr_text)
-                    qr.make(fit=True)
-                    img = qr.make_image(fill_color="black", back_color="white")
-                    buffer = io.BytesIO()
-                    img.save(buffer, format='PNG')
-                    buffer.seek(0)
-                    barcode = f"data:image/png;base64,{base64.b64encode(buffer.getvalue()).decode()}"
-                except Exception as e:
-                    logging.error(f"Error generating QR code: {str(e)}")
-                    barcode = None
-                
-                # Create label record
-                label = MultiGRNBatchDetailsLabel(
-                    batch_detail_id=batch.id,
-                    pack_number=pack_num,
-                    qty_in_pack=pack_qty,
-                    grn_number=grn_number,
-                    barcode=barcode,
-                    qr_data=qr_text
-                )
-                db.session.add(label)
-                
-                created_packs.append({
-                    'pack_num': pack_num,
-                    'grn_number': grn_number,
-                    'quantity': pack_qty
-                })
-                logging.info(f"✅ Created pack label {pack_num}/{no_of_packs}: GRN={grn_number}, Qty={pack_qty}")
+            # One label record per pack, written together
+            plan = LabelPlan()
+            plan.add_line(quantity, no_of_packs, lambda pack: f"MGN-{batch_id}-{line_id}-1-{pack['pack_number']}",
+                          _pack_qr_fields(po_number, line_selection.item_code, batch_num, grn_date,
+                                          expiry_date_obj, line_selection.bin_location),
+                          batch_detail_id=batch.id)
+            plan.save(_pack_label)
+            created_packs = [{'pack_num': pack['pack_number'], 'grn_number': pack['label_id'],
+                              'quantity': pack['quantity']} for pack in plan.packs]
             
             db.session.commit()
             
@@ -2972,25 +2882,15 @@ def generate_barcode_labels_multi_grn():
             num_packs = first_serial.no_of_packs if first_serial.no_of_packs else total_serials
             qty_per_pack = first_serial.qty_per_pack if first_serial.qty_per_pack else 1
             
-            if num_packs > 0 and total_serials % num_packs != 0:
+            try:
+                serial_packs = chunk_serials(serial_details, num_packs)
+            except ValueError as e:
                 return jsonify({
                     'success': False,
-                    'error': f'Data inconsistency: {total_serials} serials cannot be evenly divided into {num_packs} packs'
+                    'error': f'Data inconsistency: {str(e)}'
                 }), 400
             
-            serials_per_pack = total_serials // num_packs if num_packs > 0 else total_serials
-            
-            for pack_idx in range(1, num_packs + 1):
-                pack_start = (pack_idx - 1) * serials_per_pack
-                pack_end = pack_start + serials_per_pack
-                pack_serials = serial_details[pack_start:pack_end]
-                
-                if not pack_serials:
-                    return jsonify({
-                        'success': False,
-                        'error': f'Data inconsistency: Pack {pack_idx} has no serial numbers'
-                    }), 400
-                
+            for pack_idx, pack_serials in enumerate(serial_packs, start=1):
                 ref_serial = pack_serials[0]
                 serial_grn = ref_serial.grn_number or doc_number
                 
@@ -3156,27 +3056,24 @@ def generate_barcode_labels_multi_grn():
             num_packs = batch_detail.no_of_packs or 1
             batch_grn = batch_detail.grn_number or doc_number
             
-            # Calculate integer distribution across packs (first packs get remainder)
-            total_quantity = batch_detail.quantity
-            pack_quantities = distribute_quantity_to_packs(total_quantity, num_packs)
+            # Integer distribution across packs (first packs get the remainder)
+            plan = LabelPlan()
+            plan.add_line(batch_detail.quantity, num_packs, lambda pack: f"{batch_grn}-{pack['pack_number']}", {
+                'id': None,
+                'po': str(po_number),
+                'item': line_selection.item_code,
+                'batch': batch_detail.batch_number,
+                'qty': None,
+                'pack': None,
+                'grn_date': grn_date,
+                'exp_date': batch_detail.expiry_date or 'N/A',
+                'bin': line_selection.bin_location or 'N/A'
+            })
             
             # Generate multiple labels based on no_of_packs field
-            for pack_num in range(1, num_packs + 1):
-                pack_qty = pack_quantities[pack_num - 1]  # Get specific quantity for this pack
-                
-                qr_data = {
-                    'id': f"{batch_grn}-{pack_num}",
-                    'po': str(po_number),
-                    'item': line_selection.item_code,
-                    'batch': batch_detail.batch_number,
-                    'qty': pack_qty,
-                    'pack': f"{pack_num} of {num_packs}",
-                    'grn_date': grn_date,
-                    'exp_date': batch_detail.expiry_date or 'N/A',
-                    'bin': line_selection.bin_location or 'N/A'
-                }
-                
-                qr_text = json.dumps(qr_data)
+            for pack in plan.packs:
+                pack_num, pack_qty = pack['pack_number'], pack['quantity']
+                qr_data, qr_text = pack['qr_data'], pack['qr_text']
                 qr_code_image = generate_barcode_multi_grn(qr_text)
                 
                 label = {
@@ -3426,22 +3323,14 @@ def add_item_to_batch(batch_id):
                         db.session.rollback()
                         return jsonify({'success': False, 'error': f'Total batch quantity must equal item quantity'}), 400
                     
-                    import io
-                    import base64
-                    import qrcode
-                    
-                    total_labels_created = 0
-                    
                     # Get PO number and GRN date for QR code data
                     po_number = line_selection.po_link.po_doc_num if line_selection.po_link else 'N/A'
                     grn_date = batch.created_at.strftime('%Y-%m-%d') if batch.created_at else datetime.now().strftime('%Y-%m-%d')
                     
+                    # Create ONE batch_detail record with total quantity per batch
+                    batch_details = []
                     for idx, batch_data in enumerate(batch_numbers):
-                        batch_qty = float(batch_data.get('quantity', 0))
-                        batch_qty_decimal = Decimal(str(batch_qty))
-                        batch_qty_int = int(batch_qty_decimal.to_integral_value(rounding=ROUND_HALF_UP))
-                        
-                        # Create ONE batch_detail record with total quantity for this batch
+                        batch_qty_int = round_quantity(float(batch_data.get('quantity', 0)))
                         batch_expiry = datetime.strptime(batch_data['expiry_date'], '%Y-%m-%d').date() if batch_data.get('expiry_date') else expiry_date_obj
                         batch_detail = MultiGRNBatchDetails(
                             line_selection_id=line_selection.id,
@@ -3454,93 +3343,20 @@ def add_item_to_batch(batch_id):
                             qty_per_pack=Decimal(str(batch_qty_int)) / number_of_bags,
                             no_of_packs=number_of_bags
                         )
-                        db.session.add(batch_detail)
-                        db.session.flush()
-                        
-                        # Create label records for each pack
-                        if number_of_bags > 1:
-                            pack_quantities = distribute_quantity_to_packs(batch_qty_int, number_of_bags)
-                            for pack_num in range(1, number_of_bags + 1):
-                                pack_qty = pack_quantities[pack_num - 1]
-                                grn_number = f"MGN-{batch.id}-{line_selection.id}-{idx+1}-{pack_num}"
-                                
-                                # Generate QR barcode for this pack with complete data
-                                qr_data = {
-                                    'id': grn_number,
-                                    'po': str(po_number),
-                                    'item': item_code,
-                                    'batch': batch_data.get('batch_number'),
-                                    'qty': pack_qty,
-                                    'pack': f"{pack_num} of {number_of_bags}",
-                                    'grn_date': grn_date,
-                                    'exp_date': batch_expiry.strftime('%Y-%m-%d') if batch_expiry else 'N/A',
-                                    'bin': line_selection.bin_location or 'N/A'
-                                }
-                                qr_text = json.dumps(qr_data)
-                                
-                                try:
-                                    qr = qrcode.QRCode(version=1, error_correction=qrcode.constants.ERROR_CORRECT_L, box_size=10, border=4)
-                                    qr.add_data(qr_text)
-                                    qr.make(fit=True)
-                                    img = qr.make_image(fill_color="black", back_color="white")
-                                    buffer = io.BytesIO()
-                                    img.save(buffer, format='PNG')
-                                    buffer.seek(0)
-                                    barcode = f"data:image/png;base64,{base64.b64encode(buffer.getvalue()).decode()}"
-                                except Exception as e:
-                                    logging.error(f"Error generating QR code: {str(e)}")
-                                    barcode = None
-                                
-                                label = MultiGRNBatchDetailsLabel(
-                                    batch_detail_id=batch_detail.id,
-                                    pack_number=pack_num,
-                                    qty_in_pack=pack_qty,
-                                    grn_number=grn_number,
-                                    barcode=barcode,
-                                    qr_data=qr_text
-                                )
-                                db.session.add(label)
-                                total_labels_created += 1
-                                logging.info(f"✅ Created pack label {pack_num}/{number_of_bags}: GRN={grn_number}, Qty={pack_qty}")
-                        else:
-                            # Single pack - create one label with complete data
-                            grn_number = f"MGN-{batch.id}-{line_selection.id}-{idx+1}-1"
-                            qr_data = {
-                                'id': grn_number,
-                                'po': str(po_number),
-                                'item': item_code,
-                                'batch': batch_data.get('batch_number'),
-                                'qty': batch_qty_int,
-                                'pack': f"1 of 1",
-                                'grn_date': grn_date,
-                                'exp_date': batch_expiry.strftime('%Y-%m-%d') if batch_expiry else 'N/A',
-                                'bin': line_selection.bin_location or 'N/A'
-                            }
-                            qr_text = json.dumps(qr_data)
-                            
-                            try:
-                                qr = qrcode.QRCode(version=1, error_correction=qrcode.constants.ERROR_CORRECT_L, box_size=10, border=4)
-                                qr.add_data(qr_text)
-                                qr.make(fit=True)
-                                img = qr.make_image(fill_color="black", back_color="white")
-                                buffer = io.BytesIO()
-                                img.save(buffer, format='PNG')
-                                buffer.seek(0)
-                                barcode = f"data:image/png;base64,{base64.b64encode(buffer.getvalue()).decode()}"
-                            except Exception as e:
-                                logging.error(f"Error generating QR code: {str(e)}")
-                                barcode = None
-                            
-                            label = MultiGRNBatchDetailsLabel(
-                                batch_detail_id=batch_detail.id,
-                                pack_number=1,
-                                qty_in_pack=batch_qty_int,
-                                grn_number=grn_number,
-                                barcode=barcode,
-                                qr_data=qr_text
-                            )
-                            db.session.add(label)
-                            total_labels_created += 1
+                        batch_details.append((idx, batch_qty_int, batch_expiry, batch_detail))
+                    db.session.add_all([batch_detail for _, _, _, batch_detail in batch_details])
+                    db.session.flush()
+                    
+                    # Label records for every pack of every batch, written together
+                    plan = LabelPlan()
+                    for idx, batch_qty_int, batch_expiry, batch_detail in batch_details:
+                        plan.add_line(batch_qty_int, number_of_bags,
+                                      lambda pack, idx=idx: f"MGN-{batch.id}-{line_selection.id}-{idx+1}-{pack['pack_number']}",
+                                      _pack_qr_fields(po_number, item_code, batch_detail.batch_number, grn_date,
+                                                      batch_expiry, line_selection.bin_location),
+                                      batch_detail_id=batch_detail.id)
+                    plan.save(_pack_label)
+                    total_labels_created = len(plan.packs)
                     
                     logging.info(f"✅ Added {len(batch_numbers)} batch_details + {total_labels_created} pack labels for item {item_code}")
                 
@@ -3550,13 +3366,9 @@ def add_item_to_batch(batch_id):
         
         # Handle non-managed items with bags
         if not is_batch_managed and not is_serial_managed and number_of_bags > 1:
-            import io
-            import base64
-            import qrcode
-            
             # Create ONE batch_detail + N labels
-            quantity_decimal = Decimal(str(quantity))
-            quantity_int = int(quantity_decimal.to_integral_value(rounding=ROUND_HALF_UP))
+            quantity_int = round_quantity(quantity)
+            non_managed_batch_number = batch_number or f"BATCH-{batch.id}-{line_selection.id}"
             
             # Get PO number and GRN date for QR code data
             po_number = line_selection.po_link.po_doc_num if line_selection.po_link else 'N/A'
@@ -3565,7 +3377,7 @@ def add_item_to_batch(batch_id):
             # Create ONE batch_detail record with total quantity
             batch_detail = MultiGRNBatchDetails(
                 line_selection_id=line_selection.id,
-                batch_number=batch_number or f"BATCH-{batch.id}-{line_selection.id}",
+                batch_number=non_managed_batch_number,
                 quantity=Decimal(str(quantity_int)),
                 expiry_date=expiry_date_obj,
                 grn_number=f"MGN-{batch.id}-{line_selection.id}-1",
@@ -3575,52 +3387,14 @@ def add_item_to_batch(batch_id):
             db.session.add(batch_detail)
             db.session.flush()
             
-            # Distribute quantity across packs using helper function
-            pack_quantities = distribute_quantity_to_packs(quantity_int, number_of_bags)
-            
-            # Create label records for each pack
-            for pack_num in range(1, number_of_bags + 1):
-                pack_qty = pack_quantities[pack_num - 1]
-                grn_number = f"MGN-{batch.id}-{line_selection.id}-1-{pack_num}"
-                
-                # Generate QR barcode for this pack with complete data
-                qr_data = {
-                    'id': grn_number,
-                    'po': str(po_number),
-                    'item': item_code,
-                    'batch': batch_number or f"BATCH-{batch.id}-{line_selection.id}",
-                    'qty': pack_qty,
-                    'pack': f"{pack_num} of {number_of_bags}",
-                    'grn_date': grn_date,
-                    'exp_date': expiry_date_obj.strftime('%Y-%m-%d') if expiry_date_obj else 'N/A',
-                    'bin': bin_location or 'N/A'
-                }
-                qr_text = json.dumps(qr_data)
-                
-                try:
-                    qr = qrcode.QRCode(version=1, error_correction=qrcode.constants.ERROR_CORRECT_L, box_size=10, border=4)
-                    qr.add_data(qr_text)
-                    qr.make(fit=True)
-                    img = qr.make_image(fill_color="black", back_color="white")
-                    buffer = io.BytesIO()
-                    img.save(buffer, format='PNG')
-                    buffer.seek(0)
-                    barcode = f"data:image/png;base64,{base64.b64encode(buffer.getvalue()).decode()}"
-                except Exception as e:
-                    logging.error(f"Error generating QR code: {str(e)}")
-                    barcode = None
-                
-                # Create label record
-                label = MultiGRNBatchDetailsLabel(
-                    batch_detail_id=batch_detail.id,
-                    pack_number=pack_num,
-                    qty_in_pack=pack_qty,
-                    grn_number=grn_number,
-                    barcode=barcode,
-                    qr_data=qr_text
-                )
-                db.session.add(label)
-                logging.info(f"✅ Created pack label {pack_num}/{number_of_bags}: GRN={grn_number}, Qty={pack_qty}")
+            # One label record per pack, written together
+            plan = LabelPlan()
+            plan.add_line(quantity_int, number_of_bags,
+                          lambda pack: f"MGN-{batch.id}-{line_selection.id}-1-{pack['pack_number']}",
+                          _pack_qr_fields(po_number, item_code, non_managed_batch_number, grn_date,
+                                          expiry_date_obj, bin_location),
+                          batch_detail_id=batch_detail.id)
+            plan.save(_pack_label)
             
             logging.info(f"✅ Created 1 batch_detail + {number_of_bags} pack labels for non-managed item {item_code}: Total Qty={quantity_int}")
         
@@ -10,6 +10,7 @@ import os
 from flask import current_app
 import urllib.parse
 import urllib3
+from sap_gatekeeper import GatedSession
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 class SAPMultiGRNService:
@@ -21,7 +22,7 @@ class SAPMultiGRNService:
         self.password = os.environ.get('SAP_B1_PASSWORD', '')
         self.company_db = os.environ.get('SAP_B1_COMPANY_DB', '')
         self.session_id = None
-        self.session = requests.Session()
+        self.session = GatedSession()
         self.session.verify = False  # For development, in production use proper SSL
         self.is_offline = False
         self.enable_mock_data = os.environ.get('ENABLE_MOCK_SAP_DATA', 'false').lower() == 'true'
@@ -3,6 +3,9 @@ from flask_login import login_required, current_user
 from app import db
 from modules.sales_delivery.models import DeliveryDocument, DeliveryItem, DeliveryItemSerial
 from sap_integration import SAPIntegration
+from availability_snapshot import check_serials, invalidate as invalidate_availability
+from search_index import apply_search
+from cold_archive import history_child_counts, history_query
 from datetime import datetime
 from pathlib import Path
 import logging
@@ -76,22 +79,16 @@ def index():
     from_date = request.args.get('from_date', '').strip()
     to_date = request.args.get('to_date', '').strip()
 
-    query = DeliveryDocument.query.filter_by(user_id=current_user.id)
+    # Hot and archived documents (cold_archive history view)
+    query, deliveries_table, search = history_query('delivery')
+    query = query.filter(deliveries_table.c.user_id == current_user.id)
 
-    if search_term:
-        query = query.filter(
-            db.or_(
-                DeliveryDocument.so_doc_num.ilike(f'%{search_term}%'),
-                DeliveryDocument.card_name.ilike(f'%{search_term}%'),
-                DeliveryDocument.card_code.ilike(f'%{search_term}%'),
-                DeliveryDocument.sap_doc_num.ilike(f'%{search_term}%')
-            )
-        )
+    query = apply_search(query, search_term, search)
 
     if from_date:
         try:
             from_dt = datetime.strptime(from_date, '%Y-%m-%d')
-            query = query.filter(DeliveryDocument.created_at >= from_dt)
+            query = query.filter(deliveries_table.c.created_at >= from_dt)
         except ValueError:
             pass
 
@@ -99,11 +96,11 @@ def index():
         try:
             to_dt = datetime.strptime(to_date, '%Y-%m-%d')
             to_dt = to_dt.replace(hour=23, minute=59, second=59)
-            query = query.filter(DeliveryDocument.created_at <= to_dt)
+            query = query.filter(deliveries_table.c.created_at <= to_dt)
         except ValueError:
             pass
 
-    query = query.order_by(DeliveryDocument.created_at.desc())
+    query = query.order_by(deliveries_table.c.created_at.desc())
 
     pagination = query.paginate(page=page, per_page=per_page, error_out=False)
     deliveries = pagination.items
@@ -138,6 +135,8 @@ def index():
     return render_template(
         'sales_delivery/sales_delivery_index.html',
         deliveries=deliveries,
+        item_counts=history_child_counts('delivery', 'delivery_items', 'delivery_id',
+                                         [delivery.id for delivery in deliveries]),
         per_page=per_page,
         search_term=search_term,
         from_date=from_date,
@@ -596,8 +595,10 @@ def api_allocate_serials():
         if not item or item.delivery.user_id != current_user.id:
             return jsonify({'success': False, 'error': 'Access denied'})
         
-        # Clear existing serials for this item
-        DeliveryItemSerial.query.filter_by(delivery_item_id=delivery_item_id).delete()
+        # Clear existing serials for this item (ORM deletes, so the serial registry sees them)
+        for serial in DeliveryItemSerial.query.filter_by(delivery_item_id=delivery_item_id).all():
+            db.session.delete(serial)
+        db.session.flush()  # Delete before the replacement serials are inserted
         
         # Get SO data to fetch serial details
         sap = SAPIntegration()
@@ -813,6 +814,8 @@ def api_approve_delivery():
         delivery.status = 'posted'
         
         db.session.commit()
+        for item in delivery.items:
+            invalidate_availability(item.item_code, item.warehouse_code)
         
         logging.info(f"✅ Sales Delivery {delivery_id} approved and posted to SAP B1 as {delivery.sap_doc_num}")
         return jsonify({
@@ -1128,27 +1131,20 @@ def api_save_line_serials():
             return jsonify({'success': False, 'error': 'At least one serial number is required'})
         
         sap = SAPIntegration()
-        validated_serials = []
-        invalid_serials = []
-        
-        for serial_num in serial_numbers:
-            serial_num = serial_num.strip()
-            if not serial_num:
-                continue
-                
-            validation = sap.validate_serial_in_inventory(serial_num, item_code, warehouse_code)
-            
-            if validation.get('available'):
-                validated_serials.append({
-                    'internal_serial_number': serial_num,
-                    'system_serial_number': validation.get('system_serial_number', 0),
-                    'quantity': 1
-                })
-            else:
-                invalid_serials.append({
-                    'serial_number': serial_num,
-                    'reason': validation.get('error', 'Not available')
-                })
+        try:
+            available, missing = check_serials(sap, item_code, warehouse_code, serial_numbers)
+        except RuntimeError as e:
+            return jsonify({'success': False, 'error': f'Cannot validate serials: {str(e)}'})
+        
+        validated_serials = [{
+            'internal_serial_number': serial_num,
+            'system_serial_number': row.get('SystemNumber', 0),
+            'quantity': 1
+        } for serial_num, row in available.items()]
+        invalid_serials = [{
+            'serial_number': serial_num,
+            'reason': f'Serial number {serial_num} not available for item {item_code} in warehouse {warehouse_code}'
+        } for serial_num in missing]
         
         if invalid_serials:
             invalid_list = [s['serial_number'] for s in invalid_serials]
@@ -1165,7 +1161,9 @@ def api_save_line_serials():
         ).first()
         
         if existing_item:
-            DeliveryItemSerial.query.filter_by(delivery_item_id=existing_item.id).delete()
+            for serial in DeliveryItemSerial.query.filter_by(delivery_item_id=existing_item.id).all():
+                db.session.delete(serial)
+            db.session.flush()  # Delete before the replacement serials are inserted
             existing_item.quantity = len(validated_serials)
         else:
             so_data = sap.get_sales_order_by_doc_entry(delivery.so_doc_entry)
@@ -1312,6 +1310,8 @@ def api_post_delivery_to_sap():
             delivery.status = 'posted'
             delivery.submitted_at = datetime.utcnow()
             db.session.commit()
+            for item in delivery.items:
+                invalidate_availability(item.item_code, item.warehouse_code)
             
             logging.info(f"✅ Delivery {delivery_id} posted to SAP as DocNum: {result.get('doc_num')}")
             
@@ -9,7 +9,7 @@ import re
 from app import db
 from models import SerialItemTransfer, SerialItemTransferItem, DocumentNumberSeries
 from sap_integration import SAPIntegration
-from sqlalchemy import or_
+from search_index import SearchSpec, apply_search
 
 # Create blueprint for Serial Item Transfer module with absolute path for PyInstaller .exe builds
 serial_item_bp = Blueprint('serial_item_transfer', __name__, url_prefix='/serial-item-transfer',
@@ -21,6 +21,12 @@ def generate_serial_item_transfer_number():
     return DocumentNumberSeries.get_next_number('SERIAL_ITEM_TRANSFER')
 
 
+SERIAL_ITEM_TRANSFER_SEARCH = SearchSpec(
+    columns=[SerialItemTransfer.transfer_number, SerialItemTransfer.from_warehouse,
+             SerialItemTransfer.to_warehouse, SerialItemTransfer.status],
+    prefix_columns=[SerialItemTransfer.transfer_number]
+)
+
 @serial_item_bp.route('/', methods=['GET'])
 @login_required
 def index():
@@ -48,16 +54,7 @@ def index():
         query = query.filter_by(user_id=current_user.id)
 
     # Apply search filter if provided
-    if search:
-        search_filter = f"%{search}%"
-        query = query.filter(
-            or_(
-                SerialItemTransfer.transfer_number.ilike(search_filter),
-                SerialItemTransfer.from_warehouse.ilike(search_filter),
-                SerialItemTransfer.to_warehouse.ilike(search_filter),
-                SerialItemTransfer.status.ilike(search_filter)
-            )
-        )
+    query = apply_search(query, search, SERIAL_ITEM_TRANSFER_SEARCH)
 
     # Order and paginate
     query = query.order_by(SerialItemTransfer.created_at.desc())
@@ -80,7 +80,7 @@ class SOInvoiceSerial(db.Model):
     
     id = db.Column(db.Integer, primary_key=True)
     so_invoice_item_id = db.Column(db.Integer, db.ForeignKey('so_invoice_items.id'), nullable=False)
-    serial_number = db.Column(db.String(100), nullable=False)
+    serial_number = db.Column(db.String(100), nullable=False, index=True)
     quantity = db.Column(db.Integer, default=1)
     base_line_number = db.Column(db.Integer, nullable=False)  # Line number for SAP B1 posting
     
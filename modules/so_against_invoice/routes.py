@@ -14,6 +14,8 @@ from app import app, db
 from models import User, DocumentNumberSeries
 from .models import SOInvoiceDocument, SOInvoiceItem, SOInvoiceSerial, SOSeries
 from sap_integration import SAPIntegration
+from availability_snapshot import check_serials, invalidate as invalidate_availability
+from search_index import SearchSpec, apply_search
 
 # Create blueprint for SO Against Invoice module
 so_invoice_bp = Blueprint('so_against_invoice', __name__, template_folder='templates', url_prefix='/so-against-invoice')
@@ -35,6 +37,12 @@ def validate_json_csrf():
     return True
 
 
+SO_INVOICE_SEARCH = SearchSpec(
+    columns=[SOInvoiceDocument.document_number, SOInvoiceDocument.so_number, SOInvoiceDocument.card_code,
+             SOInvoiceDocument.card_name, SOInvoiceDocument.status],
+    prefix_columns=[SOInvoiceDocument.document_number, SOInvoiceDocument.so_number]
+)
+
 @so_invoice_bp.route('/', methods=['GET'])
 @login_required
 def index():
@@ -67,17 +75,7 @@ def index():
             query = query.filter_by(user_id=current_user.id)
         
         # Apply search filter if provided
-        if search:
-            search_filter = f"%{search}%"
-            query = query.filter(
-                db.or_(
-                    SOInvoiceDocument.document_number.ilike(search_filter),
-                    SOInvoiceDocument.so_number.ilike(search_filter),
-                    SOInvoiceDocument.card_code.ilike(search_filter),
-                    SOInvoiceDocument.card_name.ilike(search_filter),
-                    SOInvoiceDocument.status.ilike(search_filter)
-                )
-            )
+        query = apply_search(query, search, SO_INVOICE_SEARCH)
         
         # Order and paginate
         query = query.order_by(SOInvoiceDocument.created_at.desc())
@@ -576,30 +574,20 @@ def validate_item():
             # Scenario 1: Serial Number Managed Items
             if sap.ensure_logged_in():
                 try:
-                    url = f"{sap.base_url}/b1s/v1/SQLQueries('Series_Validation')/List"
-                    request_body = {
-                        "ParamList": f"whsCode='{warehouse_code}'&itemCode='{item_code}'&series='{serial_number}'"
-                    }
-                    response = sap.session.post(url, json=request_body, timeout=10)
-                    
-                    if response.status_code == 200:
-                        data = response.json()
-                        serial_details = data.get('value', [])
-                        
-                        if serial_details:
-                            serial_info = serial_details[0]
-                            return jsonify({
-                                'success': True,
-                                'validated': True,
-                                'item_type': 'serial',
-                                'serial_info': serial_info,
-                                'message': f'Serial {serial_number} validated successfully'
-                            })
-                        else:
-                            return jsonify({
-                                'success': False,
-                                'error': f'Serial {serial_number} not found for item {item_code} in warehouse {warehouse_code}'
-                            })
+                    available, _ = check_serials(sap, item_code, warehouse_code, [serial_number])
+                    if available:
+                        return jsonify({
+                            'success': True,
+                            'validated': True,
+                            'item_type': 'serial',
+                            'serial_info': {'ItemCode': item_code, 'DistNumber': serial_number, 'WhsCode': warehouse_code},
+                            'message': f'Serial {serial_number} validated successfully'
+                        })
+                    else:
+                        return jsonify({
+                            'success': False,
+                            'error': f'Serial {serial_number} not found for item {item_code} in warehouse {warehouse_code}'
+                        })
                             
                 except Exception as e:
                     logging.error(f"Error validating serial with SAP: {str(e)}")
@@ -795,6 +783,8 @@ def post_invoice():
                     document.updated_at = datetime.utcnow()
                     
                     db.session.commit()
+                    for item in document.items:
+                        invalidate_availability(item.item_code, item.warehouse_code)
                     
                     return jsonify({
                         'success': True,
@@ -1056,27 +1046,18 @@ def validate_serial():
         # Try to validate with SAP B1
         if sap.ensure_logged_in():
             try:
-                url = f"{sap.base_url}/b1s/v1/SQLQueries('Series_Validation')/List"
-                request_body = {
-                    "ParamList": f"whsCode='{warehouse_code}'&itemCode='{item_code}'&series='{serial_number}'"
-                }
-                response = sap.session.post(url, json=request_body, timeout=10)
-                
-                if response.status_code == 200:
-                    response_data = response.json()
-                    serial_details = response_data.get('value', [])
-                    
-                    if serial_details:
-                        return jsonify({
-                            'success': True,
-                            'serial_number': serial_number,
-                            'message': f'Serial {serial_number} validated successfully'
-                        })
-                    else:
-                        return jsonify({
-                            'success': False,
-                            'error': f'Serial {serial_number} not found or not available'
-                        })
+                available, _ = check_serials(sap, item_code, warehouse_code, [serial_number])
+                if available:
+                    return jsonify({
+                        'success': True,
+                        'serial_number': serial_number,
+                        'message': f'Serial {serial_number} validated successfully'
+                    })
+                else:
+                    return jsonify({
+                        'success': False,
+                        'error': f'Serial {serial_number} not found or not available'
+                    })
                         
             except Exception as e:
                 logging.error(f"Error validating serial with SAP: {str(e)}")
@@ -1174,8 +1155,10 @@ def add_validated_item():
         item.validation_status = 'validated'
         item.validation_error = None
         
-        # Clear existing serial numbers for this item
-        SOInvoiceSerial.query.filter_by(so_invoice_item_id=item_id).delete()
+        # Clear existing serial numbers for this item (ORM deletes, so the serial registry sees them)
+        for serial in SOInvoiceSerial.query.filter_by(so_invoice_item_id=item_id).all():
+            db.session.delete(serial)
+        db.session.flush()  # Delete before the replacement serials are inserted
         
         # Add serial numbers if provided
         if serial_numbers:
@@ -1247,7 +1230,8 @@ def remove_validated_item():
         item.validation_error = None
         
         # Clear serial numbers
-        SOInvoiceSerial.query.filter_by(so_invoice_item_id=item_id).delete()
+        for serial in SOInvoiceSerial.query.filter_by(so_invoice_item_id=item_id).all():
+            db.session.delete(serial)
         
         db.session.commit()
         
@@ -1392,6 +1376,8 @@ def post_invoice_to_sap():
                 document.comments = f"Posted to SAP B1 as Draft {draft_doc_num} (DocEntry: {draft_doc_entry})"
                 
                 db.session.commit()
+                for item in validated_items:
+                    invalidate_availability(item.item_code, item.warehouse_code)
                 
                 logging.info(f"Successfully posted SO Invoice {document.document_number} to SAP B1 as Draft {draft_doc_num} (DocEntry: {draft_doc_entry})")
                 
@@ -0,0 +1,197 @@
+"""
+Offline Scan Ingestion
+Applies batches of scans queued in the PWA while the device was offline.
+
+Every scan carries a device-generated idempotency key, so a batch that is
+replayed after a lost response is recognised and answered from the stored
+outcome. Scans that no longer fit the server state (over-picking, closed pick
+list, wrong item) are stored as conflicts and reported back to the device.
+
+Picks are confirmed in SAP B1 through the same path as the line pick button
+(pick_list_sync.confirm_pick_line). While SAP cannot be reached a pick is
+answered 'deferred': nothing is stored, and the device keeps it queued and
+sends it again on the next sync.
+"""
+
+import json
+import logging
+from datetime import datetime
+
+from app import db
+from models import OfflineScan, BinScanningLog, PickList, PickListLine
+
+MAX_BATCH_SIZE = 500
+
+# scan_type -> callable(user, scan, context, batch) returning (status, message);
+# batch is a dict shared by the scans of one upload
+SCAN_HANDLERS = {}
+
+
+def scan_handler(scan_type):
+    """Register the function that applies a scan type"""
+    def register(func):
+        SCAN_HANDLERS[scan_type] = func
+        return func
+    return register
+
+
+def _parse_time(value):
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(str(value).replace('Z', '+00:00')).replace(tzinfo=None)
+    except ValueError:
+        return None
+
+
+@scan_handler('BIN_SCAN')
+def _apply_bin_scan(user, scan, context, batch):
+    db.session.add(BinScanningLog(
+        bin_code=scan['barcode'],
+        user_id=user.id,
+        scan_type='BIN_SCAN',
+        scan_data=json.dumps(context) if context else None,
+        items_found=context.get('items_found', 0) if context else 0,
+        scan_timestamp=_parse_time(scan.get('scanned_at')) or datetime.utcnow()
+    ))
+    return 'accepted', None
+
+
+def _batch_sap(batch):
+    """One logged-in SAP session per uploaded batch; None while SAP cannot be reached"""
+    if 'sap' not in batch:
+        from sap_integration import SAPIntegration
+        sap = SAPIntegration()
+        batch['sap'] = sap if sap.ensure_logged_in() else None
+    return batch['sap']
+
+
+@scan_handler('PICK')
+def _apply_pick(user, scan, context, batch):
+    absolute_entry = context.get('absolute_entry')
+    line_number = context.get('line_number')
+    quantity = float(scan.get('quantity') or 1)
+
+    pick_list = PickList.query.filter_by(absolute_entry=absolute_entry).first()
+    if not pick_list:
+        return 'rejected', f'Pick list {absolute_entry} not found'
+    if pick_list.user_id != user.id and user.role not in ['admin', 'manager']:
+        return 'rejected', 'Access denied - You can only modify your own pick lists'
+    if pick_list.status in ('closed', 'ps_Closed'):
+        return 'conflict', f'Pick list {absolute_entry} was closed before the scan was received'
+
+    line = PickListLine.query.filter_by(pick_list_id=pick_list.id, line_number=line_number).first()
+    if not line:
+        return 'rejected', f'Line {line_number} not found on pick list {absolute_entry}'
+    if line.item_code and scan['barcode'] != line.item_code and context.get('item_code') != line.item_code:
+        return 'conflict', f'Scanned {scan["barcode"]} but line {line_number} is for {line.item_code}'
+
+    # The pick button sends the line's total; scanner picks add to what is already picked
+    if context.get('picked_quantity') is not None:
+        picked = float(context['picked_quantity'])
+    else:
+        picked = (line.picked_quantity or 0) + quantity
+    if line.released_quantity and picked > line.released_quantity:
+        return 'conflict', (f'Over-pick on line {line_number}: {picked:g} picked, '
+                            f'{line.released_quantity:g} released (picked by someone else while offline?)')
+
+    sap = _batch_sap(batch)
+    if sap is None:
+        return 'deferred', 'SAP B1 unavailable - pick kept on the device for the next sync'
+
+    from pick_list_sync import confirm_pick_line
+    result = confirm_pick_line(sap, pick_list, line_number, line.item_code or scan['barcode'], picked)
+    if not result['success']:
+        if result.get('unavailable'):
+            batch['sap'] = None  # Keep the remaining picks in order behind this one
+            return 'deferred', 'SAP B1 unavailable - pick kept on the device for the next sync'
+        return 'conflict', f"SAP B1 rejected the pick: {result['error']}"
+
+    # SAP marks the whole line picked; a partial pick stays partial locally
+    if line.released_quantity and picked < line.released_quantity:
+        line.pick_status = 'ps_PartiallyPicked'
+    return 'accepted', None
+
+
+def ingest_batch(user, scans, device_id=None):
+    """
+    Apply an uploaded batch of offline scans in device order
+
+    Args:
+        user: User who captured the scans
+        scans: list of dicts with key, sequence, scan_type, barcode, quantity, context, scanned_at
+        device_id: Optional identifier of the uploading device
+
+    Returns:
+        dict with per-scan results and accepted/conflict/rejected/duplicate counts
+    """
+    scans = sorted(scans, key=lambda scan: scan.get('sequence') or 0)
+    keys = [scan.get('key') for scan in scans if scan.get('key')]
+
+    # One query for every key already received (replayed batch)
+    existing = {}
+    if keys:
+        for row in OfflineScan.query.filter(OfflineScan.idempotency_key.in_(keys)).all():
+            existing[row.idempotency_key] = row
+
+    results = []
+    counts = {'accepted': 0, 'conflict': 0, 'rejected': 0, 'duplicate': 0, 'deferred': 0}
+    seen = set()
+    batch = {}
+
+    for scan in scans:
+        key = scan.get('key')
+        if not key or not scan.get('barcode') or not scan.get('scan_type'):
+            counts['rejected'] += 1
+            results.append({'key': key, 'status': 'rejected', 'message': 'key, scan_type and barcode are required'})
+            continue
+
+        if key in existing or key in seen:
+            stored = existing.get(key)
+            counts['duplicate'] += 1
+            results.append({'key': key, 'status': 'duplicate',
+                            'original_status': stored.status if stored else 'accepted',
+                            'message': stored.message if stored else None})
+            continue
+        seen.add(key)
+
+        context = scan.get('context') or {}
+        handler = SCAN_HANDLERS.get(scan['scan_type'])
+        if handler is None:
+            status, message = 'rejected', f"Unknown scan type {scan['scan_type']}"
+        else:
+            try:
+                with db.session.begin_nested():
+                    status, message = handler(user, scan, context, batch)
+            except Exception as e:
+                logging.error(f"❌ Offline scan {key} failed: {str(e)}")
+                status, message = 'rejected', str(e)
+
+        if status == 'deferred':
+            # Not recorded, so the device's next upload of this key is applied again
+            seen.discard(key)
+            counts[status] += 1
+            results.append({'key': key, 'status': status, 'message': message})
+            continue
+
+        db.session.add(OfflineScan(
+            idempotency_key=key,
+            user_id=user.id,
+            device_id=device_id,
+            sequence=scan.get('sequence'),
+            scan_type=scan['scan_type'],
+            barcode=scan['barcode'],
+            quantity=scan.get('quantity'),
+            context=json.dumps(context) if context else None,
+            scanned_at=_parse_time(scan.get('scanned_at')),
+            status=status,
+            message=message
+        ))
+        counts[status] += 1
+        results.append({'key': key, 'status': status, 'message': message})
+
+    db.session.commit()
+    logging.info(f"📶 Ingested {len(scans)} offline scans from {user.username} ({device_id}): "
+                 f"{counts['accepted']} accepted, {counts['conflict']} conflicts, "
+                 f"{counts['rejected']} rejected, {counts['duplicate']} duplicates, {counts['deferred']} deferred")
+    return {'results': results, **counts}
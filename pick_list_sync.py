@@ -0,0 +1,402 @@
+"""
+Incremental Pick List Sync
+Pulls only the pick lists changed in SAP B1 since the last run (UpdateDate plus
+UpdateTime watermark) and merges headers, lines and bin allocations into the
+local tables in bulk. A company that does not expose UpdateTime falls back to
+the date alone, and one without UpdateDate to a full open-list sync.
+"""
+
+import itertools
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import insert
+
+from app import db
+from models import PickList, PickListLine, PickListBinAllocation, SyncWatermark, User
+from sap_bulk_sync import SAPPageError, iter_sap_pages, replicate_deletes, replicate_written
+
+PICK_LIST_ENTITY = 'PickLists'
+
+# SAP fields used as the change watermark (date, then time of day; blank time = date only)
+WATERMARK_FIELD = os.environ.get('PICK_LIST_WATERMARK_FIELD', 'UpdateDate')
+WATERMARK_TIME_FIELD = os.environ.get('PICK_LIST_WATERMARK_TIME_FIELD', 'UpdateTime')
+
+PICK_LIST_SELECT = 'Absoluteentry,Name,OwnerCode,OwnerName,PickDate,Remarks,Status,ObjectType,UseBaseUnits,PickListsLines'
+
+LINE_FIELDS = {
+    'order_entry': 'OrderEntry',
+    'order_row_id': 'OrderRowID',
+    'picked_quantity': 'PickedQuantity',
+    'pick_status': 'PickStatus',
+    'released_quantity': 'ReleasedQuantity',
+    'previously_released_quantity': 'PreviouslyReleasedQuantity',
+    'base_object_type': 'BaseObjectType',
+}
+
+_scheduler_thread = None
+
+
+def _parse_pick_date(value):
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value[:19], '%Y-%m-%dT%H:%M:%S')
+    except ValueError:
+        return None
+
+
+def get_watermark(entity):
+    """Return the watermark row for an entity, creating it on first use"""
+    watermark = SyncWatermark.query.filter_by(entity=entity).first()
+    if not watermark:
+        watermark = SyncWatermark(entity=entity)
+        db.session.add(watermark)
+        db.session.flush()
+    return watermark
+
+
+def _parse_update_time(value):
+    """SAP time of day as HH:MM:SS (None when missing or unreadable)"""
+    for fmt in ('%H:%M:%S', '%H:%M'):
+        try:
+            return datetime.strptime(str(value or '')[:8], fmt).strftime('%H:%M:%S')
+        except ValueError:
+            continue
+    return None
+
+
+def _build_resource(last_update_date, last_update_time=None, fields=(WATERMARK_FIELD, WATERMARK_TIME_FIELD)):
+    """
+    Changed pick lists since the watermark; the first run (no watermark) only loads open ones.
+    Incremental runs include closed pick lists so status changes reach the local copy.
+
+    fields are the watermark fields SAP accepts: date and time, date only, or none.
+    """
+    fields = [field for field in fields if field]
+    select = ','.join([PICK_LIST_SELECT, *fields])
+    if fields and last_update_date:
+        filter_clause = f"{WATERMARK_FIELD} ge '{last_update_date}'"
+        if len(fields) > 1 and last_update_time:
+            filter_clause = (f"{WATERMARK_FIELD} gt '{last_update_date}' or ({WATERMARK_FIELD} eq '{last_update_date}' "
+                             f"and {fields[1]} ge '{last_update_time}')")
+    else:
+        filter_clause = "Status ne 'ps_Closed'"
+    return f"PickLists?$select={select}&$filter={filter_clause}&$orderby=Absoluteentry"
+
+
+def _rejected_field(error, fields):
+    """The watermark field a 400 answer complains about (None for any other failure)"""
+    if not isinstance(error, SAPPageError) or error.status_code != 400:
+        return None
+    text = error.text.lower()
+    return next((field for field in fields if field.lower() in text), None)
+
+
+def _sap_allocations(sap_line):
+    return [
+        (a.get('BinAbsEntry'), float(a.get('Quantity') or 0), a.get('AllowNegativeQuantity', 'tNO'),
+         a.get('SerialAndBatchNumbersBaseLine', 0), a.get('BaseLineNumber'))
+        for a in sap_line.get('DocumentLinesBinAllocations', [])
+    ]
+
+
+def _merge_page(sap_pick_lists, owner_user_id, stats):
+    """Merge one page of SAP pick lists: one query per table instead of one per row"""
+    entries = [pl.get('Absoluteentry') for pl in sap_pick_lists if pl.get('Absoluteentry')]
+    if not entries:
+        return
+
+    existing = {
+        pl.absolute_entry: pl
+        for pl in PickList.query.filter(PickList.absolute_entry.in_(entries)).all()
+    }
+
+    # --- Headers ---
+    pick_lists = {}
+    for sap_pick_list in sap_pick_lists:
+        entry = sap_pick_list.get('Absoluteentry')
+        if not entry:
+            continue
+
+        pick_date = _parse_pick_date(sap_pick_list.get('PickDate'))
+        pick_list = existing.get(entry)
+        if pick_list is None:
+            pick_list = PickList(
+                absolute_entry=entry,
+                name=sap_pick_list.get('Name') or f'SAP-{entry}',
+                pick_list_number=sap_pick_list.get('Name') or f'PL-{entry}',
+                owner_code=sap_pick_list.get('OwnerCode'),
+                owner_name=sap_pick_list.get('OwnerName'),
+                remarks=sap_pick_list.get('Remarks'),
+                status=sap_pick_list.get('Status', 'ps_Open'),
+                object_type=sap_pick_list.get('ObjectType', '156'),
+                use_base_units=sap_pick_list.get('UseBaseUnits', 'tNO'),
+                pick_date=pick_date,
+                user_id=owner_user_id
+            )
+            db.session.add(pick_list)
+            stats['inserted'] += 1
+        else:
+            new_values = (sap_pick_list.get('Status', pick_list.status),
+                          sap_pick_list.get('Remarks', pick_list.remarks),
+                          pick_date or pick_list.pick_date)
+            if (pick_list.status, pick_list.remarks, pick_list.pick_date) != new_values:
+                pick_list.status, pick_list.remarks, pick_list.pick_date = new_values
+                stats['updated'] += 1
+            else:
+                stats['unchanged'] += 1
+        pick_lists[entry] = (pick_list, sap_pick_list)
+
+    db.session.flush()  # One flush assigns ids to all new pick lists
+
+    # --- Lines ---
+    pick_list_ids = [pl.id for pl, _ in pick_lists.values()]
+    local_lines = {
+        (line.pick_list_id, line.line_number): line
+        for line in PickListLine.query.filter(PickListLine.pick_list_id.in_(pick_list_ids)).all()
+    }
+
+    seen_keys = set()
+    line_pairs = []
+    for pick_list, sap_pick_list in pick_lists.values():
+        sap_lines = sap_pick_list.get('PickListsLines', [])
+        for sap_line in sap_lines:
+            key = (pick_list.id, sap_line.get('LineNumber'))
+            seen_keys.add(key)
+            line = local_lines.get(key)
+            if line is None:
+                line = PickListLine(pick_list_id=pick_list.id, absolute_entry=sap_line.get('AbsoluteEntry'),
+                                    line_number=sap_line.get('LineNumber'))
+                db.session.add(line)
+                stats['lines_written'] += 1
+            changed = False
+            for column, sap_field in LINE_FIELDS.items():
+                value = sap_line.get(sap_field)
+                if value is not None and getattr(line, column) != value:
+                    setattr(line, column, value)
+                    changed = True
+            if changed and line.id is not None:
+                stats['lines_written'] += 1
+            line_pairs.append((line, sap_line))
+
+        pick_list.total_items = len(sap_lines)
+        pick_list.picked_items = len([l for l in sap_lines if l.get('PickStatus') == 'ps_Closed'])
+
+    removed_line_ids = [line.id for key, line in local_lines.items() if key not in seen_keys]
+    if removed_line_ids:
+        replicate_deletes(PickListBinAllocation.__table__, PickListBinAllocation.pick_list_line_id.in_(removed_line_ids))
+        replicate_deletes(PickListLine.__table__, PickListLine.id.in_(removed_line_ids))
+        PickListBinAllocation.query.filter(
+            PickListBinAllocation.pick_list_line_id.in_(removed_line_ids)
+        ).delete(synchronize_session=False)
+        PickListLine.query.filter(PickListLine.id.in_(removed_line_ids)).delete(synchronize_session=False)
+
+    db.session.flush()  # One flush inserts all new lines
+
+    # --- Bin allocations: replace only for lines whose allocations changed ---
+    line_ids = [line.id for line, _ in line_pairs]
+    local_allocations = {}
+    if line_ids:
+        for allocation in PickListBinAllocation.query.filter(
+                PickListBinAllocation.pick_list_line_id.in_(line_ids)).all():
+            local_allocations.setdefault(allocation.pick_list_line_id, []).append(
+                (allocation.bin_abs_entry, float(allocation.quantity or 0), allocation.allow_negative_quantity,
+                 allocation.serial_and_batch_numbers_base_line, allocation.base_line_number))
+
+    stale_line_ids = []
+    new_allocations = []
+    for line, sap_line in line_pairs:
+        sap_allocations = _sap_allocations(sap_line)
+        if sorted(local_allocations.get(line.id, []), key=repr) == sorted(sap_allocations, key=repr):
+            continue
+        if line.id in local_allocations:
+            stale_line_ids.append(line.id)
+        for bin_abs_entry, quantity, allow_negative, base_line, base_line_number in sap_allocations:
+            new_allocations.append({
+                'pick_list_line_id': line.id,
+                'bin_abs_entry': bin_abs_entry,
+                'quantity': quantity,
+                'allow_negative_quantity': allow_negative,
+                'serial_and_batch_numbers_base_line': base_line,
+                'base_line_number': base_line_number,
+                'created_at': datetime.utcnow()
+            })
+
+    if stale_line_ids:
+        replicate_deletes(PickListBinAllocation.__table__, PickListBinAllocation.pick_list_line_id.in_(stale_line_ids))
+        PickListBinAllocation.query.filter(
+            PickListBinAllocation.pick_list_line_id.in_(stale_line_ids)
+        ).delete(synchronize_session=False)
+    if new_allocations:
+        db.session.execute(insert(PickListBinAllocation), new_allocations)
+        written_line_ids = {allocation['pick_list_line_id'] for allocation in new_allocations}
+        replicate_written(PickListBinAllocation.__tablename__, ['pick_list_line_id'],
+                          [{'pick_list_line_id': line_id} for line_id in written_line_ids])
+    stats['allocations_written'] += len(new_allocations)
+
+
+def sync_pick_lists(sap, owner_user_id=None, full=False):
+    """
+    Incrementally sync pick lists from SAP B1 into PickList / PickListLine / PickListBinAllocation
+
+    Args:
+        sap: SAPIntegration instance
+        owner_user_id: WMS user that owns newly imported pick lists (defaults to the first admin)
+        full: Ignore the watermark and re-read all open pick lists
+
+    Returns:
+        dict with success, inserted, updated, unchanged, lines_written, allocations_written, watermark
+    """
+    stats = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'lines_written': 0, 'allocations_written': 0}
+
+    if not sap.ensure_logged_in():
+        return {'success': False, 'error': 'SAP B1 connection unavailable', **stats}
+
+    if owner_user_id is None:
+        admin = User.query.filter_by(role='admin').order_by(User.id).first()
+        owner_user_id = admin.id if admin else None
+    if owner_user_id is None:
+        return {'success': False, 'error': 'No owner user available for imported pick lists', **stats}
+
+    watermark = get_watermark(PICK_LIST_ENTITY)
+    last_update_date = None if full else watermark.last_update_date
+    last_update_time = None if full else watermark.last_update_time
+    newest = (watermark.last_update_date, watermark.last_update_time)
+    fields = [field for field in (WATERMARK_FIELD, WATERMARK_TIME_FIELD) if field]
+
+    try:
+        while True:
+            try:
+                pages = iter_sap_pages(sap, _build_resource(last_update_date, last_update_time, fields))
+                first_page = next(pages, [])
+                break
+            except SAPPageError as e:
+                # Only a field this company/SL version does not expose changes the strategy;
+                # outages and other errors fail the run and keep the watermark
+                rejected = _rejected_field(e, fields)
+                if rejected is None:
+                    raise
+                fields = fields[:fields.index(rejected)]
+                logging.warning(f"⚠️ {rejected} not usable as PickLists watermark ({e}); "
+                                f"{'using ' + fields[0] + ' only' if fields else 'using full sync'}")
+
+        use_time = len(fields) > 1
+        received = 0
+        for page in itertools.chain([first_page], pages):
+            received += len(page)
+            _merge_page(page, owner_user_id, stats)
+            for sap_pick_list in page if fields else []:
+                update_date = (sap_pick_list.get(WATERMARK_FIELD) or '')[:10]
+                update_time = _parse_update_time(sap_pick_list.get(fields[1])) if use_time else None
+                if update_date and (not newest[0] or (update_date, update_time or '') > (newest[0], newest[1] or '')):
+                    newest = (update_date, update_time)
+            db.session.commit()  # Bounded transactions - one per SAP page
+
+        watermark = get_watermark(PICK_LIST_ENTITY)
+        if fields:
+            watermark.last_update_date, watermark.last_update_time = newest[0], newest[1] if use_time else None
+        watermark.last_synced_at = datetime.utcnow()
+        watermark.rows_synced = received
+        watermark.last_error = None
+        db.session.commit()
+
+        mark = ' '.join(part for part in newest if part)
+        logging.info(f"✅ Pick list delta sync: {received} changed in SAP, {stats['inserted']} new, "
+                     f"{stats['updated']} updated, {stats['unchanged']} unchanged (watermark {mark})")
+        return {'success': True, 'received': received, 'watermark': mark, **stats}
+
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"❌ Pick list delta sync failed: {str(e)}")
+        try:
+            watermark = get_watermark(PICK_LIST_ENTITY)
+            watermark.last_error = str(e)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+        return {'success': False, 'error': str(e), **stats}
+
+
+def confirm_pick_line(sap, pick_list, line_number, item_code, picked_quantity):
+    """
+    Mark one pick list line as picked in SAP B1, then mirror it on the local rows
+    (the caller commits). Shared by the line pick button and replayed offline scans.
+
+    Returns:
+        dict with success, message/error and pick_list_status; 'unavailable' is True
+        when SAP could not be reached, so the pick can be tried again later
+    """
+    sap_result = sap.get_pick_list_by_id(pick_list.absolute_entry)
+    if not sap_result.get('success'):
+        return {'success': False, 'error': 'Failed to get pick list data from SAP',
+                'unavailable': sap.session.unavailable is not None}
+
+    sap_pick_list = sap_result['pick_list']
+    result = sap.update_pick_list_line_to_picked(pick_list.absolute_entry, {
+        'line_number': line_number,
+        'item_code': item_code,
+        'picked_quantity': float(picked_quantity),
+        'sap_pick_list': sap_pick_list
+    })
+    if not result.get('success'):
+        return {'success': False, 'error': result.get('error', 'Failed to update pick list line in SAP B1'),
+                'unavailable': sap.session.unavailable is not None}
+
+    local_line = PickListLine.query.filter_by(pick_list_id=pick_list.id, line_number=line_number).first()
+    if local_line:
+        local_line.pick_status = 'ps_Picked'
+        local_line.picked_quantity = float(picked_quantity)
+
+    # Check if pick list is fully picked or partially picked
+    all_lines_picked = True
+    any_line_picked = False
+    for line in sap_pick_list.get('PickListsLines', []):
+        if line.get('LineNumber') == line_number or line.get('PickStatus') == 'ps_Picked':
+            any_line_picked = True
+        else:
+            all_lines_picked = False
+
+    if all_lines_picked:
+        pick_list.status = 'ps_Picked'
+    elif any_line_picked:
+        pick_list.status = 'ps_PartiallyPicked'
+
+    return {'success': True, 'message': result.get('message', f'Line {line_number} marked as picked successfully'),
+            'pick_list_status': pick_list.status}
+
+
+def start_pick_list_sync_scheduler(app, interval_seconds=None):
+    """
+    Keep local pick lists fresh in a background thread so pick-list screens never wait on SAP.
+    Interval comes from PICK_LIST_SYNC_INTERVAL (seconds, default 300, 0 disables).
+    """
+    global _scheduler_thread
+
+    if interval_seconds is None:
+        interval_seconds = int(os.environ.get('PICK_LIST_SYNC_INTERVAL', '300') or 0)
+    if interval_seconds <= 0:
+        logging.info("ℹ️ Pick list background sync disabled (PICK_LIST_SYNC_INTERVAL=0)")
+        return None
+    if _scheduler_thread and _scheduler_thread.is_alive():
+        return _scheduler_thread
+
+    def run():
+        from sap_integration import SAPIntegration
+        while True:
+            with app.app_context():
+                try:
+                    sync_pick_lists(SAPIntegration())
+                except Exception as e:
+                    logging.error(f"❌ Pick list scheduler error: {str(e)}")
+                finally:
+                    db.session.remove()
+            time.sleep(interval_seconds)
+
+    _scheduler_thread = threading.Thread(target=run, name='pick-list-sync', daemon=True)
+    _scheduler_thread.start()
+    logging.info(f"✅ Pick list background sync started (every {interval_seconds}s)")
+    return _scheduler_thread
@@ -0,0 +1,325 @@
+"""
+Pick Route Engine
+Orders the bin allocations of pick lists along a walk through the warehouse
+instead of SAP line order, and merges several pick lists into one wave so a
+picker visits each bin once.
+
+Bin codes are split into aisle / rack / level by the warehouse's layout
+(PickRouteLayout: a regex with named groups, the aisle walk order and whether
+routing is serpentine). Without a layout the generic parser reads the first
+three letter/digit runs after the warehouse prefix, so 7000-FG-A01-02 is
+aisle A, rack 01, level 02. Serpentine (S-shape) routing walks every other
+visited aisle from the far end, so the picker never returns to the aisle head.
+Bins that do not parse are visited last, in bin code order.
+"""
+
+import logging
+import os
+import re
+import time
+
+from app import db
+from models import PickList, PickListLine, PickListBinAllocation, PickRouteLayout
+from reference_data import snapshot_rows
+
+PICK_WAVE_MAX_LISTS = int(os.environ.get('PICK_WAVE_MAX_LISTS', '50'))
+
+LAYOUT_GROUPS = ('aisle', 'rack', 'level')
+TOKEN_RE = re.compile(r'[A-Za-z]+|\d+')
+NATURAL_RE = re.compile(r'(\d+)')
+
+
+def _natural(token):
+    """Sort key that puts 2 before 10 and numbers before letters"""
+    if not token:
+        return (0, 0, '')
+    if token.isdigit():
+        return (1, int(token), '')
+    return (2, 0, token.upper())
+
+
+def _natural_code(code):
+    return [int(part) if part.isdigit() else part.upper() for part in NATURAL_RE.split(code or '')]
+
+
+def _aisle_name(token):
+    return str(int(token)) if token.isdigit() else token.upper()
+
+
+class RouteLayout:
+    """Compiled layout of one warehouse (a PickRouteLayout row or the generic default)"""
+
+    def __init__(self, warehouse_code, bin_pattern=None, aisle_sequence=None, serpentine=True):
+        self.warehouse_code = warehouse_code or ''
+        self.pattern = re.compile(bin_pattern, re.IGNORECASE) if bin_pattern else None
+        self.aisle_rank = {}
+        for aisle in aisle_sequence or []:
+            if aisle.strip():
+                self.aisle_rank.setdefault(_aisle_name(aisle.strip()), len(self.aisle_rank))
+        self.serpentine = serpentine
+
+    @classmethod
+    def from_model(cls, layout):
+        return cls(layout.warehouse_code, layout.bin_pattern,
+                   (layout.aisle_sequence or '').split(','), layout.serpentine is not False)
+
+    def parse(self, bin_code):
+        """(aisle, rack, level) of a bin code, None when it does not follow the layout"""
+        if not bin_code:
+            return None
+        if self.pattern is not None:
+            match = self.pattern.search(bin_code)
+            if not match:
+                return None
+            groups = match.groupdict()
+            return tuple(groups.get(name) or '' for name in LAYOUT_GROUPS)
+
+        code = bin_code
+        prefix = f"{self.warehouse_code}-".upper()
+        if self.warehouse_code and code.upper().startswith(prefix):
+            code = code[len(prefix):]
+        tokens = TOKEN_RE.findall(code)
+        if not tokens:
+            return None
+        tokens += [''] * (len(LAYOUT_GROUPS) - len(tokens))
+        return tuple(tokens[:len(LAYOUT_GROUPS)])
+
+    def aisle_key(self, aisle):
+        rank = self.aisle_rank.get(_aisle_name(aisle)) if aisle else None
+        return (0, rank, ()) if rank is not None else (1, 0, _natural(aisle))
+
+
+def validate_layout(data):
+    """Clean a layout posted by an admin; raises ValueError when the pattern is unusable"""
+    bin_pattern = (data.get('bin_pattern') or '').strip() or None
+    if bin_pattern:
+        try:
+            compiled = re.compile(bin_pattern)
+        except re.error as e:
+            raise ValueError(f'Invalid bin_pattern: {str(e)}')
+        if 'aisle' not in compiled.groupindex:
+            raise ValueError('bin_pattern needs a named group (?P<aisle>...)')
+
+    aisle_sequence = data.get('aisle_sequence') or []
+    if isinstance(aisle_sequence, str):
+        aisle_sequence = aisle_sequence.split(',')
+    aisle_sequence = [str(a).strip() for a in aisle_sequence if str(a).strip()]
+
+    return {
+        'bin_pattern': bin_pattern,
+        'aisle_sequence': ','.join(aisle_sequence) or None,
+        'serpentine': bool(data.get('serpentine', True))
+    }
+
+
+def save_layout(warehouse_code, data, user_id=None):
+    """Create or update the layout of a warehouse"""
+    values = validate_layout(data)
+    layout = PickRouteLayout.query.filter_by(warehouse_code=warehouse_code).first()
+    if layout is None:
+        layout = PickRouteLayout(warehouse_code=warehouse_code)
+        db.session.add(layout)
+    layout.bin_pattern = values['bin_pattern']
+    layout.aisle_sequence = values['aisle_sequence']
+    layout.serpentine = values['serpentine']
+    layout.updated_by = user_id
+    db.session.commit()
+    logging.info(f"🧭 Pick route layout saved for warehouse {warehouse_code}")
+    return layout
+
+
+def load_layouts(warehouse_codes):
+    """RouteLayout per warehouse code - configured ones from the database, generic for the rest"""
+    codes = {code for code in warehouse_codes if code}
+    layouts = {code: RouteLayout(code) for code in codes}
+    if codes:
+        for layout in PickRouteLayout.query.filter(PickRouteLayout.warehouse_code.in_(codes)):
+            try:
+                layouts[layout.warehouse_code] = RouteLayout.from_model(layout)
+            except re.error as e:
+                logging.warning(f"⚠️ Pick route layout for {layout.warehouse_code} ignored: {str(e)}")
+    return layouts
+
+
+def order_stops(stops, layouts):
+    """
+    Put stops in walk order and number them
+
+    Args:
+        stops: dicts with at least warehouse and bin_code
+        layouts: {warehouse_code: RouteLayout}
+
+    Returns:
+        New list of the same dicts, each with aisle, rack, level and sequence set
+    """
+    by_warehouse = {}
+    for stop in stops:
+        by_warehouse.setdefault(stop.get('warehouse') or '', []).append(stop)
+
+    ordered = []
+    for warehouse in sorted(by_warehouse):
+        layout = layouts.get(warehouse) or RouteLayout(warehouse)
+        routed, unparsed = [], []
+        for stop in by_warehouse[warehouse]:
+            location = layout.parse(stop.get('bin_code'))
+            stop['aisle'], stop['rack'], stop['level'] = location or (None, None, None)
+            if location:
+                routed.append(((layout.aisle_key(location[0]), _natural(location[1]), _natural(location[2]),
+                                _natural_code(stop['bin_code'])), stop))
+            else:
+                unparsed.append(stop)
+
+        routed.sort(key=lambda entry: entry[0])
+        aisle_index, previous_aisle, aisle_stops = -1, None, []
+        for key, stop in routed + [(None, None)]:
+            if key is None or key[0] != previous_aisle:
+                if aisle_stops and layout.serpentine and aisle_index % 2 == 1:
+                    # Already in (rack, level) order; a stable reverse sort on rack keeps levels ascending
+                    aisle_stops.sort(key=lambda entry: entry[0][1], reverse=True)
+                ordered.extend(s for _, s in aisle_stops)
+                if key is None:
+                    break
+                aisle_index, previous_aisle, aisle_stops = aisle_index + 1, key[0], []
+            aisle_stops.append((key, stop))
+
+        unparsed.sort(key=lambda s: (s.get('bin_code') is None, _natural_code(s.get('bin_code'))))
+        ordered.extend(unparsed)
+
+    for sequence, stop in enumerate(ordered, start=1):
+        stop['sequence'] = sequence
+    return ordered
+
+
+def _aisle_changes(locations):
+    """How often a walk over (warehouse, aisle) pairs moves to another aisle"""
+    changes, previous = 0, None
+    for location in locations:
+        if location[1] is None:
+            continue
+        if previous is not None and location != previous:
+            changes += 1
+        previous = location
+    return changes
+
+
+def _load_allocations(pick_list_ids):
+    """Lines and bin allocations of the pick lists as plain rows, in SAP line order"""
+    return (db.session.query(
+                PickListLine.pick_list_id, PickListLine.id.label('line_id'), PickListLine.line_number,
+                PickListLine.item_code, PickListLine.item_name, PickListLine.order_entry,
+                PickListLine.released_quantity, PickListLine.pick_status,
+                PickListBinAllocation.id.label('allocation_id'), PickListBinAllocation.bin_abs_entry,
+                PickListBinAllocation.bin_code, PickListBinAllocation.warehouse_code,
+                PickListBinAllocation.quantity, PickListBinAllocation.picked_quantity,
+                PickList.warehouse_code.label('pick_list_warehouse'))
+            .join(PickList, PickList.id == PickListLine.pick_list_id)
+            .outerjoin(PickListBinAllocation, PickListBinAllocation.pick_list_line_id == PickListLine.id)
+            .filter(PickListLine.pick_list_id.in_(pick_list_ids))
+            .order_by(PickListLine.pick_list_id, PickListLine.line_number, PickListBinAllocation.id)
+            .all())
+
+
+def route_pick_lists(pick_list_ids):
+    """
+    Walk route over the bin allocations of one pick list, or a wave of several
+
+    Allocations of the same bin are merged into one stop. Bin codes missing on
+    the allocation rows come from the reference data snapshot, so routing never
+    calls SAP.
+
+    Returns:
+        dict with success, stops (sequence, warehouse, bin, aisle/rack/level and
+        picks), line_order and walk statistics
+    """
+    started = time.perf_counter()
+    pick_list_ids = list(dict.fromkeys(pick_list_ids))
+    rows = _load_allocations(pick_list_ids)
+
+    missing = {str(row.bin_abs_entry) for row in rows if row.bin_abs_entry and not row.bin_code}
+    snapshot = {str(b.get('BinAbsEntry')): b for b in snapshot_rows('bins', missing)} if missing else {}
+
+    stops, unresolved, sap_order = {}, 0, []
+    for (pick_list_id, line_id, line_number, item_code, item_name, order_entry, released_quantity, pick_status,
+         allocation_id, bin_abs_entry, bin_code, warehouse, quantity, picked_quantity, pick_list_warehouse) in rows:
+        if bin_abs_entry and not bin_code:
+            cached = snapshot.get(str(bin_abs_entry))
+            if cached:
+                bin_code, warehouse = cached.get('BinCode'), warehouse or cached.get('Warehouse')
+            else:
+                unresolved += 1
+        warehouse = warehouse or pick_list_warehouse or ''
+
+        key = (warehouse, bin_abs_entry or bin_code)
+        stop = stops.get(key)
+        if stop is None:
+            stop = stops[key] = {'warehouse': warehouse, 'bin_abs_entry': bin_abs_entry,
+                                 'bin_code': bin_code, 'picks': []}
+        stop['picks'].append({
+            'pick_list_id': pick_list_id,
+            'line_id': line_id,
+            'line_number': line_number,
+            'item_code': item_code or order_entry,
+            'item_name': item_name,
+            'allocation_id': allocation_id,
+            'quantity': quantity if allocation_id else released_quantity,
+            'picked_quantity': picked_quantity or 0,
+            'pick_status': pick_status
+        })
+        sap_order.append(stop)
+
+    layouts = load_layouts({stop['warehouse'] for stop in stops.values()})
+    ordered = order_stops(list(stops.values()), layouts)
+
+    line_order = []
+    for stop in ordered:
+        for pick in stop['picks']:
+            line_order.append(pick['line_id'])
+    line_order = list(dict.fromkeys(line_order))
+
+    elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+    logging.info(f"🧭 Routed {len(rows)} allocations of {len(pick_list_ids)} pick list(s) "
+                 f"into {len(ordered)} stops in {elapsed_ms}ms")
+    return {
+        'success': True,
+        'pick_list_ids': pick_list_ids,
+        'stops': ordered,
+        'line_order': line_order,
+        'stats': {
+            'allocations': len(rows),
+            'stops': len(ordered),
+            'aisles': len({(s['warehouse'], s['aisle']) for s in ordered if s['aisle'] is not None}),
+            'aisle_changes': _aisle_changes((s['warehouse'], s['aisle']) for s in ordered),
+            'aisle_changes_sap_order': _aisle_changes((s['warehouse'], s['aisle']) for s in sap_order),
+            'unresolved_bins': unresolved,
+            'elapsed_ms': elapsed_ms
+        }
+    }
+
+
+def order_sap_pick_list(sap_pick_list, warehouse_code=None):
+    """
+    Reorder a pick list fetched from SAP (bin details already added by
+    enhance_pick_list_with_bin_details) in place: allocations of each line and
+    the lines themselves follow the walk route, a line at its first stop
+    """
+    lines = sap_pick_list.get('PickListsLines') or []
+    stops = []
+    for line in lines:
+        for allocation in line.get('DocumentLinesBinAllocations') or []:
+            stops.append({'warehouse': allocation.get('Warehouse') or warehouse_code or '',
+                          'bin_code': allocation.get('BinCode'), 'allocation': allocation, 'line': line})
+    if not stops:
+        return sap_pick_list
+
+    ordered = order_stops(stops, load_layouts({stop['warehouse'] for stop in stops}))
+    rank = {}
+    for stop in ordered:
+        rank[id(stop['allocation'])] = stop['sequence']
+        rank.setdefault(id(stop['line']), stop['sequence'])
+
+    unrouted = len(ordered) + 1
+    for line in lines:
+        if line.get('DocumentLinesBinAllocations'):
+            line['DocumentLinesBinAllocations'].sort(key=lambda a: rank.get(id(a), unrouted))
+    lines.sort(key=lambda line: rank.get(id(line), unrouted))
+    return sap_pick_list
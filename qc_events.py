@@ -0,0 +1,262 @@
+"""
+QC Dashboard Events
+Pushes document status changes (submit / approve / reject / post across GRPO,
+inventory, serial and direct transfers, deliveries and Multi GRN) to open QC
+dashboards over Server-Sent Events, so the page renders once instead of
+re-running every listing and count query on a refresh timer.
+
+- An after_flush hook writes one qc_dashboard_events row per status change in
+  the same transaction as the change, so rolled-back changes never appear.
+- One poller thread per process reads new events (a single indexed query
+  every QC_EVENTS_POLL_INTERVAL seconds, only while a dashboard is connected)
+  and fans them out to the local streams, which works across gunicorn
+  workers and on every database backend. Ids are allocated before commit, so
+  a slow transaction can commit an id below one already delivered: each poll
+  re-reads the last QC_EVENTS_LATE_WINDOW ids and skips the ones already seen.
+- Every open stream holds a gunicorn thread, so a process serves at most
+  half its GUNICORN_THREADS as streams.
+- Streams resume from Last-Event-ID; a client that fell too far behind is
+  told to reload (resync).
+"""
+
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+from sqlalchemy import event, inspect as sa_inspect
+
+from app import db
+from models import QCDashboardEvent
+
+POLL_INTERVAL = float(os.environ.get('QC_EVENTS_POLL_INTERVAL', '1'))
+STREAM_SECONDS = int(os.environ.get('QC_EVENTS_STREAM_SECONDS', '300'))  # Client reconnects after this
+WORKER_THREADS = int(os.environ.get('GUNICORN_THREADS', '8'))  # Same default as gunicorn_config.py
+# Per process; never more than half the threads, or streams could starve normal requests
+MAX_STREAMS = min(int(os.environ.get('QC_EVENTS_MAX_STREAMS', WORKER_THREADS // 2)), WORKER_THREADS // 2)
+LATE_WINDOW = int(os.environ.get('QC_EVENTS_LATE_WINDOW', '100'))  # Ids behind the newest that are re-read
+KEEPALIVE_SECONDS = 15
+REPLAY_LIMIT = 500
+RETRY_MS = 3000
+
+_capture_registered = False
+_tracked = {}  # model -> (document_type, number attribute)
+
+
+def _load_tracked():
+    """Document models shown on the QC dashboard (module models import the app)"""
+    if _tracked:
+        return _tracked
+
+    from models import DirectInventoryTransfer, InventoryTransfer, SerialItemTransfer, SerialNumberTransfer
+    from modules.grpo.models import GRPODocument
+    from modules.multi_grn_creation.models import MultiGRNBatch
+    from modules.sales_delivery.models import DeliveryDocument
+
+    _tracked.update({
+        GRPODocument: ('grpo', 'po_number'),
+        InventoryTransfer: ('inventory_transfer', 'transfer_request_number'),
+        SerialNumberTransfer: ('serial_transfer', 'transfer_number'),
+        SerialItemTransfer: ('serial_item_transfer', 'transfer_number'),
+        DirectInventoryTransfer: ('direct_transfer', 'transfer_number'),
+        DeliveryDocument: ('delivery', 'so_doc_num'),
+        MultiGRNBatch: ('multi_grn', 'batch_number'),
+    })
+    return _tracked
+
+
+# ----------------------------------------------------------------------
+# Capture
+# ----------------------------------------------------------------------
+
+def _capture_flush(session, flush_context):
+    tracked = _load_tracked()
+    rows = []
+    for obj in list(session.new) + list(session.dirty):
+        document = tracked.get(type(obj))
+        if document is None:
+            continue
+        if obj in session.new:
+            previous = None
+            if obj.status != 'submitted':
+                continue
+        else:
+            history = sa_inspect(obj).attrs['status'].history
+            if not history.deleted or history.deleted[0] == obj.status:
+                continue
+            previous = history.deleted[0]
+
+        document_type, number_attribute = document
+        number = getattr(obj, number_attribute)
+        rows.append({
+            'document_type': document_type,
+            'document_id': obj.id,
+            'document_number': str(number) if number is not None else None,
+            'status': obj.status,
+            'previous_status': previous,
+            'user_id': obj.user_id
+        })
+
+    if rows:
+        session.connection().execute(QCDashboardEvent.__table__.insert(), rows)
+
+
+def register_qc_event_capture(session):
+    """Record document status changes for the QC dashboard stream (after_flush, same transaction)"""
+    global _capture_registered
+    if _capture_registered:
+        return
+    event.listen(session, 'after_flush', _capture_flush)
+    _capture_registered = True
+    logging.info("✅ QC dashboard event capture registered (after_flush)")
+
+
+def latest_event_id():
+    """Id of the newest event - the page embeds it so the stream starts where the render ended"""
+    return db.session.query(db.func.max(QCDashboardEvent.id)).scalar() or 0
+
+
+# ----------------------------------------------------------------------
+# Fan-out
+# ----------------------------------------------------------------------
+
+class _Subscriber:
+    def __init__(self):
+        self.queue = queue.Queue(maxsize=REPLAY_LIMIT)
+        self.overflowed = False
+
+
+class _Broker:
+    """Polls qc_dashboard_events while anyone listens and hands new events to every local stream"""
+
+    def __init__(self):
+        self.subscribers = set()
+        self.lock = threading.Lock()
+        self.thread = None
+        self.last_id = 0
+        self.seen = set()  # Delivered ids within LATE_WINDOW of last_id
+
+    def subscribe(self, app):
+        subscriber = _Subscriber()
+        with self.lock:
+            if len(self.subscribers) >= MAX_STREAMS:
+                return None
+            self.subscribers.add(subscriber)
+            if self.thread is None or not self.thread.is_alive():
+                # Start from "now" before the caller replays its backlog, so nothing falls in between
+                self.last_id = latest_event_id()
+                self.seen = set(self._ids_since(self.last_id - LATE_WINDOW))
+                self.thread = threading.Thread(target=self._run, args=(app,), name='qc-events', daemon=True)
+                self.thread.start()
+        return subscriber
+
+    @staticmethod
+    def _ids_since(event_id):
+        return [event_id for (event_id,) in
+                db.session.query(QCDashboardEvent.id).filter(QCDashboardEvent.id > event_id)]
+
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            self.subscribers.discard(subscriber)
+
+    def _run(self, app):
+        logging.info("📡 QC dashboard event poller started")
+        while True:
+            with self.lock:
+                if not self.subscribers:
+                    self.thread = None
+                    break
+                subscribers = list(self.subscribers)
+
+            with app.app_context():
+                try:
+                    # Trailing window: catches ids that committed after a higher id was delivered
+                    events = [e.to_dict() for e in QCDashboardEvent.query
+                              .filter(QCDashboardEvent.id > self.last_id - LATE_WINDOW)
+                              .order_by(QCDashboardEvent.id).limit(REPLAY_LIMIT + LATE_WINDOW)]
+                except Exception as e:
+                    events = []
+                    logging.error(f"❌ QC dashboard event poll failed: {str(e)}")
+                finally:
+                    db.session.remove()
+
+            for item in events:
+                if item['id'] in self.seen:
+                    continue
+                self.seen.add(item['id'])
+                self.last_id = max(self.last_id, item['id'])
+                for subscriber in subscribers:
+                    try:
+                        subscriber.queue.put_nowait(item)
+                    except queue.Full:
+                        subscriber.overflowed = True
+            self.seen = {event_id for event_id in self.seen if event_id > self.last_id - LATE_WINDOW}
+            time.sleep(POLL_INTERVAL)
+        logging.info("📡 QC dashboard event poller stopped (no listeners)")
+
+
+_broker = _Broker()
+
+
+def _sse(data, event_name=None, event_id=None):
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    if event_name:
+        lines.append(f'event: {event_name}')
+    lines.append(f'data: {json.dumps(data, separators=(",", ":"))}')
+    return '\n'.join(lines) + '\n\n'
+
+
+def open_stream(app, since_id):
+    """
+    Subscribe to the event stream from since_id
+
+    Returns:
+        generator of SSE text, or None when this process already serves MAX_STREAMS streams
+        (always None when it runs fewer than two threads)
+    """
+    subscriber = _broker.subscribe(app)
+    if subscriber is None:
+        return None
+
+    # Replay what happened between the page render (or the last received event) and now
+    backlog = [e.to_dict() for e in QCDashboardEvent.query.filter(QCDashboardEvent.id > since_id)
+               .order_by(QCDashboardEvent.id).limit(REPLAY_LIMIT + 1)]
+    db.session.remove()
+
+    def generate():
+        replayed = set()
+        newest = since_id  # Sent as the SSE id, so Last-Event-ID never goes back on a late id
+        started = last_beat = time.monotonic()
+        try:
+            yield f'retry: {RETRY_MS}\n\n'
+            if len(backlog) > REPLAY_LIMIT:
+                yield _sse({'reason': 'too many missed events'}, 'resync')
+                return
+            for item in backlog:
+                replayed.add(item['id'])
+                newest = max(newest, item['id'])
+                yield _sse(item, 'status', newest)
+
+            while time.monotonic() - started < STREAM_SECONDS:
+                if subscriber.overflowed:
+                    yield _sse({'reason': 'client too slow'}, 'resync')
+                    return
+                try:
+                    item = subscriber.queue.get(timeout=1)
+                except queue.Empty:
+                    if time.monotonic() - last_beat >= KEEPALIVE_SECONDS:
+                        last_beat = time.monotonic()
+                        yield ': keepalive\n\n'
+                    continue
+                if item['id'] in replayed:
+                    continue  # Already sent in the replay
+                newest = max(newest, item['id'])
+                yield _sse(item, 'status', newest)
+        finally:
+            _broker.unsubscribe(subscriber)
+
+    return generate()
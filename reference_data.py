@@ -0,0 +1,319 @@
+"""
+Reference Data Bundle
+Keeps a versioned local snapshot of the SAP B1 data behind handheld dropdowns
+(warehouses, bins, document series, active items) and serves it as deltas.
+
+Each refresh compares SAP against the snapshot by content hash and stamps only
+the rows that changed (or disappeared, as tombstones) with a new bundle
+version. Devices keep the bundle in IndexedDB and ask for ?since_version=N, so
+a refresh with no SAP changes costs them an empty response.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+
+from flask import current_app
+
+from app import db
+from data_retention import purge_watermark
+from models import ReferenceDataEntry
+from sap_bulk_sync import bulk_upsert, content_hash, iter_sap_pages
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+MSGPACK_MIMETYPE = 'application/x-msgpack'
+
+ITEMS_RESOURCE = ("Items?$select=ItemCode,ItemName,InventoryUOM,ManageBatchNumbers,ManageSerialNumbers"
+                  "&$filter=Valid eq 'tYES' and Frozen eq 'tNO'")
+BINS_RESOURCE = "BinLocations?$select=AbsEntry,BinCode,Warehouse,Inactive"
+
+# dataset -> callable(sap) returning {entry_key: payload}
+DATASETS = {}
+
+_refresh_lock = threading.Lock()
+_scheduler_thread = None
+_background_refresh = None
+_background_lock = threading.Lock()
+
+
+def reference_dataset(name):
+    """Register the loader that reads a dataset from SAP"""
+    def register(func):
+        DATASETS[name] = func
+        return func
+    return register
+
+
+@reference_dataset('warehouses')
+def _load_warehouses(sap):
+    result = sap.get_warehouses_list()
+    if not result.get('success'):
+        raise RuntimeError(result.get('error', 'Warehouses unavailable'))
+    return {
+        wh['WarehouseCode']: {'WarehouseCode': wh['WarehouseCode'], 'WarehouseName': wh.get('WarehouseName')}
+        for wh in result.get('warehouses', [])
+    }
+
+
+@reference_dataset('bins')
+def _load_bins(sap):
+    entries = {}
+    for page in iter_sap_pages(sap, BINS_RESOURCE):
+        for bin_data in page:
+            entries[str(bin_data['AbsEntry'])] = {
+                'BinAbsEntry': bin_data['AbsEntry'],
+                'BinCode': bin_data.get('BinCode'),
+                'Warehouse': bin_data.get('Warehouse'),
+                'IsActive': 'N' if bin_data.get('Inactive') == 'tYES' else 'Y'
+            }
+    return entries
+
+
+@reference_dataset('series')
+def _load_series(sap):
+    entries = {}
+    for object_code, fetch in (('PO', sap.get_po_series), ('SO', sap.get_so_series),
+                               ('INVT', sap.get_invt_series), ('INVCNT', sap.get_invcnt_series)):
+        for series in fetch() or []:
+            entries[f"{object_code}:{series.get('Series')}"] = {
+                'ObjectCode': object_code,
+                'Series': series.get('Series'),
+                'SeriesName': series.get('SeriesName') or series.get('Name')
+            }
+    return entries
+
+
+@reference_dataset('items')
+def _load_items(sap):
+    entries = {}
+    for page in iter_sap_pages(sap, ITEMS_RESOURCE):
+        for item in page:
+            entries[item['ItemCode']] = {
+                'ItemCode': item['ItemCode'],
+                'ItemName': item.get('ItemName'),
+                'UoM': item.get('InventoryUOM'),
+                'Batch': item.get('ManageBatchNumbers') == 'tYES',
+                'Serial': item.get('ManageSerialNumbers') == 'tYES'
+            }
+    return entries
+
+
+def current_version():
+    """Highest bundle version stamped on any row (0 when the snapshot is empty)"""
+    return db.session.query(db.func.max(ReferenceDataEntry.version)).scalar() or 0
+
+
+def refresh_reference_data(sap, datasets=None):
+    """
+    Reload datasets from SAP and stamp changed rows with a new bundle version
+
+    A dataset whose loader fails or returns nothing is left untouched, so an
+    SAP outage never tombstones the devices' dropdowns.
+
+    Args:
+        sap: SAPIntegration instance
+        datasets: Optional list of dataset names (default: all)
+
+    Returns:
+        dict with success, version and per-dataset changed/deleted counts
+    """
+    with _refresh_lock:
+        if not sap.ensure_logged_in():
+            return {'success': False, 'error': 'SAP B1 connection unavailable'}
+
+        version = current_version() + 1
+        stats = {}
+        try:
+            for name in datasets or DATASETS:
+                try:
+                    loaded = DATASETS[name](sap)
+                except Exception as e:
+                    logging.warning(f"⚠️ Reference data {name} not refreshed: {str(e)}")
+                    stats[name] = {'error': str(e)}
+                    continue
+                if not loaded:
+                    logging.warning(f"⚠️ Reference data {name} not refreshed: SAP returned no rows")
+                    stats[name] = {'error': 'No rows returned'}
+                    continue
+                stats[name] = _merge_dataset(name, loaded, version)
+
+            changed = sum(s.get('changed', 0) + s.get('deleted', 0) for s in stats.values())
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"❌ Reference data refresh failed: {str(e)}")
+            return {'success': False, 'error': str(e)}
+
+        if changed:
+            logging.info(f"📚 Reference data version {version}: {changed} rows changed")
+        return {'success': True, 'version': current_version(), 'datasets': stats}
+
+
+def _merge_dataset(name, loaded, version):
+    """Write new, changed and removed rows of one dataset stamped with version"""
+    existing = {
+        row.entry_key: row
+        for row in db.session.query(ReferenceDataEntry.entry_key, ReferenceDataEntry.content_hash,
+                                    ReferenceDataEntry.deleted)
+        .filter(ReferenceDataEntry.dataset == name)
+    }
+
+    rows = []
+    for key, payload in loaded.items():
+        body = json.dumps(payload, sort_keys=True, separators=(',', ':'))
+        digest = content_hash({'payload': body}, ['payload'])
+        current = existing.get(key)
+        if current is None or current.deleted or current.content_hash != digest:
+            rows.append({'dataset': name, 'entry_key': key, 'payload': body,
+                         'content_hash': digest, 'version': version, 'deleted': False})
+    changed = len(rows)
+
+    deleted = 0
+    for key, current in existing.items():
+        if key not in loaded and not current.deleted:
+            rows.append({'dataset': name, 'entry_key': key, 'payload': '{}',
+                         'content_hash': current.content_hash, 'version': version, 'deleted': True})
+            deleted += 1
+
+    if rows:
+        bulk_upsert(ReferenceDataEntry.__tablename__, ['dataset', 'entry_key'], rows,
+                    ['payload', 'content_hash', 'version', 'deleted'])
+    return {'changed': changed, 'deleted': deleted, 'total': len(loaded)}
+
+
+def get_bundle(since_version=None, datasets=None):
+    """
+    Build the reference data bundle, or the delta since a version the device already holds
+
+    A device ahead of the server (snapshot rebuilt), or behind tombstones the
+    retention purger already removed, gets a full bundle and is told to
+    replace its copy.
+
+    Returns:
+        dict with version, full flag and {dataset: {upserts: [...], deletes: [...]}}
+    """
+    version = current_version()
+    full = (not since_version or since_version > version
+            or since_version < purge_watermark('reference_data_tombstones'))
+
+    query = ReferenceDataEntry.query
+    if datasets:
+        query = query.filter(ReferenceDataEntry.dataset.in_(datasets))
+    if full:
+        query = query.filter(ReferenceDataEntry.deleted.is_(False))
+    else:
+        query = query.filter(ReferenceDataEntry.version > since_version)
+
+    bundle = {name: {'upserts': [], 'deletes': []} for name in (datasets or DATASETS)}
+    for row in query.with_entities(ReferenceDataEntry.dataset, ReferenceDataEntry.entry_key,
+                                   ReferenceDataEntry.payload, ReferenceDataEntry.deleted):
+        section = bundle.setdefault(row.dataset, {'upserts': [], 'deletes': []})
+        if row.deleted:
+            section['deletes'].append(row.entry_key)
+        else:
+            section['upserts'].append({'key': row.entry_key, **json.loads(row.payload)})
+
+    return {'version': version, 'full': full, 'datasets': bundle}
+
+
+def snapshot_rows(dataset, keys=None, match=None):
+    """
+    Current payloads of one dataset - served as stale data while SAP is unavailable
+
+    Args:
+        keys: Only these entry keys
+        match: Only rows whose payload has these field values, e.g. {'Warehouse': 'WH01'};
+            narrowed in SQL on the stored JSON text, then checked exactly
+    """
+    query = db.session.query(ReferenceDataEntry.payload).filter(
+        ReferenceDataEntry.dataset == dataset, ReferenceDataEntry.deleted.is_(False))
+    if keys is not None:
+        query = query.filter(ReferenceDataEntry.entry_key.in_(list(keys)))
+    for field, value in (match or {}).items():
+        fragment = json.dumps({field: value}, separators=(',', ':'))[1:-1]
+        fragment = fragment.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        query = query.filter(ReferenceDataEntry.payload.like(f'%{fragment}%', escape='\\'))
+    rows = [json.loads(row.payload) for row in query]
+    if match:
+        rows = [row for row in rows if all(row.get(field) == value for field, value in match.items())]
+    return rows
+
+
+def encode_bundle(bundle, accept=''):
+    """
+    Serialise a bundle for the wire: MessagePack when the client asks for it and
+    msgpack is installed, JSON otherwise. Compression is negotiated by the
+    response pipeline.
+
+    Returns:
+        (body bytes, mimetype)
+    """
+    if msgpack is not None and MSGPACK_MIMETYPE in (accept or ''):
+        return msgpack.packb(bundle), MSGPACK_MIMETYPE
+    return current_app.json.dumps(bundle).encode('utf-8'), 'application/json'
+
+
+def refresh_in_background(app):
+    """
+    Start a one-off refresh in a background thread unless one is already running
+    (builds the first snapshot without holding up a request)
+    """
+    global _background_refresh
+
+    with _background_lock:
+        if _background_refresh and _background_refresh.is_alive():
+            return _background_refresh
+        _background_refresh = threading.Thread(target=_background_run, args=(app,),
+                                               name='reference-data-build', daemon=True)
+        _background_refresh.start()
+        return _background_refresh
+
+
+def _background_run(app):
+    from sap_integration import SAPIntegration
+    with app.app_context():
+        try:
+            refresh_reference_data(SAPIntegration())
+        except Exception as e:
+            logging.error(f"❌ Reference data background refresh error: {str(e)}")
+        finally:
+            db.session.remove()
+
+
+def start_reference_data_scheduler(app, interval_seconds=None):
+    """
+    Refresh the reference data snapshot from SAP in a background thread.
+    Interval comes from REFERENCE_DATA_REFRESH_INTERVAL (seconds, 0 disables).
+    """
+    global _scheduler_thread
+
+    if interval_seconds is None:
+        interval_seconds = int(os.environ.get('REFERENCE_DATA_REFRESH_INTERVAL', '0') or 0)
+    if interval_seconds <= 0:
+        logging.info("ℹ️ Reference data background refresh disabled (REFERENCE_DATA_REFRESH_INTERVAL not set)")
+        return None
+    if _scheduler_thread and _scheduler_thread.is_alive():
+        return _scheduler_thread
+
+    def run():
+        from sap_integration import SAPIntegration
+        while True:
+            with app.app_context():
+                try:
+                    refresh_reference_data(SAPIntegration())
+                except Exception as e:
+                    logging.error(f"❌ Reference data scheduler error: {str(e)}")
+                finally:
+                    db.session.remove()
+            time.sleep(interval_seconds)
+
+    _scheduler_thread = threading.Thread(target=run, name='reference-data-refresh', daemon=True)
+    _scheduler_thread.start()
+    logging.info(f"✅ Reference data background refresh every {interval_seconds}s")
+    return _scheduler_thread
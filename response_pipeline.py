@@ -0,0 +1,159 @@
+"""
+Response Pipeline
+Fast JSON serialisation and negotiated response compression for the Flask app.
+
+- OrjsonProvider replaces Flask's json provider when orjson is installed.
+  Dates keep Flask's HTTP-date wire format and Decimals are still sent as
+  strings, so existing clients see identical values.
+- init_compression() gzips (or brotli-compresses, when the brotli package is
+  installed) text responses above RESPONSE_COMPRESS_MIN_BYTES for clients
+  that accept it. Streamed and file responses are left alone.
+"""
+
+import dataclasses
+import gzip
+import logging
+import os
+import uuid
+from datetime import date
+from decimal import Decimal
+
+from flask import request
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.http import http_date, parse_accept_header
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESS_MIN_BYTES = int(os.environ.get('RESPONSE_COMPRESS_MIN_BYTES', '1024'))
+GZIP_LEVEL = int(os.environ.get('RESPONSE_GZIP_LEVEL', '6'))
+BROTLI_QUALITY = int(os.environ.get('RESPONSE_BROTLI_QUALITY', '5'))
+
+COMPRESSIBLE_MIMETYPES = {
+    'application/json', 'application/javascript', 'application/x-msgpack', 'application/xml',
+    'text/html', 'text/css', 'text/plain', 'text/csv', 'text/javascript', 'image/svg+xml',
+}
+
+
+def _orjson_default(value):
+    """Types orjson does not serialise the way Flask's provider does"""
+    if isinstance(value, date):
+        return http_date(value)
+    if isinstance(value, Decimal):
+        return str(value)
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return dataclasses.asdict(value)
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if hasattr(value, '__html__'):
+        return str(value.__html__())
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+if orjson is not None:
+    ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+else:
+    ORJSON_OPTIONS = 0
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson; falls back to the stdlib encoder for anything orjson rejects"""
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            # json.dumps-only options (indent, cls, ...) - keep the stdlib behaviour
+            return super().dumps(obj, **kwargs)
+        try:
+            return orjson.dumps(obj, default=_orjson_default, option=ORJSON_OPTIONS).decode('utf-8')
+        except TypeError:
+            return super().dumps(obj)
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        try:
+            body = orjson.dumps(obj, default=_orjson_default,
+                                option=ORJSON_OPTIONS | orjson.OPT_APPEND_NEWLINE)
+        except TypeError:
+            body = f"{super().dumps(obj)}\n"
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+def init_json_provider(app):
+    """Install the orjson provider when orjson is available"""
+    if orjson is None:
+        logging.info("ℹ️ orjson not installed - using Flask's default JSON provider")
+        return False
+    app.json = OrjsonProvider(app)
+    logging.info("✅ orjson JSON provider enabled")
+    return True
+
+
+def choose_encoding(accept_encoding):
+    """Best content coding the client accepts: br (if available), gzip, or None"""
+    accepted = parse_accept_header(accept_encoding or '')
+    if brotli is not None and accepted.quality('br') > 0:
+        return 'br'
+    if accepted.quality('gzip') > 0:
+        return 'gzip'
+    return None
+
+
+def compress_body(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL)
+
+
+def compress_response(response, accept_encoding):
+    """Compress a buffered response in place when it is worth it and the client accepts it"""
+    if (response.direct_passthrough or response.is_streamed
+            or response.status_code < 200 or response.status_code in (204, 206, 304)
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = choose_encoding(accept_encoding)
+    if encoding is None:
+        return response
+
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_BYTES:
+        return response
+
+    response.set_data(compress_body(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+    if response.headers.get('ETag'):
+        # Strong validators must differ between encodings
+        response.headers['ETag'] = response.headers['ETag'].rstrip('"') + f'-{encoding}"'
+    return response
+
+
+def compression_enabled():
+    return os.environ.get('RESPONSE_COMPRESSION', 'true').lower() not in ('0', 'false', 'no')
+
+
+def init_compression(app):
+    """Register the compression after_request hook (RESPONSE_COMPRESSION=false disables it)"""
+    if not compression_enabled():
+        logging.info("ℹ️ Response compression disabled (RESPONSE_COMPRESSION=false)")
+        return False
+
+    @app.after_request
+    def _compress(response):
+        return compress_response(response, request.headers.get('Accept-Encoding', ''))
+
+    logging.info(f"✅ Response compression enabled ({'br, ' if brotli else ''}gzip above {COMPRESS_MIN_BYTES} bytes)")
+    return True
@@ -15,7 +15,10 @@ from models_extensions import Branch, UserSession, ModuleConfiguration
 from modules.grpo.models import GRPODocument, GRPOItem, GRPOSerialNumber, GRPOBatchNumber, PurchaseDeliveryNote
 from modules.multi_grn_creation.models import MultiGRNBatch
 from sap_integration import SAPIntegration
-from sqlalchemy import or_
+from inventory_counting_sync import merge_counting_document, push_counting_changes
+from streaming_export import EXPORTS, register_export, export_response
+from search_index import SearchSpec, apply_search
+from cold_archive import history_query
 
 # BinScanningLog is now imported above
 
@@ -234,95 +237,9 @@ def get_invcnt_details():
                     'error': f'Document is not open. Status: {doc_status}. Only open documents can be processed.'
                 }), 400
             
-            # Save document to local database
+            # Merge into the local tables - only new or changed lines are written
             try:
-                # Check if document already exists locally
-                local_doc = SAPInventoryCount.query.filter_by(doc_entry=int(doc_entry)).first()
-                
-                if local_doc:
-                    # Update existing document
-                    local_doc.doc_number = invcnt_data.get('DocNumber')
-                    local_doc.series = invcnt_data.get('Series')
-                    local_doc.count_date = invcnt_data.get('CountDate')
-                    local_doc.counting_type = invcnt_data.get('CountingType')
-                    local_doc.count_time = invcnt_data.get('CountTime')
-                    local_doc.single_counter_type = invcnt_data.get('SingleCounterType')
-                    local_doc.document_status = invcnt_data.get('DocumentStatus')
-                    local_doc.remarks = invcnt_data.get('Remarks')
-                    local_doc.reference_2 = invcnt_data.get('Reference2')
-                    local_doc.branch_id = invcnt_data.get('BPL_IDAssignedToInvoice')
-                    local_doc.financial_period = invcnt_data.get('FinancialPeriod')
-                    local_doc.counter_type = invcnt_data.get('CounterType')
-                    local_doc.counter_id = invcnt_data.get('CounterID')
-                    local_doc.multiple_counter_role = invcnt_data.get('MultipleCounterRole')
-                    local_doc.last_updated_at = datetime.utcnow()
-                    
-                    # Delete existing lines and recreate them
-                    SAPInventoryCountLine.query.filter_by(count_id=local_doc.id).delete()
-                else:
-                    # Create new document
-                    local_doc = SAPInventoryCount(
-                        doc_entry=int(doc_entry),
-                        doc_number=invcnt_data.get('DocNumber'),
-                        series=invcnt_data.get('Series'),
-                        count_date=invcnt_data.get('CountDate'),
-                        counting_type=invcnt_data.get('CountingType'),
-                        count_time=invcnt_data.get('CountTime'),
-                        single_counter_type=invcnt_data.get('SingleCounterType'),
-                        document_status=invcnt_data.get('DocumentStatus'),
-                        remarks=invcnt_data.get('Remarks'),
-                        reference_2=invcnt_data.get('Reference2'),
-                        branch_id=invcnt_data.get('BPL_IDAssignedToInvoice'),
-                        financial_period=invcnt_data.get('FinancialPeriod'),
-                        counter_type=invcnt_data.get('CounterType'),
-                        counter_id=invcnt_data.get('CounterID'),
-                        multiple_counter_role=invcnt_data.get('MultipleCounterRole'),
-                        user_id=current_user.id
-                    )
-                    db.session.add(local_doc)
-                    db.session.flush()
-                
-                # Save document lines
-                lines = invcnt_data.get('InventoryCountLines', [])
-                for line in lines:
-                    in_whs_qty = float(line.get('InWarehouseQuantity', 0))
-                    uom_counted_qty = float(line.get('UoMCountedQuantity', 0))
-                    variance = uom_counted_qty - in_whs_qty
-                    
-                    local_line = SAPInventoryCountLine(
-                        count_id=local_doc.id,
-                        line_number=line.get('LineNumber'),
-                        item_code=line.get('ItemCode'),
-                        item_description=line.get('ItemDescription'),
-                        warehouse_code=line.get('WarehouseCode'),
-                        bin_entry=line.get('BinEntry'),
-                        in_warehouse_quantity=in_whs_qty,
-                        counted=line.get('Counted', 'tNO'),
-                        uom_code=line.get('UoMCode'),
-                        bar_code=line.get('BarCode'),
-                        #uom_counted_quantity=uom_counted_qty,
-                        items_per_unit=line.get('ItemsPerUnit', 1),
-                        counter_type=line.get('CounterType'),
-                        counter_id=line.get('CounterID'),
-                        multiple_counter_role=line.get('MultipleCounterRole'),
-                        line_status=line.get('LineStatus'),
-                        project_code=line.get('ProjectCode'),
-                        manufacturer=line.get('Manufacturer'),
-                        supplier_catalog_no=line.get('SupplierCatalogNo'),
-                        preferred_vendor=line.get('PreferredVendor'),
-                        cost_code=line.get('CostCode'),
-                        u_floor=line.get('U_Floor'),
-                        u_rack=line.get('U_Rack'),
-                        u_level=line.get('U_Level'),
-                        freeze=line.get('Freeze', 'tNO'),
-                        u_invcount=line.get('U_InvCount'),
-                        variance=variance
-                    )
-                    db.session.add(local_line)
-                
-                db.session.commit()
-                logging.info(f"✅ Saved SAP counting document {doc_entry} to local database")
-                
+                merge_counting_document(invcnt_data, current_user.id)
             except Exception as e:
                 db.session.rollback()
                 logging.error(f"❌ Error saving counting document to local database: {str(e)}")
@@ -359,186 +276,30 @@ def update_inventory_counting():
                 'error': 'Both doc_entry and document are required'
             }), 400
         
-        # Initialize SAP integration
+        # Only lines changed since SAP last accepted them are PATCHed, in chunks
         sap = SAPIntegration()
-        
-        # Call the PATCH method
-        result = sap.update_inventory_counting(doc_entry, document)
+        result = push_counting_changes(sap, doc_entry, document, current_user.id)
         
         if result.get('success'):
-            # Update local database after successful PATCH
-            try:
-                # Helper to safely convert to float with default
-                def safe_float(value, default=0):
-                    if value is None or value == '':
-                        return default
-                    try:
-                        return float(value)
-                    except (ValueError, TypeError):
-                        return default
-                
-                local_doc = SAPInventoryCount.query.filter_by(doc_entry=int(doc_entry)).first()
-                
-                # Get lines from document - try both key names for compatibility
-                lines = document.get('InventoryCountingLines', []) or document.get('InventoryCountLines', [])
-                
-                if local_doc:
-                    # Update document header
-                    local_doc.last_updated_at = datetime.utcnow()
-                    local_doc.document_status = document.get('DocumentStatus', local_doc.document_status)
-                    local_doc.remarks = document.get('Remarks', local_doc.remarks)
-                    
-                    # Update counting lines based on submitted data
-                    for line_data in lines:
-                        line_number = line_data.get('LineNumber')
-                        local_line = SAPInventoryCountLine.query.filter_by(
-                            count_id=local_doc.id,
-                            line_number=line_number
-                        ).first()
-                        
-                        if local_line:
-                            # Update all relevant fields from SAP payload
-                            local_line.item_code = line_data.get('ItemCode', local_line.item_code)
-                            local_line.item_description = line_data.get('ItemDescription', local_line.item_description)
-                            local_line.warehouse_code = line_data.get('WarehouseCode', local_line.warehouse_code)
-                            local_line.bin_entry = line_data.get('BinEntry', local_line.bin_entry)
-                            local_line.in_warehouse_quantity = safe_float(line_data.get('InWarehouseQuantity'), local_line.in_warehouse_quantity or 0)
-                            local_line.uom_code = line_data.get('UoMCode', local_line.uom_code)
-                            local_line.bar_code = line_data.get('BarCode', local_line.bar_code)
-                            local_line.items_per_unit = safe_float(line_data.get('ItemsPerUnit'), local_line.items_per_unit or 1)
-                            local_line.counter_type = line_data.get('CounterType', local_line.counter_type)
-                            local_line.counter_id = line_data.get('CounterID', local_line.counter_id)
-                            local_line.line_status = line_data.get('LineStatus', local_line.line_status)
-                            local_line.u_floor = line_data.get('U_Floor', local_line.u_floor)
-                            local_line.u_rack = line_data.get('U_Rack', local_line.u_rack)
-                            local_line.u_level = line_data.get('U_Level', local_line.u_level)
-                            # Update counted quantity and status
-                            #local_line.uom_counted_quantity = safe_float(line_data.get('UoMCountedQuantity'), 0)
-                            local_line.counted = line_data.get('Counted', 'tNO')
-                            # Calculate variance from quantities if not provided by SAP
-                            if line_data.get('Variance') is not None:
-                                local_line.variance = safe_float(line_data.get('Variance'), 0)
-                            else:
-                                local_line.variance = local_line.uom_counted_quantity - (local_line.in_warehouse_quantity or 0)
-                            local_line.updated_at = datetime.utcnow()
-                        else:
-                            # Create new line if it doesn't exist locally
-                            in_wh_qty = safe_float(line_data.get('InWarehouseQuantity'), 0)
-                            counted_qty = safe_float(line_data.get('UoMCountedQuantity'), 0)
-                            # Calculate variance if not provided
-                            variance_val = line_data.get('Variance')
-                            if variance_val is None:
-                                variance_val = counted_qty - in_wh_qty
-                            else:
-                                variance_val = safe_float(variance_val, 0)
-                            
-                            new_line = SAPInventoryCountLine(
-                                count_id=local_doc.id,
-                                line_number=line_number,
-                                item_code=line_data.get('ItemCode', ''),
-                                item_description=line_data.get('ItemDescription', ''),
-                                warehouse_code=line_data.get('WarehouseCode', ''),
-                                bin_entry=line_data.get('BinEntry'),
-                                in_warehouse_quantity=in_wh_qty,
-                                counted=line_data.get('Counted', 'tNO'),
-                                uom_code=line_data.get('UoMCode', ''),
-                                bar_code=line_data.get('BarCode', ''),
-                                #uom_counted_quantity=counted_qty,
-                                items_per_unit=safe_float(line_data.get('ItemsPerUnit'), 1),
-                                variance=variance_val,
-                                counter_type=line_data.get('CounterType', ''),
-                                counter_id=line_data.get('CounterID'),
-                                line_status=line_data.get('LineStatus', ''),
-                                u_floor=line_data.get('U_Floor', ''),
-                                u_rack=line_data.get('U_Rack', ''),
-                                u_level=line_data.get('U_Level', '')
-                            )
-                            db.session.add(new_line)
-                    
-                    db.session.commit()
-                    logging.info(f"✅ Updated local counting document {doc_entry} after PATCH")
-                else:
-                    # Create new local document if it doesn't exist
-                    logging.info(f"Creating new local record for document {doc_entry}")
-                    local_doc = SAPInventoryCount(
-                        doc_entry=int(doc_entry),
-                        doc_number=document.get('DocumentNumber'),
-                        series=document.get('Series', 0),
-                        count_date=document.get('CountDate', ''),
-                        counting_type=document.get('CountingType', ''),
-                        count_time=document.get('CountTime', ''),
-                        single_counter_type=document.get('SingleCounterType', ''),
-                        document_status=document.get('DocumentStatus', ''),
-                        remarks=document.get('Remarks', ''),
-                        reference_2=document.get('Reference2', ''),
-                        branch_id=str(document.get('BPL_IDAssignedToInvoice', '')),
-                        financial_period=document.get('FinancialPeriod'),
-                        counter_type=document.get('CounterType', ''),
-                        counter_id=document.get('CounterID'),
-                        multiple_counter_role=document.get('MultipleCounterRole', ''),
-                        user_id=current_user.id,
-                        loaded_at=datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S'),
-                        last_updated_at=datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
-                    )
-                    db.session.add(local_doc)
-                    db.session.flush()  # Get the ID for the document
-                    
-                    # Add all line items
-                    for line_data in lines:
-                        in_wh_qty = safe_float(line_data.get('InWarehouseQuantity'), 0)
-                        counted_qty = safe_float(line_data.get('UoMCountedQuantity'), 0)
-                        # Calculate variance if not provided
-                        variance_val = line_data.get('Variance')
-                        if variance_val is None:
-                            variance_val = counted_qty - in_wh_qty
-                        else:
-                            variance_val = safe_float(variance_val, 0)
-                        
-                        new_line = SAPInventoryCountLine(
-                            count_id=local_doc.id,
-                            line_number=line_data.get('LineNumber', 0),
-                            item_code=line_data.get('ItemCode', ''),
-                            item_description=line_data.get('ItemDescription', ''),
-                            warehouse_code=line_data.get('WarehouseCode', ''),
-                            bin_entry=line_data.get('BinEntry'),
-                            in_warehouse_quantity=in_wh_qty,
-                            counted=line_data.get('Counted', 'tNO'),
-                            uom_code=line_data.get('UoMCode', ''),
-                            bar_code=line_data.get('BarCode', ''),
-                            #uom_counted_quantity=counted_qty,
-                            items_per_unit=safe_float(line_data.get('ItemsPerUnit'), 1),
-                            variance=variance_val,
-                            counter_type=line_data.get('CounterType', ''),
-                            counter_id=line_data.get('CounterID'),
-                            line_status=line_data.get('LineStatus', ''),
-                            u_floor=line_data.get('U_Floor', ''),
-                            u_rack=line_data.get('U_Rack', ''),
-                            u_level=line_data.get('U_Level', '')
-                        )
-                        db.session.add(new_line)
-                    
-                    db.session.commit()
-                    logging.info(f"✅ Created local counting document {doc_entry} with {len(lines)} lines after PATCH")
-                    
-            except Exception as e:
-                db.session.rollback()
-                logging.error(f"❌ Error updating local counting document: {str(e)}")
-                # Don't fail the request if local update fails
-            
             return jsonify({
                 'success': True,
-                'message': result.get('message'),
+                'message': f"Inventory counting {doc_entry} updated successfully ({result['lines_sent']} changed lines sent)",
                 'doc_entry': doc_entry,
-                'sap_response': result.get('sap_response')
+                'lines_sent': result['lines_sent'],
+                'lines_unchanged': result['lines_unchanged'],
+                'chunks': result['chunks'],
+                'warning': result.get('warning')
             })
         else:
             return jsonify({
                 'success': False,
                 'error': result.get('error'),
+                'lines_sent': result['lines_sent'],
                 'sap_response': result.get('sap_response')
             }), 400
             
     except Exception as e:
+        db.session.rollback()
         logging.error(f"Error in update_inventory_counting API: {str(e)}")
         return jsonify({
             'success': False,
@@ -1645,22 +1406,23 @@ def inventory_transfer():
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 10, type=int)  # Default 10, allow user selection
         
-        # Build query with search functionality
-        query = InventoryTransfer.query.filter_by(user_id=current_user.id)
+        # Build query with search functionality - hot and archived transfers (cold_archive history view)
+        query, transfers_table, _ = history_query('inventory_transfer')
+        query = query.filter(transfers_table.c.user_id == current_user.id)
         
         if search_term:
             query = query.filter(
                 db.or_(
-                    InventoryTransfer.transfer_request_number.contains(search_term),
-                    InventoryTransfer.status.contains(search_term),
-                    InventoryTransfer.sap_document_number.contains(search_term),
-                    InventoryTransfer.from_warehouse.contains(search_term),
-                    InventoryTransfer.to_warehouse.contains(search_term)
+                    transfers_table.c.transfer_request_number.contains(search_term),
+                    transfers_table.c.status.contains(search_term),
+                    transfers_table.c.sap_document_number.contains(search_term),
+                    transfers_table.c.from_warehouse.contains(search_term),
+                    transfers_table.c.to_warehouse.contains(search_term)
                 )
             )
         
         # Add pagination
-        transfers_pagination = query.order_by(InventoryTransfer.created_at.desc()).paginate(
+        transfers_pagination = query.order_by(transfers_table.c.created_at.desc()).paginate(
             page=page, per_page=per_page, error_out=False
         )
         
@@ -2826,6 +2588,10 @@ def qc_dashboard():
         flash('Access denied - QC permissions required', 'error')
         return redirect(url_for('dashboard'))
     
+    # Taken before the listings so the event stream replays anything that changes while they load
+    from qc_events import latest_event_id
+    qc_event_id = latest_event_id()
+    
     # Get pending transfers for QC approval
     pending_transfers = InventoryTransfer.query.filter_by(status='submitted').order_by(InventoryTransfer.created_at.desc()).all()
     
@@ -3049,7 +2815,31 @@ def qc_dashboard():
                          pending_count=len(pending_transfers) + len(pending_grpos) + len(pending_serial_transfers) + len(pending_serial_item_transfers) + len(pending_direct_transfers) + len(pending_deliveries) + len(pending_multi_grn_batches),
                          approved_today=approved_today,
                          rejected_today=rejected_today,
-                         avg_processing_time=avg_processing_time)
+                         avg_processing_time=avg_processing_time,
+                         qc_event_id=qc_event_id)
+
+@app.route('/qc_dashboard/events')
+@login_required
+def qc_dashboard_events():
+    """Server-Sent Events stream of document status changes for the QC dashboard"""
+    if not current_user.has_permission('qc_dashboard') and current_user.role not in ['admin', 'manager']:
+        return jsonify({'success': False, 'error': 'QC permissions required'}), 403
+
+    from flask import Response
+    from qc_events import open_stream
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('since', '0')
+    try:
+        since_id = int(last_event_id)
+    except ValueError:
+        since_id = 0
+
+    stream = open_stream(app, since_id)
+    if stream is None:
+        return jsonify({'success': False, 'error': 'Too many open QC dashboard streams'}), 503
+    return Response(stream, mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
 
 @app.route('/serial_item_transfer/<int:transfer_id>/qc_approve', methods=['POST'])
 @login_required
@@ -3669,6 +3459,11 @@ def post_serial_item_transfer_to_sap(transfer_id):
         db.session.rollback()
         return jsonify({'success': False, 'error': 'Internal server error'}), 500
 
+PICK_LIST_SEARCH = SearchSpec(
+    columns=[PickList.name, PickList.sales_order_number, PickList.customer_name, PickList.warehouse_code],
+    prefix_columns=[PickList.name, PickList.sales_order_number]
+)
+
 @app.route('/pick_list')
 @login_required
 def pick_list():
@@ -3688,14 +3483,7 @@ def pick_list():
     query = PickList.query
     
     # Apply search filters
-    if search_query:
-        search_filter = or_(
-            PickList.name.ilike(f'%{search_query}%'),
-            PickList.sales_order_number.ilike(f'%{search_query}%'),
-            PickList.customer_name.ilike(f'%{search_query}%'),
-            PickList.warehouse_code.ilike(f'%{search_query}%')
-        )
-        query = query.filter(search_filter)
+    query = apply_search(query, search_query, PICK_LIST_SEARCH)
     
     # Apply status filter
     if status_filter != 'all':
@@ -3717,18 +3505,14 @@ def pick_list():
         page=page, per_page=per_page, error_out=False
     )
     
-    # Try to sync with SAP B1 for latest data
+    # Open SAP pick lists come from the locally synced copy (kept fresh by pick_list_sync)
     try:
-        from sap_integration import SAPIntegration
-        sap = SAPIntegration()
-        sap_result = sap.get_pick_lists(limit=50)
-        if sap_result.get('success'):
-            # Store SAP pick lists count for display
-            sap_count = sap_result.get('total_count', 0)
-        else:
-            sap_count = 0
+        sap_count = PickList.query.filter(
+            PickList.absolute_entry.isnot(None),
+            PickList.status != 'ps_Closed'
+        ).count()
     except Exception as e:
-        logging.warning(f"Could not sync with SAP B1: {str(e)}")
+        logging.warning(f"Could not count synced SAP pick lists: {str(e)}")
         sap_count = 0
     
     return render_template('pick_list.html', 
@@ -3816,8 +3600,19 @@ def pick_list_detail(pick_list_id):
                         break
         except Exception as e:
             logging.warning(f"Could not search SAP B1 for pick list match: {str(e)}")
-    
-    return render_template('pick_list_detail.html', 
+
+    # Present lines in walk order rather than SAP line order
+    try:
+        from pick_route import order_sap_pick_list, route_pick_lists
+        if sap_pick_list:
+            order_sap_pick_list(sap_pick_list, pick_list.warehouse_code)
+        if pick_list_lines:
+            line_rank = {line_id: i for i, line_id in enumerate(route_pick_lists([pick_list.id])['line_order'])}
+            pick_list_lines.sort(key=lambda line: line_rank.get(line.id, len(line_rank)))
+    except Exception as e:
+        logging.warning(f"Could not order pick list {pick_list.id} by pick route: {str(e)}")
+
+    return render_template('pick_list_detail.html',
                          pick_list=pick_list, 
                          pick_list_lines=pick_list_lines,
                          sap_pick_list=sap_pick_list)
@@ -3905,72 +3700,29 @@ def sync_sap_pick_lists():
     
     try:
         from sap_integration import SAPIntegration
-        sap = SAPIntegration()
-        
-        # Get pick lists from SAP B1
-        sap_result = sap.get_pick_lists(limit=100)
-        if not sap_result.get('success'):
+        from pick_list_sync import sync_pick_lists
+
+        # Delta sync: only pick lists changed in SAP since the last watermark
+        full_sync = request.args.get('full', 'false').lower() == 'true'
+        result = sync_pick_lists(SAPIntegration(), owner_user_id=current_user.id, full=full_sync)
+        if not result.get('success'):
             return jsonify({
-                'success': False, 
-                'error': sap_result.get('error', 'Failed to fetch from SAP B1')
+                'success': False,
+                'error': result.get('error', 'Failed to fetch from SAP B1')
             })
-        
-        sap_pick_lists = sap_result.get('pick_lists', [])
-        synced_count = 0
-        updated_count = 0
-        
-        for sap_pick_list in sap_pick_lists:
-            absolute_entry = sap_pick_list.get('Absoluteentry')
-            if not absolute_entry:
-                continue
-            
-            # Check if pick list exists locally
-            existing_pick_list = PickList.query.filter_by(absolute_entry=absolute_entry).first()
-            
-            if existing_pick_list:
-                # Update existing record
-                existing_pick_list.status = sap_pick_list.get('Status', existing_pick_list.status)
-                existing_pick_list.remarks = sap_pick_list.get('Remarks', existing_pick_list.remarks)
-                if sap_pick_list.get('PickDate'):
-                    try:
-                        existing_pick_list.pick_date = datetime.strptime(
-                            sap_pick_list['PickDate'][:19], '%Y-%m-%dT%H:%M:%S'
-                        )
-                    except:
-                        pass
-                updated_count += 1
-            else:
-                # Create new record
-                pick_list = PickList(
-                    absolute_entry=absolute_entry,
-                    name=sap_pick_list.get('Name', f'SAP-{absolute_entry}'),
-                    owner_code=sap_pick_list.get('OwnerCode'),
-                    owner_name=sap_pick_list.get('OwnerName'),
-                    remarks=sap_pick_list.get('Remarks'),
-                    status=sap_pick_list.get('Status', 'ps_Open'),
-                    object_type=sap_pick_list.get('ObjectType', '156'),
-                    use_base_units=sap_pick_list.get('UseBaseUnits', 'tNO'),
-                    user_id=current_user.id
-                )
-                
-                if sap_pick_list.get('PickDate'):
-                    try:
-                        pick_list.pick_date = datetime.strptime(
-                            sap_pick_list['PickDate'][:19], '%Y-%m-%dT%H:%M:%S'
-                        )
-                    except:
-                        pass
-                
-                db.session.add(pick_list)
-                synced_count += 1
-        
-        db.session.commit()
-        
+
+        synced_count = result['inserted']
+        updated_count = result['updated']
+
         return jsonify({
             'success': True,
             'message': f'Synced {synced_count} new pick lists, updated {updated_count} existing ones',
             'synced_count': synced_count,
-            'updated_count': updated_count
+            'updated_count': updated_count,
+            'unchanged_count': result['unchanged'],
+            'lines_written': result['lines_written'],
+            'allocations_written': result['allocations_written'],
+            'watermark': result.get('watermark')
         })
         
     except Exception as e:
@@ -4336,58 +4088,11 @@ def mark_pick_list_line_as_picked(absolute_entry):
         if pick_list.user_id != current_user.id and current_user.role not in ['admin', 'manager']:
             return jsonify({'success': False, 'error': 'Access denied - You can only modify your own pick lists'}), 403
         
-        # Initialize SAP integration and update line status
         from sap_integration import SAPIntegration
-        sap = SAPIntegration()
-        
-        # Get current pick list data from SAP to build proper PATCH payload
-        sap_result = sap.get_pick_list_by_id(absolute_entry)
-        if not sap_result.get('success'):
-            return jsonify({'success': False, 'error': 'Failed to get pick list data from SAP'}), 500
-        
-        sap_pick_list = sap_result['pick_list']
-        
-        # Prepare data for line-level pick
-        line_pick_data = {
-            'line_number': line_number,
-            'item_code': item_code,
-            'picked_quantity': float(picked_quantity),
-            'sap_pick_list': sap_pick_list
-        }
-        
-        result = sap.update_pick_list_line_to_picked(absolute_entry, line_pick_data)
+        from pick_list_sync import confirm_pick_line
+        result = confirm_pick_line(SAPIntegration(), pick_list, line_number, item_code, picked_quantity)
         
         if result.get('success'):
-            # Update local database - find and update the specific line
-            from models import PickListLine
-            local_line = PickListLine.query.filter_by(
-                pick_list_id=pick_list.id,
-                line_number=line_number
-            ).first()
-            
-            if local_line:
-                local_line.pick_status = 'ps_Picked'
-                local_line.picked_quantity = float(picked_quantity)
-            
-            # Check if pick list is fully picked or partially picked
-            all_lines_picked = True
-            any_line_picked = False
-            
-            for line in sap_pick_list.get('PickListsLines', []):
-                if line.get('LineNumber') == line_number:
-                    # This line is now picked
-                    any_line_picked = True
-                elif line.get('PickStatus') == 'ps_Picked':
-                    any_line_picked = True
-                elif line.get('PickStatus') != 'ps_Picked':
-                    all_lines_picked = False
-            
-            # Update pick list status based on line statuses
-            if all_lines_picked:
-                pick_list.status = 'ps_Picked'
-            elif any_line_picked:
-                pick_list.status = 'ps_PartiallyPicked'
-            
             db.session.commit()
             
             logging.info(f"Pick list line {line_number} (Item: {item_code}) marked as picked successfully")
@@ -4411,6 +4116,80 @@ def mark_pick_list_line_as_picked(absolute_entry):
         logging.error(f"Error marking pick list line as picked: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/pick-list/<int:pick_list_id>/route')
+@login_required
+def pick_list_route(pick_list_id):
+    """Bin allocations of a pick list in walk order"""
+    if not current_user.has_permission('pick_list'):
+        return jsonify({'success': False, 'error': 'Access denied'}), 403
+
+    pick_list = PickList.query.get_or_404(pick_list_id)
+    if pick_list.user_id != current_user.id and current_user.role not in ['admin', 'manager']:
+        return jsonify({'success': False, 'error': 'Access denied - You can only view your own pick lists'}), 403
+
+    try:
+        from pick_route import route_pick_lists
+        return jsonify(route_pick_lists([pick_list.id]))
+    except Exception as e:
+        logging.error(f"Error routing pick list {pick_list_id}: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/pick-waves', methods=['POST'])
+@login_required
+def build_pick_wave():
+    """One walk route over several pick lists (JSON {"pick_list_ids": [...]})"""
+    if not current_user.has_permission('pick_list'):
+        return jsonify({'success': False, 'error': 'Access denied'}), 403
+
+    from pick_route import PICK_WAVE_MAX_LISTS, route_pick_lists
+    data = request.get_json(silent=True) or {}
+    try:
+        pick_list_ids = list(dict.fromkeys(int(i) for i in data.get('pick_list_ids') or []))
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'error': 'pick_list_ids must be a list of ids'}), 400
+    if not pick_list_ids:
+        return jsonify({'success': False, 'error': 'pick_list_ids is required'}), 400
+    if len(pick_list_ids) > PICK_WAVE_MAX_LISTS:
+        return jsonify({'success': False, 'error': f'A wave holds at most {PICK_WAVE_MAX_LISTS} pick lists'}), 400
+
+    owners = dict(db.session.query(PickList.id, PickList.user_id).filter(PickList.id.in_(pick_list_ids)))
+    missing = [i for i in pick_list_ids if i not in owners]
+    if missing:
+        return jsonify({'success': False, 'error': f'Pick lists not found: {missing}'}), 404
+    if current_user.role not in ['admin', 'manager'] and any(u != current_user.id for u in owners.values()):
+        return jsonify({'success': False, 'error': 'Access denied - You can only route your own pick lists'}), 403
+
+    try:
+        return jsonify(route_pick_lists(pick_list_ids))
+    except Exception as e:
+        logging.error(f"Error building pick wave: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/pick-route/layouts')
+@login_required
+def pick_route_layouts():
+    """Configured warehouse layouts used for pick routing"""
+    if current_user.role not in ['admin', 'manager']:
+        return jsonify({'success': False, 'error': 'Access denied'}), 403
+
+    from models import PickRouteLayout
+    layouts = PickRouteLayout.query.order_by(PickRouteLayout.warehouse_code).all()
+    return jsonify({'success': True, 'layouts': [layout.to_dict() for layout in layouts]})
+
+@app.route('/api/pick-route/layouts/<warehouse_code>', methods=['PUT'])
+@login_required
+def save_pick_route_layout(warehouse_code):
+    """Set how a warehouse's bin codes map to aisles (JSON {"bin_pattern", "aisle_sequence", "serpentine"})"""
+    if current_user.role not in ['admin', 'manager']:
+        return jsonify({'success': False, 'error': 'Access denied'}), 403
+
+    from pick_route import save_layout
+    try:
+        layout = save_layout(warehouse_code, request.get_json(silent=True) or {}, current_user.id)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    return jsonify({'success': True, 'layout': layout.to_dict()})
+
 @app.route('/pick_list/<int:pick_list_id>/reject', methods=['POST'])
 @login_required
 def reject_pick_list(pick_list_id):
@@ -4504,6 +4283,12 @@ def inventory_counting_sap():
                          doc_num=doc_num, 
                          series=series)
 
+# Counting documents are found by number only - integer columns, matched exactly
+COUNTING_HISTORY_SEARCH = SearchSpec(
+    columns=[],
+    numeric_columns=[SAPInventoryCount.doc_entry, SAPInventoryCount.doc_number, SAPInventoryCount.series]
+)
+
 @app.route('/inventory_counting_history')
 @login_required
 def inventory_counting_history():
@@ -4524,15 +4309,7 @@ def inventory_counting_history():
             db.joinedload(SAPInventoryCount.lines)
         ).filter_by(user_id=current_user.id)
         
-        if search_term:
-            search_pattern = f'%{search_term}%'
-            query = query.filter(
-                db.or_(
-                    SAPInventoryCount.doc_entry.cast(db.String).ilike(search_pattern),
-                    SAPInventoryCount.doc_number.cast(db.String).ilike(search_pattern),
-                    SAPInventoryCount.series.cast(db.String).ilike(search_pattern)
-                )
-            )
+        query = apply_search(query, search_term, COUNTING_HISTORY_SEARCH)
         
         if status_filter:
             query = query.filter(SAPInventoryCount.document_status == status_filter)
@@ -4857,6 +4634,86 @@ def get_qr_code_history():
             'error': str(e)
         })
 
+
+def _inventory_counting_export_query(user):
+    """One row per counting line with its document header"""
+    query = db.session.query(
+        SAPInventoryCount.doc_entry.label('doc_entry'),
+        SAPInventoryCount.doc_number.label('doc_number'),
+        SAPInventoryCount.series.label('series'),
+        SAPInventoryCount.document_status.label('document_status'),
+        SAPInventoryCount.count_date.label('count_date'),
+        SAPInventoryCount.loaded_at.label('loaded_at'),
+        SAPInventoryCountLine.line_number.label('line_number'),
+        SAPInventoryCountLine.item_code.label('item_code'),
+        SAPInventoryCountLine.item_description.label('item_description'),
+        SAPInventoryCountLine.warehouse_code.label('warehouse_code'),
+        SAPInventoryCountLine.bin_entry.label('bin_entry'),
+        SAPInventoryCountLine.in_warehouse_quantity.label('in_warehouse_quantity'),
+        SAPInventoryCountLine.uom_counted_quantity.label('counted_quantity'),
+        SAPInventoryCountLine.variance.label('variance'),
+        SAPInventoryCountLine.counted.label('counted'),
+        SAPInventoryCountLine.line_status.label('line_status')
+    ).join(SAPInventoryCountLine, SAPInventoryCountLine.count_id == SAPInventoryCount.id)
+    if user.role != 'admin':
+        query = query.filter(SAPInventoryCount.user_id == user.id)
+    return query.order_by(SAPInventoryCount.loaded_at.desc(), SAPInventoryCountLine.line_number)
+
+
+register_export('inventory_counts', _inventory_counting_export_query, [
+    ('DocEntry', 'doc_entry'), ('DocNum', 'doc_number'), ('Series', 'series'), ('Status', 'document_status'),
+    ('Count Date', 'count_date'), ('Loaded At', 'loaded_at'), ('Line', 'line_number'),
+    ('Item Code', 'item_code'), ('Description', 'item_description'), ('Warehouse', 'warehouse_code'),
+    ('Bin Entry', 'bin_entry'), ('In Warehouse', 'in_warehouse_quantity'), ('Counted Qty', 'counted_quantity'),
+    ('Variance', 'variance'), ('Counted', 'counted'), ('Line Status', 'line_status')
+], date_column=SAPInventoryCount.loaded_at, permission='inventory_counting')
+
+
+def _qr_label_export_query(user):
+    query = db.session.query(
+        QRCodeLabel.id.label('id'),
+        QRCodeLabel.label_type.label('label_type'),
+        QRCodeLabel.item_code.label('item_code'),
+        QRCodeLabel.item_name.label('item_name'),
+        QRCodeLabel.po_number.label('po_number'),
+        QRCodeLabel.batch_number.label('batch_number'),
+        QRCodeLabel.warehouse_code.label('warehouse_code'),
+        QRCodeLabel.bin_code.label('bin_code'),
+        QRCodeLabel.quantity.label('quantity'),
+        QRCodeLabel.uom.label('uom'),
+        QRCodeLabel.qr_format.label('qr_format'),
+        QRCodeLabel.created_at.label('created_at')
+    )
+    if user.role != 'admin':
+        query = query.filter(QRCodeLabel.user_id == user.id)
+    return query.order_by(QRCodeLabel.created_at.desc())
+
+
+register_export('qr_labels', _qr_label_export_query, [
+    ('ID', 'id'), ('Label Type', 'label_type'), ('Item Code', 'item_code'), ('Item Name', 'item_name'),
+    ('PO Number', 'po_number'), ('Batch', 'batch_number'), ('Warehouse', 'warehouse_code'), ('Bin', 'bin_code'),
+    ('Quantity', 'quantity'), ('UoM', 'uom'), ('Format', 'qr_format'), ('Created At', 'created_at')
+], date_column=QRCodeLabel.created_at)
+
+
+@app.route('/api/export/<dataset_name>')
+@login_required
+def export_dataset(dataset_name):
+    """Stream a history dataset as CSV or XLSX (?format=csv|xlsx&from_date=YYYY-MM-DD&to_date=YYYY-MM-DD)"""
+    dataset = EXPORTS.get(dataset_name)
+    if dataset is None:
+        return jsonify({'success': False, 'error': f'Unknown export {dataset_name}'}), 404
+    if not dataset.allowed(current_user):
+        return jsonify({'success': False, 'error': 'Access denied'}), 403
+
+    try:
+        return export_response(dataset, current_user._get_current_object(),
+                               export_format=request.args.get('format', 'csv').lower(),
+                               from_date=request.args.get('from_date'),
+                               to_date=request.args.get('to_date'))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
 @app.route('/api/scan_bin', methods=['POST'])
 @login_required
 def scan_bin():
@@ -5789,6 +5646,270 @@ def sync_sap_data():
     
     return redirect(url_for('dashboard'))
 
+@app.route('/api/replication/status')
+@login_required
+def replication_status():
+    """Queue depth and lag of the write-behind MySQL replication"""
+    if current_user.role not in ['admin', 'manager']:
+        return jsonify({'success': False, 'error': 'Access denied'}), 403
+
+    manager = app.config.get('DUAL_DB')
+    if not manager or not manager.mysql_engine:
+        return jsonify({'success': True, 'enabled': False})
+
+    try:
+        return jsonify({'success': True, **manager.get_replication_status()})
+    except Exception as e:
+        logging.error(f"Error reading replication status: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/scans/batch', methods=['POST'])
+@login_required
+def ingest_offline_scans():
+    """Batch upload of scans queued offline by the service worker (idempotent per scan key)"""
+    try:
+        data = request.get_json() or {}
+        scans = data.get('scans') or []
+
+        from offline_scan_ingest import ingest_batch, MAX_BATCH_SIZE
+        if len(scans) > MAX_BATCH_SIZE:
+            return jsonify({'success': False, 'error': f'At most {MAX_BATCH_SIZE} scans per batch'}), 413
+
+        result = ingest_batch(current_user, scans, device_id=data.get('device_id'))
+        return jsonify({'success': True, **result})
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Error ingesting offline scans: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/scans/conflicts')
+@login_required
+def offline_scan_conflicts():
+    """Offline scans the server could not apply - own scans, or everyone's for admins/managers"""
+    from models import OfflineScan
+    query = OfflineScan.query.filter(OfflineScan.status.in_(['conflict', 'rejected']))
+    if current_user.role not in ['admin', 'manager']:
+        query = query.filter_by(user_id=current_user.id)
+
+    scans = query.order_by(OfflineScan.received_at.desc()).limit(200).all()
+    return jsonify({
+        'success': True,
+        'conflicts': [{
+            'key': scan.idempotency_key,
+            'user_id': scan.user_id,
+            'device_id': scan.device_id,
+            'scan_type': scan.scan_type,
+            'barcode': scan.barcode,
+            'quantity': scan.quantity,
+            'context': json.loads(scan.context) if scan.context else {},
+            'status': scan.status,
+            'message': scan.message,
+            'scanned_at': scan.scanned_at.isoformat() if scan.scanned_at else None,
+            'received_at': scan.received_at.isoformat() if scan.received_at else None
+        } for scan in scans]
+    })
+
+@app.route('/api/reference-data')
+@login_required
+def reference_data_bundle():
+    """Versioned reference data for handheld dropdowns (?since_version=N returns only the changes)"""
+    from reference_data import current_version, refresh_in_background, get_bundle, encode_bundle
+    try:
+        since_version = request.args.get('since_version', type=int)
+        datasets = [name for name in request.args.get('datasets', '').split(',') if name] or None
+
+        # No snapshot yet: build it off the request thread and have the device retry
+        if current_version() == 0:
+            refresh_in_background(app)
+            response = jsonify({'success': False, 'error': 'Reference data is being built - retry shortly'})
+            response.headers['Retry-After'] = '30'
+            return response, 503
+
+        bundle = get_bundle(since_version=since_version, datasets=datasets)
+        body, mimetype = encode_bundle(bundle, request.headers.get('Accept', ''))
+        response = app.response_class(body, mimetype=mimetype)
+        response.vary.add('Accept')
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+    except Exception as e:
+        logging.error(f"Error building reference data bundle: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/reference-data/refresh', methods=['POST'])
+@login_required
+def refresh_reference_data_bundle():
+    """Reload the reference data snapshot from SAP now"""
+    if current_user.role not in ['admin', 'manager']:
+        return jsonify({'success': False, 'error': 'Access denied'}), 403
+
+    from reference_data import refresh_reference_data
+    datasets = (request.get_json(silent=True) or {}).get('datasets')
+    result = refresh_reference_data(SAPIntegration(), datasets=datasets)
+    return jsonify(result), (200 if result.get('success') else 502)
+
+@app.route('/api/serial-registry/rebuild', methods=['POST'])
+@login_required
+def rebuild_serial_registry_now():
+    """Recompute the serial registry from the serial tables (repair / backfill)"""
+    if current_user.role not in ['admin', 'manager']:
+        return jsonify({'success': False, 'error': 'Access denied'}), 403
+
+    from serial_registry import rebuild_serial_registry
+    result = rebuild_serial_registry()
+    return jsonify(result), (200 if result.get('success') else 500)
+
+@app.route('/api/data-retention')
+@login_required
+def data_retention_status():
+    """Retention policies with table sizes, rows due for purge and the last run"""
+    if current_user.role not in ['admin', 'manager']:
+        return jsonify({'success': False, 'error': 'Access denied'}), 403
+
+    try:
+        from data_retention import retention_status
+        return jsonify({'success': True, **retention_status()})
+    except Exception as e:
+        logging.error(f"Error building data retention status: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/data-retention/run', methods=['POST'])
+@login_required
+def run_data_retention_now():
+    """Run the retention purger now (optional JSON {"policies": [...]})"""
+    if current_user.role not in ['admin', 'manager']:
+        return jsonify({'success': False, 'error': 'Access denied'}), 403
+
+    from data_retention import run_retention
+    data = request.get_json(silent=True) or {}
+    result = run_retention(data.get('policies'))
+    return jsonify(result), (200 if result.get('success') else 500)
+
+@app.route('/api/history/<kind>')
+@login_required
+def document_history(kind):
+    """Documents of one type including archived ones (?search=&status=&from_date=&to_date=&page=&per_page=)"""
+    from cold_archive import get_document_type
+    from search_index import apply_search
+    from streaming_export import apply_date_range
+
+    document_type = get_document_type(kind)
+    if document_type is None:
+        return jsonify({'success': False, 'error': f'Unknown document type: {kind}'}), 404
+    if not current_user.has_permission(document_type.permission):
+        return jsonify({'success': False, 'error': 'Access denied'}), 403
+
+    try:
+        query, history, search = history_query(kind)
+        if current_user.role not in ['admin', 'manager']:
+            query = query.filter(history.c.user_id == current_user.id)
+        status = request.args.get('status', '').strip()
+        if status:
+            query = query.filter(history.c.status == status)
+        query = apply_search(query, request.args.get('search', '').strip(), search)
+        query = apply_date_range(query, history.c.created_at,
+                                 request.args.get('from_date'), request.args.get('to_date'))
+
+        page = request.args.get('page', 1, type=int)
+        per_page = min(request.args.get('per_page', 10, type=int), 100)
+        documents = query.order_by(history.c.created_at.desc(), history.c.id.desc()).paginate(
+            page=page, per_page=per_page, error_out=False)
+        return jsonify({
+            'success': True,
+            'documents': [row._asdict() for row in documents.items],
+            'page': documents.page,
+            'per_page': per_page,
+            'total': documents.total,
+            'pages': documents.pages
+        })
+    except Exception as e:
+        logging.error(f"Error loading {kind} history: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/history/<kind>/<int:document_id>')
+@login_required
+def document_history_detail(kind, document_id):
+    """One document with its lines, serials, batches and labels, whether hot or archived"""
+    from cold_archive import get_document_type, history_document
+
+    document_type = get_document_type(kind)
+    if document_type is None:
+        return jsonify({'success': False, 'error': f'Unknown document type: {kind}'}), 404
+    if not current_user.has_permission(document_type.permission):
+        return jsonify({'success': False, 'error': 'Access denied'}), 403
+
+    document = history_document(kind, document_id)
+    if document is None or (current_user.role not in ['admin', 'manager']
+                            and document.get('user_id') != current_user.id):
+        return jsonify({'success': False, 'error': 'Document not found'}), 404
+    return jsonify({'success': True, 'document': document})
+
+@app.route('/api/cold-archive/run', methods=['POST'])
+@login_required
+def run_cold_archive_now():
+    """Archive completed documents now (optional JSON {"kinds": [...], "older_than_days": N})"""
+    if current_user.role not in ['admin', 'manager']:
+        return jsonify({'success': False, 'error': 'Access denied'}), 403
+
+    from cold_archive import run_archival
+    data = request.get_json(silent=True) or {}
+    result = run_archival(data.get('kinds'), data.get('older_than_days'))
+    return jsonify(result), (200 if result.get('success') else 500)
+
+@app.route('/api/cold-archive/restore', methods=['POST'])
+@login_required
+def restore_archived_document():
+    """Move an archived document back into the working tables (JSON {"kind": ..., "id": ...})"""
+    if current_user.role not in ['admin', 'manager']:
+        return jsonify({'success': False, 'error': 'Access denied'}), 403
+
+    from cold_archive import restore_document
+    data = request.get_json(silent=True) or {}
+    if not data.get('kind') or not data.get('id'):
+        return jsonify({'success': False, 'error': 'kind and id are required'}), 400
+    result = restore_document(data['kind'], int(data['id']))
+    return jsonify(result), (200 if result.get('success') else 400)
+
+@app.route('/api/sap-gatekeeper/status')
+@login_required
+def sap_gatekeeper_status():
+    """Concurrency limits, queueing, shed calls and circuit breaker state of this worker's SAP gatekeeper"""
+    if current_user.role not in ['admin', 'manager']:
+        return jsonify({'success': False, 'error': 'Access denied'}), 403
+
+    from sap_gatekeeper import gatekeeper
+    return jsonify({'success': True, **gatekeeper.metrics()})
+
+@app.route('/api/sap-outbox/reconciliation')
+@login_required
+def sap_outbox_reconciliation():
+    """Queued, failed and abandoned SAP postings (?verify=true also checks each reference in SAP)"""
+    if current_user.role not in ['admin', 'manager']:
+        return jsonify({'success': False, 'error': 'Access denied'}), 403
+
+    try:
+        from sap_posting_outbox import reconciliation_report
+        verify = request.args.get('verify', 'false').lower() == 'true'
+        return jsonify({'success': True, **reconciliation_report(verify_in_sap=verify)})
+    except Exception as e:
+        logging.error(f"Error building SAP outbox reconciliation report: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/sap-outbox/<int:entry_id>/retry', methods=['POST'])
+@login_required
+def sap_outbox_retry(entry_id):
+    """Requeue a failed SAP posting; the dispatcher checks SAP for the reference before posting again"""
+    if current_user.role not in ['admin', 'manager']:
+        return jsonify({'success': False, 'error': 'Access denied'}), 403
+
+    try:
+        from sap_posting_outbox import requeue
+        if not requeue(entry_id):
+            return jsonify({'success': False, 'error': 'Only failed or dead postings can be retried'}), 400
+        return jsonify({'success': True, 'message': 'Posting queued for retry'})
+    except Exception as e:
+        logging.error(f"Error requeueing SAP posting {entry_id}: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 # Duplicate route removed - using the one defined earlier
 
 # Default admin user is created in app.py during initialization
@@ -0,0 +1,389 @@
+"""
+Async SAP Client
+asyncio counterpart of SAPIntegration for the hot read paths behind the scan
+and lookup APIs - item validation, bin lookup, document series, batch and
+serial availability and serial location.
+
+SAPIntegration blocks a worker thread for every Service Layer round trip and
+logs in again on every request. AsyncSAPIntegration keeps one
+httpx.AsyncClient (pooled keep-alive connections) and one SAP session per
+event loop, so hundreds of handheld requests can wait on a slow SAP from a
+single worker and Login only happens again after SAP answers 401.
+
+Method names, arguments and return dicts match SAPIntegration, so the async
+routes in asgi.py answer exactly like the Flask routes. Calls share the SAP
+gatekeeper (limits, circuit breaker, default timeouts) with the sync client.
+httpx is optional: without it asgi.py serves every route through Flask.
+"""
+
+import asyncio
+import logging
+import os
+import weakref
+
+from sap_capabilities import capability_registry
+from sap_gatekeeper import FAILURE_STATUSES, classify, default_timeout, gatekeeper
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+MAX_CONNECTIONS = int(os.environ.get('SAP_ASYNC_MAX_CONNECTIONS', '100'))
+
+# One client per event loop - httpx connections cannot be shared across loops
+_clients = weakref.WeakKeyDictionary()
+
+
+class AsyncSAPIntegration:
+
+    def __init__(self):
+        if httpx is None:
+            raise RuntimeError('httpx is not installed - the async SAP client is unavailable')
+        self.base_url = os.environ.get('SAP_B1_SERVER', '')
+        self.username = os.environ.get('SAP_B1_USERNAME', '')
+        self.password = os.environ.get('SAP_B1_PASSWORD', '')
+        self.company_db = os.environ.get('SAP_B1_COMPANY_DB', '')
+        self.session_id = None
+        self.client = httpx.AsyncClient(
+            verify=False,  # Same as SAPIntegration; in production use proper SSL
+            limits=httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_CONNECTIONS)
+        )
+        self._login_lock = asyncio.Lock()
+
+    async def close(self):
+        await self.client.aclose()
+
+    async def login(self):
+        """Login to SAP B1 Service Layer"""
+        if not self.base_url or not self.username or not self.password or not self.company_db:
+            logging.warning("SAP B1 configuration not complete. Running in offline mode.")
+            return False
+
+        try:
+            response = await self._send('POST', f"{self.base_url}/b1s/v1/Login", json={
+                "UserName": self.username,
+                "Password": self.password,
+                "CompanyDB": self.company_db
+            })
+            if response.status_code == 200:
+                self.session_id = response.json().get('SessionId')
+                logging.info("Successfully logged in to SAP B1 (async client)")
+                return True
+            logging.warning(f"SAP B1 login failed: {response.text}. Running in offline mode.")
+            return False
+        except Exception as e:
+            logging.warning(f"SAP B1 login error: {str(e)}. Running in offline mode.")
+            return False
+
+    async def ensure_logged_in(self):
+        """Ensure we have a valid session; concurrent callers share one Login"""
+        if self.session_id:
+            return True
+        async with self._login_lock:
+            if self.session_id:
+                return True
+            return await self.login()
+
+    async def _send(self, method, url, **kwargs):
+        """One HTTP call through the SAP gatekeeper (shared with the sync client)"""
+        endpoint_class = classify(method, url)
+        if kwargs.get('timeout') is None:
+            connect, read = default_timeout(endpoint_class)
+            kwargs['timeout'] = httpx.Timeout(read, connect=connect)
+        started = await gatekeeper.enter_async(endpoint_class)
+        failed = False
+        try:
+            response = await self.client.request(method, url, **kwargs)
+            failed = response.status_code in FAILURE_STATUSES
+            return response
+        except httpx.TransportError:
+            failed = True
+            raise
+        finally:
+            gatekeeper.exit(endpoint_class, started, failed)
+
+    async def _request(self, method, url, session_cookie=False, **kwargs):
+        """
+        One Service Layer call. A 401 means the shared session expired: the
+        first caller to see it logs in again and every caller retries once.
+        session_cookie sends B1SESSION explicitly, for URLs outside /b1s/v1
+        that the session cookie's path does not cover.
+        """
+        for attempt in range(2):
+            session_id = self.session_id
+            if session_cookie:
+                kwargs['headers'] = {**kwargs.get('headers', {}), 'Cookie': f'B1SESSION={session_id}'}
+            response = await self._send(method, url, **kwargs)
+            if response.status_code != 401 or attempt:
+                return response
+            async with self._login_lock:
+                if self.session_id == session_id:
+                    self.session_id = None
+                    if not await self.login():
+                        return response
+        return response
+
+    async def _sql_query(self, code, param_list=None, headers=None, timeout=None):
+        payload = {"ParamList": param_list} if param_list else None
+        return await self._request('POST', f"{self.base_url}/b1s/v1/SQLQueries('{code}')/List",
+                                   json=payload, headers=headers or {}, timeout=timeout)
+
+    async def validate_item_code(self, item_code):
+        """Validate ItemCode and get BatchNum, SerialNum, and NonBatch_NonSerialMethod from SAP B1"""
+        failure = {'success': False, 'item_code': item_code, 'batch_required': False,
+                   'serial_required': False, 'manage_method': 'N'}
+        if not await self.ensure_logged_in():
+            return {**failure, 'error': 'SAP B1 connection unavailable'}
+
+        try:
+            response = await self._sql_query('ItemCode_Batch_Serial_Val', f"itemCode='{item_code}'")
+            if response.status_code != 200:
+                logging.error(f"SAP B1 validation failed: {response.status_code} - {response.text}")
+                return {**failure, 'error': f'SAP B1 error: {response.status_code}'}
+
+            values = response.json().get('value', [])
+            if not values:
+                logging.warning(f"No validation data found for ItemCode: {item_code}")
+                return {**failure, 'error': f'Item {item_code} not found in SAP'}
+
+            result = values[0]
+            batch_num = result.get('BatchNum', 'N')
+            serial_num = result.get('SerialNum', 'N')
+            return {
+                'success': True,
+                'item_name': result.get('ItemName'),
+                'item_code': item_code,
+                'batch_required': batch_num == 'Y',
+                'serial_required': serial_num == 'Y',
+                'manage_method': result.get('NonBatch_NonSerialMethod', 'N'),
+                'batch_num': batch_num,
+                'serial_num': serial_num
+            }
+        except Exception as e:
+            logging.error(f"Error validating ItemCode {item_code}: {str(e)}")
+            return {**failure, 'error': str(e)}
+
+    async def _get_item_description(self, item_code):
+        """Get item description from SAP B1 Items master data"""
+        try:
+            if not item_code:
+                return "Unknown Item"
+            response = await self._request(
+                'GET', f"{self.base_url}/b1s/v1/Items?$filter=ItemCode eq '{item_code}'&$select=ItemCode,ItemName",
+                timeout=10)
+            if response.status_code == 200:
+                items = response.json().get('value', [])
+                if items:
+                    return items[0].get('ItemName', f'Item {item_code}')
+        except Exception as e:
+            logging.warning(f"⚠️ Could not fetch item description for {item_code}: {str(e)}")
+        return f'Item {item_code}'
+
+    async def validate_item_for_direct_transfer(self, item_code):
+        """Validate item code and determine if it's serial or batch managed"""
+        try:
+            if not await self.ensure_logged_in():
+                return {'valid': False, 'error': 'SAP B1 authentication failed'}
+
+            response = await self._sql_query('ItemCode_Batch_Serial_Val', f"itemCode='{item_code}'", timeout=10)
+            if response.status_code != 200:
+                logging.error(f"❌ SAP B1 API call failed: {response.status_code} - {response.text}")
+                return {'valid': False, 'error': f'SAP B1 API call failed: {response.status_code}'}
+
+            values = response.json().get('value', [])
+            if not values:
+                return {'valid': False, 'error': f'Item code {item_code} not found in SAP B1'}
+
+            item = values[0]
+            is_serial_managed = item.get('SerialNum', 'N') == 'Y'
+            is_batch_managed = item.get('BatchNum', 'N') == 'Y'
+            return {
+                'valid': True,
+                'item_code': item.get('ItemCode', item_code),
+                'item_description': await self._get_item_description(item_code),
+                'item_type': 'serial' if is_serial_managed else 'batch' if is_batch_managed else 'none',
+                'is_serial_managed': is_serial_managed,
+                'is_batch_managed': is_batch_managed
+            }
+        except Exception as e:
+            logging.error(f"❌ Error validating item: {str(e)}")
+            return {'valid': False, 'error': f'Error validating item: {str(e)}'}
+
+    async def get_warehouses_list(self):
+        """Get all warehouses from SAP B1"""
+        if not await self.ensure_logged_in():
+            return {'success': False, 'warehouses': [], 'error': 'SAP B1 connection unavailable'}
+
+        try:
+            response = await self._request('GET', f"{self.base_url}/b1s/v1/Warehouses?$select=WarehouseName,WarehouseCode",
+                                           headers={"Prefer": "odata.maxpagesize=0"})
+            if response.status_code == 200:
+                return {'success': True, 'warehouses': response.json().get('value', [])}
+            logging.warning(f"Failed to get warehouses: {response.status_code} - {response.text}")
+            return {'success': False, 'warehouses': [], 'error': f'SAP API error: {response.status_code}'}
+        except Exception as e:
+            logging.error(f"Error fetching warehouses: {str(e)}")
+            return {'success': False, 'warehouses': [], 'error': str(e)}
+
+    async def get_bin_locations_list(self, warehouse_code):
+        """Get bin locations for a specific warehouse using SQL Query"""
+        if not await self.ensure_logged_in():
+            return {'success': False, 'bins': [], 'error': 'SAP B1 connection unavailable'}
+
+        try:
+            response = await self._sql_query('GetBinCodeByWHCode', f"whsCode='{warehouse_code}'",
+                                             headers={"Prefer": "odata.maxpagesize=0"})
+            if response.status_code != 200:
+                logging.warning(f"Failed to get bin locations: {response.status_code} - {response.text}")
+                return {'success': False, 'bins': [], 'error': f'SAP API error: {response.status_code}'}
+
+            bins = [{
+                'BinCode': bin_data.get('BinCode'),
+                'BinName': bin_data.get('BinCode'),
+                'BinAbsEntry': bin_data.get('BinAbsEntry'),
+                'IsActive': bin_data.get('IsActive', 'N')
+            } for bin_data in response.json().get('value', [])]
+            return {'success': True, 'bins': bins}
+        except Exception as e:
+            logging.error(f"Error fetching bin locations: {str(e)}")
+            return {'success': False, 'bins': [], 'error': str(e)}
+
+    async def _get_series(self, code, label):
+        if not await self.ensure_logged_in():
+            logging.warning("SAP B1 not available, returning empty series list")
+            return []
+        try:
+            response = await self._sql_query(code)
+            if response.status_code == 200:
+                return response.json().get('value', [])
+            logging.warning(f"Failed to get {label} series: {response.status_code} - {response.text}")
+            return []
+        except Exception as e:
+            logging.error(f"Error fetching {label} series: {str(e)}")
+            return []
+
+    async def get_po_series(self):
+        """Get PO series from SAP B1 using SQLQueries"""
+        return await self._get_series('Get_PO_Series', 'PO')
+
+    async def get_invt_series(self):
+        """Get Inventory Transfer series from SAP B1 using SQLQueries"""
+        return await self._get_series('Get_INVT_Series', 'INVT')
+
+    async def get_batch_number_details(self, item_code):
+        """Get batch number details for a specific item (BatchNumberDetails outside /b1s/v1, like SAPIntegration)"""
+        try:
+            if not await self.ensure_logged_in():
+                return {'success': False, 'error': 'SAP B1 login failed'}
+
+            response = await self._request('GET', f"{self.base_url}/BatchNumberDetails", session_cookie=True,
+                                           headers={'Content-Type': 'application/json'},
+                                           params={'$filter': f"ItemCode eq '{item_code}'"})
+            if response.status_code == 200:
+                return {'success': True, 'batches': response.json().get('value', [])}
+            logging.error(f"❌ Error fetching batch details: {response.status_code} - {response.text}")
+            return {'success': False, 'error': f'HTTP {response.status_code}'}
+        except Exception as e:
+            logging.error(f"Error getting batch number details: {str(e)}")
+            return {'success': False, 'error': str(e)}
+
+    async def get_available_serial_numbers(self, item_code, warehouse_code):
+        """Fetch available serial numbers for an item in a specific warehouse (SerialNumberDetails)"""
+        if not await self.ensure_logged_in():
+            return {'success': False, 'error': 'SAP B1 connection unavailable'}
+
+        try:
+            filter_query = f"ItemCode eq '{item_code}' and WhsCode eq '{warehouse_code}' and Status eq '0'"
+            response = await self._request(
+                'GET', f"{self.base_url}/b1s/v1/SerialNumberDetails?$filter={filter_query}"
+                       f"&$select=DistNumber,ItemCode,WhsCode,SystemNumber,Status")
+            if response.status_code != 200:
+                logging.error(f"❌ SAP B1 API call failed: {response.status_code} - {response.text}")
+                return {'success': False, 'error': f'SAP B1 API call failed: {response.status_code}',
+                        'serial_numbers': []}
+
+            serial_numbers = [{
+                'serial_number': serial_data.get('DistNumber', ''),
+                'internal_serial': serial_data.get('DistNumber', ''),
+                'system_number': serial_data.get('SystemNumber', 0),
+                'warehouse_code': serial_data.get('WhsCode', ''),
+                'item_code': serial_data.get('ItemCode', ''),
+                'status': serial_data.get('Status', '0')
+            } for serial_data in response.json().get('value', []) if serial_data.get('DistNumber')]
+            return {
+                'success': True,
+                'item_code': item_code,
+                'warehouse_code': warehouse_code,
+                'serial_numbers': serial_numbers,
+                'count': len(serial_numbers)
+            }
+        except Exception as e:
+            logging.error(f"❌ Error fetching serial numbers: {str(e)}")
+            return {'success': False, 'error': f'Error fetching serial numbers: {str(e)}', 'serial_numbers': []}
+
+    async def get_bin_details(self, bin_abs_entry):
+        """Get bin location details from SAP B1"""
+        if not await self.ensure_logged_in():
+            return None
+        try:
+            response = await self._request(
+                'GET', f"{self.base_url}/b1s/v1/BinLocations?$select=AbsEntry,BinCode,Warehouse"
+                       f"&$filter=AbsEntry eq {bin_abs_entry}")
+            return response.json() if response.status_code == 200 else None
+        except Exception as e:
+            logging.error(f"Error fetching bin details: {str(e)}")
+            return None
+
+    async def get_serial_current_location(self, serial_number):
+        """Get current location of a serial number using the SQL Query, with SAPIntegration's fallback"""
+        if not await self.ensure_logged_in():
+            return {'success': False, 'error': 'SAP B1 connection unavailable'}
+
+        capability = "SQLQueries('get_serial_current_location')"
+        if not capability_registry.is_missing(self.company_db, capability):
+            try:
+                response = await self._sql_query('get_serial_current_location', f"serial_number='{serial_number}'")
+                capability_registry.record_response(self.company_db, capability, response)
+                if response.status_code == 200:
+                    values = response.json().get('value', [])
+                    if not values:
+                        return {'success': False, 'error': f'Serial number {serial_number} not found or has no quantity'}
+                    result = values[0]
+                    bin_abs = result.get('BinAbsEntry')
+                    return {
+                        'success': True,
+                        'data': result,
+                        'bin_details': await self.get_bin_details(bin_abs) if bin_abs else None
+                    }
+                logging.warning(f"SQL Query failed: {response.status_code} - {response.text}")
+            except Exception as e:
+                logging.error(f"Error with SQL query, trying fallback: {str(e)}")
+
+        # Rare path (query not deployed in this company) - reuse the sync fallback off the event loop
+        return await asyncio.to_thread(_sync_serial_location_fallback, serial_number)
+
+
+def _sync_serial_location_fallback(serial_number):
+    from sap_integration import SAPIntegration
+
+    sap = SAPIntegration()
+    if not sap.ensure_logged_in():
+        return {'success': False, 'error': 'SAP B1 connection unavailable'}
+    return sap._get_serial_location_fallback(serial_number)
+
+
+def get_async_sap():
+    """The shared AsyncSAPIntegration of the running event loop"""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = _clients[loop] = AsyncSAPIntegration()
+    return client
+
+
+async def close_async_sap():
+    """Close the running loop's client (ASGI lifespan shutdown)"""
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.close()
@@ -0,0 +1,319 @@
+"""
+SAP B1 Bulk Sync Engine
+Streams Service Layer pages into local tables with batched multi-row upserts,
+skipping rows whose content has not changed since the last sync
+
+Core writes never reach the flush capture of the MySQL replication, so the
+upserts (and the other Core and bulk writes of the syncs, through
+replicate_written / replicate_deletes) queue their rows for the mirror
+themselves.
+"""
+
+import hashlib
+import json
+import logging
+import re
+from datetime import date, datetime, time
+from decimal import Decimal, InvalidOperation
+
+from app import db
+from db_dual_support import get_replication
+
+DEFAULT_PAGE_SIZE = 500
+DEFAULT_BATCH_SIZE = 500
+
+# Decimal places compared by content hashes (SAP quantities and prices carry at most 6)
+NUMERIC_PLACES = 6
+NUMERIC_QUANTUM = Decimal(1).scaleb(-NUMERIC_PLACES)
+ISO_DATETIME = re.compile(r'^\d{4}-\d{2}-\d{2}(?:[T ]\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?)?(?:Z|[+-]\d{2}:?\d{2})?$')
+
+# Tables created by a sync in this process - avoids re-running CREATE TABLE IF NOT EXISTS every sync
+_ensured_tables = set()
+
+
+class SAPPageError(RuntimeError):
+    """SAP refused a page request; status_code and text let callers tell a missing field from an outage"""
+
+    def __init__(self, message, status_code, text):
+        super().__init__(message)
+        self.status_code = status_code
+        self.text = text or ''
+
+
+def get_dialect():
+    """Return the active database dialect name: postgresql, mysql or sqlite"""
+    return db.engine.dialect.name
+
+
+def ensure_table(table_name, ddl_by_dialect):
+    """Run the CREATE TABLE IF NOT EXISTS statement for the active dialect once per process"""
+    if table_name in _ensured_tables:
+        return
+    dialect = get_dialect()
+    ddl = ddl_by_dialect.get(dialect) or ddl_by_dialect.get('sqlite')
+    db.session.execute(db.text(ddl))
+    _ensured_tables.add(table_name)
+
+
+def _next_page_url(sap, data):
+    """Absolute URL of the page after data (None on the last page); nextLink may be absolute or relative"""
+    next_link = data.get('odata.nextLink') or data.get('@odata.nextLink')
+    if not next_link:
+        return None
+    if next_link.startswith('http'):
+        return next_link
+    if next_link.startswith('/'):
+        return f"{sap.base_url}{next_link}"
+    return f"{sap.base_url}/b1s/v1/{next_link}"
+
+
+def iter_sap_pages(sap, resource, page_size=DEFAULT_PAGE_SIZE):
+    """
+    Stream an SAP B1 Service Layer collection page by page following odata.nextLink
+
+    Args:
+        sap: Logged-in SAPIntegration instance
+        resource: Collection path relative to /b1s/v1/, may include $select/$filter
+        page_size: Rows per page requested through the Prefer header
+
+    Yields:
+        list of entity dicts for each page
+    """
+    url = f"{sap.base_url}/b1s/v1/{resource}"
+    headers = {"Prefer": f"odata.maxpagesize={page_size}"}
+
+    while url:
+        response = sap.session.get(url, headers=headers, timeout=60)
+        if response.status_code != 200:
+            raise SAPPageError(f"SAP B1 returned {response.status_code} for {resource}: {response.text}",
+                               response.status_code, response.text)
+
+        data = response.json()
+        yield data.get('value', [])
+        url = _next_page_url(sap, data)
+
+
+def sql_param_list(params):
+    """Build a SQLQueries ParamList string (values quoted, embedded quotes doubled)"""
+    return '&'.join(f"{name}='{str(value).replace(chr(39), chr(39) * 2)}'" for name, value in params.items())
+
+
+def iter_sql_query_pages(sap, sql_code, params=None, page_size=DEFAULT_PAGE_SIZE):
+    """
+    Stream the result of a registered SAP B1 SQLQuery page by page
+
+    Every page is a POST of the same ParamList to the List action (or to the
+    nextLink the Service Layer returns), so large results are never cut off
+    at the default page size.
+
+    Yields:
+        list of row dicts for each page
+    """
+    url = f"{sap.base_url}/b1s/v1/SQLQueries('{sql_code}')/List"
+    body = {"ParamList": sql_param_list(params)} if params else {}
+    headers = {"Prefer": f"odata.maxpagesize={page_size}"}
+
+    while url:
+        response = sap.session.post(url, json=body, headers=headers, timeout=60)
+        if response.status_code != 200:
+            raise SAPPageError(f"SAP B1 returned {response.status_code} for SQLQuery {sql_code}: {response.text}",
+                               response.status_code, response.text)
+
+        data = response.json()
+        yield data.get('value', [])
+        url = _next_page_url(sap, data)
+
+
+def _normalize(value):
+    """
+    Canonical text of a value, so SAP payloads and DB rows hash identically:
+    numbers (int, float, Decimal, MySQL 1/0 booleans) rounded to NUMERIC_PLACES
+    without trailing zeros, dates and datetimes (objects or ISO strings) in ISO
+    format with a midnight datetime as the bare date, other strings without
+    CHAR padding
+    """
+    if value is None:
+        return ''
+    if isinstance(value, (bool, int, float, Decimal)):
+        number = Decimal(str(int(value) if isinstance(value, bool) else value))
+        if not number.is_finite():
+            return str(number)
+        try:
+            number = number.quantize(NUMERIC_QUANTUM).normalize()
+        except InvalidOperation:
+            return str(number)  # More digits than the decimal context holds - compare unrounded
+        return '0' if number.is_zero() else format(number, 'f')
+    if isinstance(value, str):
+        value = value.rstrip()
+        if not ISO_DATETIME.match(value):
+            return value
+        try:
+            value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            return value
+    if isinstance(value, datetime):
+        value = value.replace(tzinfo=None)  # SAP sends UTC 'Z', the DB returns naive values
+        return value.date().isoformat() if value.time() == time.min else value.isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    return str(value)
+
+
+def content_hash(row, columns):
+    """Stable hash of the given columns of a row"""
+    payload = json.dumps([_normalize(row.get(column)) for column in columns])
+    return hashlib.md5(payload.encode('utf-8')).hexdigest()
+
+
+def _chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _key_filter(key_columns, rows):
+    """Row-value IN condition matching the key of every row, and its parameters"""
+    params = {}
+    key_tuples = []
+    for index, row in enumerate(rows):
+        placeholders = []
+        for column in key_columns:
+            param = f"k_{column}_{index}"
+            params[param] = row[column]
+            placeholders.append(f":{param}")
+        key_tuples.append(f"({', '.join(placeholders)})")
+    return f"({', '.join(key_columns)}) IN ({', '.join(key_tuples)})", params
+
+
+def _fetch_existing_hashes(table_name, key_columns, compare_columns, chunk):
+    """Load the current content hash of every row in the chunk with a single IN query"""
+    condition, params = _key_filter(key_columns, chunk)
+    select_columns = list(dict.fromkeys(key_columns + compare_columns))
+    sql = f"SELECT {', '.join(select_columns)} FROM {table_name} WHERE {condition}"
+
+    existing = {}
+    for db_row in db.session.execute(db.text(sql), params).mappings():
+        key = tuple(_normalize(db_row[column]) for column in key_columns)
+        existing[key] = content_hash(db_row, compare_columns)
+    return existing
+
+
+def replicate_written(table_name, key_columns, rows, connection=None):
+    """
+    Queue rows written by Core statements for the MySQL mirror. They are read back
+    by key_columns, so the mirror gets whole rows with the primary's ids. Only
+    mapped tables are replicated, as with the flush capture.
+    """
+    replication = get_replication()
+    table = db.metadata.tables.get(table_name)
+    if replication is None or table is None:
+        return
+    connection = connection if connection is not None else db.session.connection()
+    primary_key = [column.name for column in table.primary_key.columns]
+    for chunk in _chunks(rows, DEFAULT_BATCH_SIZE):
+        condition, params = _key_filter(key_columns, chunk)
+        written = connection.execute(db.text(f"SELECT * FROM {table_name} WHERE {condition}"), params).mappings().all()
+        replication.capture_rows(connection, table_name, 'UPSERT', written, key_columns=primary_key)
+
+
+def replicate_deletes(table, *criteria, connection=None):
+    """Queue for the MySQL mirror the rows of table matching criteria; call it before a Core or bulk delete"""
+    replication = get_replication()
+    if replication is None:
+        return
+    connection = connection if connection is not None else db.session.connection()
+    primary_key = list(table.primary_key.columns)
+    deleted = connection.execute(db.select(*primary_key).where(*criteria)).mappings().all()
+    replication.capture_rows(connection, table.name, 'DELETE', deleted,
+                             key_columns=[column.name for column in primary_key])
+
+
+def _upsert_sql(dialect, table_name, columns, key_columns, update_columns, row_count):
+    """Build one multi-row INSERT ... ON CONFLICT / ON DUPLICATE KEY UPDATE statement"""
+    values = ", ".join(
+        "(" + ", ".join(f":{column}_{index}" for column in columns) + ")"
+        for index in range(row_count)
+    )
+    sql = f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES {values}"
+
+    if dialect == 'mysql':
+        assignments = ", ".join(f"{column} = VALUES({column})" for column in update_columns)
+        return f"{sql} ON DUPLICATE KEY UPDATE {assignments}"
+
+    # PostgreSQL and SQLite (3.24+) share ON CONFLICT syntax
+    assignments = ", ".join(f"{column} = EXCLUDED.{column}" for column in update_columns)
+    return f"{sql} ON CONFLICT ({', '.join(key_columns)}) DO UPDATE SET {assignments}"
+
+
+def bulk_upsert(table_name, key_columns, rows, compare_columns, batch_size=DEFAULT_BATCH_SIZE, timestamps=True):
+    """
+    Upsert rows into table_name in batches, writing only new or changed rows
+
+    Each batch costs one SELECT (to diff content hashes) and at most one
+    multi-row upsert statement, so n rows take O(n / batch_size) round trips.
+
+    Args:
+        table_name: Target table with a unique constraint on key_columns
+        key_columns: Columns identifying a row
+        rows: Iterable of dicts (may be a generator streaming SAP pages)
+        compare_columns: Non-key columns that are written and compared
+        batch_size: Rows per SELECT/upsert round trip
+        timestamps: Maintain created_at/updated_at columns
+
+    Returns:
+        dict with inserted, updated, unchanged and total counts
+    """
+    dialect = get_dialect()
+    stats = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'total': 0}
+
+    for chunk in _chunks(rows, batch_size):
+        # Last occurrence wins when SAP returns the same key twice in a batch
+        unique_rows = {}
+        for row in chunk:
+            unique_rows[tuple(_normalize(row[column]) for column in key_columns)] = row
+        chunk = list(unique_rows.values())
+        stats['total'] += len(chunk)
+
+        existing = _fetch_existing_hashes(table_name, key_columns, compare_columns, chunk)
+
+        pending = []
+        for key, row in unique_rows.items():
+            if key not in existing:
+                stats['inserted'] += 1
+                pending.append(row)
+            elif existing[key] != content_hash(row, compare_columns):
+                stats['updated'] += 1
+                pending.append(row)
+            else:
+                stats['unchanged'] += 1
+
+        if not pending:
+            continue
+
+        columns = key_columns + compare_columns
+        update_columns = list(compare_columns)
+        if timestamps:
+            columns = columns + ['created_at', 'updated_at']
+            update_columns = update_columns + ['updated_at']
+
+        now = datetime.utcnow()
+        params = {}
+        for index, row in enumerate(pending):
+            for column in key_columns + compare_columns:
+                params[f"{column}_{index}"] = row.get(column)
+            if timestamps:
+                params[f"created_at_{index}"] = now
+                params[f"updated_at_{index}"] = now
+
+        sql = _upsert_sql(dialect, table_name, columns, key_columns, update_columns, len(pending))
+        db.session.execute(db.text(sql), params)
+        replicate_written(table_name, key_columns, pending)
+
+    logging.info(f"📦 Bulk sync {table_name}: {stats['inserted']} inserted, "
+                 f"{stats['updated']} updated, {stats['unchanged']} unchanged")
+    return stats
@@ -0,0 +1,135 @@
+"""
+SAP B1 Capability Registry
+Remembers which SQLQueries, entity sets and API versions exist in each SAP
+company database, so SAPIntegration fallback chains go straight to the
+strategy that works instead of paying for failed round trips on every call.
+
+Capabilities are learned lazily: the first call that gets a "does not exist"
+answer records it, and later calls skip that strategy until the entry expires.
+The registry is persisted next to sap_queries_validated.flag.
+"""
+
+import json
+import logging
+import os
+import re
+import threading
+from datetime import datetime, timedelta
+from urllib.parse import unquote, urlsplit
+
+CAPABILITY_FILE = '.local/state/sap_capabilities.json'
+
+# Answers that mean the strategy does not exist in this company (not a transient failure)
+MISSING_STATUSES = (404, 501)
+# On a 400 only these name the resource itself; 'not found' / 'no matching records'
+# alone are data errors (bad parameter, unknown key) and say nothing about the resource
+MISSING_MARKERS = ('invalid resource', 'unrecognized resource')
+# "No matching records" - the resource is missing when it is a SQLQuery or collection, not a keyed record
+NO_MATCHING_RECORDS = -2028
+SQL_QUERY_SEGMENT = re.compile(r"/SQLQueries\('[^']*'\)", re.IGNORECASE)
+
+
+def _error_code(response):
+    try:
+        return int(response.json()['error']['code'])
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+def _addresses_resource(response):
+    """The request named a SQLQuery or a whole collection rather than one record by key"""
+    url = getattr(getattr(response, 'request', None), 'url', None) or ''
+    path = unquote(urlsplit(url).path)
+    if SQL_QUERY_SEGMENT.search(path):
+        return True
+    return bool(path) and '(' not in path.split('/b1s/', 1)[-1]
+
+
+def is_missing_response(response):
+    """True when an SAP response says the query/entity set/API version does not exist"""
+    if response.status_code in MISSING_STATUSES:
+        return True
+    if response.status_code == 400:
+        text = (response.text or '').lower()
+        if any(marker in text for marker in MISSING_MARKERS):
+            return True
+        return _error_code(response) == NO_MATCHING_RECORDS and _addresses_resource(response)
+    return False
+
+
+class SAPCapabilityRegistry:
+    """Per-company record of SAP strategies known to be available or missing"""
+
+    def __init__(self, path=CAPABILITY_FILE, ttl_hours=None):
+        self.path = path
+        if ttl_hours is None:
+            ttl_hours = float(os.environ.get('SAP_CAPABILITY_TTL_HOURS', '24'))
+        self.ttl = timedelta(hours=ttl_hours)
+        self._lock = threading.Lock()
+        self._data = self._load()
+
+    def _load(self):
+        if os.environ.get('FORCE_SAP_VALIDATION', '').lower() in ('true', '1', 'yes'):
+            return {}
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self):
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(self._data, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logging.warning(f"⚠️ Could not persist SAP capability registry: {e}")
+
+    def _entry(self, company_db, capability):
+        entry = self._data.get(company_db or '', {}).get(capability)
+        if not entry:
+            return None
+        checked_at = datetime.fromisoformat(entry['checked_at'])
+        if datetime.utcnow() - checked_at > self.ttl:
+            return None
+        return entry
+
+    def is_missing(self, company_db, capability):
+        """True if the capability was recently found not to exist - callers skip straight to the next strategy"""
+        entry = self._entry(company_db, capability)
+        return bool(entry) and not entry['available']
+
+    def record(self, company_db, capability, available):
+        """Remember whether a capability exists; only writes the file when the answer changes"""
+        with self._lock:
+            company = self._data.setdefault(company_db or '', {})
+            previous = company.get(capability)
+            company[capability] = {'available': bool(available), 'checked_at': datetime.utcnow().isoformat()}
+            if previous is None or previous['available'] != bool(available):
+                if not available:
+                    logging.info(f"🧭 SAP capability '{capability}' not available in {company_db} - using fallback directly")
+                self._save()
+
+    def record_response(self, company_db, capability, response):
+        """Record the outcome of a call; transient errors (timeouts, 5xx) are not recorded"""
+        if response.status_code == 200:
+            self.record(company_db, capability, True)
+        elif is_missing_response(response):
+            self.record(company_db, capability, False)
+
+    def reset(self, company_db=None):
+        """Forget learned capabilities (e.g. after SQL queries were created in SAP)"""
+        with self._lock:
+            if company_db is None:
+                self._data = {}
+            else:
+                self._data.pop(company_db, None)
+            self._save()
+
+    def snapshot(self, company_db):
+        return dict(self._data.get(company_db or '', {}))
+
+
+capability_registry = SAPCapabilityRegistry()
@@ -0,0 +1,381 @@
+"""
+SAP Gatekeeper
+Every Service Layer call goes through one gatekeeper per process, so a slow
+SAP sees fewer WMS requests instead of more.
+
+- Endpoint classes: each call is classified as login, sql (SQLQueries and
+  $crossjoin), read (other GETs) or write (document POST/PATCH, $batch).
+  Each class has its own default timeout (used when the caller gives none)
+  and its own concurrency limit.
+- AdaptiveLimiter: the limit follows observed latency, gradient style.
+  While recent latency stays within SAP_GATE_LATENCY_TOLERANCE x the long-term
+  latency the limit grows by about sqrt(limit). When latency rises it shrinks
+  in proportion, and each timeout, connection error or 502/503/504 cuts it
+  by 10% (AIMD). Callers over the limit queue for up to
+  SAP_GATE_QUEUE_TIMEOUT seconds and are then shed.
+- CircuitBreaker: opens after SAP_BREAKER_FAILURES consecutive failures, or
+  when at least half of the last SAP_BREAKER_WINDOW calls failed. While open,
+  calls fail at once for SAP_BREAKER_COOLDOWN seconds. After that one trial
+  call decides whether it closes again.
+
+Shed and rejected calls raise SAPUnavailableError. It is a
+requests ConnectionError, so existing callers take their offline paths, and
+SAPIntegration serves the reference data snapshot (warehouses, bins, series,
+items) marked 'stale'. Limits and breaker state are per process.
+SAP_GATEKEEPER=false turns limiting and the breaker off; default timeouts
+still apply.
+"""
+
+import asyncio
+import logging
+import math
+import os
+import threading
+import time
+from collections import deque
+from urllib.parse import urlsplit
+
+import requests
+
+ENABLED = os.environ.get('SAP_GATEKEEPER', 'true').lower() not in ('0', 'false', 'no')
+QUEUE_TIMEOUT = float(os.environ.get('SAP_GATE_QUEUE_TIMEOUT', '10'))
+MAX_QUEUE = int(os.environ.get('SAP_GATE_MAX_QUEUE', '200'))
+LATENCY_TOLERANCE = float(os.environ.get('SAP_GATE_LATENCY_TOLERANCE', '2.0'))
+CONNECT_TIMEOUT = float(os.environ.get('SAP_CONNECT_TIMEOUT', '5'))
+
+BREAKER_FAILURES = int(os.environ.get('SAP_BREAKER_FAILURES', '5'))
+BREAKER_WINDOW = int(os.environ.get('SAP_BREAKER_WINDOW', '20'))
+BREAKER_COOLDOWN = float(os.environ.get('SAP_BREAKER_COOLDOWN', '30'))
+
+# Answers that mean SAP itself is struggling (business errors are 4xx and do not count)
+FAILURE_STATUSES = (502, 503, 504)
+
+# class -> initial, min and max concurrency and default read timeout (seconds)
+ENDPOINT_CLASSES = {
+    'login': {'initial': 4, 'min': 1, 'max': 8, 'timeout': 30},
+    'sql': {'initial': 16, 'min': 2, 'max': 64, 'timeout': 30},
+    'read': {'initial': 16, 'min': 2, 'max': 64, 'timeout': 30},
+    'write': {'initial': 8, 'min': 1, 'max': 16, 'timeout': 60},
+}
+
+
+def _class_settings(name):
+    """ENDPOINT_CLASSES entry with SAP_LIMIT_<CLASS>=initial,min,max and SAP_TIMEOUT_<CLASS> applied"""
+    settings = dict(ENDPOINT_CLASSES[name])
+    limits = os.environ.get(f'SAP_LIMIT_{name.upper()}')
+    if limits:
+        settings['initial'], settings['min'], settings['max'] = (int(v) for v in limits.split(','))
+    settings['timeout'] = float(os.environ.get(f'SAP_TIMEOUT_{name.upper()}', settings['timeout']))
+    return settings
+
+
+def classify(method, url):
+    """Endpoint class of a Service Layer call"""
+    path = urlsplit(url).path
+    if path.endswith(('/Login', '/Logout')):
+        return 'login'
+    if 'SQLQueries(' in path or '$crossjoin' in path:
+        return 'sql'
+    if method.upper() in ('GET', 'HEAD') and not path.endswith('$batch'):
+        return 'read'
+    return 'write'
+
+
+def default_timeout(endpoint_class):
+    """(connect, read) timeout for calls that do not set their own"""
+    return (CONNECT_TIMEOUT, _class_settings(endpoint_class)['timeout'])
+
+
+class SAPUnavailableError(requests.exceptions.ConnectionError):
+    """Call refused by the gatekeeper - circuit open or shed from a full queue"""
+
+    def __init__(self, reason, endpoint_class):
+        self.reason = reason
+        self.endpoint_class = endpoint_class
+        super().__init__(f"SAP B1 unavailable ({reason}, {endpoint_class})")
+
+
+class AdaptiveLimiter:
+    """Concurrency limit for one endpoint class that adapts to latency and failures"""
+
+    def __init__(self, name, initial, min_limit, max_limit, tolerance=LATENCY_TOLERANCE):
+        self.name = name
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.tolerance = tolerance
+        self.in_flight = 0
+        self.queued = 0
+        self.short_rtt = None
+        self.long_rtt = None
+        self._cond = threading.Condition()
+        self.stats = {'acquired': 0, 'queued': 0, 'shed': 0, 'dropped': 0, 'max_queued': 0,
+                      'wait_seconds': 0.0, 'max_wait_seconds': 0.0}
+
+    def _take(self):
+        if self.in_flight < max(int(self.limit), 1):
+            self.in_flight += 1
+            self.stats['acquired'] += 1
+            return True
+        return False
+
+    def try_acquire(self):
+        with self._cond:
+            return self._take()
+
+    def acquire(self, timeout=QUEUE_TIMEOUT):
+        """Take a slot, queueing up to timeout seconds; False means the call is shed"""
+        with self._cond:
+            if self._take():
+                return True
+            if not self.enqueue():
+                return False
+            started = time.monotonic()
+            deadline = started + timeout
+            acquired = False
+            while not acquired:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+                acquired = self._take()
+            self.dequeue(time.monotonic() - started, acquired)
+            return acquired
+
+    def enqueue(self):
+        """Count a caller waiting for a slot; False (shed) when the queue is full"""
+        if self.queued >= MAX_QUEUE:
+            self.stats['shed'] += 1
+            return False
+        self.queued += 1
+        self.stats['queued'] += 1
+        self.stats['max_queued'] = max(self.stats['max_queued'], self.queued)
+        return True
+
+    def dequeue(self, waited, acquired):
+        self.queued -= 1
+        self.stats['wait_seconds'] += waited
+        self.stats['max_wait_seconds'] = max(self.stats['max_wait_seconds'], waited)
+        if not acquired:
+            self.stats['shed'] += 1
+
+    def release(self, latency, dropped=False):
+        """Give the slot back and adapt the limit to how the call went"""
+        with self._cond:
+            in_flight = self.in_flight
+            self.in_flight -= 1
+            previous = int(self.limit)
+            if dropped:
+                self.stats['dropped'] += 1
+                self.limit = max(self.min_limit, self.limit * 0.9)
+            else:
+                self._adapt(latency, in_flight)
+            if int(self.limit) > previous:
+                self._cond.notify_all()
+            else:
+                self._cond.notify()
+
+    def _adapt(self, latency, in_flight):
+        if self.short_rtt is None:
+            self.short_rtt = self.long_rtt = latency
+            return
+        self.short_rtt = self.short_rtt * 0.8 + latency * 0.2
+        self.long_rtt = self.long_rtt * 0.99 + latency * 0.01
+        if self.long_rtt / self.short_rtt > 2:
+            # Latency dropped a lot - let the long-term view catch up faster
+            self.long_rtt *= 0.95
+
+        gradient = max(0.5, min(1.0, self.tolerance * self.long_rtt / self.short_rtt))
+        if gradient >= 1.0 and in_flight < self.limit / 2:
+            return  # Not using the limit we have - no evidence that more would help
+        target = self.limit * gradient + math.sqrt(self.limit)
+        self.limit = max(self.min_limit, min(self.max_limit, self.limit * 0.8 + target * 0.2))
+
+    def snapshot(self):
+        with self._cond:
+            return {
+                'limit': round(self.limit, 2),
+                'in_flight': self.in_flight,
+                'queued': self.queued,
+                'latency_ms': round(self.short_rtt * 1000) if self.short_rtt is not None else None,
+                'baseline_latency_ms': round(self.long_rtt * 1000) if self.long_rtt is not None else None,
+                **{k: v for k, v in self.stats.items() if not k.endswith('seconds')},
+                'avg_wait_ms': round(self.stats['wait_seconds'] * 1000 / self.stats['queued'])
+                if self.stats['queued'] else 0,
+                'max_wait_ms': round(self.stats['max_wait_seconds'] * 1000)
+            }
+
+
+class CircuitBreaker:
+    """closed -> open after repeated failures -> half_open after the cooldown -> closed on a good trial"""
+
+    def __init__(self, failures=BREAKER_FAILURES, window=BREAKER_WINDOW, cooldown=BREAKER_COOLDOWN):
+        self.failure_threshold = failures
+        self.cooldown = cooldown
+        self.results = deque(maxlen=window)
+        self.state = 'closed'
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+        self.stats = {'opened': 0, 'rejected': 0}
+
+    def allow(self):
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.cooldown:
+                self.state = 'half_open'
+                self._trial = False
+            if self.state == 'half_open' and not self._trial:
+                self._trial = True
+                return True
+            self.stats['rejected'] += 1
+            return False
+
+    def abandon(self):
+        """The allowed call never reached SAP (shed) - let another caller make the trial"""
+        with self._lock:
+            self._trial = False
+
+    def record(self, success):
+        with self._lock:
+            self.results.append(success)
+            self.consecutive_failures = 0 if success else self.consecutive_failures + 1
+            if self.state == 'half_open':
+                if success:
+                    self.state = 'closed'
+                    self.results.clear()
+                    logging.info("✅ SAP circuit breaker closed - Service Layer answering again")
+                else:
+                    self._open()
+            elif self.state == 'closed' and not success:
+                failed = self.results.count(False)
+                if (self.consecutive_failures >= self.failure_threshold
+                        or (len(self.results) >= self.results.maxlen // 2 and failed * 2 >= len(self.results))):
+                    self._open()
+
+    def _open(self):
+        self.state = 'open'
+        self.opened_at = time.monotonic()
+        self._trial = False
+        self.stats['opened'] += 1
+        logging.warning(f"🔌 SAP circuit breaker open - failing fast for {self.cooldown:.0f}s "
+                        f"({self.consecutive_failures} consecutive failures)")
+
+    def is_open(self):
+        return self.state != 'closed'
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'state': self.state,
+                'consecutive_failures': self.consecutive_failures,
+                'recent_failure_ratio': round(self.results.count(False) / len(self.results), 2) if self.results else 0,
+                'open_for_seconds': round(time.monotonic() - self.opened_at, 1) if self.state != 'closed' else 0,
+                **self.stats
+            }
+
+
+class SAPGatekeeper:
+    """Limiters per endpoint class plus one circuit breaker for the Service Layer"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """Fresh limiters and breaker (tests, and new worker processes)"""
+        self.limiters = {}
+        for name in ENDPOINT_CLASSES:
+            settings = _class_settings(name)
+            self.limiters[name] = AdaptiveLimiter(name, settings['initial'], settings['min'], settings['max'])
+        self.breaker = CircuitBreaker()
+
+    def enter(self, endpoint_class):
+        """Wait for a slot; returns the start time to pass to exit()"""
+        if not ENABLED:
+            return time.monotonic()
+        if not self.breaker.allow():
+            raise SAPUnavailableError('circuit_open', endpoint_class)
+        if not self.limiters[endpoint_class].acquire():
+            self.breaker.abandon()
+            raise SAPUnavailableError('shed', endpoint_class)
+        return time.monotonic()
+
+    async def enter_async(self, endpoint_class):
+        """enter() for coroutines - polls for a slot instead of blocking the event loop"""
+        if not ENABLED:
+            return time.monotonic()
+        if not self.breaker.allow():
+            raise SAPUnavailableError('circuit_open', endpoint_class)
+        limiter = self.limiters[endpoint_class]
+        if not limiter.try_acquire():
+            with limiter._cond:
+                queued = limiter.enqueue()
+            acquired = False
+            started = time.monotonic()
+            delay = 0.005
+            while queued and not acquired and time.monotonic() - started < QUEUE_TIMEOUT:
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 0.05)
+                acquired = limiter.try_acquire()
+            if queued:
+                with limiter._cond:
+                    limiter.dequeue(time.monotonic() - started, acquired)
+            if not acquired:
+                self.breaker.abandon()
+                raise SAPUnavailableError('shed', endpoint_class)
+        return time.monotonic()
+
+    def exit(self, endpoint_class, started, failed):
+        if not ENABLED:
+            return
+        self.limiters[endpoint_class].release(time.monotonic() - started, dropped=failed)
+        if endpoint_class == 'login' and not failed:
+            # Every request logs in, so a working Login would hide failing data calls
+            self.breaker.abandon()
+        else:
+            self.breaker.record(not failed)
+
+    def is_open(self):
+        return ENABLED and self.breaker.is_open()
+
+    def metrics(self):
+        return {
+            'enabled': ENABLED,
+            'breaker': self.breaker.snapshot(),
+            'classes': {name: limiter.snapshot() for name, limiter in self.limiters.items()}
+        }
+
+
+gatekeeper = SAPGatekeeper()
+
+
+class GatedSession(requests.Session):
+    """requests.Session for SAP: default timeouts, and every call goes through the gatekeeper"""
+
+    def __init__(self):
+        super().__init__()
+        self.unavailable = None  # SAPUnavailableError of the latest call - lets callers fall back to stale data
+
+    def request(self, method, url, *args, **kwargs):
+        self.unavailable = None
+        endpoint_class = classify(method, url)
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = default_timeout(endpoint_class)
+        try:
+            started = gatekeeper.enter(endpoint_class)
+        except SAPUnavailableError as e:
+            self.unavailable = e
+            raise
+
+        failed = False
+        try:
+            response = super().request(method, url, *args, **kwargs)
+            failed = response.status_code in FAILURE_STATUSES
+            return response
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            failed = True
+            raise
+        finally:
+            gatekeeper.exit(endpoint_class, started, failed)
@@ -5,11 +5,134 @@ import os
 from datetime import datetime
 import urllib.parse
 import urllib3
+import uuid
 
+from sap_capabilities import capability_registry
+from sap_gatekeeper import GatedSession, gatekeeper
 from models import InventoryTransferItem, TransferScanState, InventoryTransferRequestLine
 
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
+# Service Layer answers these when $batch is not enabled for the company/SL version
+SAP_BATCH_UNSUPPORTED_STATUSES = (404, 405, 501)
+
+
+def build_batch_request(operations, atomic=True, base_path='/b1s/v1'):
+    """
+    Build an OData $batch multipart/mixed request body for SAP B1 Service Layer
+
+    Args:
+        operations: List of dicts with keys: method, path (relative to base_path), body (optional)
+        atomic: Wrap all operations in one changeset so SAP commits them in a single transaction.
+                Changesets may only contain writes, so pass atomic=False for GET requests.
+
+    Returns:
+        tuple (content_type, body)
+    """
+    batch_boundary = f"batch_{uuid.uuid4().hex}"
+    changeset_boundary = f"changeset_{uuid.uuid4().hex}"
+    lines = []
+
+    def _append_operation(target, content_id, operation):
+        target.append("Content-Type: application/http")
+        target.append("Content-Transfer-Encoding: binary")
+        if content_id is not None:
+            target.append(f"Content-ID: {content_id}")
+        target.append("")
+        path = urllib.parse.quote(operation['path'].lstrip('/'), safe="/?$=&(),'")
+        target.append(f"{operation['method'].upper()} {base_path}/{path}")
+        if operation.get('body') is not None:
+            target.append("Content-Type: application/json")
+            target.append("")
+            target.append(json.dumps(operation['body']))
+        target.append("")
+
+    if atomic:
+        lines.append(f"--{batch_boundary}")
+        lines.append(f"Content-Type: multipart/mixed; boundary={changeset_boundary}")
+        lines.append("")
+        for content_id, operation in enumerate(operations, start=1):
+            lines.append(f"--{changeset_boundary}")
+            _append_operation(lines, content_id, operation)
+        lines.append(f"--{changeset_boundary}--")
+    else:
+        for operation in operations:
+            lines.append(f"--{batch_boundary}")
+            _append_operation(lines, None, operation)
+
+    lines.append(f"--{batch_boundary}--")
+    lines.append("")
+
+    return f"multipart/mixed; boundary={batch_boundary}", "\r\n".join(lines)
+
+
+def _get_boundary(content_type):
+    """Extract the multipart boundary from a Content-Type header value"""
+    for param in (content_type or '').split(';'):
+        key, _, value = param.strip().partition('=')
+        if key.lower() == 'boundary':
+            return value.strip('"')
+    return None
+
+
+def _split_headers(block):
+    """Split a MIME block into (headers dict, remaining body)"""
+    head, _, body = block.partition("\n\n")
+    headers = {}
+    for header_line in head.split("\n"):
+        name, sep, value = header_line.partition(':')
+        if sep:
+            headers[name.strip().lower()] = value.strip()
+    return headers, body
+
+
+def parse_batch_response(content_type, text):
+    """
+    Parse an OData $batch multipart/mixed response from SAP B1 Service Layer
+
+    Returns:
+        list of dicts with keys: status, body, content_id (in response order)
+    """
+    boundary = _get_boundary(content_type)
+    if not boundary:
+        return []
+
+    results = []
+    normalized = text.replace("\r\n", "\n")
+    for part in normalized.split(f"--{boundary}"):
+        part = part.strip("\n")
+        if not part or part.startswith('--'):
+            continue
+
+        part_headers, part_body = _split_headers(part)
+        part_type = part_headers.get('content-type', '')
+
+        if part_type.lower().startswith('multipart/mixed'):
+            results.extend(parse_batch_response(part_type, part_body))
+            continue
+
+        status_line, _, http_rest = part_body.partition("\n")
+        try:
+            status = int(status_line.split(' ')[1])
+        except (IndexError, ValueError):
+            logging.warning(f"Unexpected $batch part status line: {status_line}")
+            continue
+
+        _, response_body = _split_headers(http_rest)
+        response_body = response_body.strip()
+        try:
+            parsed_body = json.loads(response_body) if response_body else None
+        except ValueError:
+            parsed_body = response_body
+
+        results.append({
+            'status': status,
+            'body': parsed_body,
+            'content_id': part_headers.get('content-id')
+        })
+
+    return results
+
 
 class SAPIntegration:
 
@@ -20,9 +143,10 @@ class SAPIntegration:
         self.password = os.environ.get('SAP_B1_PASSWORD', '')
         self.company_db = os.environ.get('SAP_B1_COMPANY_DB', '')
         self.session_id = None
-        self.session = requests.Session()
+        self.session = GatedSession()  # Limits, circuit breaker and default timeouts (sap_gatekeeper)
         self.session.verify = False  # For development, in production use proper SSL
         self.is_offline = False
+        self._batch_supported = os.environ.get('SAP_B1_USE_BATCH', 'true').lower() == 'true'
 
         # Cache for frequently accessed data
         self._warehouse_cache = {}
@@ -72,9 +196,177 @@ class SAPIntegration:
             return self.login()
         return True
 
+    def _stale_reference(self, dataset, keys=None, match=None):
+        """
+        Reference data snapshot rows to serve while the gatekeeper refuses SAP
+        calls (circuit open or shed). None when SAP is merely erroring or the
+        snapshot is empty, so callers keep their usual failure result.
+        """
+        if self.session.unavailable is None and not gatekeeper.is_open():
+            return None
+        try:
+            from reference_data import snapshot_rows
+            rows = snapshot_rows(dataset, keys, match)
+        except Exception as e:
+            logging.warning(f"⚠️ No stale {dataset} snapshot available: {str(e)}")
+            return None
+        if not rows:
+            return None
+        logging.info(f"📦 SAP unavailable - serving {len(rows)} stale {dataset} rows from the reference snapshot")
+        return rows
+
+    def execute_batch(self, operations, atomic=True):
+        """
+        Execute several Service Layer operations in one OData $batch round trip
+
+        With atomic=True all operations are sent in a single changeset, so SAP
+        either commits all of them or none. Falls back to sequential calls when
+        the Service Layer does not accept $batch.
+
+        Args:
+            operations: List of dicts with keys: method, path (e.g. 'StockTransfers'), body (optional)
+            atomic: Send operations as one changeset (single SAP transaction); use False for GETs
+
+        Returns:
+            dict with success, mode ('batch' or 'sequential'), results (one per operation), error,
+            and status when SAP refused the $batch request as a whole
+        """
+        if not operations:
+            return {'success': True, 'mode': 'batch', 'results': []}
+
+        if not self.ensure_logged_in():
+            return {'success': False, 'mode': 'batch', 'results': [], 'error': 'SAP B1 connection unavailable'}
+
+        if not self._batch_supported:
+            return self._execute_sequential(operations, atomic)
+
+        try:
+            content_type, body = build_batch_request(operations, atomic=atomic)
+            url = f"{self.base_url}/b1s/v1/$batch"
+            logging.info(f"📦 Sending $batch with {len(operations)} operation(s) (atomic={atomic})")
+
+            response = self.session.post(url, data=body.encode('utf-8'),
+                                         headers={'Content-Type': content_type},
+                                         timeout=60)
+
+            if response.status_code in SAP_BATCH_UNSUPPORTED_STATUSES:
+                logging.warning(f"⚠️ SAP $batch not supported ({response.status_code}), using sequential calls")
+                self._batch_supported = False
+                return self._execute_sequential(operations, atomic)
+
+            if response.status_code not in (200, 202):
+                error_msg = f"SAP B1 $batch failed with status {response.status_code}: {response.text}"
+                logging.error(error_msg)
+                return {'success': False, 'mode': 'batch', 'results': [], 'status': response.status_code,
+                        'error': error_msg}
+
+            results = parse_batch_response(response.headers.get('Content-Type', ''), response.text)
+            failed = [r for r in results if r['status'] >= 400]
+
+            if failed or len(results) != len(operations):
+                error_msg = self._extract_sap_error(failed[0]['body']) if failed else \
+                    f"Expected {len(operations)} $batch responses, got {len(results)}"
+                logging.error(f"❌ SAP B1 $batch rejected: {error_msg}")
+                return {'success': False, 'mode': 'batch', 'results': results, 'error': error_msg}
+
+            logging.info(f"✅ SAP B1 $batch completed: {len(results)} operation(s)")
+            return {'success': True, 'mode': 'batch', 'results': results}
+
+        except Exception as e:
+            logging.error(f"Error executing SAP B1 $batch: {str(e)}")
+            return {'success': False, 'mode': 'batch', 'results': [], 'error': str(e)}
+
+    def _execute_sequential(self, operations, atomic=True):
+        """Fallback for execute_batch: issue operations one by one, stopping at the first failure when atomic"""
+        results = []
+        for operation in operations:
+            url = f"{self.base_url}/b1s/v1/{operation['path'].lstrip('/')}"
+            try:
+                response = self.session.request(operation['method'].upper(), url,
+                                                json=operation.get('body'), timeout=30)
+                try:
+                    response_body = response.json() if response.text else None
+                except ValueError:
+                    response_body = response.text
+                results.append({'status': response.status_code, 'body': response_body, 'content_id': None})
+            except Exception as e:
+                results.append({'status': 599, 'body': str(e), 'content_id': None})
+
+            if results[-1]['status'] >= 400 and atomic:
+                error_msg = self._extract_sap_error(results[-1]['body'])
+                logging.error(f"❌ Sequential SAP call {operation['method']} {operation['path']} failed "
+                              f"after {len(results) - 1} successful operation(s): {error_msg}")
+                return {'success': False, 'mode': 'sequential', 'results': results, 'error': error_msg}
+
+        failed = [r for r in results if r['status'] >= 400]
+        return {
+            'success': not failed,
+            'mode': 'sequential',
+            'results': results,
+            'error': self._extract_sap_error(failed[0]['body']) if failed else None
+        }
+
+    @staticmethod
+    def _extract_sap_error(body):
+        """Pull the human readable message out of a Service Layer error body"""
+        if isinstance(body, dict):
+            message = body.get('error', {}).get('message', {})
+            if isinstance(message, dict):
+                return message.get('value', json.dumps(body))
+            return str(message)
+        return str(body)
+
+    def get_bin_abs_entries(self, bin_requests):
+        """
+        Resolve several (bin_code, warehouse_code) pairs to BinAbsEntry in one $batch round trip
+
+        Returns:
+            dict mapping (bin_code, warehouse_code) -> AbsEntry or None
+        """
+        pairs = list(dict.fromkeys((b, w) for b, w in bin_requests if b))
+        if not pairs:
+            return {}
+
+        operations = [{
+            'method': 'GET',
+            'path': f"BinLocations?$filter=BinCode eq '{bin_code}' and Warehouse eq '{warehouse_code}'&$select=AbsEntry,BinCode"
+        } for bin_code, warehouse_code in pairs]
+
+        result = self.execute_batch(operations, atomic=False)
+        abs_entries = {}
+        for index, pair in enumerate(pairs):
+            entry = None
+            if index < len(result.get('results', [])):
+                part = result['results'][index]
+                if part['status'] == 200 and isinstance(part['body'], dict):
+                    bins = part['body'].get('value', [])
+                    entry = bins[0].get('AbsEntry') if bins else None
+            abs_entries[pair] = entry
+        return abs_entries
+
+    def _stale_item_validation(self, item_code):
+        rows = self._stale_reference('items', [item_code])
+        if not rows:
+            return None
+        item = rows[0]
+        return {
+            'success': True,
+            'item_name': item.get('ItemName'),
+            'item_code': item_code,
+            'batch_required': item.get('Batch', False),
+            'serial_required': item.get('Serial', False),
+            'manage_method': 'N',
+            'batch_num': 'Y' if item.get('Batch') else 'N',
+            'serial_num': 'Y' if item.get('Serial') else 'N',
+            'stale': True
+        }
+
     def validate_item_code(self, item_code):
         """Validate ItemCode and get BatchNum, SerialNum, and NonBatch_NonSerialMethod from SAP B1"""
         if not self.ensure_logged_in():
+            stale = self._stale_item_validation(item_code)
+            if stale:
+                return stale
             logging.warning("SAP B1 not available, returning default validation for ItemCode")
             return {
                 'success': False,
@@ -140,6 +432,9 @@ class SAPIntegration:
                 }
                 
         except Exception as e:
+            stale = self._stale_item_validation(item_code)
+            if stale:
+                return stale
             logging.error(f"Error validating ItemCode {item_code}: {str(e)}")
             return {
                 'success': False,
@@ -153,6 +448,9 @@ class SAPIntegration:
     def get_warehouses_list(self):
         """Get all warehouses from SAP B1"""
         if not self.ensure_logged_in():
+            stale = self._stale_reference('warehouses')
+            if stale:
+                return {'success': True, 'warehouses': stale, 'stale': True}
             logging.warning("SAP B1 not available, returning empty warehouse list")
             return {'success': False, 'warehouses': [], 'error': 'SAP B1 connection unavailable'}
 
@@ -171,6 +469,9 @@ class SAPIntegration:
                 logging.warning(f"Failed to get warehouses: {response.status_code} - {response.text}")
                 return {'success': False, 'warehouses': [], 'error': f'SAP API error: {response.status_code}'}
         except Exception as e:
+            stale = self._stale_reference('warehouses')
+            if stale:
+                return {'success': True, 'warehouses': stale, 'stale': True}
             logging.error(f"Error fetching warehouses: {str(e)}")
             return {'success': False, 'warehouses': [], 'error': str(e)}
 
@@ -329,9 +630,27 @@ class SAPIntegration:
             logging.error(f"Error getting bins: {str(e)}")
             return []
 
+    def _stale_bin_locations(self, warehouse_code):
+        """
+        Snapshot bins in the GetBinCodeByWHCode shape: active bins only, with
+        IsActive carrying OBIN.Disabled ('N') as the live query returns it
+        (the snapshot itself stores IsActive as 'Y'/'N')
+        """
+        rows = self._stale_reference('bins', match={'Warehouse': warehouse_code})
+        bins = [{
+            'BinCode': row.get('BinCode'),
+            'BinName': row.get('BinCode'),
+            'BinAbsEntry': row.get('BinAbsEntry'),
+            'IsActive': 'N'
+        } for row in sorted(rows or [], key=lambda row: row.get('BinCode') or '') if row.get('IsActive') == 'Y']
+        return {'success': True, 'bins': bins, 'stale': True} if bins else None
+
     def get_bin_locations_list(self, warehouse_code):
         """Get bin locations for a specific warehouse using SQL Query"""
         if not self.ensure_logged_in():
+            stale = self._stale_bin_locations(warehouse_code)
+            if stale:
+                return stale
             logging.warning("SAP B1 not available, returning empty bin list")
             return {'success': False, 'bins': [], 'error': 'SAP B1 connection unavailable'}
 
@@ -366,6 +685,9 @@ class SAPIntegration:
                 return {'success': False, 'bins': [], 'error': f'SAP API error: {response.status_code}'}
                 
         except Exception as e:
+            stale = self._stale_bin_locations(warehouse_code)
+            if stale:
+                return stale
             logging.error(f"Error fetching bin locations: {str(e)}")
             return {'success': False, 'bins': [], 'error': str(e)}
 
@@ -395,11 +717,16 @@ class SAPIntegration:
 
             }
 
+    def _stale_series(self, object_code):
+        rows = self._stale_reference('series')
+        return [{'Series': row.get('Series'), 'SeriesName': row.get('SeriesName')}
+                for row in rows or [] if row.get('ObjectCode') == object_code]
+
     def get_po_series(self):
         """Get PO series from SAP B1 using SQLQueries"""
         if not self.ensure_logged_in():
             logging.warning("SAP B1 not available, returning empty series list")
-            return []
+            return self._stale_series('PO')
 
         try:
             url = f"{self.base_url}/b1s/v1/SQLQueries('Get_PO_Series')/List"
@@ -416,7 +743,7 @@ class SAPIntegration:
                 
         except Exception as e:
             logging.error(f"Error fetching PO series: {str(e)}")
-            return []
+            return self._stale_series('PO')
 
     def get_po_doc_entry(self, series, doc_num):
         """Get DocEntry from SAP B1 using series and document number"""
@@ -549,6 +876,10 @@ class SAPIntegration:
             logging.warning("SAP B1 not available")
             return {'success': False, 'error': 'SAP B1 connection unavailable'}
 
+        # Known missing in this company - go straight to the standard APIs
+        if capability_registry.is_missing(self.company_db, "SQLQueries('get_serial_current_location')"):
+            return self._get_serial_location_fallback(serial_number)
+
         try:
             # First try the custom SQL query
             url = f"{self.base_url}/b1s/v1/SQLQueries('get_serial_current_location')/List"
@@ -557,6 +888,7 @@ class SAPIntegration:
             }
             logging.info(f"🔍 Fetching location for serial: {serial_number}")
             response = self.session.post(url, json=payload, timeout=30)
+            capability_registry.record_response(self.company_db, "SQLQueries('get_serial_current_location')", response)
 
             if response.status_code == 200:
                 data = response.json()
@@ -686,10 +1018,13 @@ class SAPIntegration:
 
         # Try Method 1: SQL Query Get_SO_Series (preferred - uses custom SAP query)
         try:
+            if capability_registry.is_missing(self.company_db, "SQLQueries('Get_SO_Series')"):
+                raise LookupError("Get_SO_Series not available in this company")
             url_sql = f"{self.base_url}/b1s/v1/SQLQueries('Get_SO_Series')/List"
             logging.debug(f"🔍 Attempting SQL query Get_SO_Series: {url_sql}")
             
             response = self.session.post(url_sql, json={}, timeout=30)
+            capability_registry.record_response(self.company_db, "SQLQueries('Get_SO_Series')", response)
             
             if response.status_code == 200:
                 data = response.json()
@@ -713,10 +1048,13 @@ class SAPIntegration:
 
         # Try Method 2: v2 Series endpoint
         try:
+            if capability_registry.is_missing(self.company_db, 'v2/Series'):
+                raise LookupError("v2 Series endpoint not available in this company")
             url_v2 = f"{self.base_url}/b1s/v2/Series?$filter=ObjectCode eq '17'&$select=Series,SeriesName"
             logging.debug(f"Attempting v2 Series endpoint: {url_v2}")
             
             response = self.session.get(url_v2, timeout=30)
+            capability_registry.record_response(self.company_db, 'v2/Series', response)
             
             if response.status_code == 200:
                 data = response.json()
@@ -832,12 +1170,15 @@ class SAPIntegration:
 
         # Try Method 1: SQL Query Get_Open_SO_DocNum (preferred - uses custom SAP query)
         try:
+            if capability_registry.is_missing(self.company_db, "SQLQueries('Get_Open_SO_DocNum')"):
+                raise LookupError("Get_Open_SO_DocNum not available in this company")
             url_sql = f"{self.base_url}/b1s/v1/SQLQueries('Get_Open_SO_DocNum')/List"
             body = {"ParamList": f"series='{series}'"}
             headers = {"Prefer": "odata.maxpagesize=0"}
             logging.debug(f"🔍 Attempting SQL query Get_Open_SO_DocNum: {url_sql} with series: {series}")
             
             response = self.session.post(url_sql, json=body,headers=headers, timeout=30)
+            capability_registry.record_response(self.company_db, "SQLQueries('Get_Open_SO_DocNum')", response)
             
             if response.status_code == 200:
                 data = response.json()
@@ -1164,52 +1505,12 @@ class SAPIntegration:
     def get_available_serials_from_inventory(self, item_code, warehouse_code):
         """
         Get list of available serial numbers for an item in a specific warehouse.
-        Uses SerialNumberDetails API with Status=0 filter for available serials.
+        Served from the short-lived availability snapshot (one paged SQLQuery per item/warehouse).
         """
-        if not self.ensure_logged_in():
-            logging.warning("SAP B1 not available")
-            return {
-                'success': False,
-                'error': 'SAP B1 connection unavailable',
-                'serial_numbers': []
-            }
-        
+        from availability_snapshot import get_snapshot
+
         try:
-            filter_query = f"ItemCode eq '{item_code}'"
-            url = f"{self.base_url}/b1s/v1/SerialNumberDetails?$filter={filter_query}&$select=SerialNumber,AdmissionDate"
-            
-            headers = {"Prefer": "odata.maxpagesize=500"}
-            logging.info(f"🔍 Fetching available serials for {item_code} in {warehouse_code}")
-            response = self.session.get(url, headers=headers, timeout=30)
-            
-            if response.status_code == 200:
-                data = response.json()
-                serial_list = data.get('value', [])
-                
-                available_serials = []
-                for serial in serial_list:
-                    available_serials.append({
-                        'internal_serial_number': serial.get('DistNumber', ''),
-                        'system_serial_number': serial.get('SystemNumber', 0),
-                        'item_code': serial.get('ItemCode', ''),
-                        'warehouse_code': serial.get('WhsCode', ''),
-                        'quantity': 1
-                    })
-                
-                logging.info(f"✅ Found {len(available_serials)} available serials for {item_code}")
-                return {
-                    'success': True,
-                    'serial_numbers': available_serials,
-                    'count': len(available_serials)
-                }
-            else:
-                logging.error(f"❌ SAP API error: {response.status_code}")
-                return {
-                    'success': False,
-                    'error': f'SAP API error: {response.status_code}',
-                    'serial_numbers': []
-                }
-                
+            snapshot = get_snapshot(self, item_code, warehouse_code)
         except Exception as e:
             logging.error(f"❌ Error fetching available serials: {str(e)}")
             return {
@@ -1218,11 +1519,26 @@ class SAPIntegration:
                 'serial_numbers': []
             }
 
+        available_serials = [{
+            'internal_serial_number': serial,
+            'system_serial_number': row.get('SystemNumber', 0),
+            'item_code': item_code,
+            'warehouse_code': warehouse_code,
+            'quantity': 1
+        } for serial, row in snapshot.entries.items()]
+
+        logging.info(f"✅ Found {len(available_serials)} available serials for {item_code} in {warehouse_code}")
+        return {
+            'success': True,
+            'serial_numbers': available_serials,
+            'count': len(available_serials)
+        }
+
     def get_invt_series(self):
         """Get Inventory Transfer series from SAP B1 using SQLQueries"""
         if not self.ensure_logged_in():
             logging.warning("SAP B1 not available, returning empty series list")
-            return []
+            return self._stale_series('INVT')
 
         try:
             url = f"{self.base_url}/b1s/v1/SQLQueries('Get_INVT_Series')/List"
@@ -1240,7 +1556,7 @@ class SAPIntegration:
                 
         except Exception as e:
             logging.error(f"Error fetching INVT series: {str(e)}")
-            return []
+            return self._stale_series('INVT')
 
     def get_invt_doc_entry(self, series, doc_num):
         """Get Inventory Transfer DocEntry from SAP B1 using series and document number"""
@@ -1364,12 +1680,15 @@ class SAPIntegration:
 
         # Try Method 1: SQL Query Get_Open_INVCNT_DocNum (preferred - uses custom SAP query)
         try:
+            if capability_registry.is_missing(self.company_db, "SQLQueries('Get_Open_INVCNT_DocNum')"):
+                raise LookupError("Get_Open_INVCNT_DocNum not available in this company")
             url_sql = f"{self.base_url}/b1s/v1/SQLQueries('Get_Open_INVCNT_DocNum')/List"
             body = {"ParamList": f"series='{series}'"}
             headers = {"Prefer": "odata.maxpagesize=0"}
             logging.debug(f"🔍 Attempting SQL query Get_Open_INVCNT_DocNum: {url_sql} with series: {series}")
             
             response = self.session.post(url_sql,headers=headers ,json=body, timeout=30)
+            capability_registry.record_response(self.company_db, "SQLQueries('Get_Open_INVCNT_DocNum')", response)
             
             if response.status_code == 200:
                 data = response.json()
@@ -1844,7 +2163,7 @@ class SAPIntegration:
             }
             
             logging.info(f"🔍 Fetching batch details for item {item_code} from SAP B1")
-            response = requests.get(url, headers=headers, params=params, verify=False, timeout=30)
+            response = self.session.get(url, headers=headers, params=params, timeout=30)
             
             if response.status_code == 200:
                 data = response.json()
@@ -2973,354 +3292,216 @@ class SAPIntegration:
         }
 
     def sync_warehouses(self):
-        """Sync warehouses from SAP B1 to local database"""
+        """Sync warehouses from SAP B1 to local database (branches table) with batched upserts"""
         if not self.ensure_logged_in():
             logging.warning("Cannot sync warehouses - SAP B1 not available")
             return False
 
         try:
-            url = f"{self.base_url}/b1s/v1/Warehouses"
-            response = self.session.get(url)
-
-            if response.status_code == 200:
-                warehouses = response.json().get('value', [])
-
-                from app import db
-
-                # Clear cache and update database
-                self._warehouse_cache = {}
-
-                for wh in warehouses:
-                    # Check if warehouse exists in branches table
-                    existing = db.session.execute(
-                        db.text("SELECT id FROM branches WHERE id = :id"), {
-                            "id": wh.get('WarehouseCode')
-                        }).fetchone()
-
-                    if not existing:
-                        # Insert new warehouse as branch - use compatible SQL
-                        import os
-                        # Removed circular import
-                        db_uri = os.environ.get('DATABASE_URL', '')
-
-                        if 'postgresql' in db_uri.lower(
-                        ) or 'mysql' in db_uri.lower():
-                            insert_sql = """
-                                INSERT INTO branches (id, name, address, is_active, created_at, updated_at)
-                                VALUES (:id, :name, :address, :is_active, NOW(), NOW())
-                            """
-                        else:
-                            insert_sql = """
-                                INSERT INTO branches (id, name, address, is_active, created_at, updated_at)
-                                VALUES (:id, :name, :address, :is_active, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
-                            """
-
-                        db.session.execute(
-                            db.text(insert_sql), {
-                                "id": wh.get('WarehouseCode'),
-                                "name": wh.get('WarehouseName', ''),
-                                "address": wh.get('Street', ''),
-                                "is_active": wh.get('Inactive') != 'Y'
-                            })
-                    else:
-                        # Update existing warehouse - use compatible SQL
-                        import os
-                        # Removed circular import
-                        db_uri = os.environ.get('DATABASE_URL', '')
-
-                        if 'postgresql' in db_uri.lower(
-                        ) or 'mysql' in db_uri.lower():
-                            update_sql = """
-                                UPDATE branches SET 
-                                    name = :name, 
-                                    address = :address, 
-                                    is_active = :is_active,
-                                    updated_at = NOW()
-                                WHERE id = :id
-                            """
-                        else:
-                            update_sql = """
-                                UPDATE branches SET 
-                                    name = :name, 
-                                    address = :address, 
-                                    is_active = :is_active,
-                                    updated_at = CURRENT_TIMESTAMP
-                                WHERE id = :id
-                            """
-
-                        db.session.execute(
-                            db.text(update_sql), {
-                                "id": wh.get('WarehouseCode'),
-                                "name": wh.get('WarehouseName', ''),
-                                "address": wh.get('Street', ''),
-                                "is_active": wh.get('Inactive') != 'Y'
-                            })
-
-                    # Cache warehouse data
-                    self._warehouse_cache[wh.get('WarehouseCode')] = {
-                        'WarehouseCode': wh.get('WarehouseCode'),
-                        'WarehouseName': wh.get('WarehouseName'),
-                        'Address': wh.get('Street'),
-                        'Active': wh.get('Inactive') != 'Y'
-                    }
+            from app import db
+            from sap_bulk_sync import iter_sap_pages, bulk_upsert
+
+            # Clear cache and update database
+            self._warehouse_cache = {}
+
+            def warehouse_rows():
+                for page in iter_sap_pages(self, "Warehouses?$select=WarehouseCode,WarehouseName,Street,Inactive"):
+                    for wh in page:
+                        if not wh.get('WarehouseCode'):
+                            continue
+                        # Cache warehouse data
+                        self._warehouse_cache[wh.get('WarehouseCode')] = {
+                            'WarehouseCode': wh.get('WarehouseCode'),
+                            'WarehouseName': wh.get('WarehouseName'),
+                            'Address': wh.get('Street'),
+                            'Active': wh.get('Inactive') != 'Y'
+                        }
+                        yield {
+                            "id": wh.get('WarehouseCode'),
+                            "name": wh.get('WarehouseName', ''),
+                            "address": wh.get('Street', ''),
+                            "is_active": wh.get('Inactive') != 'Y'
+                        }
 
-                db.session.commit()
-                logging.info(
-                    f"Synced {len(warehouses)} warehouses from SAP B1")
-                return True
+            stats = bulk_upsert('branches', ['id'], warehouse_rows(), ['name', 'address', 'is_active'])
+            db.session.commit()
+            logging.info(f"Synced {stats['total']} warehouses from SAP B1")
+            return stats
 
         except Exception as e:
             logging.error(f"Error syncing warehouses: {str(e)}")
             return False
 
     def sync_bins(self, warehouse_code=None):
-        """Sync bin locations from SAP B1"""
+        """Sync bin locations from SAP B1 with batched upserts"""
         if not self.ensure_logged_in():
             logging.warning("Cannot sync bins - SAP B1 not available")
             return False
 
         try:
+            from app import db
+            from sap_bulk_sync import ensure_table, iter_sap_pages, bulk_upsert
+
+            ensure_table('bin_locations', {
+                'postgresql': """
+                    CREATE TABLE IF NOT EXISTS bin_locations (
+                        id SERIAL PRIMARY KEY,
+                        bin_code VARCHAR(50) NOT NULL,
+                        warehouse_code VARCHAR(10) NOT NULL,
+                        bin_name VARCHAR(100),
+                        is_active BOOLEAN DEFAULT TRUE,
+                        created_at TIMESTAMP DEFAULT NOW(),
+                        updated_at TIMESTAMP DEFAULT NOW(),
+                        UNIQUE(bin_code, warehouse_code)
+                    )
+                """,
+                'mysql': """
+                    CREATE TABLE IF NOT EXISTS bin_locations (
+                        id INT AUTO_INCREMENT PRIMARY KEY,
+                        bin_code VARCHAR(50) NOT NULL,
+                        warehouse_code VARCHAR(10) NOT NULL,
+                        bin_name VARCHAR(100),
+                        is_active BOOLEAN DEFAULT TRUE,
+                        created_at TIMESTAMP DEFAULT NOW(),
+                        updated_at TIMESTAMP DEFAULT NOW() ON UPDATE NOW(),
+                        UNIQUE KEY unique_bin_warehouse (bin_code, warehouse_code)
+                    )
+                """,
+                'sqlite': """
+                    CREATE TABLE IF NOT EXISTS bin_locations (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        bin_code VARCHAR(50) NOT NULL,
+                        warehouse_code VARCHAR(10) NOT NULL,
+                        bin_name VARCHAR(100),
+                        is_active BOOLEAN DEFAULT 1,
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        UNIQUE(bin_code, warehouse_code)
+                    )
+                """
+            })
+
             # Get bins for specific warehouse or all warehouses
+            resource = "BinLocations?$select=BinCode,Warehouse,Description,Inactive"
             if warehouse_code:
-                url = f"{self.base_url}/b1s/v1/BinLocations?$filter=Warehouse eq '{warehouse_code}'"
-            else:
-                url = f"{self.base_url}/b1s/v1/BinLocations"
-
-            response = self.session.get(url)
-
-            if response.status_code == 200:
-                bins = response.json().get('value', [])
-
-                # Create bins table if not exists - use compatible SQL
-                from app import db, app
-                import os
-
-                db_uri = os.environ.get('DATABASE_URL', '')
-
-                if 'postgresql' in db_uri.lower():
-                    create_table_sql = """
-                        CREATE TABLE IF NOT EXISTS bin_locations (
-                            id SERIAL PRIMARY KEY,
-                            bin_code VARCHAR(50) NOT NULL,
-                            warehouse_code VARCHAR(10) NOT NULL,
-                            bin_name VARCHAR(100),
-                            is_active BOOLEAN DEFAULT TRUE,
-                            created_at TIMESTAMP DEFAULT NOW(),
-                            updated_at TIMESTAMP DEFAULT NOW(),
-                            UNIQUE(bin_code, warehouse_code)
-                        )
-                    """
-                elif 'mysql' in db_uri.lower():
-                    create_table_sql = """
-                        CREATE TABLE IF NOT EXISTS bin_locations (
-                            id INT AUTO_INCREMENT PRIMARY KEY,
-                            bin_code VARCHAR(50) NOT NULL,
-                            warehouse_code VARCHAR(10) NOT NULL,
-                            bin_name VARCHAR(100),
-                            is_active BOOLEAN DEFAULT TRUE,
-                            created_at TIMESTAMP DEFAULT NOW(),
-                            updated_at TIMESTAMP DEFAULT NOW() ON UPDATE NOW(),
-                            UNIQUE KEY unique_bin_warehouse (bin_code, warehouse_code)
-                        )
-                    """
-                else:
-                    create_table_sql = """
-                        CREATE TABLE IF NOT EXISTS bin_locations (
-                            id INTEGER PRIMARY KEY AUTOINCREMENT,
-                            bin_code VARCHAR(50) NOT NULL,
-                            warehouse_code VARCHAR(10) NOT NULL,
-                            bin_name VARCHAR(100),
-                            is_active BOOLEAN DEFAULT 1,
-                            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                            UNIQUE(bin_code, warehouse_code)
-                        )
-                    """
+                resource += f"&$filter=Warehouse eq '{warehouse_code}'"
 
-                db.session.execute(db.text(create_table_sql))
+            # Clear cache
+            self._bin_cache = {}
 
-                # Clear cache
-                self._bin_cache = {}
-
-                for bin_data in bins:
-                    bin_code = bin_data.get('BinCode')
-                    wh_code = bin_data.get(
-                        'Warehouse')  # Use 'Warehouse' not 'WarehouseCode'
-
-                    if bin_code and wh_code:
-                        # Upsert bin location - use database-specific syntax
-                        if 'postgresql' in db_uri.lower():
-                            upsert_sql = """
-                                INSERT INTO bin_locations (bin_code, warehouse_code, bin_name, is_active, created_at, updated_at)
-                                VALUES (:bin_code, :warehouse_code, :bin_name, :is_active, NOW(), NOW())
-                                ON CONFLICT (bin_code, warehouse_code) 
-                                DO UPDATE SET 
-                                    bin_name = EXCLUDED.bin_name,
-                                    is_active = EXCLUDED.is_active,
-                                    updated_at = NOW()
-                            """
-                        elif 'mysql' in db_uri.lower():
-                            upsert_sql = """
-                                INSERT INTO bin_locations (bin_code, warehouse_code, bin_name, is_active, created_at, updated_at)
-                                VALUES (:bin_code, :warehouse_code, :bin_name, :is_active, NOW(), NOW())
-                                ON DUPLICATE KEY UPDATE 
-                                    bin_name = VALUES(bin_name),
-                                    is_active = VALUES(is_active),
-                                    updated_at = NOW()
-                            """
-                        else:
-                            # SQLite - use INSERT OR REPLACE
-                            upsert_sql = """
-                                INSERT OR REPLACE INTO bin_locations (bin_code, warehouse_code, bin_name, is_active, created_at, updated_at)
-                                VALUES (:bin_code, :warehouse_code, :bin_name, :is_active, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
-                            """
-
-                        db.session.execute(
-                            db.text(upsert_sql), {
-                                "bin_code": bin_code,
-                                "warehouse_code": wh_code,
-                                "bin_name": bin_data.get('Description', ''),
-                                "is_active": bin_data.get('Inactive') != 'Y'
-                            })
+            def bin_rows():
+                for page in iter_sap_pages(self, resource):
+                    for bin_data in page:
+                        bin_code = bin_data.get('BinCode')
+                        wh_code = bin_data.get('Warehouse')  # Use 'Warehouse' not 'WarehouseCode'
+                        if not (bin_code and wh_code):
+                            continue
 
                         # Cache bin data
-                        cache_key = f"{wh_code}:{bin_code}"
-                        self._bin_cache[cache_key] = {
+                        self._bin_cache[f"{wh_code}:{bin_code}"] = {
                             'BinCode': bin_code,
                             'WarehouseCode': wh_code,
                             'Description': bin_data.get('Description', ''),
                             'Active': bin_data.get('Inactive') != 'Y'
                         }
+                        yield {
+                            "bin_code": bin_code,
+                            "warehouse_code": wh_code,
+                            "bin_name": bin_data.get('Description', ''),
+                            "is_active": bin_data.get('Inactive') != 'Y'
+                        }
 
-                db.session.commit()
-                logging.info(f"Synced {len(bins)} bin locations from SAP B1")
-                return True
+            stats = bulk_upsert('bin_locations', ['bin_code', 'warehouse_code'], bin_rows(),
+                                ['bin_name', 'is_active'])
+            db.session.commit()
+            logging.info(f"Synced {stats['total']} bin locations from SAP B1")
+            return stats
 
         except Exception as e:
             logging.error(f"Error syncing bins: {str(e)}")
             return False
 
     def sync_business_partners(self):
-        """Sync business partners (suppliers/customers) from SAP B1"""
+        """Sync business partners (suppliers/customers) from SAP B1 with batched upserts"""
         if not self.ensure_logged_in():
             logging.warning(
                 "Cannot sync business partners - SAP B1 not available")
             return False
 
         try:
-            # Get suppliers and customers
-            url = f"{self.base_url}/b1s/v1/BusinessPartners?$filter=CardType eq 'cSupplier' or CardType eq 'cCustomer'"
-            response = self.session.get(url)
+            from app import db
+            from sap_bulk_sync import ensure_table, iter_sap_pages, bulk_upsert
+
+            ensure_table('business_partners', {
+                'postgresql': """
+                    CREATE TABLE IF NOT EXISTS business_partners (
+                        id SERIAL PRIMARY KEY,
+                        card_code VARCHAR(50) UNIQUE NOT NULL,
+                        card_name VARCHAR(200) NOT NULL,
+                        card_type VARCHAR(20) NOT NULL,
+                        phone VARCHAR(50),
+                        email VARCHAR(100),
+                        address TEXT,
+                        is_active BOOLEAN DEFAULT TRUE,
+                        created_at TIMESTAMP DEFAULT NOW(),
+                        updated_at TIMESTAMP DEFAULT NOW()
+                    )
+                """,
+                'mysql': """
+                    CREATE TABLE IF NOT EXISTS business_partners (
+                        id INT AUTO_INCREMENT PRIMARY KEY,
+                        card_code VARCHAR(50) UNIQUE NOT NULL,
+                        card_name VARCHAR(200) NOT NULL,
+                        card_type VARCHAR(20) NOT NULL,
+                        phone VARCHAR(50),
+                        email VARCHAR(100),
+                        address TEXT,
+                        is_active BOOLEAN DEFAULT TRUE,
+                        created_at TIMESTAMP DEFAULT NOW(),
+                        updated_at TIMESTAMP DEFAULT NOW() ON UPDATE NOW()
+                    )
+                """,
+                'sqlite': """
+                    CREATE TABLE IF NOT EXISTS business_partners (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        card_code VARCHAR(50) UNIQUE NOT NULL,
+                        card_name VARCHAR(200) NOT NULL,
+                        card_type VARCHAR(20) NOT NULL,
+                        phone VARCHAR(50),
+                        email VARCHAR(100),
+                        address TEXT,
+                        is_active BOOLEAN DEFAULT 1,
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                """
+            })
 
-            if response.status_code == 200:
-                partners = response.json().get('value', [])
-
-                from app import db, app
-
-                # Create business_partners table if not exists - use database-specific syntax
-                db_uri = os.environ.get('DATABASE_URL', '')
-
-                if 'postgresql' in db_uri.lower():
-                    create_table_sql = """
-                        CREATE TABLE IF NOT EXISTS business_partners (
-                            id SERIAL PRIMARY KEY,
-                            card_code VARCHAR(50) UNIQUE NOT NULL,
-                            card_name VARCHAR(200) NOT NULL,
-                            card_type VARCHAR(20) NOT NULL,
-                            phone VARCHAR(50),
-                            email VARCHAR(100),
-                            address TEXT,
-                            is_active BOOLEAN DEFAULT TRUE,
-                            created_at TIMESTAMP DEFAULT NOW(),
-                            updated_at TIMESTAMP DEFAULT NOW()
-                        )
-                    """
-                elif 'mysql' in db_uri.lower():
-                    create_table_sql = """
-                        CREATE TABLE IF NOT EXISTS business_partners (
-                            id INT AUTO_INCREMENT PRIMARY KEY,
-                            card_code VARCHAR(50) UNIQUE NOT NULL,
-                            card_name VARCHAR(200) NOT NULL,
-                            card_type VARCHAR(20) NOT NULL,
-                            phone VARCHAR(50),
-                            email VARCHAR(100),
-                            address TEXT,
-                            is_active BOOLEAN DEFAULT TRUE,
-                            created_at TIMESTAMP DEFAULT NOW(),
-                            updated_at TIMESTAMP DEFAULT NOW() ON UPDATE NOW()
-                        )
-                    """
-                else:
-                    create_table_sql = """
-                        CREATE TABLE IF NOT EXISTS business_partners (
-                            id INTEGER PRIMARY KEY AUTOINCREMENT,
-                            card_code VARCHAR(50) UNIQUE NOT NULL,
-                            card_name VARCHAR(200) NOT NULL,
-                            card_type VARCHAR(20) NOT NULL,
-                            phone VARCHAR(50),
-                            email VARCHAR(100),
-                            address TEXT,
-                            is_active BOOLEAN DEFAULT 1,
-                            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                        )
-                    """
-
-                db.session.execute(db.text(create_table_sql))
-
-                for partner in partners:
-                    card_code = partner.get('CardCode')
-                    if card_code:
-                        # Use database-specific upsert syntax
-                        if 'postgresql' in db_uri.lower():
-                            upsert_sql = """
-                                INSERT INTO business_partners (card_code, card_name, card_type, phone, email, address, is_active, created_at, updated_at)
-                                VALUES (:card_code, :card_name, :card_type, :phone, :email, :address, :is_active, NOW(), NOW())
-                                ON CONFLICT (card_code) 
-                                DO UPDATE SET 
-                                    card_name = EXCLUDED.card_name,
-                                    card_type = EXCLUDED.card_type,
-                                    phone = EXCLUDED.phone,
-                                    email = EXCLUDED.email,
-                                    address = EXCLUDED.address,
-                                    is_active = EXCLUDED.is_active,
-                                    updated_at = NOW()
-                            """
-                        elif 'mysql' in db_uri.lower():
-                            upsert_sql = """
-                                INSERT INTO business_partners (card_code, card_name, card_type, phone, email, address, is_active, created_at, updated_at)
-                                VALUES (:card_code, :card_name, :card_type, :phone, :email, :address, :is_active, NOW(), NOW())
-                                ON DUPLICATE KEY UPDATE 
-                                    card_name = VALUES(card_name),
-                                    card_type = VALUES(card_type),
-                                    phone = VALUES(phone),
-                                    email = VALUES(email),
-                                    address = VALUES(address),
-                                    is_active = VALUES(is_active),
-                                    updated_at = NOW()
-                            """
-                        else:
-                            # SQLite - use INSERT OR REPLACE
-                            upsert_sql = """
-                                INSERT OR REPLACE INTO business_partners (card_code, card_name, card_type, phone, email, address, is_active, created_at, updated_at)
-                                VALUES (:card_code, :card_name, :card_type, :phone, :email, :address, :is_active, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
-                            """
-
-                        db.session.execute(
-                            db.text(upsert_sql), {
-                                "card_code": card_code,
-                                "card_name": partner.get('CardName', ''),
-                                "card_type": partner.get('CardType', ''),
-                                "phone": partner.get('Phone1', ''),
-                                "email": partner.get('EmailAddress', ''),
-                                "address": partner.get('Address', ''),
-                                "is_active": partner.get('Valid') == 'Y'
-                            })
+            # Get suppliers and customers
+            resource = ("BusinessPartners?$select=CardCode,CardName,CardType,Phone1,EmailAddress,Address,Valid"
+                        "&$filter=CardType eq 'cSupplier' or CardType eq 'cCustomer'")
+
+            def partner_rows():
+                for page in iter_sap_pages(self, resource):
+                    for partner in page:
+                        if not partner.get('CardCode'):
+                            continue
+                        yield {
+                            "card_code": partner.get('CardCode'),
+                            "card_name": partner.get('CardName', ''),
+                            "card_type": partner.get('CardType', ''),
+                            "phone": partner.get('Phone1', ''),
+                            "email": partner.get('EmailAddress', ''),
+                            "address": partner.get('Address', ''),
+                            "is_active": partner.get('Valid') == 'Y'
+                        }
 
-                db.session.commit()
-                logging.info(
-                    f"Synced {len(partners)} business partners from SAP B1")
-                return True
+            stats = bulk_upsert('business_partners', ['card_code'], partner_rows(),
+                                ['card_name', 'card_type', 'phone', 'email', 'address', 'is_active'])
+            db.session.commit()
+            logging.info(
+                f"Synced {stats['total']} business partners from SAP B1")
+            return stats
 
         except Exception as e:
             logging.error(f"Error syncing business partners: {str(e)}")
@@ -4009,6 +4190,82 @@ class SAPIntegration:
             }
         }
 
+    @staticmethod
+    def _apply_sales_order_fields(sales_order, order_data):
+        """Copy SAP Orders header fields onto a SalesOrder row"""
+        sales_order.doc_entry = order_data.get('DocEntry')
+        sales_order.doc_num = order_data.get('DocNum')
+        sales_order.doc_type = order_data.get('DocType')
+        
+        # Parse dates
+        doc_date = order_data.get('DocDate')
+        if doc_date:
+            if isinstance(doc_date, str):
+                sales_order.doc_date = datetime.fromisoformat(doc_date.replace('Z', '+00:00'))
+            else:
+                sales_order.doc_date = doc_date
+        
+        doc_due_date = order_data.get('DocDueDate')
+        if doc_due_date:
+            if isinstance(doc_due_date, str):
+                sales_order.doc_due_date = datetime.fromisoformat(doc_due_date.replace('Z', '+00:00'))
+            else:
+                sales_order.doc_due_date = doc_due_date
+        
+        sales_order.card_code = order_data.get('CardCode')
+        sales_order.card_name = order_data.get('CardName')
+        sales_order.address = order_data.get('Address')
+        sales_order.doc_total = order_data.get('DocTotal')
+        sales_order.doc_currency = order_data.get('DocCurrency')
+        sales_order.comments = order_data.get('Comments')
+        sales_order.document_status = order_data.get('DocumentStatus')
+        sales_order.last_sap_sync = datetime.utcnow()
+
+    @staticmethod
+    def _apply_sales_order_line_fields(order_line, line_data):
+        """Copy SAP DocumentLines fields onto a SalesOrderLine row"""
+        order_line.line_num = line_data.get('LineNum')
+        order_line.item_code = line_data.get('ItemCode')
+        order_line.item_description = line_data.get('ItemDescription') or line_data.get('Dscription')
+        order_line.quantity = line_data.get('Quantity')
+        order_line.open_quantity = line_data.get('OpenQuantity', line_data.get('RemainingOpenQuantity'))
+        order_line.delivered_quantity = line_data.get('DeliveredQuantity')
+        order_line.unit_price = line_data.get('UnitPrice')
+        order_line.line_total = line_data.get('LineTotal')
+        order_line.warehouse_code = line_data.get('WarehouseCode')
+        order_line.unit_of_measure = line_data.get('UoMCode')
+        order_line.line_status = line_data.get('LineStatus')
+
+    def get_sales_orders_by_doc_entries(self, doc_entries, chunk_size=20):
+        """
+        Fetch several Sales Orders (header and DocumentLines) with OR-filtered Orders queries
+
+        Returns:
+            dict of DocEntry -> order dict; orders SAP could not return are absent
+        """
+        if not doc_entries or not self.ensure_logged_in():
+            return {}
+
+        from sap_bulk_sync import iter_sap_pages
+
+        orders = {}
+        doc_entries = sorted(doc_entries)
+        select = ("DocEntry,DocNum,DocType,DocDate,DocDueDate,CardCode,CardName,Address,"
+                  "DocTotal,DocCurrency,Comments,DocumentStatus,DocumentLines")
+        for start in range(0, len(doc_entries), chunk_size):
+            chunk = doc_entries[start:start + chunk_size]
+            condition = ' or '.join(f"DocEntry eq {int(entry)}" for entry in chunk)
+            try:
+                for page in iter_sap_pages(self, f"Orders?$filter={condition}&$select={select}", page_size=chunk_size):
+                    for order in page:
+                        orders[order.get('DocEntry')] = order
+            except Exception as e:
+                logging.error(f"Error fetching Sales Orders {chunk}: {str(e)}")
+
+        logging.info(f"📥 Fetched {len(orders)}/{len(doc_entries)} Sales Orders from SAP in "
+                     f"{(len(doc_entries) + chunk_size - 1) // chunk_size} request(s)")
+        return orders
+
     def sync_sales_order_to_local_db(self, order_data):
         """Sync Sales Order data to local database"""
         try:
@@ -4028,33 +4285,7 @@ class SAPIntegration:
                 db.session.add(sales_order)
             
             # Update Sales Order fields
-            sales_order.doc_entry = doc_entry
-            sales_order.doc_num = order_data.get('DocNum')
-            sales_order.doc_type = order_data.get('DocType')
-            
-            # Parse dates
-            doc_date = order_data.get('DocDate')
-            if doc_date:
-                if isinstance(doc_date, str):
-                    sales_order.doc_date = datetime.fromisoformat(doc_date.replace('Z', '+00:00'))
-                else:
-                    sales_order.doc_date = doc_date
-            
-            doc_due_date = order_data.get('DocDueDate')
-            if doc_due_date:
-                if isinstance(doc_due_date, str):
-                    sales_order.doc_due_date = datetime.fromisoformat(doc_due_date.replace('Z', '+00:00'))
-                else:
-                    sales_order.doc_due_date = doc_due_date
-            
-            sales_order.card_code = order_data.get('CardCode')
-            sales_order.card_name = order_data.get('CardName')
-            sales_order.address = order_data.get('Address')
-            sales_order.doc_total = order_data.get('DocTotal')
-            sales_order.doc_currency = order_data.get('DocCurrency')
-            sales_order.comments = order_data.get('Comments')
-            sales_order.document_status = order_data.get('DocumentStatus')
-            sales_order.last_sap_sync = datetime.utcnow()
+            self._apply_sales_order_fields(sales_order, order_data)
             
             db.session.flush()  # Get the ID
             
@@ -4079,17 +4310,7 @@ class SAPIntegration:
                     db.session.add(order_line)
                 
                 # Update line fields
-                order_line.line_num = line_num
-                order_line.item_code = line_data.get('ItemCode')
-                order_line.item_description = line_data.get('ItemDescription') or line_data.get('Dscription')
-                order_line.quantity = line_data.get('Quantity')
-                order_line.open_quantity = line_data.get('OpenQuantity')
-                order_line.delivered_quantity = line_data.get('DeliveredQuantity')
-                order_line.unit_price = line_data.get('UnitPrice')
-                order_line.line_total = line_data.get('LineTotal')
-                order_line.warehouse_code = line_data.get('WarehouseCode')
-                order_line.unit_of_measure = line_data.get('UoMCode')
-                order_line.line_status = line_data.get('LineStatus')
+                self._apply_sales_order_line_fields(order_line, line_data)
                 
                 lines_synced += 1
             
@@ -4108,13 +4329,53 @@ class SAPIntegration:
             return {'success': False, 'error': str(e)}
 
     def enhance_picklist_with_sales_order_data(self, picklist_lines):
-        """Enhance picklist lines with Sales Order item details"""
+        """
+        Enhance picklist lines with Sales Order item details
+
+        Set-based: local orders and lines are loaded with one IN-query each, orders
+        missing locally are fetched from SAP together and stored, then lines are
+        joined in memory - the query count does not grow with the number of lines.
+        """
         enhanced_lines = []
         
         try:
             from app import db
             from models import SalesOrder, SalesOrderLine
             
+            order_entries = {
+                int(line['OrderEntry']) for line in picklist_lines
+                if line.get('OrderEntry') and line.get('OrderRowID') is not None
+            }
+            
+            orders = {}
+            if order_entries:
+                orders = {
+                    order.doc_entry: order
+                    for order in SalesOrder.query.filter(SalesOrder.doc_entry.in_(order_entries)).all()
+                }
+            
+            # Fetch and store only the orders not yet synced locally
+            missing = order_entries - set(orders)
+            if missing:
+                for doc_entry, order_data in self.get_sales_orders_by_doc_entries(missing).items():
+                    sales_order = SalesOrder()
+                    self._apply_sales_order_fields(sales_order, order_data)
+                    for line_data in order_data.get('DocumentLines', []):
+                        if line_data.get('LineNum') is None:
+                            continue
+                        order_line = SalesOrderLine()
+                        self._apply_sales_order_line_fields(order_line, line_data)
+                        sales_order.order_lines.append(order_line)
+                    db.session.add(sales_order)
+                    orders[doc_entry] = sales_order
+                db.session.commit()
+            
+            order_lines = {}
+            if orders:
+                order_ids = {order.id: order for order in orders.values()}
+                for order_line in SalesOrderLine.query.filter(SalesOrderLine.sales_order_id.in_(order_ids)).all():
+                    order_lines[(order_line.sales_order_id, order_line.line_num)] = order_line
+            
             for line in picklist_lines:
                 enhanced_line = line.copy()
                 
@@ -4122,23 +4383,11 @@ class SAPIntegration:
                 order_row_id = line.get('OrderRowID')
                 
                 if order_entry and order_row_id is not None:
-                    # First try to get from local database
-                    sales_order = SalesOrder.query.filter_by(doc_entry=order_entry).first()
-                    
-                    if not sales_order:
-                        # Fetch from SAP B1 and sync to local
-                        sap_result = self.get_sales_order_by_doc_entry(order_entry)
-                        if sap_result.get('success'):
-                            sync_result = self.sync_sales_order_to_local_db(sap_result['sales_order'])
-                            if sync_result.get('success'):
-                                sales_order = SalesOrder.query.filter_by(doc_entry=order_entry).first()
+                    sales_order = orders.get(int(order_entry))
                     
                     if sales_order:
-                        # Get the specific line based on OrderRowID (which corresponds to LineNum)
-                        order_line = SalesOrderLine.query.filter_by(
-                            sales_order_id=sales_order.id,
-                            line_num=order_row_id
-                        ).first()
+                        # OrderRowID corresponds to the Sales Order LineNum
+                        order_line = order_lines.get((sales_order.id, int(order_row_id)))
                         
                         if order_line:
                             # Enhance the picklist line with Sales Order data directly on the line object
@@ -4155,8 +4404,6 @@ class SAPIntegration:
                                 'UnitPrice': order_line.unit_price,
                                 'LineTotal': order_line.line_total
                             })
-                            
-                            logging.info(f"✅ Enhanced picklist line {line.get('LineNumber')} with Sales Order data: {order_line.item_code}")
                         else:
                             logging.warning(f"⚠️ Sales Order line not found: OrderEntry={order_entry}, OrderRowID={order_row_id}")
                     else:
@@ -4165,6 +4412,9 @@ class SAPIntegration:
                     logging.debug(f"No OrderEntry or OrderRowID for picklist line {line.get('LineNumber')}")
                 
                 enhanced_lines.append(enhanced_line)
+            
+            logging.info(f"✅ Enhanced {len(enhanced_lines)} picklist lines from {len(orders)} Sales Orders "
+                         f"({len(missing)} fetched from SAP)")
                 
         except Exception as e:
             logging.error(f"Error enhancing picklist with Sales Order data: {str(e)}")
@@ -5062,6 +5312,12 @@ class SAPIntegration:
             
             stock_transfer_lines = []
             line_num = 0
+
+            # Resolve every bin of the transfer in one $batch round trip
+            bin_entries = self.get_bin_abs_entries(
+                [(item.get('from_bin'), from_warehouse) for item in items] +
+                [(item.get('to_bin'), to_warehouse) for item in items]
+            )
             
             for item in items:
                 line = {
@@ -5073,7 +5329,7 @@ class SAPIntegration:
                 }
                 
                 if item.get('from_bin'):
-                    from_bin_abs_entry = self.get_bin_abs_entry(item['from_bin'], from_warehouse)
+                    from_bin_abs_entry = bin_entries.get((item['from_bin'], from_warehouse))
                     
                     if from_bin_abs_entry is None:
                         logging.error(f"Could not find BinAbsEntry for from_bin {item['from_bin']}")
@@ -5091,7 +5347,7 @@ class SAPIntegration:
                     line["StockTransferLinesBinAllocations"] = bin_allocations
                 
                 if item.get('to_bin'):
-                    to_bin_abs_entry = self.get_bin_abs_entry(item['to_bin'], to_warehouse)
+                    to_bin_abs_entry = bin_entries.get((item['to_bin'], to_warehouse))
                     
                     if to_bin_abs_entry is None:
                         logging.error(f"Could not find BinAbsEntry for to_bin {item['to_bin']}")
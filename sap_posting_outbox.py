@@ -0,0 +1,437 @@
+"""
+SAP B1 Posting Outbox
+Document postings are queued in sap_posting_outbox in the same transaction as
+the local status change, then dispatched to SAP with an idempotency reference.
+Before any retry the dispatcher looks the reference up in SAP, so a timeout
+after SAP committed the document never produces a duplicate.
+
+Documents that SAP must create together (enqueue_batch_posting) share one entry
+and are posted in a single $batch changeset: SAP commits all of them or none.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import requests
+
+from app import db
+from models import SAPPostingOutbox
+
+# Reference is stored in this UDF when configured, otherwise appended to Comments
+IDEMPOTENCY_UDF = os.environ.get('SAP_IDEMPOTENCY_UDF', '')
+MAX_ATTEMPTS = int(os.environ.get('SAP_OUTBOX_MAX_ATTEMPTS', '8'))
+# A 'processing' entry older than this was abandoned by a crashed worker
+STALE_PROCESSING_MINUTES = 10
+# SAP statuses worth retrying - everything else 4xx is a business error
+RETRYABLE_STATUSES = (401, 408, 429, 500, 502, 503, 504)
+# endpoint of an entry whose payload is a list of $batch operations
+BATCH_ENDPOINT = '$batch'
+
+# document_type -> callable(entry) that applies the posting outcome to the local document
+_result_handlers = {}
+
+_dispatcher_thread = None
+
+
+def register_result_handler(document_type, handler):
+    """
+    Register the function that updates the local document when its posting finishes
+
+    For $batch entries entry.documents maps each document name to what SAP
+    created (None if it was not created).
+    """
+    _result_handlers[document_type] = handler
+
+
+def _reference_tag(key):
+    return f"[WMS:{key}]"
+
+
+def stamp_reference(payload, key):
+    """Write the idempotency reference into the SAP document"""
+    payload = dict(payload)
+    if IDEMPOTENCY_UDF:
+        payload[IDEMPOTENCY_UDF] = key
+    else:
+        tag = _reference_tag(key)
+        comments = payload.get('Comments') or ''
+        # SAP Comments is limited to 254 characters
+        payload['Comments'] = f"{comments[:253 - len(tag)]} {tag}".strip()
+    return payload
+
+
+def _new_key(key_prefix, source_id):
+    """Idempotency key of a new entry - random, so concurrent enqueues for one document never collide"""
+    return f"{key_prefix}-{source_id}-{uuid.uuid4().hex[:12]}"
+
+
+def enqueue_posting(document_type, source_id, endpoint, payload, key_prefix):
+    """
+    Queue a document for posting. Adds to the current session without committing,
+    so the caller's status change and the outbox entry commit together.
+
+    Returns:
+        The SAPPostingOutbox entry
+    """
+    key = _new_key(key_prefix, source_id)
+
+    entry = SAPPostingOutbox(
+        document_type=document_type,
+        source_id=source_id,
+        endpoint=endpoint,
+        idempotency_key=key,
+        payload=json.dumps(stamp_reference(payload, key), default=str),
+        status='pending',
+        attempts=0,
+        next_attempt_at=datetime.utcnow()
+    )
+    db.session.add(entry)
+    return entry
+
+
+def enqueue_batch_posting(document_type, source_id, documents, key_prefix):
+    """
+    Queue documents that SAP must create in one transaction, as one entry posted
+    in a single $batch changeset. Each document gets its own reference (key-1,
+    key-2, ...) so a retry can find what SAP already created.
+
+    Args:
+        documents: List of (name, endpoint, payload); name identifies the document
+                   in entry.documents for the result handler
+
+    Returns:
+        The SAPPostingOutbox entry
+    """
+    key = _new_key(key_prefix, source_id)
+
+    entry = SAPPostingOutbox(
+        document_type=document_type,
+        source_id=source_id,
+        endpoint=BATCH_ENDPOINT,
+        idempotency_key=key,
+        payload=json.dumps(_batch_operations(key, documents), default=str),
+        status='pending',
+        attempts=0,
+        next_attempt_at=datetime.utcnow()
+    )
+    db.session.add(entry)
+    return entry
+
+
+def _batch_operations(key, documents, operation_keys=None):
+    """$batch operations of documents; operation_keys (name -> key) keeps the references already issued"""
+    operation_keys = dict(operation_keys or {})
+    numbers = [int(operation_key.rsplit('-', 1)[1]) for operation_key in operation_keys.values()]
+    next_number = max(numbers, default=0) + 1
+    operations = []
+    for name, endpoint, payload in documents:
+        if name not in operation_keys:
+            operation_keys[name] = f"{key}-{next_number}"
+            next_number += 1
+        operation_key = operation_keys[name]
+        operations.append({'name': name, 'method': 'POST', 'path': endpoint, 'key': operation_key,
+                           'body': stamp_reference(payload, operation_key)})
+    return operations
+
+
+def refresh_pending_posting(entry, payload=None, documents=None):
+    """
+    Replace the payload of an entry that is still waiting to be posted (the local
+    document changed since it was queued). Entries being posted or already posted
+    are left alone; returns whether the payload was replaced.
+
+    Args:
+        payload: New document of a single-document entry
+        documents: New (name, endpoint, payload) list of a $batch entry; a document
+                   keeps its reference, so a retry still finds it in SAP
+    """
+    if entry.status != 'pending':
+        return False
+    if entry.endpoint == BATCH_ENDPOINT:
+        issued = {operation['name']: operation['key'] for operation in json.loads(entry.payload)}
+        operations = _batch_operations(entry.idempotency_key, documents, issued)
+        entry.payload = json.dumps(operations, default=str)
+    else:
+        entry.payload = json.dumps(stamp_reference(payload, entry.idempotency_key), default=str)
+    return True
+
+
+def find_existing_document(sap, endpoint, key):
+    """Look the idempotency reference up in SAP; returns the document dict or None"""
+    if IDEMPOTENCY_UDF:
+        condition = f"{IDEMPOTENCY_UDF} eq '{key}'"
+    else:
+        condition = f"contains(Comments, '{_reference_tag(key)}')"
+
+    url = f"{sap.base_url}/b1s/v1/{endpoint}?$filter={condition}&$select=DocEntry,DocNum&$top=1"
+    response = sap.session.get(url, timeout=30)
+    if response.status_code != 200:
+        raise RuntimeError(f"SAP lookup of {key} failed ({response.status_code}): {response.text}")
+
+    documents = response.json().get('value', [])
+    return documents[0] if documents else None
+
+
+def _claim(entry_id):
+    """Move a pending entry to processing; False if another worker got it first"""
+    claimed = SAPPostingOutbox.query.filter_by(id=entry_id, status='pending').update(
+        {'status': 'processing', 'attempts': SAPPostingOutbox.attempts + 1, 'updated_at': datetime.utcnow()},
+        synchronize_session=False
+    )
+    db.session.commit()
+    return claimed == 1
+
+
+def _finish(entry, status, doc=None, error=None, documents=None):
+    entry.status = status
+    entry.last_error = error
+    entry.documents = documents or {}
+    if documents:
+        doc = next((document for document in documents.values() if document), None)
+    if doc:
+        entry.sap_doc_entry = doc.get('DocEntry')
+        entry.sap_doc_num = str(doc.get('DocNum')) if doc.get('DocNum') is not None else None
+        entry.posted_at = datetime.utcnow()
+
+    handler = _result_handlers.get(entry.document_type)
+    if handler and status in ('posted', 'failed', 'dead'):
+        handler(entry)
+    db.session.commit()
+
+
+def _attempted_before(entry):
+    """Whether an earlier attempt was made (attempts restart at 0 on requeue, last_error survives it)"""
+    return entry.attempts > 1 or bool(entry.last_error)
+
+
+def _retry_later(entry, error):
+    if entry.attempts >= MAX_ATTEMPTS:
+        logging.error(f"❌ SAP posting {entry.idempotency_key} gave up after {entry.attempts} attempts: {error}")
+        _finish(entry, 'dead', error=error)
+        return
+    delay = min(30 * (2 ** (entry.attempts - 1)), 3600)
+    entry.status = 'pending'
+    entry.last_error = error
+    entry.next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
+    db.session.commit()
+    logging.warning(f"⚠️ SAP posting {entry.idempotency_key} will retry in {delay}s: {error}")
+
+
+def dispatch_entry(entry, sap=None):
+    """
+    Post one outbox entry to SAP
+
+    Returns:
+        The entry's status after the attempt: posted, failed, pending, dead,
+        or processing if another worker owns it
+    """
+    if not _claim(entry.id):
+        db.session.refresh(entry)
+        return entry.status
+    db.session.refresh(entry)
+
+    if sap is None:
+        from sap_integration import SAPIntegration
+        sap = SAPIntegration()
+
+    try:
+        if not sap.ensure_logged_in():
+            _retry_later(entry, 'SAP login failed')
+            return entry.status
+
+        if entry.endpoint == BATCH_ENDPOINT:
+            _post_batch(entry, sap)
+            return entry.status
+
+        # A previous attempt may have reached SAP even though we never saw the response
+        if _attempted_before(entry):
+            existing = find_existing_document(sap, entry.endpoint, entry.idempotency_key)
+            if existing:
+                logging.info(f"♻️ SAP posting {entry.idempotency_key} already exists as DocEntry {existing.get('DocEntry')}")
+                _finish(entry, 'posted', doc=existing)
+                return entry.status
+
+        response = sap.session.post(f"{sap.base_url}/b1s/v1/{entry.endpoint}",
+                                    json=json.loads(entry.payload), timeout=60)
+
+        if response.status_code == 201:
+            document = response.json()
+            logging.info(f"✅ SAP posting {entry.idempotency_key} created DocNum={document.get('DocNum')}")
+            _finish(entry, 'posted', doc=document)
+        elif response.status_code in RETRYABLE_STATUSES:
+            if response.status_code == 401:
+                sap.session_id = None
+            _retry_later(entry, f"HTTP {response.status_code}: {response.text}")
+        else:
+            logging.error(f"❌ SAP rejected {entry.idempotency_key}: {response.text}")
+            _finish(entry, 'failed', error=response.text)
+
+    except (requests.exceptions.Timeout, requests.exceptions.ConnectionError, RuntimeError) as e:
+        _retry_later(entry, str(e))
+    except Exception as e:
+        db.session.rollback()
+        entry = SAPPostingOutbox.query.get(entry.id)
+        _retry_later(entry, str(e))
+
+    return entry.status
+
+
+def _post_batch(entry, sap):
+    """Post the documents of a $batch entry in one changeset, leaving out any that a previous attempt created"""
+    operations = json.loads(entry.payload)
+    documents = {operation['name']: None for operation in operations}
+    if _attempted_before(entry):
+        for operation in operations:
+            documents[operation['name']] = find_existing_document(sap, operation['path'], operation['key'])
+
+    missing = [operation for operation in operations if documents[operation['name']] is None]
+    if not missing:
+        logging.info(f"♻️ SAP posting {entry.idempotency_key} already exists")
+        _finish(entry, 'posted', documents=documents)
+        return
+
+    result = sap.execute_batch(missing, atomic=True)
+    # Only the sequential fallback can create part of the documents
+    for operation, part in zip(missing, result.get('results', [])):
+        if part['status'] in (200, 201) and isinstance(part['body'], dict):
+            documents[operation['name']] = part['body']
+
+    if result['success']:
+        logging.info(f"✅ SAP posting {entry.idempotency_key} created {len(missing)} document(s) in one $batch")
+        _finish(entry, 'posted', documents=documents)
+        return
+
+    # No status: the request itself failed (timeout, connection error); 599: same in the sequential fallback
+    statuses = [part['status'] for part in result.get('results', []) if part['status'] >= 400] or [result.get('status')]
+    if 401 in statuses:
+        sap.session_id = None
+    if any(status is None or status == 599 or status in RETRYABLE_STATUSES for status in statuses):
+        _retry_later(entry, result.get('error'))
+    else:
+        logging.error(f"❌ SAP rejected {entry.idempotency_key}: {result.get('error')}")
+        _finish(entry, 'failed', error=result.get('error'), documents=documents)
+
+
+def dispatch_pending(limit=50, sap=None):
+    """Dispatch due outbox entries in creation order; returns a count per resulting status"""
+    stale_before = datetime.utcnow() - timedelta(minutes=STALE_PROCESSING_MINUTES)
+    SAPPostingOutbox.query.filter(
+        SAPPostingOutbox.status == 'processing',
+        SAPPostingOutbox.updated_at < stale_before
+    ).update({'status': 'pending'}, synchronize_session=False)
+    db.session.commit()
+
+    due = SAPPostingOutbox.query.filter(
+        SAPPostingOutbox.status == 'pending',
+        SAPPostingOutbox.next_attempt_at <= datetime.utcnow()
+    ).order_by(SAPPostingOutbox.id).limit(limit).all()
+
+    outcome = {}
+    for entry in due:
+        status = dispatch_entry(entry, sap)
+        outcome[status] = outcome.get(status, 0) + 1
+    return outcome
+
+
+def requeue(entry_id):
+    """Put a failed or dead entry back in the queue (after the cause was fixed)"""
+    entry = SAPPostingOutbox.query.get(entry_id)
+    if not entry or entry.status not in ('failed', 'dead'):
+        return False
+    entry.status = 'pending'
+    entry.attempts = 0  # A full retry budget, not the one attempt left under MAX_ATTEMPTS
+    entry.next_attempt_at = datetime.utcnow()
+    db.session.commit()
+    return True
+
+
+def reconciliation_report(verify_in_sap=False, sap=None, limit=200):
+    """
+    Summarise outbox state for operators
+
+    Args:
+        verify_in_sap: Also check that unresolved entries' references exist in SAP
+        limit: Maximum unresolved entries listed
+
+    Returns:
+        dict with counts per status and the unresolved entries
+    """
+    counts = dict(db.session.query(SAPPostingOutbox.status, db.func.count(SAPPostingOutbox.id))
+                  .group_by(SAPPostingOutbox.status).all())
+
+    unresolved = SAPPostingOutbox.query.filter(
+        SAPPostingOutbox.status.in_(['pending', 'processing', 'failed', 'dead'])
+    ).order_by(SAPPostingOutbox.id).limit(limit).all()
+
+    if verify_in_sap and unresolved and sap is None:
+        from sap_integration import SAPIntegration
+        sap = SAPIntegration()
+        verify_in_sap = sap.ensure_logged_in()
+
+    entries = []
+    for entry in unresolved:
+        item = {
+            'id': entry.id,
+            'document_type': entry.document_type,
+            'source_id': entry.source_id,
+            'idempotency_key': entry.idempotency_key,
+            'status': entry.status,
+            'attempts': entry.attempts,
+            'last_error': entry.last_error,
+            'created_at': entry.created_at.isoformat() if entry.created_at else None,
+            'next_attempt_at': entry.next_attempt_at.isoformat() if entry.next_attempt_at else None
+        }
+        if verify_in_sap:
+            try:
+                endpoint, key = entry.endpoint, entry.idempotency_key
+                if endpoint == BATCH_ENDPOINT:
+                    # One changeset: the first document stands for all of them
+                    first = json.loads(entry.payload)[0]
+                    endpoint, key = first['path'], first['key']
+                existing = find_existing_document(sap, endpoint, key)
+                item['in_sap'] = bool(existing)
+                item['sap_doc_num'] = existing.get('DocNum') if existing else None
+            except Exception as e:
+                item['in_sap'] = None
+                item['verify_error'] = str(e)
+        entries.append(item)
+
+    return {'counts': counts, 'unresolved': entries}
+
+
+def start_sap_outbox_dispatcher(app, interval_seconds=None):
+    """
+    Retry queued SAP postings in a background thread.
+    Interval comes from SAP_OUTBOX_DISPATCH_INTERVAL (seconds, 0 disables).
+    """
+    global _dispatcher_thread
+
+    if interval_seconds is None:
+        interval_seconds = int(os.environ.get('SAP_OUTBOX_DISPATCH_INTERVAL', '30') or 0)
+    if interval_seconds <= 0:
+        logging.info("ℹ️ SAP posting outbox dispatcher disabled (SAP_OUTBOX_DISPATCH_INTERVAL=0)")
+        return None
+    if _dispatcher_thread and _dispatcher_thread.is_alive():
+        return _dispatcher_thread
+
+    def run():
+        while True:
+            # Sleep first so blueprints have registered their result handlers
+            time.sleep(interval_seconds)
+            with app.app_context():
+                try:
+                    dispatch_pending()
+                except Exception as e:
+                    logging.error(f"❌ SAP outbox dispatcher error: {str(e)}")
+                finally:
+                    db.session.remove()
+
+    _dispatcher_thread = threading.Thread(target=run, name='sap-outbox-dispatcher', daemon=True)
+    _dispatcher_thread.start()
+    logging.info(f"✅ SAP posting outbox dispatcher started (every {interval_seconds}s)")
+    return _dispatcher_thread
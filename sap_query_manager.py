@@ -4,9 +4,10 @@ Validates and creates required SQL queries in SAP B1 database on application sta
 """
 
 import logging
-import requests
 import urllib3
 
+from sap_gatekeeper import GatedSession
+
 # Disable SSL warnings for SAP B1 connections
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
@@ -20,6 +21,7 @@ class SAPQueryManager:
         self.company_db = company_db
         self.session_id = None
         self.logger = logging.getLogger(__name__)
+        self.http = GatedSession()
         
         self.required_queries = [
             {
@@ -151,6 +153,11 @@ class SAPQueryManager:
                 "SqlCode": "GET_GRPO_Series",
                 "SqlName": "GET_GRPO_Series",
                 "SqlText": "SELECT DISTINCT T1.Series AS SeriesID,T1.SeriesName FROM OPDN T0 INNER JOIN NNM1 T1 ON T0.Series = T1.Series"
+            },
+            {
+                "SqlCode": "Available_Serials_By_WH",
+                "SqlName": "Available_Serials_By_WH",
+                "SqlText": "SELECT T0.[DistNumber] AS [SerialNumber], T0.[SysNumber] AS [SystemNumber], T1.[Quantity] AS [Quantity] FROM [OSRN] T0 INNER JOIN [OSRQ] T1 ON T0.[AbsEntry] = T1.[MdAbsEntry] WHERE T1.[Quantity] > 0 AND T0.[ItemCode] = :itemCode AND T1.[WhsCode] = :whsCode ORDER BY T0.[DistNumber]"
             }
         ]
     
@@ -164,7 +171,7 @@ class SAPQueryManager:
                 "Password": self.password
             }
             
-            response = requests.post(
+            response = self.http.post(
                 login_url,
                 json=payload,
                 verify=False,
@@ -190,7 +197,7 @@ class SAPQueryManager:
         
         try:
             logout_url = f"{self.server_url}/b1s/v1/Logout"
-            requests.post(
+            self.http.post(
                 logout_url,
                 cookies={'B1SESSION': self.session_id},
                 verify=False,
@@ -204,7 +211,7 @@ class SAPQueryManager:
         """Check if a SQL query exists in SAP B1"""
         try:
             url = f"{self.server_url}/b1s/v1/SQLQueries('{sql_code}')"
-            response = requests.get(
+            response = self.http.get(
                 url,
                 cookies={'B1SESSION': self.session_id},
                 verify=False,
@@ -221,7 +228,7 @@ class SAPQueryManager:
         """Create a SQL query in SAP B1"""
         try:
             url = f"{self.server_url}/b1s/v1/SQLQueries"
-            response = requests.post(
+            response = self.http.post(
                 url,
                 json=query_data,
                 cookies={'B1SESSION': self.session_id},
@@ -341,6 +348,9 @@ def validate_sap_queries(app, force=None):
                 f.write(f"Database: {current_db_hash}\n")
                 f.write(f"Timestamp: {datetime.now().isoformat()}\n")
                 logging.info("✅ SQL query validation completed - flag file created, will skip on future restarts")
+                # Queries may have just been created - let fallback chains probe them again
+                from sap_capabilities import capability_registry
+                capability_registry.reset(company_db)
             else:
                 f.write(f"Status: attempted but failed (SAP connection issue)\n")
                 f.write(f"Database: {current_db_hash}\n")
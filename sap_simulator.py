@@ -0,0 +1,1286 @@
+#!/usr/bin/env python3
+"""
+SAP B1 Service Layer Simulator
+Local, deterministic stand-in for the SAP B1 Service Layer, so the WMS can be
+exercised and load tested without a real SAP server.
+
+Serves /b1s/v1 with:
+- Login / Logout (B1SESSION cookie, 401 for unknown sessions)
+- SQLQueries('<code>')/List for every query in sap_query_manager.required_queries
+- Warehouses, BinLocations, Items, BatchNumberDetails, SerialNumberDetails,
+  PurchaseOrders, Orders, PurchaseDeliveryNotes, InventoryTransferRequests,
+  PickLists and InventoryCountings: $filter (eq/ne/gt/ge/lt/le, contains and
+  startswith joined by 'and', groups joined by 'or'), $select, $top, $skip and odata.maxpagesize paging with nextLink
+- $crossjoin(<Entity>,<Entity>/<Lines>) with $expand($select) and $filter
+- POST StockTransfers, PurchaseDeliveryNotes, DeliveryNotes, Invoices, Drafts,
+  InventoryCountings (stock, serial and batch movements are validated and
+  applied); PATCH PickLists / InventoryCountings
+- $batch with changesets (a failing operation rolls back its changeset)
+
+The dataset is generated from SAP_SIM_SEED, so a seed always yields the same
+warehouses, bins, items, batches, serials and documents. Latency
+(SAP_SIM_LATENCY_MS plus up to SAP_SIM_JITTER_MS per request, plus
+SAP_SIM_OP_LATENCY_MS per operation inside a $batch) and error injection
+(SAP_SIM_ERROR_RATE of requests answer one of SAP_SIM_ERROR_STATUSES,
+optionally only for SAP_SIM_ERROR_RESOURCES) can be changed at runtime with
+POST /sim/config. GET /sim/stats returns the calls per resource, POST
+/sim/reset clears them (and restores the dataset with {"data": true}).
+
+Run:
+    SAP_SIM_PORT=50001 python sap_simulator.py
+
+and point the WMS at it:
+    SAP_B1_SERVER=http://127.0.0.1:50001 SAP_B1_USERNAME=manager
+    SAP_B1_PASSWORD=sim SAP_B1_COMPANY_DB=SIM_COMPANY
+"""
+
+import copy
+import json
+import logging
+import operator
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import date, timedelta
+from urllib.parse import parse_qsl, quote, unquote, urlencode
+
+from flask import Flask, Response, request
+
+BASE_PATH = '/b1s/v1'
+BASE_DATE = date(2026, 1, 5)  # Fixed so a seed always produces the same documents
+
+WAREHOUSES = [
+    ('7000-FG', 'Finished Goods'),
+    ('7000-QFG', 'QC Finished Goods'),
+    ('7000-RM', 'Raw Material'),
+    ('7000-WIP', 'Work In Progress'),
+]
+
+SERIES = [
+    (101, 'PO2026', '22'),
+    (102, 'POIMP', '22'),
+    (201, 'SO2026', '17'),
+    (301, 'GRPO2026', '20'),
+    (401, 'ITR2026', '1250000001'),
+    (501, 'CNT2026', '1470000065'),
+]
+
+# Key property of each entity set (everything else is keyed by DocEntry)
+ENTITY_KEYS = {
+    'Warehouses': 'WarehouseCode',
+    'BinLocations': 'AbsEntry',
+    'Items': 'ItemCode',
+    'PickLists': 'Absoluteentry',
+    'InventoryCountings': 'DocumentEntry',
+}
+
+# Line collection of each document entity set
+DOCUMENT_LINES = {
+    'PurchaseOrders': 'DocumentLines',
+    'Orders': 'DocumentLines',
+    'PurchaseDeliveryNotes': 'DocumentLines',
+    'DeliveryNotes': 'DocumentLines',
+    'Invoices': 'DocumentLines',
+    'Drafts': 'DocumentLines',
+    'StockTransfers': 'StockTransferLines',
+    'InventoryTransferRequests': 'StockTransferLines',
+    'InventoryCountings': 'InventoryCountingLines',
+    'PickLists': 'PickListsLines',
+    'Items': 'ItemWarehouseInfoCollection',
+}
+
+POSTABLE = ('StockTransfers', 'PurchaseDeliveryNotes', 'DeliveryNotes', 'Invoices', 'Drafts', 'InventoryCountings')
+PATCHABLE = ('PickLists', 'InventoryCountings')
+
+# $crossjoin rows carry the table codes instead of the enum names
+CROSSJOIN_STATUS_CODES = {'bost_Open': 'O', 'bost_Close': 'C', 'bost_Paid': 'C', 'bost_Delivered': 'C'}
+
+COMPARATORS = {'eq': operator.eq, 'ne': operator.ne, 'gt': operator.gt,
+               'ge': operator.ge, 'lt': operator.lt, 'le': operator.le,
+               'contains': lambda left, right: left is not None and right in left,
+               'startswith': lambda left, right: left is not None and left.startswith(right)}
+DATE_LITERAL = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+FILTER_CLAUSE = re.compile(r"^\(?\s*([\w/]+)\s+(eq|ne|gt|ge|lt|le)\s+(.+?)\s*\)?$")
+FILTER_FUNCTION = re.compile(r"^\(?\s*(contains|startswith)\(\s*([\w/]+)\s*,\s*(.+?)\s*\)\s*\)?$")
+RESOURCE_PATH = re.compile(r"^(\$?\w+)(?:\((.*?)\))?(?:/(\w+))?$")
+SAFE_QUERY = "'$(),/"
+INTERNAL_SETS = ('series', 'batch_stock', 'serials')
+
+
+class SimulatorConfig:
+    """Latency and error injection knobs (environment defaults, changeable at runtime)"""
+
+    def __init__(self):
+        self.seed = int(os.environ.get('SAP_SIM_SEED', '42'))
+        self.latency_ms = float(os.environ.get('SAP_SIM_LATENCY_MS', '40'))
+        self.jitter_ms = float(os.environ.get('SAP_SIM_JITTER_MS', '20'))
+        self.op_latency_ms = float(os.environ.get('SAP_SIM_OP_LATENCY_MS', '5'))
+        self.error_rate = float(os.environ.get('SAP_SIM_ERROR_RATE', '0'))
+        self.error_statuses = [int(s) for s in os.environ.get('SAP_SIM_ERROR_STATUSES', '500,503').split(',') if s.strip()]
+        self.error_resources = [r.strip() for r in os.environ.get('SAP_SIM_ERROR_RESOURCES', '').split(',') if r.strip()]
+        self.page_size = int(os.environ.get('SAP_SIM_PAGE_SIZE', '20'))  # Service Layer default
+        self.require_session = os.environ.get('SAP_SIM_REQUIRE_SESSION', 'true').lower() == 'true'
+        self.company_db = os.environ.get('SAP_SIM_COMPANY_DB', '')  # Empty accepts any company
+        self.password = os.environ.get('SAP_SIM_PASSWORD', '')  # Empty accepts any password
+
+    def update(self, values):
+        for name in ('latency_ms', 'jitter_ms', 'op_latency_ms', 'error_rate'):
+            if name in values:
+                setattr(self, name, float(values[name]))
+        if 'page_size' in values:
+            self.page_size = int(values['page_size'])
+        if 'error_statuses' in values:
+            self.error_statuses = [int(s) for s in values['error_statuses']]
+        if 'error_resources' in values:
+            self.error_resources = list(values['error_resources'])
+
+    def to_dict(self):
+        return {
+            'seed': self.seed,
+            'latency_ms': self.latency_ms,
+            'jitter_ms': self.jitter_ms,
+            'op_latency_ms': self.op_latency_ms,
+            'error_rate': self.error_rate,
+            'error_statuses': self.error_statuses,
+            'error_resources': self.error_resources,
+            'page_size': self.page_size,
+            'require_session': self.require_session
+        }
+
+
+# ----------------------------------------------------------------------
+# Dataset
+# ----------------------------------------------------------------------
+
+def _iso(day):
+    return f"{day.isoformat()}T00:00:00Z"
+
+
+def build_dataset(seed=42, items=60, purchase_orders=40, sales_orders=30, transfer_requests=30,
+                  pick_lists=20, countings=10, grpos=10):
+    """
+    Generate the simulated company
+
+    Items cycle through batch managed, serial managed and unmanaged; every
+    item has stock in every warehouse. Documents reference existing items,
+    warehouses and bins only.
+    """
+    rng = random.Random(seed)
+    data = {name: [] for name in ('Warehouses', 'BinLocations', 'Items', 'BatchNumberDetails', 'SerialNumberDetails',
+                                  'PurchaseOrders', 'Orders', 'PurchaseDeliveryNotes', 'DeliveryNotes', 'Invoices',
+                                  'Drafts', 'StockTransfers', 'InventoryTransferRequests', 'PickLists',
+                                  'InventoryCountings')}
+    data['series'] = [{'Series': s, 'SeriesName': n, 'ObjectCode': o} for s, n, o in SERIES]
+    data['batch_stock'] = []
+    data['serials'] = []
+
+    bins_by_warehouse = {}
+    for warehouse_index, (code, name) in enumerate(WAREHOUSES):
+        bins = []
+        for aisle in range(1, 5):
+            for level in range(1, 11):
+                abs_entry = len(data['BinLocations']) + 1
+                bins.append(abs_entry)
+                data['BinLocations'].append({
+                    'AbsEntry': abs_entry,
+                    'BinCode': f"{code}-A{aisle:02d}-{level:02d}",
+                    'Warehouse': code,
+                    'Sublevel1': f"A{aisle:02d}",
+                    'Sublevel2': f"{level:02d}",
+                    'Inactive': 'tYES' if abs_entry % 13 == 0 else 'tNO',
+                    'MaximumQty': 0.0
+                })
+        bins_by_warehouse[code] = [b for b in bins if b % 13 != 0]
+        data['Warehouses'].append({
+            'WarehouseCode': code,
+            'WarehouseName': name,
+            'BusinessPlaceID': 1,
+            'EnableBinLocations': 'tYES',
+            'DefaultBin': bins_by_warehouse[code][0],
+            'Inactive': 'tNO'
+        })
+
+    system_number = 0
+    for index in range(1, items + 1):
+        kind = ('batch', 'serial', 'none')[index % 3]
+        item_code = f"ITM-{index:04d}"
+        item_name = f"Simulated {kind} item {index}"
+        stock = []
+        for code, _ in WAREHOUSES:
+            if kind == 'batch':
+                quantity = 0.0
+                for batch_index in range(1, 4):
+                    system_number += 1
+                    batch_quantity = float(rng.randint(20, 200))
+                    quantity += batch_quantity
+                    batch_number = f"B{index:04d}-{code[-2:]}{batch_index}"
+                    data['BatchNumberDetails'].append({
+                        'DocEntry': system_number,
+                        'ItemCode': item_code,
+                        'ItemDescription': item_name,
+                        'Status': 'bdsStatus_Released',
+                        'Batch': batch_number,
+                        'SystemNumber': system_number,
+                        'ExpirationDate': _iso(BASE_DATE + timedelta(days=rng.randint(60, 720))),
+                        'ManufacturingDate': _iso(BASE_DATE - timedelta(days=rng.randint(1, 90))),
+                        'AdmissionDate': _iso(BASE_DATE)
+                    })
+                    data['batch_stock'].append({'AbsEntry': system_number, 'ItemCode': item_code, 'WhsCode': code,
+                                                'Quantity': batch_quantity, 'CommitQty': 0.0})
+            elif kind == 'serial':
+                quantity = float(rng.randint(5, 15))
+                for _ in range(int(quantity)):
+                    system_number += 1
+                    serial = {
+                        'AbsEntry': system_number,
+                        'SysNumber': system_number,
+                        'ItemCode': item_code,
+                        'DistNumber': f"SN{index:04d}{system_number:06d}",
+                        'WhsCode': code,
+                        'BinAbs': rng.choice(bins_by_warehouse[code]),
+                        'Quantity': 1.0,
+                        'history': [{'DocType': 20, 'DocEntry': 1, 'DocNum': 9000, 'DocDate': _iso(BASE_DATE),
+                                     'CardCode': 'V0001', 'CardName': 'Vendor 1', 'WhsCode': code}]
+                    }
+                    data['serials'].append(serial)
+                    data['SerialNumberDetails'].append({
+                        'DocEntry': system_number,
+                        'ItemCode': item_code,
+                        'ItemDescription': item_name,
+                        'SerialNumber': serial['DistNumber'],
+                        'SystemNumber': system_number,
+                        'Status': 'sdsStatus_Released'
+                    })
+            else:
+                quantity = float(rng.randint(500, 5000))
+            stock.append({'WarehouseCode': code, 'InStock': quantity, 'Committed': 0.0, 'Ordered': 0.0})
+
+        data['Items'].append({
+            'ItemCode': item_code,
+            'ItemName': item_name,
+            'ForeignName': None,
+            'InventoryUOM': 'EA',
+            'BarCode': f"89{index:011d}",
+            'ManageBatchNumbers': 'tYES' if kind == 'batch' else 'tNO',
+            'ManageSerialNumbers': 'tYES' if kind == 'serial' else 'tNO',
+            'Valid': 'tYES',
+            'ItemWarehouseInfoCollection': stock
+        })
+
+    item_codes = [item['ItemCode'] for item in data['Items']]
+    warehouse_codes = [code for code, _ in WAREHOUSES]
+    next_entry = 1
+
+    def document_lines(count, with_bins=False):
+        lines = []
+        for line_num in range(count):
+            item = data['Items'][item_codes.index(rng.choice(item_codes))]
+            quantity = float(rng.randint(1, 50))
+            price = round(rng.uniform(1, 250), 2)
+            line = {
+                'LineNum': line_num,
+                'ItemCode': item['ItemCode'],
+                'ItemDescription': item['ItemName'],
+                'Quantity': quantity,
+                'RemainingOpenQuantity': quantity,
+                'WarehouseCode': rng.choice(warehouse_codes),
+                'LineStatus': 'bost_Open',
+                'Price': price,
+                'UnitPrice': price,
+                'PriceAfterVAT': round(price * 1.18, 2),
+                'LineTotal': round(price * quantity, 2),
+                'MeasureUnit': 'EA',
+                'UnitsOfMeasurment': 1.0
+            }
+            if with_bins:
+                line['BinAbsEntry'] = rng.choice(bins_by_warehouse[line['WarehouseCode']])
+            lines.append(line)
+        return lines
+
+    def marketing_documents(entity, count, series_for, card_prefix, first_num):
+        nonlocal next_entry
+        for index in range(count):
+            lines = document_lines(rng.randint(1, 8))
+            doc_entry = next_entry
+            next_entry += 1
+            for line in lines:
+                line['DocEntry'] = doc_entry
+            data[entity].append({
+                'DocEntry': doc_entry,
+                'DocNum': first_num + index,
+                'Series': series_for(index),
+                'CardCode': f"{card_prefix}{index % 12 + 1:04d}",
+                'CardName': f"{'Vendor' if card_prefix == 'V' else 'Customer'} {index % 12 + 1}",
+                'DocDate': _iso(BASE_DATE - timedelta(days=index % 30)),
+                'DocDueDate': _iso(BASE_DATE + timedelta(days=14)),
+                'DocumentStatus': 'bost_Open',
+                'BPL_IDAssignedToInvoice': 1,
+                'DocTotal': round(sum(line['LineTotal'] for line in lines), 2),
+                'DocumentLines': lines
+            })
+
+    marketing_documents('PurchaseOrders', purchase_orders, lambda index: 102 if index % 4 == 0 else 101, 'V', 5001)
+    marketing_documents('Orders', sales_orders, lambda index: 201, 'C', 7001)
+
+    for index in range(grpos):
+        doc_entry = next_entry
+        next_entry += 1
+        lines = []
+        for line_num, line in enumerate(document_lines(rng.randint(1, 4))):
+            line['DocEntry'] = doc_entry
+            item = data['Items'][item_codes.index(line['ItemCode'])]
+            if item['ManageBatchNumbers'] == 'tYES':
+                batch = next(b for b in data['BatchNumberDetails'] if b['ItemCode'] == item['ItemCode'])
+                line['BatchNumbers'] = [{'BatchNumber': batch['Batch'], 'Quantity': line['Quantity'],
+                                         'ExpiryDate': batch['ExpirationDate'],
+                                         'ManufacturingDate': batch['ManufacturingDate']}]
+            lines.append(line)
+        data['PurchaseDeliveryNotes'].append({
+            'DocEntry': doc_entry, 'DocNum': 9001 + index, 'Series': 301,
+            'CardCode': f"V{index % 12 + 1:04d}", 'CardName': f"Vendor {index % 12 + 1}",
+            'DocDate': _iso(BASE_DATE - timedelta(days=index)), 'DocumentStatus': 'bost_Open',
+            'DocTotal': round(sum(line['LineTotal'] for line in lines), 2), 'DocumentLines': lines
+        })
+
+    for index in range(transfer_requests):
+        doc_entry = next_entry
+        next_entry += 1
+        from_warehouse, to_warehouse = rng.sample(warehouse_codes, 2)
+        lines = []
+        for line in document_lines(rng.randint(1, 6)):
+            lines.append({
+                'LineNum': line['LineNum'], 'DocEntry': doc_entry, 'ItemCode': line['ItemCode'],
+                'ItemDescription': line['ItemDescription'], 'Quantity': line['Quantity'],
+                'RemainingOpenQuantity': line['Quantity'], 'FromWarehouseCode': from_warehouse,
+                'WarehouseCode': to_warehouse, 'LineStatus': 'bost_Open', 'UoMCode': 'EA'
+            })
+        data['InventoryTransferRequests'].append({
+            'DocEntry': doc_entry, 'DocNum': 3001 + index, 'Series': 401,
+            'DocDate': _iso(BASE_DATE - timedelta(days=index % 10)), 'DueDate': _iso(BASE_DATE + timedelta(days=7)),
+            'FromWarehouse': from_warehouse, 'ToWarehouse': to_warehouse, 'DocumentStatus': 'bost_Open',
+            'Comments': f"Simulated transfer request {index + 1}", 'StockTransferLines': lines
+        })
+
+    for index in range(pick_lists):
+        absolute_entry = index + 1
+        order = data['Orders'][index % len(data['Orders'])]
+        lines = []
+        for line_number, order_line in enumerate(order['DocumentLines']):
+            lines.append({
+                'AbsoluteEntry': absolute_entry, 'LineNumber': line_number, 'OrderEntry': order['DocEntry'],
+                'OrderRowID': order_line['LineNum'], 'BaseObjectType': '17', 'PickStatus': 'ps_Released',
+                'ReleasedQuantity': order_line['Quantity'], 'PreviouslyReleasedQuantity': 0.0,
+                'PickedQuantity': 0.0, 'SerialNumbers': [], 'BatchNumbers': [],
+                'DocumentLinesBinAllocations': [{
+                    'BinAbsEntry': rng.choice(bins_by_warehouse[order_line['WarehouseCode']]),
+                    'Quantity': order_line['Quantity'], 'AllowNegativeQuantity': 'tNO',
+                    'SerialAndBatchNumbersBaseLine': -1, 'BaseLineNumber': line_number
+                }]
+            })
+        data['PickLists'].append({
+            'Absoluteentry': absolute_entry, 'Name': f"PL-SIM-{absolute_entry:04d}", 'OwnerCode': 1,
+            'OwnerName': 'manager', 'PickDate': _iso(BASE_DATE), 'Remarks': None, 'Status': 'ps_Released',
+            'ObjectType': '156', 'UseBaseUnits': 'tNO', 'UpdateDate': _iso(BASE_DATE), 'UpdateTime': '08:00:00',
+            'PickListsLines': lines
+        })
+
+    for index in range(countings):
+        doc_entry = next_entry
+        next_entry += 1
+        warehouse = warehouse_codes[index % len(warehouse_codes)]
+        lines = []
+        for line_number, item_code in enumerate(rng.sample(item_codes, 6), start=1):
+            item = data['Items'][item_codes.index(item_code)]
+            in_stock = next(s['InStock'] for s in item['ItemWarehouseInfoCollection'] if s['WarehouseCode'] == warehouse)
+            lines.append({
+                'LineNumber': line_number, 'ItemCode': item_code, 'ItemDescription': item['ItemName'],
+                'WarehouseCode': warehouse, 'BinEntry': rng.choice(bins_by_warehouse[warehouse]),
+                'InWarehouseQuantity': in_stock, 'Counted': 'tNO', 'CountedQuantity': 0.0, 'Variance': -in_stock,
+                'LineStatus': 'clsOpen'
+            })
+        data['InventoryCountings'].append({
+            'DocumentEntry': doc_entry, 'DocumentNumber': 6001 + index, 'Series': 501,
+            'CountDate': _iso(BASE_DATE), 'CountTime': '08:00:00', 'DocumentStatus': 'cdsOpen',
+            'Remarks': f"Simulated count {index + 1}", 'InventoryCountingLines': lines
+        })
+
+    data['next_doc_entry'] = next_entry + 1000
+    return data
+
+
+# ----------------------------------------------------------------------
+# Query helpers
+# ----------------------------------------------------------------------
+
+def _field(record, name):
+    """Property of a record, matched case-insensitively like the Service Layer"""
+    if name in record:
+        return record[name]
+    lowered = name.lower()
+    for key, value in record.items():
+        if key.lower() == lowered:
+            return value
+    return None
+
+
+def _literal(text):
+    text = text.strip()
+    if len(text) >= 2 and text[0] == text[-1] == "'":
+        return text[1:-1].replace("''", "'")
+    if text in ('true', 'false'):
+        return text == 'true'
+    if text == 'null':
+        return None
+    for cast in (int, float):
+        try:
+            return cast(text)
+        except ValueError:
+            pass
+    return text
+
+
+def _compare(left, op, right):
+    if isinstance(right, str) and isinstance(left, str) and DATE_LITERAL.match(right):
+        left = left[:10]  # Date literal: compare the date part of a datetime value, as SAP does
+    elif isinstance(right, str) and left is not None and not isinstance(left, str):
+        left = str(left)
+    elif isinstance(right, (int, float)) and isinstance(left, str):
+        try:
+            left = float(left)
+        except ValueError:
+            return False
+    try:
+        return COMPARATORS[op](left, right)
+    except TypeError:
+        return op == 'ne'
+
+
+def parse_filter(expression):
+    """Split an OData $filter into (path, op, right-hand text) clauses joined by 'and'"""
+    clauses = []
+    for part in re.split(r"\s+and\s+", (expression or '').strip(), flags=re.IGNORECASE):
+        if not part:
+            continue
+        function = FILTER_FUNCTION.match(part.strip())
+        if function:
+            name, path, value = function.groups()
+            clauses.append((path, name, value))
+            continue
+        match = FILTER_CLAUSE.match(part.strip())
+        if not match:
+            raise ValueError(f"Unsupported $filter clause: {part}")
+        clauses.append(match.groups())
+    return clauses
+
+
+def parse_filter_groups(expression):
+    """Split an OData $filter joined by top-level 'or' into groups of 'and' clauses"""
+    return [parse_filter(group) for group in re.split(r"\s+or\s+", (expression or '').strip(), flags=re.IGNORECASE)]
+
+
+def _matches(record, clauses):
+    return all(_compare(_field(record, path), op, _literal(value)) for path, op, value in clauses)
+
+
+def _select(record, select):
+    """Copy of a record (only the $select properties when given)"""
+    if not select:
+        return copy.deepcopy(record)
+    return {name: copy.deepcopy(_field(record, name)) for name in select}
+
+
+def _param(value, name):
+    return str(value) == str(name)
+
+
+def _error(status, code, message):
+    return status, {'error': {'code': code, 'message': {'lang': 'en-us', 'value': message}}}
+
+
+# ----------------------------------------------------------------------
+# SQLQueries (sap_query_manager.required_queries)
+# ----------------------------------------------------------------------
+
+def _series_rows(data, object_code, *columns):
+    rows = [s for s in data['series'] if s['ObjectCode'] == object_code]
+    return [{c: s[c] for c in columns} for s in sorted(rows, key=lambda s: s['SeriesName'])]
+
+
+def _item(data, item_code):
+    return next((i for i in data['Items'] if i['ItemCode'] == item_code), None)
+
+
+def _warehouse_name(data, code):
+    return next((w['WarehouseName'] for w in data['Warehouses'] if w['WarehouseCode'] == code), None)
+
+
+def _series_name(data, series):
+    return next((s['SeriesName'] for s in data['series'] if _param(s['Series'], series)), None)
+
+
+def _live_serials(data, item_code=None, warehouse=None, number=None):
+    return [s for s in data['serials'] if s['Quantity'] > 0
+            and (item_code is None or s['ItemCode'] == item_code)
+            and (warehouse is None or s['WhsCode'] == warehouse)
+            and (number is None or s['DistNumber'] == number)]
+
+
+def _batches(data, item_code):
+    details = {b['SystemNumber']: b for b in data['BatchNumberDetails']}
+    return [(details[s['AbsEntry']], s) for s in data['batch_stock'] if s['ItemCode'] == item_code]
+
+
+def _open(documents, series=None):
+    return [d for d in documents if d['DocumentStatus'] in ('bost_Open', 'cdsOpen')
+            and (series is None or _param(d['Series'], series))]
+
+
+def _grpo_batches(data, p, item_code=None, line_num=None):
+    rows = []
+    for grpo in data['PurchaseDeliveryNotes']:
+        if not _param(grpo['DocEntry'], p['docEntry']):
+            continue
+        for line in grpo['DocumentLines']:
+            if item_code is not None and (line['ItemCode'] != item_code or not _param(line['LineNum'], line_num)):
+                continue
+            for batch in line.get('BatchNumbers', []):
+                rows.append({'DocEntry': grpo['DocEntry'], 'LineNum': line['LineNum'], 'ItemCode': line['ItemCode'],
+                             'BatchNum': batch['BatchNumber'], 'Quantity': batch['Quantity'],
+                             'ExpDate': batch.get('ExpiryDate'), 'MnfDate': batch.get('ManufacturingDate')})
+    return rows
+
+
+def _stock_rows(data, item_code, warehouse=None):
+    item = _item(data, item_code)
+    if not item:
+        return []
+    return [(item, s) for s in item['ItemWarehouseInfoCollection']
+            if s['InStock'] > 0 and (warehouse is None or s['WarehouseCode'] == warehouse)]
+
+
+SQL_QUERIES = {
+    'ItemCode_Validation': (('item_code', 'whcode'), lambda d, p: [
+        {'ItemCode': s['ItemCode'], 'itemName': _item(d, s['ItemCode'])['ItemName'], 'DistNumber': s['DistNumber'],
+         'WhsCode': s['WhsCode']} for s in _live_serials(d, p['item_code'], p['whcode'])]),
+    'ItemCode_Batch_Serial_Val': (('itemCode',), lambda d, p: [
+        {'ItemCode': i['ItemCode'], 'BatchNum': 'Y' if i['ManageBatchNumbers'] == 'tYES' else 'N',
+         'SerialNum': 'Y' if i['ManageSerialNumbers'] == 'tYES' else 'N', 'NonBatch_NonSerialMethod': 'A'}
+        for i in [_item(d, p['itemCode'])] if i]),
+    'GetSerialManagedItemWH': (('itemCode',), lambda d, p: [
+        {'itemCode': s['ItemCode'], 'SerialNumber': s['DistNumber'], 'WarehouseCode': s['WhsCode'],
+         'WarehouseName': _warehouse_name(d, s['WhsCode']), 'AvailableQty': s['Quantity'], 'SysNumber': s['SysNumber']}
+        for s in sorted(_live_serials(d, p['itemCode']), key=lambda s: s['DistNumber'])]),
+    'GetNonSerialNonBatchManagedItemWH': (('itemCode',), lambda d, p: [
+        {'ItemCode': i['ItemCode'], 'ItemName': i['ItemName'], 'WarehouseCode': s['WarehouseCode'],
+         'WarehouseName': _warehouse_name(d, s['WarehouseCode']), 'AvailableQty': s['InStock']}
+        for i, s in _stock_rows(d, p['itemCode'])]),
+    'GetBatchManagedItemWH': (('itemCode',), lambda d, p: [
+        {'itemCode': b['ItemCode'], 'BatchNumber': b['Batch'], 'WarehouseCode': s['WhsCode'],
+         'WarehouseName': _warehouse_name(d, s['WhsCode']), 'AvailableQty': s['Quantity'], 'SysNumber': b['SystemNumber']}
+        for b, s in sorted(_batches(d, p['itemCode']), key=lambda r: r[0]['Batch']) if s['Quantity'] > 0]),
+    'Get_SO_Series': ((), lambda d, p: _series_rows(d, '17', 'SeriesName', 'Series')),
+    'Get_SO_Details': (('SONumber', 'Series'), lambda d, p: [
+        {'DocEntry': o['DocEntry']} for o in d['Orders']
+        if _param(o['DocNum'], p['SONumber']) and _param(o['Series'], p['Series'])]),
+    'Get_PO_Series': ((), lambda d, p: _series_rows(d, '22', 'Series', 'SeriesName')),
+    'Get_PO_DocEntry': (('series', 'docNum'), lambda d, p: [
+        {'DocEntry': o['DocEntry']} for o in d['PurchaseOrders']
+        if _param(o['Series'], p['series']) and _param(o['DocNum'], p['docNum'])]),
+    'Get_Open_SO_DocNum': (('series',), lambda d, p: [
+        {'DocEntry': o['DocEntry'], 'DocNum': o['DocNum'], 'CardCode': o['CardCode'], 'CardName': o['CardName'],
+         'DocStatus': 'O'} for o in _open(d['Orders'], p['series'])]),
+    'Get_Open_PO_DocNum': (('series',), lambda d, p: [
+        {'DocEntry': o['DocEntry'], 'DocNum': o['DocNum'], 'Series': o['Series'],
+         'SeriesName': _series_name(d, o['Series']), 'CardCode': o['CardCode'], 'CardName': o['CardName']}
+        for o in sorted(_open(d['PurchaseOrders'], p['series']), key=lambda o: o['DocNum'])]),
+    'Get_Open_INVTRNF_DocNum': (('series',), lambda d, p: [
+        {'DocEntry': t['DocEntry'], 'DocNum': t['DocNum'], 'Series': t['Series'],
+         'SeriesName': _series_name(d, t['Series'])}
+        for t in sorted(_open(d['InventoryTransferRequests'], p['series']), key=lambda t: t['DocNum'])]),
+    'Get_Open_INVCNT_DocNum': (('series',), lambda d, p: [
+        {'DocEntry': c['DocumentEntry'], 'DocNum': c['DocumentNumber'], 'SeriesName': _series_name(d, c['Series']),
+         'CountDate': c['CountDate'], 'Status': 'O'}
+        for c in sorted(_open(d['InventoryCountings'], p['series']), key=lambda c: c['DocumentNumber'])]),
+    'Get_INVT_DocEntry': (('series', 'docNum'), lambda d, p: [
+        {'DocEntry': t['DocEntry']} for t in d['InventoryTransferRequests']
+        if _param(t['Series'], p['series']) and _param(t['DocNum'], p['docNum'])]),
+    'Get_INVT_Series': ((), lambda d, p: _series_rows(d, '1250000001', 'Series', 'SeriesName')),
+    'Get_INVCNT_DocEntry': (('series', 'docNum'), lambda d, p: [
+        {'DocEntry': c['DocumentEntry']} for c in d['InventoryCountings']
+        if _param(c['Series'], p['series']) and _param(c['DocumentNumber'], p['docNum'])]),
+    'Get_INVCNT_Series': ((), lambda d, p: _series_rows(d, '1470000065', 'Series', 'SeriesName')),
+    'GetBinCodeByWHCode': (('whsCode',), lambda d, p: [
+        {'BinAbsEntry': b['AbsEntry'], 'BinCode': b['BinCode'], 'IsActive': 'N'}
+        for b in sorted(d['BinLocations'], key=lambda b: b['BinCode'])
+        if b['Warehouse'] == p['whsCode'] and b['Inactive'] == 'tNO']),
+    'Series_Validation': (('itemCode', 'series', 'whsCode'), lambda d, p: [
+        {'ItemCode': s['ItemCode'], 'DistNumber': s['DistNumber'], 'WhsCode': s['WhsCode']}
+        for s in _live_serials(d, p['itemCode'], p['whsCode'], p['series'])]),
+    'Quantity_Check': (('whCode', 'itemCode'), lambda d, p: [
+        {'OnHand': s['InStock'], 'ItemCode': i['ItemCode'], 'ManSerNum': 'Y' if i['ManageSerialNumbers'] == 'tYES' else 'N'}
+        for i, s in _stock_rows(d, p['itemCode'], p['whCode'])]),
+    'item_tracking': (('serialNumber',), lambda d, p: [
+        {'ItemCode': s['ItemCode'], 'SerialNumber': s['DistNumber'], 'DocDate': h['DocDate'], 'DocEntry': h['DocEntry'],
+         'DocNum': h['DocNum'], 'DocType': h['DocType'], 'CardCode': h.get('CardCode'), 'CardName': h.get('CardName'),
+         'WhsCode': h['WhsCode'], 'SerialAbsEntry': s['AbsEntry'], 'ReleaseQty': 0, 'Quantity': 1}
+        for s in d['serials'] if s['DistNumber'] == p['serialNumber'] for h in s['history']]),
+    'get_serial_current_location': (('serial_number',), lambda d, p: [
+        {'ItemCode': s['ItemCode'], 'itemName': _item(d, s['ItemCode'])['ItemName'], 'DistNumber': s['DistNumber'],
+         'WhsCode': s['WhsCode'], 'WhsName': _warehouse_name(d, s['WhsCode']), 'BPLName': 'Simulated Branch',
+         'BPLid': 1, 'BinAbsEntry': s['BinAbs']}
+        for s in _live_serials(d, number=p['serial_number'])]),
+    'GET_GRPO_DocEntry_By_Series': (('seriesID',), lambda d, p: [
+        {'DocNum': g['DocNum'], 'CardName': g['CardName'], 'DocStatus': 'O', 'DocEntry': g['DocEntry']}
+        for g in _open(d['PurchaseDeliveryNotes'], p['seriesID'])]),
+    'Get_Batches_By_DocEntry': (('docEntry',), lambda d, p: _grpo_batches(d, p)),
+    'Get_Batch_By_DocEntry_ItemCode': (('docEntry', 'itemCode', 'lineNum'), lambda d, p: _grpo_batches(
+        d, p, p['itemCode'], p['lineNum'])),
+    'GET_GRPO_Series': ((), lambda d, p: [
+        {'SeriesID': s, 'SeriesName': _series_name(d, s)}
+        for s in sorted({g['Series'] for g in d['PurchaseDeliveryNotes']})]),
+    'Available_Serials_By_WH': (('itemCode', 'whsCode'), lambda d, p: [
+        {'SerialNumber': s['DistNumber'], 'SystemNumber': s['SysNumber'], 'Quantity': s['Quantity']}
+        for s in sorted(_live_serials(d, p['itemCode'], p['whsCode']), key=lambda s: s['DistNumber'])]),
+}
+
+
+def parse_param_list(param_list):
+    """Parse a SQLQueries ParamList (name='value'&name='value', quotes doubled inside values)"""
+    params = {}
+    for match in re.finditer(r"(\w+)\s*=\s*(?:'((?:[^']|'')*)'|([^&]*))", param_list or ''):
+        name, quoted, bare = match.groups()
+        params[name] = quoted.replace("''", "'") if quoted is not None else bare
+    return params
+
+
+# ----------------------------------------------------------------------
+# Simulator
+# ----------------------------------------------------------------------
+
+class ServiceLayerSimulator:
+    """State and request handling of the simulated Service Layer (thread safe)"""
+
+    def __init__(self, config=None):
+        self.config = config or SimulatorConfig()
+        self.lock = threading.RLock()
+        self.rng = random.Random(self.config.seed)
+        self.sessions = {}
+        self._journal = None
+        self.reset(data=True)
+
+    def reset(self, data=False):
+        with self.lock:
+            if data:
+                self.data = build_dataset(self.config.seed)
+                self.rng = random.Random(self.config.seed)
+            self.stats = {'requests': 0, 'operations': 0, 'errors': 0, 'errors_injected': 0,
+                          'by_resource': {}, 'since': time.time()}
+
+    # -- accounting ----------------------------------------------------
+
+    @staticmethod
+    def resource_label(method, path):
+        """Stable name of a call for the stats (key values left out)"""
+        match = RESOURCE_PATH.match(path.split('?', 1)[0])
+        if not match:
+            return f"{method} {path.split('(', 1)[0]}"
+        name, key, sub = match.groups()
+        if name == 'SQLQueries' and key:
+            return f"{method} SQLQueries({key.strip(chr(39))})"
+        if name == '$crossjoin' and key:
+            return f"{method} $crossjoin({key.split(',')[0]})"
+        return f"{method} {name}" + (f"/{sub}" if sub else '')
+
+    def count(self, label, status, request=True, operation=True):
+        """Account one HTTP request and/or Service Layer operation ($batch parts are operations only)"""
+        with self.lock:
+            if request:
+                self.stats['requests'] += 1
+            if operation:
+                self.stats['operations'] += 1
+            if status >= 400:
+                self.stats['errors'] += 1
+            resource = self.stats['by_resource'].setdefault(label, {'calls': 0, 'errors': 0})
+            resource['calls'] += 1
+            if status >= 400:
+                resource['errors'] += 1
+
+    def snapshot_stats(self):
+        with self.lock:
+            return copy.deepcopy(self.stats)
+
+    def delay(self, operations=1):
+        with self.lock:
+            jitter = self.rng.uniform(0, self.config.jitter_ms)
+        delay_ms = self.config.latency_ms + jitter + self.config.op_latency_ms * max(operations - 1, 0)
+        if delay_ms > 0:
+            time.sleep(delay_ms / 1000.0)
+
+    def injected_error(self, label):
+        if self.config.error_rate <= 0 or label.endswith(('Login', 'Logout')):
+            return None
+        if self.config.error_resources and not any(r in label for r in self.config.error_resources):
+            return None
+        with self.lock:
+            if self.rng.random() >= self.config.error_rate:
+                return None
+            self.stats['errors_injected'] += 1
+            status = self.rng.choice(self.config.error_statuses or [500])
+        return _error(status, -1, 'Simulated Service Layer failure')
+
+    # -- sessions ------------------------------------------------------
+
+    def login(self, body):
+        body = body or {}
+        if not body.get('UserName') or not body.get('CompanyDB') or \
+                (self.config.company_db and body['CompanyDB'] != self.config.company_db) or \
+                (self.config.password and body.get('Password') != self.config.password):
+            return _error(401, -304, 'Fail to get DB Credentials from SLD')
+        session_id = str(uuid.uuid4())
+        with self.lock:
+            self.sessions[session_id] = body['UserName']
+        return 200, {'odata.metadata': f"{BASE_PATH}/$metadata#B1Sessions/@Element",
+                     'SessionId': session_id, 'Version': '1000190', 'SessionTimeout': 30}
+
+    def valid_session(self, session_id):
+        return not self.config.require_session or session_id in self.sessions
+
+    # -- dispatch ------------------------------------------------------
+
+    def handle(self, method, path, args, body, headers):
+        """
+        Execute one Service Layer operation
+
+        Returns:
+            tuple (status, payload or None)
+        """
+        match = RESOURCE_PATH.match(path)
+        if not match:
+            return _error(404, -1, f"Resource not found for the segment '{path}'")
+        name, key, sub = match.groups()
+
+        if name == 'SQLQueries':
+            if method == 'POST' and key and sub == 'List':
+                return self._sql_query(key.strip("'"), path, args, body, headers)
+            if method == 'GET' and key:
+                code = key.strip("'")
+                if code not in SQL_QUERIES:
+                    return _error(404, -2028, 'No matching records found (ODBC -2028)')
+                return 200, {'SqlCode': code, 'SqlName': code}
+            if method == 'POST' and not key:
+                return 201, body
+        if name == '$crossjoin' and method == 'GET':
+            return self._crossjoin([e.strip() for e in (key or '').split(',')], args, headers)
+            if method == 'GET' and not key:
+                return 200, {'value': [{'SqlCode': code, 'SqlName': code} for code in SQL_QUERIES]}
+        if not isinstance(self.data.get(name), list) or name in INTERNAL_SETS:
+            return _error(404, -1, f"Resource not found for the segment '{name}'")
+
+        if method == 'GET':
+            if key is None:
+                return self._collection(name, self.data[name], args, headers, path)
+            record = self._find(name, key)
+            if record is None:
+                return _error(404, -2028, 'No matching records found (ODBC -2028)')
+            if sub == 'BinLocations' and name == 'Warehouses':
+                bins = [b for b in self.data['BinLocations'] if b['Warehouse'] == record['WarehouseCode']]
+                return self._collection('BinLocations', bins, args, headers, path)
+            if sub:
+                return _error(404, -1, f"Resource not found for the segment '{sub}'")
+            select = [s for s in args.get('$select', '').split(',') if s]
+            with self.lock:
+                return 200, {'odata.metadata': f"{BASE_PATH}/$metadata#{name}/@Element", **_select(record, select)}
+
+        if method == 'POST' and key is None and name in POSTABLE:
+            return self._atomic(lambda: self._create(name, body))
+        if method == 'PATCH' and key is not None and name in PATCHABLE:
+            return self._atomic(lambda: self._update(name, key, body))
+        return _error(405, -1, f"{method} is not supported on {name}")
+
+    def _atomic(self, write):
+        """Run a write so that a failure leaves no partial changes (joins a running changeset)"""
+        with self.lock:
+            if self._journal is not None:
+                return write()
+            self._journal = journal = []
+            try:
+                status, payload = write()
+                if status >= 400:
+                    self._rollback(journal)
+                return status, payload
+            finally:
+                self._journal = None
+
+    def _update(self, name, key, body):
+        record = self._find(name, key)
+        if record is None:
+            return _error(404, -2028, 'No matching records found (ODBC -2028)')
+        self._remember(record)
+        self._merge(record, body or {}, DOCUMENT_LINES.get(name))
+        return 204, None
+
+    def _find(self, name, key):
+        key_value = _literal(key)
+        key_field = ENTITY_KEYS.get(name, 'DocEntry')
+        return next((r for r in self.data[name] if _compare(r.get(key_field), 'eq', key_value)), None)
+
+    def _page(self, rows, args, headers, path):
+        prefer = headers.get('Prefer', '')
+        match = re.search(r"odata\.maxpagesize=(\d+)", prefer)
+        page_size = int(match.group(1)) if match else self.config.page_size
+        skip = int(args.get('$skip') or 0)
+        top = int(args['$top']) if args.get('$top') else None
+        remaining = rows[skip:] if top is None else rows[skip:skip + top]
+        if page_size <= 0 or len(remaining) <= page_size:
+            return remaining, None
+        next_args = {**args, '$skip': skip + page_size}
+        if top is not None:
+            next_args['$top'] = top - page_size
+        return remaining[:page_size], f"{path.split('?', 1)[0]}?{urlencode(next_args, quote_via=quote, safe=SAFE_QUERY)}"
+
+    def _collection(self, name, records, args, headers, path):
+        try:
+            groups = parse_filter_groups(args.get('$filter'))
+        except ValueError as e:
+            return _error(400, -1, str(e))
+        select = [s for s in args.get('$select', '').split(',') if s]
+        with self.lock:
+            rows = [_select(r, select) for r in records if any(_matches(r, clauses) for clauses in groups)]
+        page, next_link = self._page(rows, args, headers, path)
+        payload = {'odata.metadata': f"{BASE_PATH}/$metadata#{name}", 'value': page}
+        if next_link:
+            payload['odata.nextLink'] = next_link
+        return 200, payload
+
+    def _sql_query(self, code, path, args, body, headers):
+        if code not in SQL_QUERIES:
+            return _error(404, -2028, 'No matching records found (ODBC -2028)')
+        required, query = SQL_QUERIES[code]
+        params = parse_param_list((body or {}).get('ParamList'))
+        missing = [name for name in required if name not in params]
+        if missing:
+            return _error(400, -1, f"Parameter '{missing[0]}' is missing")
+        with self.lock:
+            rows = copy.deepcopy(query(self.data, params))
+        page, next_link = self._page(rows, args, headers, path)
+        payload = {'odata.metadata': f"{BASE_PATH}/$metadata#SQLQueries('{code}')/List", 'SqlText': '', 'value': page}
+        if next_link:
+            payload['odata.nextLink'] = next_link
+        return 200, payload
+
+    def _crossjoin(self, entities, args, headers):
+        if len(entities) != 2 or '/' not in entities[1] or entities[0] not in self.data:
+            return _error(400, -1, 'Only $crossjoin(<Entity>,<Entity>/<Lines>) is simulated')
+        parent, child = entities
+        collection = child.split('/', 1)[1]
+        key_field = ENTITY_KEYS.get(parent, 'DocEntry')
+        selects = {path: [c.strip() for c in columns.split(',') if c.strip()]
+                   for path, columns in re.findall(r"([\w/]+)\(\$select=([^)]*)\)", args.get('$expand', ''))}
+        try:
+            clauses = parse_filter(args.get('$filter'))
+        except ValueError as e:
+            return _error(400, -1, str(e))
+
+        def resolve(records, text):
+            for path in (child, parent):
+                if text.startswith(path + '/') and '/' not in text[len(path) + 1:]:
+                    return _field(records[path], text[len(path) + 1:])
+            return _literal(text)
+
+        def crossjoin_value(value):
+            return CROSSJOIN_STATUS_CODES.get(value, value) if isinstance(value, str) else value
+
+        rows = []
+        with self.lock:
+            for header in self.data[parent]:
+                header_fields = {k: v for k, v in header.items() if not isinstance(v, list)}
+                for line in header.get(collection, []):
+                    records = {parent: header_fields, child: {key_field: header[key_field], **line}}
+                    if all(_compare(resolve(records, left), op, resolve(records, right))
+                           for left, op, right in clauses):
+                        rows.append({path: {k: crossjoin_value(v) for k, v in
+                                            _select(records[path], selects.get(path)).items()}
+                                     for path in (parent, child)})
+        page, next_link = self._page(rows, args, headers, f"$crossjoin({parent},{child})")
+        payload = {'odata.metadata': f"{BASE_PATH}/$metadata#Collection(Edm.ComplexType)", 'value': page}
+        if next_link:
+            payload['odata.nextLink'] = next_link
+        return 200, payload
+
+    # -- writes --------------------------------------------------------
+
+    def _remember(self, record):
+        """Journal a record before it changes so a failed changeset can restore it"""
+        if self._journal is not None:
+            self._journal.append(('restore', record, copy.deepcopy(record)))
+
+    def _insert(self, collection, record):
+        self.data[collection].append(record)
+        if self._journal is not None:
+            self._journal.append(('remove', self.data[collection], record))
+
+    def _rollback(self, journal):
+        for action, target, saved in reversed(journal):
+            if action == 'restore':
+                target.clear()
+                target.update(saved)
+            else:
+                target.remove(saved)
+
+    @staticmethod
+    def _merge(record, patch, lines_field):
+        for name, value in patch.items():
+            if name == lines_field and isinstance(value, list):
+                for line_patch in value:
+                    line_key = 'LineNumber' if 'LineNumber' in line_patch else 'LineNum'
+                    line = next((l for l in record.get(name, []) if l.get(line_key) == line_patch.get(line_key)), None)
+                    if line is None:
+                        record.setdefault(name, []).append(dict(line_patch))
+                    else:
+                        line.update(line_patch)
+            else:
+                record[name] = value
+
+    def _stock(self, item, warehouse):
+        return next((s for s in item['ItemWarehouseInfoCollection'] if s['WarehouseCode'] == warehouse), None)
+
+    def _move(self, item, line, from_warehouse, to_warehouse, quantity):
+        """Validate and apply the stock effect of one line (from_warehouse None = receipt)"""
+        to_stock = self._stock(item, to_warehouse)
+        from_stock = self._stock(item, from_warehouse) if from_warehouse else None
+        if to_stock is None or (from_warehouse and from_stock is None):
+            return _error(400, -10, f"Item {item['ItemCode']} is not defined in the warehouse")
+        if from_stock is not None and from_stock['InStock'] < quantity:
+            return _error(400, -10, f"Quantity falls into negative inventory [{item['ItemCode']}][{from_warehouse}]")
+
+        if item['ManageSerialNumbers'] == 'tYES':
+            numbers = [s.get('InternalSerialNumber') or s.get('ManufacturerSerialNumber')
+                       for s in line.get('SerialNumbers', [])]
+            if len(numbers) != int(quantity):
+                return _error(400, -10, f"Serial numbers do not match the quantity for {item['ItemCode']}")
+            for number in numbers:
+                serial = next((s for s in self.data['serials'] if s['ItemCode'] == item['ItemCode']
+                               and s['DistNumber'] == number), None)
+                if from_warehouse:
+                    if serial is None or serial['WhsCode'] != from_warehouse or serial['Quantity'] <= 0:
+                        return _error(400, -10, f"Serial number {number} is not available in {from_warehouse}")
+                    self._remember(serial)
+                    serial['WhsCode'] = to_warehouse
+                    serial['BinAbs'] = None
+                    serial['history'].append({'DocType': 67, 'DocEntry': self.data['next_doc_entry'],
+                                              'DocNum': self.data['next_doc_entry'], 'DocDate': _iso(date.today()),
+                                              'WhsCode': to_warehouse})
+                elif serial is not None:
+                    return _error(400, -10, f"Serial number {number} already exists")
+                else:
+                    system_number = len(self.data['serials']) + 100000
+                    self._insert('serials', {
+                        'AbsEntry': system_number, 'SysNumber': system_number, 'ItemCode': item['ItemCode'],
+                        'DistNumber': number, 'WhsCode': to_warehouse, 'BinAbs': None, 'Quantity': 1.0,
+                        'history': [{'DocType': 20, 'DocEntry': self.data['next_doc_entry'],
+                                     'DocNum': self.data['next_doc_entry'], 'DocDate': _iso(date.today()),
+                                     'WhsCode': to_warehouse}]
+                    })
+        elif item['ManageBatchNumbers'] == 'tYES':
+            batches = line.get('BatchNumbers', [])
+            if abs(sum(float(b.get('Quantity') or 0) for b in batches) - quantity) > 1e-6:
+                return _error(400, -10, f"Batch quantities do not match the line quantity for {item['ItemCode']}")
+            for batch in batches:
+                batch_quantity = float(batch.get('Quantity') or 0)
+                detail = next((b for b in self.data['BatchNumberDetails'] if b['ItemCode'] == item['ItemCode']
+                               and b['Batch'] == batch.get('BatchNumber')), None)
+                if from_warehouse:
+                    source = detail and next((s for s in self.data['batch_stock'] if s['AbsEntry'] == detail['SystemNumber']
+                                              and s['WhsCode'] == from_warehouse), None)
+                    if source is None or source['Quantity'] < batch_quantity:
+                        return _error(400, -10, f"Batch {batch.get('BatchNumber')} has insufficient quantity in {from_warehouse}")
+                    self._remember(source)
+                    source['Quantity'] -= batch_quantity
+                if detail is None:
+                    system_number = len(self.data['BatchNumberDetails']) + 200000
+                    detail = {'DocEntry': system_number, 'ItemCode': item['ItemCode'], 'ItemDescription': item['ItemName'],
+                              'Status': 'bdsStatus_Released', 'Batch': batch.get('BatchNumber'),
+                              'SystemNumber': system_number, 'ExpirationDate': batch.get('ExpiryDate'),
+                              'ManufacturingDate': batch.get('ManufacturingDate'), 'AdmissionDate': _iso(date.today())}
+                    self._insert('BatchNumberDetails', detail)
+                target = next((s for s in self.data['batch_stock'] if s['AbsEntry'] == detail['SystemNumber']
+                               and s['WhsCode'] == to_warehouse), None)
+                if target is None:
+                    self._insert('batch_stock', {'AbsEntry': detail['SystemNumber'], 'ItemCode': item['ItemCode'],
+                                                 'WhsCode': to_warehouse, 'Quantity': batch_quantity, 'CommitQty': 0.0})
+                else:
+                    self._remember(target)
+                    target['Quantity'] += batch_quantity
+
+        if from_stock is not None:
+            self._remember(from_stock)
+            from_stock['InStock'] -= quantity
+        self._remember(to_stock)
+        to_stock['InStock'] += quantity
+        return None
+
+    def _create(self, name, body):
+        lines_field = DOCUMENT_LINES[name]
+        if not isinstance(body, dict) or not body.get(lines_field):
+            return _error(400, -5002, 'No matching records found')
+        warehouses = {w['WarehouseCode'] for w in self.data['Warehouses']}
+
+        for line in body[lines_field]:
+            item = _item(self.data, line.get('ItemCode'))
+            if item is None:
+                return _error(400, -10, f"Invalid ItemCode '{line.get('ItemCode')}'")
+            quantity = float(line.get('Quantity') or line.get('CountedQuantity') or 0)
+            if name == 'StockTransfers':
+                from_warehouse = line.get('FromWarehouseCode') or body.get('FromWarehouse')
+                to_warehouse = line.get('WarehouseCode') or body.get('ToWarehouse')
+                if from_warehouse not in warehouses or to_warehouse not in warehouses:
+                    return _error(400, -10, 'Invalid warehouse code')
+                failure = self._move(item, line, from_warehouse, to_warehouse, quantity)
+            elif name == 'PurchaseDeliveryNotes':
+                if line.get('WarehouseCode') not in warehouses:
+                    return _error(400, -10, 'Invalid warehouse code')
+                failure = self._move(item, line, None, line['WarehouseCode'], quantity)
+                if failure is None and line.get('BaseEntry') is not None:
+                    failure = self._receive_base_line(line, quantity)
+            else:
+                failure = None
+            if failure:
+                return failure
+
+        doc_entry = self.data['next_doc_entry']
+        self.data['next_doc_entry'] += 1
+        key_field = ENTITY_KEYS.get(name, 'DocEntry')
+        document = {**copy.deepcopy(body), key_field: doc_entry,
+                    'DocumentNumber' if name == 'InventoryCountings' else 'DocNum': doc_entry + 10000,
+                    'DocumentStatus': 'cdsOpen' if name == 'InventoryCountings' else 'bost_Open'}
+        if name == 'PurchaseDeliveryNotes':
+            document.setdefault('Series', 301)
+        for line_num, line in enumerate(document[lines_field]):
+            line.setdefault('LineNumber' if name == 'InventoryCountings' else 'LineNum', line_num)
+            line.setdefault(key_field, doc_entry)
+        self._insert(name, document)
+        return 201, {'odata.metadata': f"{BASE_PATH}/$metadata#{name}/@Element", **document}
+
+    def _receive_base_line(self, line, quantity):
+        order = next((o for o in self.data['PurchaseOrders'] if _param(o['DocEntry'], line['BaseEntry'])), None)
+        base_line = order and next((l for l in order['DocumentLines'] if _param(l['LineNum'], line.get('BaseLine'))), None)
+        if base_line is None or base_line['LineStatus'] != 'bost_Open':
+            return _error(400, -10, f"Base document line {line.get('BaseEntry')}/{line.get('BaseLine')} is not open")
+        if quantity > base_line['RemainingOpenQuantity'] + 1e-6:
+            return _error(400, -10, 'Quantity exceeds the open quantity of the base document line')
+        self._remember(order)
+        base_line['RemainingOpenQuantity'] -= quantity
+        if base_line['RemainingOpenQuantity'] <= 1e-6:
+            base_line['LineStatus'] = 'bost_Close'
+            if all(l['LineStatus'] == 'bost_Close' for l in order['DocumentLines']):
+                order['DocumentStatus'] = 'bost_Close'
+        return None
+
+    # -- $batch --------------------------------------------------------
+
+    def batch(self, content_type, text):
+        """
+        Execute a multipart/mixed $batch body
+
+        Returns:
+            tuple (response content type, response body, number of operations)
+        """
+        parts = _parse_multipart(content_type, text)
+        boundary = f"batchresponse_{uuid.uuid4().hex}"
+        lines = []
+        operations = 0
+        for part in parts:
+            lines.append(f"--{boundary}")
+            if part[0] == 'changeset':
+                operations += len(part[1])
+                changeset_boundary = f"changesetresponse_{uuid.uuid4().hex}"
+                lines += [f"Content-Type: multipart/mixed; boundary={changeset_boundary}", '']
+                for content_id, status, payload in self._changeset(part[1]):
+                    lines.append(f"--{changeset_boundary}")
+                    lines += _http_part(content_id, status, payload)
+                lines.append(f"--{changeset_boundary}--")
+            else:
+                operations += 1
+                _, content_id, method, path, args, body = part
+                status, payload = self._operation(method, path, args, body)
+                lines += _http_part(content_id, status, payload)
+        lines += [f"--{boundary}--", '']
+        return f"multipart/mixed;boundary={boundary}", '\r\n'.join(lines), operations
+
+    def _operation(self, method, path, args, body):
+        status, payload = self.handle(method, path, args, body, {})
+        self.count(self.resource_label(method, path), status, request=False)
+        return status, payload
+
+    def _changeset(self, requests_):
+        """Run a changeset atomically: the first failure rolls back the others and is the only response"""
+        with self.lock:
+            self._journal = journal = []
+            try:
+                results = []
+                for _, content_id, method, path, args, body in requests_:
+                    status, payload = self._operation(method, path, args, body)
+                    if status >= 400:
+                        self._rollback(journal)
+                        return [(content_id, status, payload)]
+                    results.append((content_id, status, payload))
+                return results
+            finally:
+                self._journal = None
+
+
+def _parse_multipart(content_type, text):
+    boundary = next((p.split('=', 1)[1].strip().strip('"') for p in (content_type or '').split(';')
+                     if p.strip().lower().startswith('boundary=')), None)
+    if not boundary:
+        return []
+    parts = []
+    for block in text.replace('\r\n', '\n').split(f"--{boundary}"):
+        block = block.strip('\n')
+        if not block or block.startswith('--'):
+            continue
+        head, _, rest = block.partition('\n\n')
+        headers = {}
+        for header_line in head.split('\n'):
+            name, sep, value = header_line.partition(':')
+            if sep:
+                headers[name.strip().lower()] = value.strip()
+        if headers.get('content-type', '').lower().startswith('multipart/mixed'):
+            parts.append(('changeset', _parse_multipart(headers['content-type'], rest)))
+            continue
+        request_line, _, http_rest = rest.partition('\n')
+        method, target = (request_line.split(' ') + [''])[:2]
+        _, _, body_text = http_rest.partition('\n\n')
+        target = target.split(BASE_PATH + '/', 1)[-1]
+        path, _, query = target.partition('?')
+        body = json.loads(body_text.strip()) if body_text.strip() else None
+        parts.append(('request', headers.get('content-id'), method.upper(), unquote(path),
+                      dict(parse_qsl(query, keep_blank_values=True)), body))
+    return parts
+
+
+def _http_part(content_id, status, payload):
+    lines = ['Content-Type: application/http', 'Content-Transfer-Encoding: binary']
+    if content_id:
+        lines.append(f"Content-ID: {content_id}")
+    lines += ['', f"HTTP/1.1 {status} {'OK' if status < 400 else 'Error'}"]
+    if payload is not None:
+        lines += ['Content-Type: application/json;odata=minimalmetadata;charset=utf-8', '', json.dumps(payload)]
+    else:
+        lines.append('')
+    return lines
+
+
+# ----------------------------------------------------------------------
+# HTTP front end
+# ----------------------------------------------------------------------
+
+def create_simulator_app(simulator=None):
+    """Flask app serving the simulated Service Layer under /b1s/v1 plus /sim control endpoints"""
+    simulator = simulator or ServiceLayerSimulator()
+    sim_app = Flask(__name__)
+    sim_app.config['SAP_SIMULATOR'] = simulator
+
+    def respond(status, payload, headers=None):
+        body = json.dumps(payload) if payload is not None else ''
+        return Response(body, status=status, headers=headers or {},
+                        mimetype='application/json' if payload is not None else None)
+
+    @sim_app.route(f"{BASE_PATH}/", methods=['GET'])
+    def service_root():
+        return respond(200, {'odata.metadata': f"{BASE_PATH}/$metadata",
+                             'value': [{'name': n, 'url': n} for n in ENTITY_KEYS]})
+
+    @sim_app.route(f"{BASE_PATH}/<path:path>", methods=['GET', 'POST', 'PATCH', 'PUT', 'DELETE'])
+    @sim_app.route('/<any(BatchNumberDetails, SerialNumberDetails):path>', methods=['GET'])
+    def service_layer(path):
+        method = request.method
+        label = simulator.resource_label(method, path)
+        body_text = request.get_data(as_text=True)
+
+        if path == 'Login' and method == 'POST':
+            simulator.delay()
+            status, payload = simulator.login(json.loads(body_text) if body_text else None)
+            simulator.count(label, status)
+            headers = {}
+            if status == 200:
+                headers['Set-Cookie'] = f"B1SESSION={payload['SessionId']}; path={BASE_PATH}; HttpOnly"
+            return respond(status, payload, headers)
+
+        session_id = request.cookies.get('B1SESSION')
+        if not simulator.valid_session(session_id):
+            simulator.count(label, 401)
+            return respond(*_error(401, 301, 'Invalid session or session already timeout.'))
+        if path == 'Logout' and method == 'POST':
+            with simulator.lock:
+                simulator.sessions.pop(session_id, None)
+            simulator.count(label, 204)
+            return respond(204, None)
+
+        injected = simulator.injected_error(label)
+        if path == '$batch' and method == 'POST':
+            if injected:
+                simulator.delay()
+                simulator.count(label, injected[0])
+                return respond(*injected)
+            content_type, text, operations = simulator.batch(request.content_type, body_text)
+            simulator.delay(operations)
+            simulator.count(label, 202, operation=False)
+            return Response(text, status=202, content_type=content_type)
+
+        simulator.delay()
+        if injected:
+            status, payload = injected
+        else:
+            try:
+                body = json.loads(body_text) if body_text else None
+            except ValueError:
+                body = None
+            args = dict(parse_qsl(request.query_string.decode('utf-8'), keep_blank_values=True))
+            status, payload = simulator.handle(method, path, args, body, request.headers)
+        simulator.count(label, status)
+        return respond(status, payload)
+
+    @sim_app.route('/sim/stats', methods=['GET'])
+    def sim_stats():
+        return respond(200, simulator.snapshot_stats())
+
+    @sim_app.route('/sim/config', methods=['GET', 'POST'])
+    def sim_config():
+        if request.method == 'POST':
+            simulator.config.update(request.get_json(silent=True) or {})
+            logging.info(f"⚙️ SAP simulator config: {simulator.config.to_dict()}")
+        return respond(200, simulator.config.to_dict())
+
+    @sim_app.route('/sim/reset', methods=['POST'])
+    def sim_reset():
+        simulator.reset(data=bool((request.get_json(silent=True) or {}).get('data')))
+        return respond(200, {'success': True})
+
+    return sim_app
+
+
+def start_simulator_thread(simulator=None, host='127.0.0.1', port=0):
+    """
+    Serve the simulator from a background thread (tests and embedded use)
+
+    Returns:
+        tuple (server, base_url) - call server.shutdown() to stop it
+    """
+    from werkzeug.serving import make_server
+
+    server = make_server(host, port, create_simulator_app(simulator), threaded=True)
+    threading.Thread(target=server.serve_forever, name='sap-simulator', daemon=True).start()
+    return server, f"http://{host}:{server.server_port}"
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    config = SimulatorConfig()
+    host = os.environ.get('SAP_SIM_HOST', '127.0.0.1')
+    port = int(os.environ.get('SAP_SIM_PORT', '50001'))
+    logging.info(f"🧪 SAP Service Layer simulator on http://{host}:{port}{BASE_PATH} - {config.to_dict()}")
+    create_simulator_app(ServiceLayerSimulator(config)).run(host=host, port=port, threaded=True)
@@ -0,0 +1,126 @@
+"""
+Document Search
+Shared query builder for the search boxes on the document list pages.
+
+Searches are written so the database can answer them from an index instead of
+scanning the table:
+
+- PostgreSQL: ILIKE '%term%' served by pg_trgm GIN indexes
+  (migrations/postgresql_search_trigram_indexes.sql)
+- MySQL: MATCH ... AGAINST on an ngram FULLTEXT index
+  (migrations/mysql/changes/2026-10-19_search_fulltext_indexes.sql),
+  falling back to LIKE when the table has no matching FULLTEXT index
+- Terms that look like scanned document numbers also match the
+  document-number columns by prefix (LIKE 'term%', B-tree indexable), ORed
+  into the same query as the substring search, and integer terms compare
+  numeric columns exactly rather than casting them to text
+"""
+
+import logging
+import re
+
+from sqlalchemy import or_
+from sqlalchemy.dialects.mysql import match
+
+from app import db
+from sap_bulk_sync import get_dialect
+
+# Looks like something a scanner produced: no spaces, at least one digit (GRN-2026-000123, 41523, PL/7000/12)
+DOCUMENT_NUMBER = re.compile(r'^(?=.*\d)[A-Za-z0-9][A-Za-z0-9\-/_.]*$')
+
+# Shorter terms cannot use trigram / ngram indexes - plain LIKE is as good
+MIN_INDEXED_TERM = 3
+
+# table name -> list of column-name sets covered by a FULLTEXT index (MySQL)
+_fulltext_indexes = {}
+
+
+class SearchSpec:
+    """Columns searched by a list page"""
+
+    def __init__(self, columns, prefix_columns=None, numeric_columns=None):
+        self.columns = list(columns)  # text columns matched anywhere in the value
+        self.prefix_columns = list(prefix_columns or [])  # document numbers - also matched by prefix
+        self.numeric_columns = list(numeric_columns or [])  # integer columns matched exactly
+
+    @property
+    def table_name(self):
+        return self.columns[0].table.name if self.columns else None
+
+
+def escape_like(term):
+    """Escape LIKE wildcards so a search for '50%' or 'A_1' matches literally"""
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _like(column, pattern, dialect):
+    # MySQL and SQLite LIKE is already case-insensitive and can use a B-tree index for prefixes
+    if dialect == 'postgresql':
+        return column.ilike(pattern, escape='\\')
+    return column.like(pattern, escape='\\')
+
+
+def _fulltext_column_sets(table_name):
+    """FULLTEXT indexes on a MySQL table, read once per process"""
+    if table_name not in _fulltext_indexes:
+        indexes = {}
+        try:
+            rows = db.session.execute(db.text(
+                "SELECT INDEX_NAME, COLUMN_NAME FROM information_schema.STATISTICS "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table AND INDEX_TYPE = 'FULLTEXT'"
+            ), {'table': table_name})
+            for index_name, column_name in rows:
+                indexes.setdefault(index_name, set()).add(column_name)
+        except Exception as e:
+            logging.warning(f"⚠️ Could not read FULLTEXT indexes for {table_name}: {str(e)}")
+        _fulltext_indexes[table_name] = [frozenset(columns) for columns in indexes.values()]
+    return _fulltext_indexes[table_name]
+
+
+def _contains_clause(spec, term, dialect):
+    """Substring match across the spec's text columns"""
+    if dialect == 'mysql' and len(term) >= MIN_INDEXED_TERM:
+        names = frozenset(column.name for column in spec.columns)
+        if names in _fulltext_column_sets(spec.table_name):
+            # ngram parser + quoted phrase = substring semantics, answered by the FULLTEXT index
+            phrase = '"' + term.replace('"', ' ') + '"'
+            return match(*spec.columns, against=phrase).in_boolean_mode()
+
+    pattern = f'%{escape_like(term)}%'
+    return or_(*[_like(column, pattern, dialect) for column in spec.columns])
+
+
+def _numeric_clauses(spec, term):
+    if term.isdigit() and len(term) < 10:
+        return [column == int(term) for column in spec.numeric_columns]
+    return []
+
+
+def apply_search(query, term, spec):
+    """
+    Filter a list query by a search box term
+
+    Args:
+        query: Query to filter
+        term: Raw text from the search box (blank = no filter)
+        spec: SearchSpec of the page
+
+    Returns:
+        the filtered query
+    """
+    term = (term or '').strip()
+    if not term:
+        return query
+
+    dialect = get_dialect()
+    clauses = _numeric_clauses(spec, term)
+
+    # Scanned document number: anchored match on the number columns as well, so
+    # a prefix hit never hides rows that only contain the term elsewhere
+    if spec.prefix_columns and DOCUMENT_NUMBER.match(term):
+        pattern = f'{escape_like(term)}%'
+        clauses.extend(_like(column, pattern, dialect) for column in spec.prefix_columns)
+
+    if spec.columns:
+        clauses.append(_contains_clause(spec, term, dialect))
+    return query.filter(or_(*clauses)) if clauses else query.filter(db.false())
@@ -0,0 +1,334 @@
+"""
+Serial Registry
+One row per serial number answering "where is serial X in the WMS right now":
+item, warehouse, and the document that last touched it.
+
+Serials are written by six modules into six tables (GRPO, Multiple GRN, serial
+transfers, serial item transfers, sales deliveries, SO against invoice). An
+after_flush hook re-resolves every serial a flush touched from those tables in
+the same transaction - inserted, edited or deleted serial rows, and the serials
+of documents whose status changed - so the registry never disagrees with them.
+When several documents hold the same serial the most recent row wins.
+
+lookup_serials() answers thousands of serial checks with one IN query on the
+unique serial_number index.
+"""
+
+import logging
+from datetime import datetime
+
+from sqlalchemy import event, inspect as sa_inspect
+
+from app import db
+from models import SerialRegistry
+from sap_bulk_sync import bulk_upsert, get_dialect, replicate_deletes, replicate_written, _upsert_sql
+
+# Serials per IN (...) - one round trip for a typical scan session
+LOOKUP_CHUNK = 5000
+
+REGISTRY_COLUMNS = ['item_code', 'warehouse_code', 'source_type', 'source_id', 'document_id',
+                    'document_number', 'status', 'recorded_at']
+
+# Documents that take a serial out of the warehouse once posted
+OUTBOUND_SOURCES = {'delivery', 'so_invoice'}
+# Receipts in these statuses never brought the serial into stock
+INBOUND_SOURCES = {'grpo', 'multi_grn'}
+NOT_RECEIVED_STATUSES = {'rejected', 'failed'}
+
+_sources = None
+_capture_registered = False
+
+
+class SerialSource:
+    """A table serial numbers are written to, and how to read registry entries from it"""
+
+    def __init__(self, name, model, serial_column, document_model, build_query):
+        self.name = name
+        self.model = model
+        self.serial_column = serial_column
+        self.document_model = document_model
+        self.build_query = build_query  # callable(session) -> Query of labelled registry columns
+
+    def query(self, session, serials=None, document_ids=None):
+        query = self.build_query(session)
+        if serials is not None:
+            query = query.filter(self.serial_column.in_(serials))
+        if document_ids is not None:
+            query = query.filter(self.document_model.id.in_(document_ids))
+        return query
+
+
+def _registry_entities(source_type, serial, item_code, warehouse_code, source, document, document_number):
+    return [
+        serial.label('serial_number'), item_code.label('item_code'), warehouse_code.label('warehouse_code'),
+        db.literal(source_type).label('source_type'), source.id.label('source_id'),
+        document.id.label('document_id'), document_number.label('document_number'),
+        document.status.label('status'), source.created_at.label('recorded_at')
+    ]
+
+
+def _load_sources():
+    """Build the source list on first use (module models import after app start-up)"""
+    global _sources
+    if _sources is not None:
+        return _sources
+
+    from models import (SerialNumberTransfer, SerialNumberTransferItem, SerialNumberTransferSerial,
+                        SerialItemTransfer, SerialItemTransferItem)
+    from modules.grpo.models import GRPODocument, GRPOItem, GRPOSerialNumber
+    from modules.multi_grn_creation.models import (MultiGRNBatch, MultiGRNPOLink, MultiGRNLineSelection,
+                                                   MultiGRNSerialDetails)
+    from modules.sales_delivery.models import DeliveryDocument, DeliveryItem, DeliveryItemSerial
+    from modules.so_against_invoice.models import SOInvoiceDocument, SOInvoiceItem, SOInvoiceSerial
+
+    def grpo(session):
+        return (session.query(GRPOSerialNumber)
+                .join(GRPOItem, GRPOItem.id == GRPOSerialNumber.grpo_item_id)
+                .join(GRPODocument, GRPODocument.id == GRPOItem.grpo_id)
+                .with_entities(*_registry_entities(
+                    'grpo', GRPOSerialNumber.internal_serial_number, GRPOItem.item_code,
+                    db.func.coalesce(GRPOItem.warehouse_code, GRPODocument.warehouse_code),
+                    GRPOSerialNumber, GRPODocument, GRPODocument.doc_number)))
+
+    def multi_grn(session):
+        return (session.query(MultiGRNSerialDetails)
+                .join(MultiGRNLineSelection, MultiGRNLineSelection.id == MultiGRNSerialDetails.line_selection_id)
+                .join(MultiGRNPOLink, MultiGRNPOLink.id == MultiGRNLineSelection.po_link_id)
+                .join(MultiGRNBatch, MultiGRNBatch.id == MultiGRNPOLink.batch_id)
+                .with_entities(*_registry_entities(
+                    'multi_grn', MultiGRNSerialDetails.serial_number, MultiGRNLineSelection.item_code,
+                    MultiGRNLineSelection.warehouse_code, MultiGRNSerialDetails, MultiGRNBatch,
+                    MultiGRNBatch.batch_number)))
+
+    def serial_transfer(session):
+        # Serials stay in the source warehouse until the transfer is posted
+        warehouse = db.case((SerialNumberTransfer.status == 'posted', SerialNumberTransferItem.to_warehouse_code),
+                            else_=SerialNumberTransferItem.from_warehouse_code)
+        return (session.query(SerialNumberTransferSerial)
+                .join(SerialNumberTransferItem, SerialNumberTransferItem.id == SerialNumberTransferSerial.transfer_item_id)
+                .join(SerialNumberTransfer, SerialNumberTransfer.id == SerialNumberTransferItem.serial_transfer_id)
+                .filter(SerialNumberTransferSerial.is_validated.is_(True))
+                .with_entities(*_registry_entities(
+                    'serial_transfer', SerialNumberTransferSerial.serial_number, SerialNumberTransferItem.item_code,
+                    warehouse, SerialNumberTransferSerial, SerialNumberTransfer,
+                    SerialNumberTransfer.transfer_number)))
+
+    def serial_item_transfer(session):
+        warehouse = db.case((SerialItemTransfer.status == 'posted', SerialItemTransferItem.to_warehouse_code),
+                            else_=SerialItemTransferItem.from_warehouse_code)
+        return (session.query(SerialItemTransferItem)
+                .join(SerialItemTransfer, SerialItemTransfer.id == SerialItemTransferItem.serial_item_transfer_id)
+                .filter(SerialItemTransferItem.validation_status != 'failed')
+                .with_entities(*_registry_entities(
+                    'serial_item_transfer', SerialItemTransferItem.serial_number, SerialItemTransferItem.item_code,
+                    warehouse, SerialItemTransferItem, SerialItemTransfer, SerialItemTransfer.transfer_number)))
+
+    def delivery(session):
+        return (session.query(DeliveryItemSerial)
+                .join(DeliveryItem, DeliveryItem.id == DeliveryItemSerial.delivery_item_id)
+                .join(DeliveryDocument, DeliveryDocument.id == DeliveryItem.delivery_id)
+                .filter(DeliveryItemSerial.allocation_status == 'allocated')
+                .with_entities(*_registry_entities(
+                    'delivery', DeliveryItemSerial.internal_serial_number, DeliveryItem.item_code,
+                    DeliveryItem.warehouse_code, DeliveryItemSerial, DeliveryDocument,
+                    db.cast(DeliveryDocument.so_doc_num, db.String))))
+
+    def so_invoice(session):
+        return (session.query(SOInvoiceSerial)
+                .join(SOInvoiceItem, SOInvoiceItem.id == SOInvoiceSerial.so_invoice_item_id)
+                .join(SOInvoiceDocument, SOInvoiceDocument.id == SOInvoiceItem.so_invoice_id)
+                .filter(SOInvoiceSerial.validation_status != 'failed')
+                .with_entities(*_registry_entities(
+                    'so_invoice', SOInvoiceSerial.serial_number, SOInvoiceItem.item_code,
+                    SOInvoiceItem.warehouse_code, SOInvoiceSerial, SOInvoiceDocument,
+                    SOInvoiceDocument.document_number)))
+
+    _sources = [
+        SerialSource('grpo', GRPOSerialNumber, GRPOSerialNumber.internal_serial_number, GRPODocument, grpo),
+        SerialSource('multi_grn', MultiGRNSerialDetails, MultiGRNSerialDetails.serial_number, MultiGRNBatch, multi_grn),
+        SerialSource('serial_transfer', SerialNumberTransferSerial, SerialNumberTransferSerial.serial_number,
+                     SerialNumberTransfer, serial_transfer),
+        SerialSource('serial_item_transfer', SerialItemTransferItem, SerialItemTransferItem.serial_number,
+                     SerialItemTransfer, serial_item_transfer),
+        SerialSource('delivery', DeliveryItemSerial, DeliveryItemSerial.internal_serial_number, DeliveryDocument,
+                     delivery),
+        SerialSource('so_invoice', SOInvoiceSerial, SOInvoiceSerial.serial_number, SOInvoiceDocument, so_invoice),
+    ]
+    return _sources
+
+
+def _chunks(values, size):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def _latest(rows, entries):
+    """Keep the most recently recorded row per serial"""
+    for row in rows:
+        serial = row.serial_number
+        if not serial:
+            continue
+        current = entries.get(serial)
+        if current is None or (row.recorded_at or datetime.min) >= (current['recorded_at'] or datetime.min):
+            entries[serial] = dict(row._mapping)
+    return entries
+
+
+def resolve_serials(session, serials):
+    """Current registry entry of each serial, read from the source tables ({serial: entry})"""
+    entries = {}
+    for chunk in _chunks(serials, LOOKUP_CHUNK):
+        for source in _load_sources():
+            _latest(source.query(session, serials=chunk), entries)
+    return entries
+
+
+def _write_entries(connection, serials, entries):
+    """Upsert resolved serials and delete the ones no source holds any more"""
+    now = datetime.utcnow()
+    if entries:
+        columns = ['serial_number'] + REGISTRY_COLUMNS + ['created_at', 'updated_at']
+        for chunk in _chunks(entries.values(), 500):
+            params = {}
+            for index, entry in enumerate(chunk):
+                for column in ['serial_number'] + REGISTRY_COLUMNS:
+                    params[f"{column}_{index}"] = entry.get(column)
+                params[f"created_at_{index}"] = now
+                params[f"updated_at_{index}"] = now
+            sql = _upsert_sql(get_dialect(), SerialRegistry.__tablename__, columns, ['serial_number'],
+                              REGISTRY_COLUMNS + ['updated_at'], len(chunk))
+            connection.execute(db.text(sql), params)
+            replicate_written(SerialRegistry.__tablename__, ['serial_number'], chunk, connection=connection)
+
+    missing = [serial for serial in serials if serial not in entries]
+    for chunk in _chunks(missing, LOOKUP_CHUNK):
+        replicate_deletes(SerialRegistry.__table__, SerialRegistry.serial_number.in_(chunk), connection=connection)
+        connection.execute(SerialRegistry.__table__.delete().where(SerialRegistry.serial_number.in_(chunk)))
+
+
+def _changed_value(obj, key):
+    """Previous value of an attribute changed in this flush (None when unchanged)"""
+    history = sa_inspect(obj).attrs[key].history
+    return history.deleted[0] if history.deleted else None
+
+
+def _capture_flush(session, flush_context):
+    sources = _load_sources()
+    by_model = {source.model: source for source in sources}
+    by_document = {}
+    for source in sources:
+        by_document.setdefault(source.document_model, []).append(source)
+
+    serials = set()
+    deleted_sources = []  # (source_type, id) of deleted rows whose serial was never loaded
+    document_ids = {}  # source -> document ids whose status changed
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        source = by_model.get(type(obj))
+        if source is not None:
+            key = source.serial_column.key
+            if obj in session.deleted:
+                # Never load attributes of a deleted row - it is already gone
+                loaded = sa_inspect(obj).dict
+                if key in loaded:
+                    serials.add(loaded[key])
+                else:
+                    deleted_sources.append((source.name, sa_inspect(obj).identity[0]))
+                continue
+            serials.add(getattr(obj, key))
+            if obj in session.dirty:
+                serials.add(_changed_value(obj, key))
+            continue
+        if type(obj) in by_document and obj in session.dirty and sa_inspect(obj).attrs.status.history.has_changes():
+            for document_source in by_document[type(obj)]:
+                document_ids.setdefault(document_source, set()).add(obj.id)
+
+    for source_type, source_id in deleted_sources:
+        serials.update(serial for (serial,) in session.query(SerialRegistry.serial_number).filter(
+            SerialRegistry.source_type == source_type, SerialRegistry.source_id == source_id))
+
+    for source, ids in document_ids.items():
+        serials.update(row.serial_number for row in source.query(session, document_ids=list(ids)))
+
+    serials.discard(None)
+    serials.discard('')
+    if serials:
+        _write_entries(session.connection(), serials, resolve_serials(session, serials))
+
+
+def register_serial_capture(session):
+    """Keep the registry in step with the serial tables (after_flush, same transaction)"""
+    global _capture_registered
+    if _capture_registered:
+        return
+    event.listen(session, 'after_flush', _capture_flush)
+    _capture_registered = True
+    logging.info("✅ Serial registry capture registered (after_flush)")
+
+
+def lookup_serials(serial_numbers):
+    """
+    Bulk "where is this serial" check
+
+    Args:
+        serial_numbers: Iterable of serial numbers (duplicates and blanks ignored)
+
+    Returns:
+        dict {serial_number: registry entry dict} for the serials the WMS holds
+    """
+    wanted = {str(serial).strip() for serial in serial_numbers if serial and str(serial).strip()}
+    found = {}
+    for chunk in _chunks(wanted, LOOKUP_CHUNK):
+        for entry in SerialRegistry.query.filter(SerialRegistry.serial_number.in_(chunk)):
+            found[entry.serial_number] = entry.to_dict()
+    return found
+
+
+def in_stock(entry):
+    """Whether a registry entry means the serial is still in the warehouse (a receipt must reject it)"""
+    if entry['source_type'] in OUTBOUND_SOURCES:
+        return entry.get('status') != 'posted'  # Shipped - a customer return can be received again
+    if entry['source_type'] in INBOUND_SOURCES:
+        return entry.get('status') not in NOT_RECEIVED_STATUSES
+    return True
+
+
+def rebuild_serial_registry():
+    """
+    Recompute the whole registry from the source tables (backfill and repair)
+
+    Returns:
+        dict with success and upserted/removed counts
+    """
+    try:
+        entries = {}
+        for source in _load_sources():
+            _latest(source.query(db.session).yield_per(5000), entries)
+
+        stats = bulk_upsert(SerialRegistry.__tablename__, ['serial_number'], entries.values(), REGISTRY_COLUMNS)
+
+        stale = [serial for (serial,) in db.session.query(SerialRegistry.serial_number) if serial not in entries]
+        for chunk in _chunks(stale, LOOKUP_CHUNK):
+            replicate_deletes(SerialRegistry.__table__, SerialRegistry.serial_number.in_(chunk))
+            SerialRegistry.query.filter(SerialRegistry.serial_number.in_(chunk)).delete(synchronize_session=False)
+        db.session.commit()
+
+        logging.info(f"🔢 Serial registry rebuilt: {len(entries)} serials, {len(stale)} stale removed")
+        return {'success': True, 'serials': len(entries), 'inserted': stats['inserted'],
+                'updated': stats['updated'], 'removed': len(stale)}
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"❌ Serial registry rebuild failed: {str(e)}")
+        return {'success': False, 'error': str(e)}
+
+
+def init_serial_registry(app):
+    """Register the capture hook and backfill the registry when it is still empty"""
+    register_serial_capture(db.session)
+    with app.app_context():
+        try:
+            if SerialRegistry.query.first() is None:
+                rebuild_serial_registry()
+        except Exception as e:
+            db.session.rollback()
+            logging.warning(f"⚠️ Serial registry backfill skipped: {str(e)}")
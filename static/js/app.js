@@ -278,6 +278,16 @@ document.addEventListener('DOMContentLoaded', () => {
     window.addEventListener('online', () => {
         window.wmsApp.syncOfflineData();
     });
+
+    // Offline scans the server could not apply are shown to the operator
+    window.addEventListener('scanqueue:result', (event) => {
+        const problems = (event.detail.results || []).filter(result =>
+            result.status === 'conflict' || result.status === 'rejected'
+        );
+        problems.forEach(result => {
+            window.wmsApp.showAlert(`Offline scan not applied: ${result.message}`, 'warning');
+        });
+    });
 });
 
 // Global utility functions
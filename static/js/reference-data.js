@@ -0,0 +1,134 @@
+// Reference data bundle - warehouses, bins, series and active items kept in IndexedDB
+// Synced from /api/reference-data with ?since_version= so only changed rows travel,
+// then dropdowns and client-side validation read the local copy.
+(function (scope) {
+    const DB_NAME = 'wms-reference';
+    const DB_VERSION = 1;
+    const ENTRY_STORE = 'entries';
+    const META_STORE = 'meta';
+    const ENDPOINT = '/api/reference-data';
+
+    let syncInFlight = null;
+
+    function openDatabase() {
+        return new Promise((resolve, reject) => {
+            const request = indexedDB.open(DB_NAME, DB_VERSION);
+            request.onupgradeneeded = () => {
+                const db = request.result;
+                if (!db.objectStoreNames.contains(ENTRY_STORE)) {
+                    const store = db.createObjectStore(ENTRY_STORE, { keyPath: ['dataset', 'key'] });
+                    store.createIndex('dataset', 'dataset', { unique: false });
+                }
+                if (!db.objectStoreNames.contains(META_STORE)) {
+                    db.createObjectStore(META_STORE, { keyPath: 'name' });
+                }
+            };
+            request.onsuccess = () => resolve(request.result);
+            request.onerror = () => reject(request.error);
+        });
+    }
+
+    function transaction(storeNames, mode, work) {
+        return openDatabase().then(db => new Promise((resolve, reject) => {
+            const tx = db.transaction(storeNames, mode);
+            const result = work(tx);
+            tx.oncomplete = () => { db.close(); resolve(result); };
+            tx.onerror = () => { db.close(); reject(tx.error); };
+            tx.onabort = () => { db.close(); reject(tx.error); };
+        }));
+    }
+
+    function applyBundle(bundle) {
+        return transaction([ENTRY_STORE, META_STORE], 'readwrite', tx => {
+            const entries = tx.objectStore(ENTRY_STORE);
+            if (bundle.full) {
+                entries.clear();
+            }
+            Object.entries(bundle.datasets || {}).forEach(([dataset, changes]) => {
+                (changes.upserts || []).forEach(row => entries.put({ ...row, dataset }));
+                (changes.deletes || []).forEach(key => entries.delete([dataset, key]));
+            });
+            tx.objectStore(META_STORE).put({ name: 'version', value: bundle.version, synced_at: new Date().toISOString() });
+        });
+    }
+
+    const ReferenceData = {
+        async version() {
+            return transaction([META_STORE], 'readonly', tx => {
+                const holder = { value: 0 };
+                tx.objectStore(META_STORE).get('version').onsuccess = event => {
+                    holder.value = event.target.result ? event.target.result.value : 0;
+                };
+                return holder;
+            }).then(holder => holder.value);
+        },
+
+        // Fetch the changes since the local version; concurrent callers share one request
+        sync() {
+            if (!syncInFlight) {
+                syncInFlight = ReferenceData.version()
+                    .then(version => fetch(`${ENDPOINT}?since_version=${version}`, {
+                        credentials: 'same-origin',
+                        headers: { 'Accept': 'application/json' }
+                    }))
+                    .then(response => {
+                        if (!response.ok) {
+                            throw new Error(`Reference data sync failed: ${response.status}`);
+                        }
+                        return response.json();
+                    })
+                    .then(bundle => applyBundle(bundle).then(() => bundle.version))
+                    .finally(() => { syncInFlight = null; });
+            }
+            return syncInFlight;
+        },
+
+        async list(dataset, predicate) {
+            const rows = await transaction([ENTRY_STORE], 'readonly', tx => {
+                const items = [];
+                tx.objectStore(ENTRY_STORE).index('dataset').openCursor(IDBKeyRange.only(dataset)).onsuccess = event => {
+                    const cursor = event.target.result;
+                    if (cursor) {
+                        items.push(cursor.value);
+                        cursor.continue();
+                    }
+                };
+                return items;
+            });
+            return predicate ? rows.filter(predicate) : rows;
+        },
+
+        async get(dataset, key) {
+            return transaction([ENTRY_STORE], 'readonly', tx => {
+                const holder = { value: null };
+                tx.objectStore(ENTRY_STORE).get([dataset, key]).onsuccess = event => {
+                    holder.value = event.target.result || null;
+                };
+                return holder;
+            }).then(holder => holder.value);
+        },
+
+        warehouses() {
+            return ReferenceData.list('warehouses');
+        },
+
+        bins(warehouseCode) {
+            return ReferenceData.list('bins', bin => bin.Warehouse === warehouseCode && bin.IsActive !== 'N');
+        },
+
+        series(objectCode) {
+            return ReferenceData.list('series', series => series.ObjectCode === objectCode);
+        },
+
+        // Client-side validation of a scanned item code against active items
+        item(itemCode) {
+            return ReferenceData.get('items', itemCode);
+        }
+    };
+
+    scope.ReferenceData = ReferenceData;
+
+    if (typeof window !== 'undefined') {
+        window.addEventListener('online', () => ReferenceData.sync().catch(() => {}));
+    }
+})(typeof self !== 'undefined' ? self : window);
@@ -0,0 +1,253 @@
+// Offline scan queue - shared by pages and the service worker
+// Scans are stored in IndexedDB with a device-generated idempotency key and
+// uploaded in order, in batches, to /api/scans/batch by Background Sync.
+// Pages send scans through ScanQueue.submit(), which queues them when the
+// device is offline or the server cannot be reached.
+(function (scope) {
+    const DB_NAME = 'wms-offline';
+    const DB_VERSION = 1;
+    const STORE = 'scan-queue';
+    const CONFLICT_STORE = 'scan-conflicts';
+    const SYNC_TAG = 'wms-scan-sync';
+    const BATCH_SIZE = 200;
+    const ENDPOINT = '/api/scans/batch';
+    const WORKER_URL = '/static/js/service-worker.js';
+    // Gateway answers while the server or SAP is down - the scan is queued instead
+    const QUEUE_STATUSES = [502, 503, 504];
+
+    function openDatabase() {
+        return new Promise((resolve, reject) => {
+            const request = indexedDB.open(DB_NAME, DB_VERSION);
+            request.onupgradeneeded = () => {
+                const db = request.result;
+                if (!db.objectStoreNames.contains(STORE)) {
+                    // Auto-increment sequence keeps scans in capture order
+                    const store = db.createObjectStore(STORE, { keyPath: 'sequence', autoIncrement: true });
+                    store.createIndex('key', 'key', { unique: true });
+                }
+                if (!db.objectStoreNames.contains(CONFLICT_STORE)) {
+                    db.createObjectStore(CONFLICT_STORE, { keyPath: 'key' });
+                }
+            };
+            request.onsuccess = () => resolve(request.result);
+            request.onerror = () => reject(request.error);
+        });
+    }
+
+    function transaction(storeNames, mode, work) {
+        return openDatabase().then(db => new Promise((resolve, reject) => {
+            const tx = db.transaction(storeNames, mode);
+            const result = work(tx);
+            tx.oncomplete = () => { db.close(); resolve(result); };
+            tx.onerror = () => { db.close(); reject(tx.error); };
+            tx.onabort = () => { db.close(); reject(tx.error); };
+        }));
+    }
+
+    function generateKey() {
+        if (scope.crypto && scope.crypto.randomUUID) {
+            return scope.crypto.randomUUID();
+        }
+        return 'xxxxxxxx-xxxx-4xxx-yxxx-xxxxxxxxxxxx'.replace(/[xy]/g, c => {
+            const r = Math.random() * 16 | 0;
+            return (c === 'x' ? r : (r & 0x3 | 0x8)).toString(16);
+        });
+    }
+
+    function deviceId() {
+        // Service workers have no localStorage - pages pass the id along with each scan
+        if (typeof localStorage === 'undefined') {
+            return null;
+        }
+        let id = localStorage.getItem('wms_device_id');
+        if (!id) {
+            id = generateKey();
+            localStorage.setItem('wms_device_id', id);
+        }
+        return id;
+    }
+
+    function readBatch(limit) {
+        return transaction([STORE], 'readonly', tx => {
+            const scans = [];
+            tx.objectStore(STORE).openCursor().onsuccess = event => {
+                const cursor = event.target.result;
+                if (cursor && scans.length < limit) {
+                    scans.push(cursor.value);
+                    cursor.continue();
+                }
+            };
+            return scans;
+        });
+    }
+
+    function removeProcessed(scans, results) {
+        return transaction([STORE, CONFLICT_STORE], 'readwrite', tx => {
+            const byKey = {};
+            results.forEach(result => { byKey[result.key] = result; });
+            scans.forEach(scan => {
+                const result = byKey[scan.key];
+                if (!result || result.status === 'deferred') {
+                    return;  // Deferred scans stay queued, in order, for the next sync
+                }
+                tx.objectStore(STORE).delete(scan.sequence);
+                if (result.status === 'conflict' || result.status === 'rejected') {
+                    tx.objectStore(CONFLICT_STORE).put({ ...scan, status: result.status, message: result.message });
+                }
+            });
+        });
+    }
+
+    const ScanQueue = {
+        SYNC_TAG,
+
+        // Queue a scan; returns the stored record (resolves immediately, even offline)
+        async enqueue(scan) {
+            const record = {
+                key: scan.key || generateKey(),
+                device_id: scan.device_id || deviceId(),
+                scan_type: scan.scan_type,
+                barcode: scan.barcode,
+                quantity: scan.quantity != null ? scan.quantity : 1,
+                context: scan.context || {},
+                scanned_at: new Date().toISOString()
+            };
+            await transaction([STORE], 'readwrite', tx => tx.objectStore(STORE).add(record));
+            ScanQueue.requestSync();
+            return record;
+        },
+
+        // Send a scan to its online endpoint, or queue it when the device is offline,
+        // the request fails on the network or a gateway error comes back.
+        // Resolves { queued: true, record } or { queued: false, response }.
+        async submit(url, options, scan) {
+            if (typeof navigator !== 'undefined' && navigator.onLine === false) {
+                return { queued: true, record: await ScanQueue.enqueue(scan) };
+            }
+            let response;
+            try {
+                response = await fetch(url, { credentials: 'same-origin', ...options });
+            } catch (error) {
+                return { queued: true, record: await ScanQueue.enqueue(scan) };
+            }
+            if (QUEUE_STATUSES.includes(response.status)) {
+                return { queued: true, record: await ScanQueue.enqueue(scan) };
+            }
+            return { queued: false, response };
+        },
+
+        async pendingCount() {
+            return transaction([STORE], 'readonly', tx => {
+                const counter = { value: 0 };
+                tx.objectStore(STORE).count().onsuccess = event => { counter.value = event.target.result; };
+                return counter;
+            }).then(counter => counter.value);
+        },
+
+        async conflicts() {
+            return transaction([CONFLICT_STORE], 'readonly', tx => {
+                const items = [];
+                tx.objectStore(CONFLICT_STORE).openCursor().onsuccess = event => {
+                    const cursor = event.target.result;
+                    if (cursor) {
+                        items.push(cursor.value);
+                        cursor.continue();
+                    }
+                };
+                return items;
+            });
+        },
+
+        async clearConflicts() {
+            return transaction([CONFLICT_STORE], 'readwrite', tx => tx.objectStore(CONFLICT_STORE).clear());
+        },
+
+        // Ask the service worker to upload; falls back to uploading from the page
+        requestSync() {
+            if (typeof navigator === 'undefined' || typeof window === 'undefined') {
+                return;
+            }
+            if ('serviceWorker' in navigator && 'SyncManager' in window) {
+                // The worker is registered under /static/js/, so look it up by its scope rather
+                // than navigator.serviceWorker.ready (which only resolves for controlled pages)
+                navigator.serviceWorker.getRegistration(WORKER_URL)
+                    .then(registration => {
+                        if (!registration) {
+                            throw new Error('Service worker not registered');
+                        }
+                        return registration.sync.register(SYNC_TAG);
+                    })
+                    .catch(() => ScanQueue.flush().catch(() => {}));
+            } else if (navigator.onLine) {
+                ScanQueue.flush().catch(() => {});
+            }
+        },
+
+        // Upload queued scans oldest-first in batches until the queue is empty.
+        // Throws on network/server errors so Background Sync retries later.
+        async flush() {
+            let summary = { accepted: 0, conflict: 0, rejected: 0, duplicate: 0, deferred: 0 };
+            for (;;) {
+                const scans = await readBatch(BATCH_SIZE);
+                if (scans.length === 0) {
+                    return summary;
+                }
+
+                const response = await fetch(ENDPOINT, {
+                    method: 'POST',
+                    credentials: 'same-origin',
+                    headers: { 'Content-Type': 'application/json' },
+                    body: JSON.stringify({
+                        device_id: scans[0].device_id,
+                        scans: scans.map(scan => ({
+                            key: scan.key,
+                            sequence: scan.sequence,
+                            scan_type: scan.scan_type,
+                            barcode: scan.barcode,
+                            quantity: scan.quantity,
+                            context: scan.context,
+                            scanned_at: scan.scanned_at
+                        }))
+                    })
+                });
+                if (!response.ok) {
+                    throw new Error(`Scan upload failed: ${response.status}`);
+                }
+
+                const data = await response.json();
+                await removeProcessed(scans, data.results || []);
+                Object.keys(summary).forEach(status => { summary[status] += data[status] || 0; });
+                ScanQueue.notify({ type: 'SCAN_QUEUE_RESULT', results: data.results || [] });
+                if (data.deferred) {
+                    // The server cannot apply them yet (SAP down) - let Background Sync retry later
+                    throw new Error(`${data.deferred} scans deferred by the server`);
+                }
+            }
+        },
+
+        // Tell open pages about upload results (conflicts are shown to the operator)
+        notify(message) {
+            if (scope.clients && scope.clients.matchAll) {
+                scope.clients.matchAll({ includeUncontrolled: true }).then(clients => {
+                    clients.forEach(client => client.postMessage(message));
+                });
+            } else if (typeof window !== 'undefined') {
+                window.dispatchEvent(new CustomEvent('scanqueue:result', { detail: message }));
+            }
+        }
+    };
+
+    scope.ScanQueue = ScanQueue;
+
+    if (typeof window !== 'undefined') {
+        // Pages: upload when connectivity returns and surface worker results as DOM events
+        window.addEventListener('online', () => ScanQueue.requestSync());
+        if ('serviceWorker' in navigator) {
+            navigator.serviceWorker.addEventListener('message', event => {
+                if (event.data && event.data.type === 'SCAN_QUEUE_RESULT') {
+                    window.dispatchEvent(new CustomEvent('scanqueue:result', { detail: event.data }));
+                }
+            });
+        }
+    }
+})(typeof self !== 'undefined' ? self : window);
@@ -1,10 +1,14 @@
 // Service Worker for PWA functionality
-const CACHE_NAME = 'wms-cache-v1';
+importScripts('/static/js/scan-queue.js');
+
+const CACHE_NAME = 'wms-cache-v3';
 const urlsToCache = [
     '/',
     '/static/css/style.css',
     '/static/js/app.js',
     '/static/js/barcode-scanner.js',
+    '/static/js/scan-queue.js',
+    '/static/js/reference-data.js',
     '/static/manifest.json',
     '/static/icons/icon-192x192.png',
     '/static/icons/icon-512x512.png',
@@ -34,6 +38,12 @@ self.addEventListener('install', event => {
 
 // Fetch event - serve from cache when offline
 self.addEventListener('fetch', event => {
+    // API calls and writes always go to the network (offline scans use the scan queue)
+    const url = new URL(event.request.url);
+    if (event.request.method !== 'GET' || url.pathname.startsWith('/api/')) {
+        return;
+    }
+
     event.respondWith(
         caches.match(event.request)
             .then(response => {
@@ -92,6 +102,10 @@ self.addEventListener('sync', event => {
     if (event.tag === 'background-sync') {
         event.waitUntil(doBackgroundSync());
     }
+    // Offline scan queue - rejected promise makes the browser retry with backoff
+    if (event.tag === ScanQueue.SYNC_TAG) {
+        event.waitUntil(ScanQueue.flush());
+    }
 });
 
 async function doBackgroundSync() {
@@ -218,6 +232,9 @@ self.addEventListener('message', event => {
     if (event.data && event.data.type === 'SKIP_WAITING') {
         self.skipWaiting();
     }
+    if (event.data && event.data.type === 'FLUSH_SCAN_QUEUE') {
+        event.waitUntil(ScanQueue.flush().catch(error => console.error('Scan queue upload failed:', error)));
+    }
 });
 
 // Periodic background sync (when supported)
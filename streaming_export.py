@@ -0,0 +1,270 @@
+"""
+Streaming Export
+CSV and XLSX downloads of history/audit datasets in bounded memory.
+
+Rows are read with Query.yield_per (a server-side cursor on PostgreSQL and
+MySQL) and written by generators that hand the response a few hundred rows
+at a time, so a million-row export never holds more than one batch. Date
+range filters are applied in SQL.
+
+Datasets are registered by the module that owns the data:
+
+    register_export('qr_labels', build_query, columns, date_column=QRCodeLabel.created_at)
+
+and served by GET /api/export/<dataset>?format=csv|xlsx&from_date=&to_date=
+"""
+
+import csv
+import io
+import logging
+import re
+import zipfile
+from datetime import datetime, date, timedelta
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+from flask import Response, stream_with_context
+
+from app import db
+
+DEFAULT_BATCH_SIZE = 1000
+FLUSH_EVERY = 500
+
+CSV_MIMETYPE = 'text/csv'
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# dataset name -> ExportDataset
+EXPORTS = {}
+
+# Characters XML 1.0 does not allow (SAP remarks occasionally contain them)
+_ILLEGAL_XML = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+class ExportDataset:
+    """An exportable dataset: a query factory, its output columns and the column date filters apply to"""
+
+    def __init__(self, name, build_query, columns, date_column=None, permission=None, admin_only=False):
+        self.name = name
+        self.build_query = build_query  # callable(user) -> Query selecting the labelled columns
+        self.columns = columns  # list of (header, label)
+        self.date_column = date_column  # Column, or the name of a selected column when the source varies
+        self.permission = permission
+        self.admin_only = admin_only
+
+    def allowed(self, user):
+        if user.role == 'admin':
+            return True
+        if self.admin_only:
+            return False
+        return not self.permission or user.has_permission(self.permission)
+
+
+def register_export(name, build_query, columns, date_column=None, permission=None, admin_only=False):
+    """Register a dataset for /api/export/<name>"""
+    EXPORTS[name] = ExportDataset(name, build_query, columns, date_column, permission, admin_only)
+    return EXPORTS[name]
+
+
+def _parse_day(value):
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value.strip()[:10], '%Y-%m-%d')
+    except ValueError:
+        raise ValueError(f"Invalid date '{value}' - expected YYYY-MM-DD")
+
+
+def apply_date_range(query, column, from_date=None, to_date=None):
+    """Filter column to [from_date, to_date] (whole days, inclusive) in SQL"""
+    start, end = _parse_day(from_date), _parse_day(to_date)
+    if end is not None:
+        end += timedelta(days=1)
+
+    # Some history tables keep timestamps as ISO strings - compare as strings there
+    as_text = isinstance(column.type, db.String)
+    if start is not None:
+        query = query.filter(column >= (start.strftime('%Y-%m-%d') if as_text else start))
+    if end is not None:
+        query = query.filter(column < (end.strftime('%Y-%m-%d') if as_text else end))
+    return query
+
+
+def stream_rows(query, batch_size=DEFAULT_BATCH_SIZE):
+    """Iterate a query in batches through a server-side cursor"""
+    for row in query.yield_per(batch_size):
+        yield row
+
+
+def _text(value):
+    if value is None:
+        return ''
+    if isinstance(value, (datetime, date)):
+        return value.isoformat(sep=' ') if isinstance(value, datetime) else value.isoformat()
+    return str(value)
+
+
+def iter_csv(headers, rows, flush_every=FLUSH_EVERY):
+    """Yield UTF-8 CSV (with BOM for Excel) a batch of rows at a time"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write('\ufeff')
+    writer.writerow(headers)
+
+    for count, row in enumerate(rows, 1):
+        writer.writerow([_text(value) for value in row])
+        if count % flush_every == 0:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate(0)
+    yield buffer.getvalue().encode('utf-8')
+
+
+class _ChunkStream:
+    """Write-only, non-seekable file object that collects what zipfile writes until drained"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+_XLSX_PARTS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+
+
+def _column_letter(index):
+    letters = ''
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+def _xlsx_cell(ref, value):
+    if value is None:
+        return ''
+    if isinstance(value, (int, float, Decimal)) and not isinstance(value, bool):
+        return f'<c r="{ref}"><v>{value}</v></c>'
+    text = escape(_ILLEGAL_XML.sub('', _text(value)))
+    return f'<c r="{ref}" t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def iter_xlsx(headers, rows, sheet_name='Export', flush_every=FLUSH_EVERY):
+    """
+    Yield an XLSX workbook with a single sheet, streamed row by row
+
+    Strings are written inline (no shared-strings table) so nothing about
+    earlier rows has to be kept in memory.
+    """
+    letters = [_column_letter(index) for index in range(len(headers))]
+    stream = _ChunkStream()
+
+    with zipfile.ZipFile(stream, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, content in _XLSX_PARTS.items():
+            archive.writestr(name, content)
+        archive.writestr('xl/workbook.xml', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+            f'<sheets><sheet name="{escape(sheet_name[:31])}" sheetId="1" r:id="rId1"/></sheets>'
+            '</workbook>'
+        ))
+        yield stream.drain()
+
+        with archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            header_cells = ''.join(_xlsx_cell(f'{letters[i]}1', header) for i, header in enumerate(headers))
+            sheet.write((
+                '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+                f'<row r="1">{header_cells}</row>'
+            ).encode('utf-8'))
+
+            for number, row in enumerate(rows, 2):
+                cells = ''.join(_xlsx_cell(f'{letters[i]}{number}', value) for i, value in enumerate(row))
+                sheet.write(f'<row r="{number}">{cells}</row>'.encode('utf-8'))
+                if number % flush_every == 0:
+                    yield stream.drain()
+
+            sheet.write(b'</sheetData></worksheet>')
+    yield stream.drain()
+
+
+def export_response(dataset, user, export_format='csv', from_date=None, to_date=None):
+    """
+    Build the streaming download for a registered dataset
+
+    Raises:
+        ValueError: unknown format or invalid date
+    """
+    if export_format not in ('csv', 'xlsx'):
+        raise ValueError(f"Unsupported export format '{export_format}' - use csv or xlsx")
+
+    query = dataset.build_query(user)
+    date_column = dataset.date_column
+    if isinstance(date_column, str):
+        date_column = query.statement.selected_columns[date_column]
+    if date_column is not None:
+        query = apply_date_range(query, date_column, from_date, to_date)
+
+    headers = [header for header, _ in dataset.columns]
+    labels = [label for _, label in dataset.columns]
+
+    username = user.username
+
+    def rows():
+        count = 0
+        try:
+            for row in stream_rows(query):
+                count += 1
+                mapping = row._mapping
+                yield [mapping[label] for label in labels]
+        finally:
+            logging.info(f"📤 Export {dataset.name} ({export_format}) for {username}: {count} rows")
+
+    stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    if export_format == 'xlsx':
+        body, mimetype = iter_xlsx(headers, rows(), sheet_name=dataset.name), XLSX_MIMETYPE
+    else:
+        body, mimetype = iter_csv(headers, rows()), CSV_MIMETYPE
+
+    return Response(stream_with_context(body), mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename="{dataset.name}_{stamp}.{export_format}"',
+        'Cache-Control': 'no-store',
+        'X-Accel-Buffering': 'no'  # let nginx pass chunks straight through
+    })
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Concurrency stress test for the document number allocator (document_numbers.py)
+Runs STRESS_WORKERS independent allocators (one per simulated worker process)
+with STRESS_THREADS threads each against the configured database, draws
+STRESS_ALLOCATIONS numbers in total and checks that none is handed out twice
+and that the allocation rate stays above STRESS_MIN_RATE per second.
+The scratch series rows are deleted afterwards.
+"""
+
+import os
+import sys
+import threading
+import time
+import logging
+from collections import Counter
+
+sys.path.insert(0, '.')
+
+from app import app, db
+from models import DocumentNumberSeries
+from document_numbers import BlockAllocator
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+WORKERS = int(os.environ.get('STRESS_WORKERS', '4'))
+THREADS = int(os.environ.get('STRESS_THREADS', '8'))
+ALLOCATIONS = int(os.environ.get('STRESS_ALLOCATIONS', '5000'))
+MIN_RATE = float(os.environ.get('STRESS_MIN_RATE', '200'))
+
+STRESS_TYPE = f'STRESS_TEST_{os.getpid()}'
+SESSION_TYPE = f'STRESS_SESSION_{os.getpid()}'
+
+
+def _allocate_concurrently(document_type, block_size):
+    """Draw ALLOCATIONS numbers from WORKERS allocators x THREADS threads"""
+    allocators = [BlockAllocator(engine=db.engine, block_size=block_size) for _ in range(WORKERS)]
+    per_thread = ALLOCATIONS // (WORKERS * THREADS)
+    numbers = []
+    errors = []
+    numbers_lock = threading.Lock()
+    start_gate = threading.Barrier(WORKERS * THREADS)
+
+    def run(allocator):
+        drawn = []
+        try:
+            start_gate.wait()
+            for _ in range(per_thread):
+                drawn.append(allocator.next_number(document_type))
+        except Exception as e:
+            errors.append(e)
+        with numbers_lock:
+            numbers.extend(drawn)
+
+    threads = [threading.Thread(target=run, args=(allocator,))
+               for allocator in allocators for _ in range(THREADS)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return numbers, errors, per_thread * WORKERS * THREADS, elapsed
+
+
+def test_no_duplicates_under_load(block_size=20):
+    """Concurrent workers never receive the same number"""
+    numbers, errors, expected, elapsed = _allocate_concurrently(STRESS_TYPE, block_size)
+    assert not errors, f"{len(errors)} allocation errors, first: {errors[0]}"
+    assert len(numbers) == expected, f"{len(numbers)} of {expected} numbers drawn"
+
+    duplicates = [number for number, count in Counter(numbers).items() if count > 1]
+    assert not duplicates, f"{len(duplicates)} duplicates, e.g. {duplicates[:5]}"
+
+    rate = expected / elapsed
+    print(f"📊 {expected:,} numbers, {WORKERS} workers x {THREADS} threads, block {block_size}: "
+          f"{elapsed:.2f}s ({rate:,.0f}/s)")
+    assert rate >= MIN_RATE, f"{rate:.0f} allocations/s below {MIN_RATE:.0f}/s"
+
+
+def test_single_number_blocks():
+    """Block size 1 (one UPDATE per number) is still duplicate-free"""
+    numbers, errors, expected, _ = _allocate_concurrently(f'{STRESS_TYPE}_B1', 1)
+    assert not errors, f"{len(errors)} allocation errors, first: {errors[0]}"
+    assert len(set(numbers)) == len(numbers) == expected
+
+
+def test_caller_session_not_committed():
+    """get_next_number leaves the caller's pending changes uncommitted"""
+    db.session.add(DocumentNumberSeries(document_type=SESSION_TYPE, prefix='X-'))
+    number = DocumentNumberSeries.get_next_number(STRESS_TYPE)
+    db.session.rollback()
+    assert number.startswith('DOC-'), number
+    assert DocumentNumberSeries.query.filter_by(document_type=SESSION_TYPE).first() is None
+
+
+def main():
+    """Run the allocator stress tests"""
+    print("🔬 Stress testing document number allocation")
+    print("=" * 60)
+
+    tests = [test_no_duplicates_under_load, test_single_number_blocks, test_caller_session_not_committed]
+    failed = 0
+    with app.app_context():
+        db.create_all()
+        try:
+            for test in tests:
+                try:
+                    test()
+                    print(f"✅ {test.__name__}")
+                except AssertionError as e:
+                    failed += 1
+                    print(f"❌ {test.__name__}: {e}")
+        finally:
+            db.session.rollback()
+            DocumentNumberSeries.query.filter(
+                DocumentNumberSeries.document_type.in_([STRESS_TYPE, f'{STRESS_TYPE}_B1', SESSION_TYPE])
+            ).delete(synchronize_session=False)
+            db.session.commit()
+    print(f"\n🎯 {len(tests) - failed}/{len(tests)} tests passed")
+    return failed == 0
+
+
+if __name__ == "__main__":
+    main()
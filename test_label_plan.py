@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Test script for pack splitting and label planning (label_plan.py)
+Property checks over random quantities and pack counts; no database needed.
+"""
+
+import json
+import random
+import sys
+
+sys.path.insert(0, '.')
+
+from label_plan import LabelPlan, chunk_serials, round_quantity, split_quantity
+
+ROUNDS = 2000
+
+
+def test_round_quantity():
+    """Halves round up, not to even"""
+    assert [round_quantity(q) for q in (0.5, 1.5, 2.5, 2.4999, '7', None)] == [1, 2, 3, 2, 7, 0]
+
+
+def test_split_properties():
+    """Packs add up to the rounded quantity, differ by at most one and never grow"""
+    rng = random.Random(49)
+    for _ in range(ROUNDS):
+        total = round(rng.uniform(0, 5000), rng.choice([0, 1, 3]))
+        num_packs = rng.randint(1, 60)
+        packs = split_quantity(total, num_packs)
+        assert len(packs) == num_packs
+        assert sum(packs) == round_quantity(total), (total, num_packs, packs)
+        assert max(packs) - min(packs) <= 1, (total, num_packs, packs)
+        assert packs == sorted(packs, reverse=True), (total, num_packs, packs)
+    assert split_quantity(11, 3) == [4, 4, 3]
+    assert split_quantity(10, 0) == []
+
+
+def test_chunk_serials():
+    """Serials keep their order and must divide evenly"""
+    rng = random.Random(50)
+    for _ in range(ROUNDS // 10):
+        num_packs = rng.randint(1, 12)
+        serials = [f'SN{n:05d}' for n in range(num_packs * rng.randint(1, 9))]
+        chunks = chunk_serials(serials, num_packs)
+        assert len(chunks) == num_packs
+        assert [s for chunk in chunks for s in chunk] == serials
+        assert len({len(chunk) for chunk in chunks}) == 1
+    for serials, num_packs in ((['A', 'B', 'C'], 2), ([], 1), (['A'], 0)):
+        try:
+            chunk_serials(serials, num_packs)
+        except ValueError:
+            continue
+        raise AssertionError(f'{len(serials)} serials into {num_packs} packs should be rejected')
+
+
+def test_plan_labels():
+    """QR payloads match their pack and label IDs are unique across a document"""
+    rng = random.Random(51)
+    plan = LabelPlan()
+    expected = 0
+    for line in range(200):
+        total, num_packs = rng.uniform(0, 300), rng.randint(1, 8)
+        expected += round_quantity(total)
+        plan.add_line(total, num_packs, lambda pack, line=line: f"GRN-{line}-{pack['pack_number']}",
+                      {'id': None, 'item': f'ITM-{line}', 'qty': None, 'pack': None, 'bin': 'N/A'})
+    assert plan.total_quantity == expected
+    assert [pack['sequence'] for pack in plan.packs] == list(range(len(plan.packs)))
+    assert len({pack['label_id'] for pack in plan.packs}) == len(plan.packs)
+    for pack in plan.packs:
+        qr = json.loads(pack['qr_text'])
+        assert list(qr) == ['id', 'item', 'qty', 'pack', 'bin']
+        assert qr['id'] == pack['label_id'] and qr['qty'] == pack['quantity']
+        assert qr['pack'] == f"{pack['pack_number']} of {pack['total_packs']}"
+
+    sparse = LabelPlan()
+    sparse.add_line(2, 5, lambda pack: pack['pack_number'], skip_empty=True)
+    assert [pack['quantity'] for pack in sparse.packs] == [1, 1]
+
+
+def main():
+    """Run all label plan tests"""
+    print("🔬 Testing pack splitting and label planning")
+    print("=" * 60)
+    tests = [
+        test_round_quantity,
+        test_split_properties,
+        test_chunk_serials,
+        test_plan_labels,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__name__}: {e}")
+    print(f"\n🎯 {len(tests) - failed}/{len(tests)} tests passed")
+    return failed == 0
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Test script for the offline scan queue (static/js/scan-queue.js) and its
+server side (offline_scan_ingest.py)
+Replays an offline pick against the SAP simulator and checks it reaches SAP,
+that picks are deferred while SAP is down, and (with node installed) that
+ScanQueue.submit queues scans when the device is offline or the server is
+unreachable. Scratch rows are deleted afterwards.
+"""
+
+import json
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import uuid
+
+sys.path.insert(0, '.')
+
+from app import app, db
+from models import User, PickList, PickListLine, OfflineScan
+from offline_scan_ingest import ingest_batch
+from sap_simulator import ServiceLayerSimulator, SimulatorConfig, start_simulator_thread
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+SAP_ENV = ('SAP_B1_SERVER', 'SAP_B1_USERNAME', 'SAP_B1_PASSWORD', 'SAP_B1_COMPANY_DB')
+
+# Minimal in-memory IndexedDB, enough for scan-queue.js
+NODE_HARNESS = r"""
+const stores = {};
+function later(fn) { queueMicrotask(fn); }
+function request(result) {
+    const req = { result };
+    later(() => req.onsuccess && req.onsuccess({ target: req }));
+    return req;
+}
+function objectStore(name) {
+    const store = stores[name];
+    return {
+        createIndex() {},
+        add(record) { record[store.keyPath] = ++store.next; store.rows.set(record[store.keyPath], record); return request(); },
+        put(record) { store.rows.set(record[store.keyPath], record); return request(); },
+        delete(key) { store.rows.delete(key); return request(); },
+        clear() { store.rows.clear(); return request(); },
+        count() { return request(store.rows.size); },
+        openCursor() {
+            const values = [...store.rows.keys()].sort((a, b) => a - b).map(key => store.rows.get(key));
+            const req = {};
+            let index = 0;
+            const step = () => later(() => {
+                const value = values[index++];
+                req.onsuccess({ target: { result: value === undefined ? null : { value, continue: step } } });
+            });
+            step();
+            return req;
+        }
+    };
+}
+const database = {
+    objectStoreNames: { contains: name => name in stores },
+    createObjectStore(name, options) {
+        stores[name] = { keyPath: (options || {}).keyPath || 'key', next: 0, rows: new Map() };
+        return objectStore(name);
+    },
+    transaction() {
+        const tx = { objectStore };
+        setTimeout(() => tx.oncomplete && tx.oncomplete(), 0);
+        return tx;
+    },
+    close() {}
+};
+globalThis.indexedDB = {
+    open() {
+        const req = { result: database };
+        later(() => { req.onupgradeneeded && req.onupgradeneeded(); req.onsuccess(); });
+        return req;
+    }
+};
+globalThis.window = globalThis;
+globalThis.addEventListener = () => {};
+globalThis.dispatchEvent = () => {};
+globalThis.CustomEvent = class { constructor(type, init) { this.type = type; this.detail = (init || {}).detail; } };
+globalThis.localStorage = { values: {}, getItem(k) { return this.values[k] || null; }, setItem(k, v) { this.values[k] = v; } };
+Object.defineProperty(globalThis, 'navigator', { value: { onLine: true }, writable: true, configurable: true });
+
+let scanAnswer = () => { throw new TypeError('Failed to fetch'); };
+let batchAnswer = () => { throw new TypeError('Failed to fetch'); };
+const calls = [];
+globalThis.fetch = async (url, options) => {
+    calls.push(url);
+    return url === '/api/scans/batch' ? batchAnswer(JSON.parse(options.body)) : scanAnswer();
+};
+const reply = (status, body) => ({ status, ok: status < 400, json: async () => body });
+const settle = () => new Promise(resolve => setTimeout(resolve, 20));
+
+require(process.argv[process.argv.length - 1]);
+const out = {};
+const pick = { scan_type: 'PICK', barcode: 'ITM-1', context: { absolute_entry: 1, line_number: 0 } };
+(async () => {
+    navigator.onLine = false;
+    out.offline = (await ScanQueue.submit('/api/pick', {}, pick)).queued;
+    out.offline_fetches = calls.length;
+    navigator.onLine = true;
+    out.network_error = (await ScanQueue.submit('/api/pick', {}, pick)).queued;
+    await settle();
+    scanAnswer = () => reply(503, {});
+    out.gateway_error = (await ScanQueue.submit('/api/pick', {}, pick)).queued;
+    await settle();
+    scanAnswer = () => reply(200, { success: true });
+    out.online = (await ScanQueue.submit('/api/pick', {}, pick)).queued;
+    out.pending_before_flush = await ScanQueue.pendingCount();
+
+    batchAnswer = body => {
+        const results = body.scans.map((scan, i) => ({ key: scan.key, status: i === 0 ? 'deferred' : 'accepted' }));
+        return reply(200, { results, accepted: results.length - 1, deferred: 1 });
+    };
+    try {
+        await ScanQueue.flush();
+        out.flush_error = null;
+    } catch (error) {
+        out.flush_error = error.message;
+    }
+    out.pending_after_flush = await ScanQueue.pendingCount();
+    console.log(JSON.stringify(out));
+})();
+"""
+
+
+def _scan(key, quantity=1):
+    return {'key': key, 'sequence': 1, 'scan_type': 'PICK', 'barcode': 'ITM-OFFLINE', 'quantity': quantity,
+            'context': {'absolute_entry': 1, 'line_number': 0}, 'scanned_at': '2026-10-19T08:00:00Z'}
+
+
+def test_offline_pick_reaches_sap():
+    """A replayed pick is confirmed in SAP, once; picks wait on the device while SAP is down"""
+    config = SimulatorConfig()
+    config.latency_ms = config.jitter_ms = config.op_latency_ms = 0
+    simulator = ServiceLayerSimulator(config)
+    server, base_url = start_simulator_thread(simulator)
+    saved_env = {name: os.environ.get(name) for name in SAP_ENV}
+    os.environ.update({'SAP_B1_SERVER': base_url, 'SAP_B1_USERNAME': 'manager',
+                       'SAP_B1_PASSWORD': 'sim', 'SAP_B1_COMPANY_DB': 'SIM_COMPANY'})
+    sap_line = simulator.data['PickLists'][0]['PickListsLines'][0]
+    keys = [f'test-{uuid.uuid4()}' for _ in range(2)]
+
+    with app.app_context():
+        db.create_all()
+        user = User.query.filter_by(role='admin').first() or User.query.first()
+        assert user is not None, 'needs at least one user in the database'
+        stale = PickList.query.filter_by(absolute_entry=1).all()
+        assert not stale, 'pick list with absolute entry 1 already exists in this database'
+
+        pick_list = PickList(name='OFFLINE-TEST', user_id=user.id, absolute_entry=1, status='ps_Released')
+        db.session.add(pick_list)
+        db.session.flush()
+        db.session.add(PickListLine(pick_list_id=pick_list.id, line_number=0, item_code='ITM-OFFLINE',
+                                    released_quantity=sap_line['ReleasedQuantity'], picked_quantity=0))
+        db.session.commit()
+        try:
+            result = ingest_batch(user, [_scan(keys[0])], device_id='test-device')
+            assert result['results'][0]['status'] == 'accepted', result
+            assert sap_line['PickedQuantity'] == 1.0, sap_line
+            assert sap_line['PickStatus'] == 'ps_Picked', sap_line
+
+            replay = ingest_batch(user, [_scan(keys[0])], device_id='test-device')
+            assert replay['duplicate'] == 1, replay
+
+            os.environ['SAP_B1_SERVER'] = 'http://127.0.0.1:1'  # Nothing listens here
+            down = ingest_batch(user, [_scan(keys[1])], device_id='test-device')
+            assert down['results'][0]['status'] == 'deferred', down
+            assert OfflineScan.query.filter_by(idempotency_key=keys[1]).count() == 0
+            line = PickListLine.query.filter_by(pick_list_id=pick_list.id, line_number=0).first()
+            assert line.picked_quantity == 1.0, line.picked_quantity
+        finally:
+            db.session.rollback()
+            OfflineScan.query.filter(OfflineScan.idempotency_key.in_(keys)).delete(synchronize_session=False)
+            PickListLine.query.filter_by(pick_list_id=pick_list.id).delete(synchronize_session=False)
+            PickList.query.filter_by(id=pick_list.id).delete(synchronize_session=False)
+            db.session.commit()
+            for name, value in saved_env.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
+            server.shutdown()
+
+
+def test_scan_queue_submit():
+    """Scans are queued offline, on network and gateway errors; deferred scans stay queued"""
+    node = shutil.which('node')
+    if not node:
+        print("   node not installed - skipped")
+        return
+    script = os.path.abspath(os.path.join('static', 'js', 'scan-queue.js'))
+    completed = subprocess.run([node, '-e', NODE_HARNESS, '--', script], capture_output=True, text=True, timeout=60)
+    assert completed.returncode == 0, completed.stderr
+    out = json.loads(completed.stdout.strip().splitlines()[-1])
+    assert out['offline'] and out['offline_fetches'] == 0, out
+    assert out['network_error'] and out['gateway_error'], out
+    assert out['online'] is False, out
+    assert out['pending_before_flush'] == 3, out
+    assert out['flush_error'] and out['pending_after_flush'] == 1, out
+
+
+def main():
+    """Run all offline scan tests"""
+    print("🔬 Testing the offline scan queue")
+    print("=" * 60)
+    tests = [
+        test_offline_pick_reaches_sap,
+        test_scan_queue_submit,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__name__}: {e}")
+    print(f"\n🎯 {len(tests) - failed}/{len(tests)} tests passed")
+    return failed == 0
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Test script for the pick route engine (pick_route.py)
+Checks bin code parsing and serpentine ordering, then builds a large wave of
+scratch pick lists on the configured database and times the routing. The
+scratch pick lists are deleted afterwards.
+"""
+
+import logging
+import random
+import sys
+
+sys.path.insert(0, '.')
+
+from app import app, db
+from models import User, PickList, PickListLine, PickListBinAllocation
+from pick_route import RouteLayout, order_stops, route_pick_lists
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+WAVE_LISTS = 20
+LINES_PER_LIST = 100
+
+
+def _walk(bin_codes, layout):
+    stops = [{'warehouse': layout.warehouse_code, 'bin_code': code} for code in bin_codes]
+    return [stop['bin_code'] for stop in order_stops(stops, {layout.warehouse_code: layout})]
+
+
+def test_generic_parser():
+    """Aisle, rack and level are read after the warehouse prefix"""
+    layout = RouteLayout('7000-FG')
+    assert layout.parse('7000-FG-A01-02') == ('A', '01', '02')
+    assert layout.parse('7000-FG-B-12') == ('B', '12', '')
+    assert layout.parse('7000-FG-SYSTEM-BIN-LOCATION') == ('SYSTEM', 'BIN', 'LOCATION')
+    assert layout.parse('') is None
+
+
+def test_serpentine_walk():
+    """Racks go up in the first visited aisle, down in the next; unparsed bins come last"""
+    layout = RouteLayout('WH1')
+    bins = ['WH1-C-02-1', 'WH1-A-10-1', 'WH1-A-02-2', 'WH1-A-02-1', 'WH1-C-09-1', '???', 'WH1-D-01-1', 'WH1-D-07-3']
+    assert _walk(bins, layout) == ['WH1-A-02-1', 'WH1-A-02-2', 'WH1-A-10-1',
+                                   'WH1-C-09-1', 'WH1-C-02-1',
+                                   'WH1-D-01-1', 'WH1-D-07-3', '???']
+
+    layout.serpentine = False
+    assert _walk(bins, layout)[3:5] == ['WH1-C-02-1', 'WH1-C-09-1']
+
+
+def test_configured_layout():
+    """A layout regex and aisle sequence override the generic parser"""
+    layout = RouteLayout('WH2', r'^R(?P<rack>\d+)-(?P<aisle>[A-Z])(?P<level>\d)$', ['Z', 'B', 'A'])
+    assert layout.parse('R07-B3') == ('B', '07', '3')
+    assert _walk(['R01-A1', 'R05-B1', 'R02-Z1', 'R09-B2'], layout) == ['R02-Z1', 'R09-B2', 'R05-B1', 'R01-A1']
+
+
+def test_large_wave_routes_fast():
+    """A wave of 20 pick lists (4,000 allocations) routes well under 100 ms with bins merged"""
+    rng = random.Random(7)
+    with app.app_context():
+        db.create_all()
+        user = User.query.filter_by(role='admin').first() or User.query.first()
+        assert user is not None, 'needs at least one user in the database'
+
+        pick_list_ids = []
+        try:
+            for n in range(WAVE_LISTS):
+                pick_list = PickList(name=f'ROUTE-TEST-{n}', user_id=user.id, warehouse_code='7000-FG')
+                db.session.add(pick_list)
+                db.session.flush()
+                pick_list_ids.append(pick_list.id)
+                for line_number in range(LINES_PER_LIST):
+                    line = PickListLine(pick_list_id=pick_list.id, line_number=line_number,
+                                        item_code=f'ITM-{rng.randint(1, 500):04d}', released_quantity=2)
+                    db.session.add(line)
+                    db.session.flush()
+                    for _ in range(2):
+                        aisle, rack, level = rng.choice('ABCDEFGH'), rng.randint(1, 30), rng.randint(1, 4)
+                        db.session.add(PickListBinAllocation(
+                            pick_list_line_id=line.id, quantity=1, warehouse_code='7000-FG',
+                            bin_abs_entry=ord(aisle) * 1000 + rack * 10 + level,
+                            bin_code=f'7000-FG-{aisle}{rack:02d}-{level:02d}'))
+            db.session.commit()
+
+            route_pick_lists(pick_list_ids[:1])  # Warm up
+            result = min((route_pick_lists(pick_list_ids) for _ in range(3)),
+                         key=lambda r: r['stats']['elapsed_ms'])  # Best of 3, as GC pauses are not routing
+            stats = result['stats']
+            print(f"   {stats['allocations']} allocations -> {stats['stops']} stops in {stats['elapsed_ms']}ms, "
+                  f"aisle changes {stats['aisle_changes_sap_order']} -> {stats['aisle_changes']}")
+            assert stats['allocations'] == WAVE_LISTS * LINES_PER_LIST * 2
+            assert stats['stops'] <= 8 * 30 * 4
+            assert stats['aisle_changes'] == stats['aisles'] - 1
+            assert sum(len(stop['picks']) for stop in result['stops']) == stats['allocations']
+            assert len(result['line_order']) == WAVE_LISTS * LINES_PER_LIST
+            assert stats['elapsed_ms'] < 100, f"took {stats['elapsed_ms']}ms"
+        finally:
+            db.session.rollback()
+            line_ids = [i for (i,) in db.session.query(PickListLine.id)
+                        .filter(PickListLine.pick_list_id.in_(pick_list_ids))]
+            if line_ids:
+                PickListBinAllocation.query.filter(PickListBinAllocation.pick_list_line_id.in_(line_ids)) \
+                    .delete(synchronize_session=False)
+                PickListLine.query.filter(PickListLine.id.in_(line_ids)).delete(synchronize_session=False)
+            PickList.query.filter(PickList.id.in_(pick_list_ids)).delete(synchronize_session=False)
+            db.session.commit()
+
+
+def main():
+    """Run all pick route tests"""
+    print("🔬 Testing the pick route engine")
+    print("=" * 60)
+    tests = [
+        test_generic_parser,
+        test_serpentine_walk,
+        test_configured_layout,
+        test_large_wave_routes_fast,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__name__}: {e}")
+    print(f"\n🎯 {len(tests) - failed}/{len(tests)} tests passed")
+    return failed == 0
+
+
+if __name__ == "__main__":
+    main()
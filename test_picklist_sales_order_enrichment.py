@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Test script for set-based pick list enrichment
+Checks that SAPIntegration.enhance_picklist_with_sales_order_data issues a
+fixed number of SQL queries and SAP calls however many lines the pick list has.
+Runs against a throwaway SQLite database.
+"""
+
+import os
+import sys
+import logging
+import tempfile
+
+sys.path.insert(0, '.')
+# A file, not :memory: - app.py sets pool_size/max_overflow, which the in-memory pool rejects
+DB_DIR = tempfile.TemporaryDirectory()
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(DB_DIR.name, 'enrichment.db')}"
+
+from sqlalchemy import event
+
+from app import app, db
+from models import SalesOrder, SalesOrderLine
+from sap_integration import SAPIntegration
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+class QueryCounter:
+    """Counts SELECT statements sent to the database"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.selects = 0
+
+    def _count(self, conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            self.selects += 1
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self._count)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self._count)
+
+
+class StandInSAP(SAPIntegration):
+    """SAPIntegration whose Orders lookup is served locally and counted"""
+
+    def __init__(self, remote_orders):
+        super().__init__()
+        self.remote_orders = remote_orders
+        self.order_fetches = []
+
+    def get_sales_orders_by_doc_entries(self, doc_entries, chunk_size=20):
+        self.order_fetches.append(sorted(doc_entries))
+        return {entry: self.remote_orders[entry] for entry in doc_entries if entry in self.remote_orders}
+
+
+def _order(doc_entry, line_count):
+    return {
+        'DocEntry': doc_entry, 'DocNum': doc_entry + 1000, 'CardCode': f'C{doc_entry}',
+        'CardName': f'Customer {doc_entry}', 'DocumentStatus': 'bost_Open',
+        'DocumentLines': [
+            {'LineNum': n, 'ItemCode': f'ITEM-{doc_entry}-{n}', 'Quantity': 5, 'WarehouseCode': '7000-FG'}
+            for n in range(line_count)
+        ]
+    }
+
+
+def _pick_lines(order_entries, lines_per_order):
+    return [
+        {'LineNumber': index, 'OrderEntry': entry, 'OrderRowID': n}
+        for index, (entry, n) in enumerate((e, n) for e in order_entries for n in range(lines_per_order))
+    ]
+
+
+def _reset_database(local_orders):
+    db.drop_all()
+    db.create_all()
+    sap = SAPIntegration()
+    for entry in local_orders:
+        order_data = _order(entry, 20)
+        sales_order = SalesOrder()
+        sap._apply_sales_order_fields(sales_order, order_data)
+        for line_data in order_data['DocumentLines']:
+            order_line = SalesOrderLine()
+            sap._apply_sales_order_line_fields(order_line, line_data)
+            sales_order.order_lines.append(order_line)
+        db.session.add(sales_order)
+    db.session.commit()
+    db.session.expunge_all()
+
+
+def test_query_count_is_constant():
+    """10 or 200 lines across local orders cost the same two SELECTs"""
+    for lines_per_order in (1, 20):
+        _reset_database(local_orders=[1, 2, 3, 4, 5, 6, 7, 8, 9, 10])
+        sap = StandInSAP(remote_orders={})
+        with QueryCounter(db.engine) as counter:
+            enhanced = sap.enhance_picklist_with_sales_order_data(_pick_lines(range(1, 11), lines_per_order))
+        assert counter.selects == 2, f"expected 2 SELECTs, got {counter.selects}"
+        assert sap.order_fetches == []
+        assert all(line['ItemCode'].startswith('ITEM-') for line in enhanced)
+
+
+def test_missing_orders_fetched_once():
+    """Orders absent locally are fetched from SAP in a single call and joined"""
+    _reset_database(local_orders=[1])
+    sap = StandInSAP(remote_orders={2: _order(2, 20), 3: _order(3, 20)})
+    enhanced = sap.enhance_picklist_with_sales_order_data(_pick_lines([1, 2, 3], 5))
+    assert sap.order_fetches == [[2, 3]]
+    assert [line['CustomerCode'] for line in enhanced[::5]] == ['C1', 'C2', 'C3']
+    assert SalesOrder.query.count() == 3
+
+    # Second run is served entirely from the local database
+    db.session.expunge_all()
+    sap.order_fetches = []
+    sap.enhance_picklist_with_sales_order_data(_pick_lines([1, 2, 3], 5))
+    assert sap.order_fetches == []
+
+
+def main():
+    """Run enrichment tests"""
+    print("🔬 Testing set-based pick list Sales Order enrichment")
+    print("=" * 60)
+    tests = [test_query_count_is_constant, test_missing_orders_fetched_once]
+    failed = 0
+    with app.app_context():
+        for test in tests:
+            try:
+                test()
+                print(f"✅ {test.__name__}")
+            except AssertionError as e:
+                failed += 1
+                print(f"❌ {test.__name__}: {e}")
+    print(f"\n🎯 {len(tests) - failed}/{len(tests)} tests passed")
+    return failed == 0
+
+
+if __name__ == "__main__":
+    main()
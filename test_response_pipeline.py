@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Test and benchmark script for the response pipeline
+Checks that the orjson provider, negotiated compression and precompiled
+serialize_model produce the same payloads as before, and times them on
+payloads shaped like the largest endpoints (bin contents, REST table dumps).
+Runs against a throwaway SQLite database.
+"""
+
+import gzip
+import json
+import os
+import sys
+import tempfile
+import time
+import logging
+from datetime import datetime, date, timedelta
+from decimal import Decimal
+
+sys.path.insert(0, '.')
+# A file, not :memory: - app.py sets pool_size/max_overflow, which the in-memory pool rejects
+DB_DIR = tempfile.TemporaryDirectory()
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(DB_DIR.name, 'response_pipeline.db')}"
+
+from flask import jsonify
+from flask.json.provider import DefaultJSONProvider
+
+from app import app
+from models import BinItem
+import api_rest
+import response_pipeline
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+ROWS = 5000
+
+
+def _legacy_serialize(obj, exclude_fields=None):
+    """serialize_model as it was before precompiled serializers"""
+    exclude_fields = exclude_fields or []
+    result = {}
+    for column in obj.__table__.columns:
+        if column.name in exclude_fields:
+            continue
+        value = getattr(obj, column.name)
+        result[column.name] = value.isoformat() if isinstance(value, datetime) else value
+    return result
+
+
+def _bin_items(count):
+    now = datetime(2026, 1, 15, 8, 30, 12, 123456)
+    return [BinItem(
+        id=index, bin_code=f'7000-FG-A{index % 50:03d}', item_code=f'ITEM-{index:05d}',
+        item_name=f'Finished good {index}', batch_number=f'B{index:06d}', quantity=index * 1.5,
+        available_quantity=index, committed_quantity=0, uom='EA', expiry_date=date(2027, 1, 1),
+        warehouse_code='7000-FG', sap_abs_entry=index, batch_status='bdsStatus_Released',
+        last_sap_sync=now, created_at=now, updated_at=now + timedelta(seconds=index)
+    ) for index in range(count)]
+
+
+def _bin_scan_payload(count):
+    """Shape of the get_bin_items response"""
+    return {'success': True, 'items': [{
+        'ItemCode': f'ITEM-{index:05d}', 'ItemName': f'Finished good {index}', 'BatchNumber': f'B{index:06d}',
+        'OnHand': Decimal('12.500'), 'Available': index, 'UoM': 'EA', 'ExpiryDate': date(2027, 1, 1),
+        'AdmissionDate': datetime(2026, 1, 15, 8, 30), 'Warehouse': '7000-FG', 'BinCode': '7000-FG-A001'
+    } for index in range(count)]}
+
+
+def _timed(func, repeat=5):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1000
+
+
+def test_serializer_matches_legacy():
+    """Precompiled serializers return exactly what the per-column loop did"""
+    items = _bin_items(50)
+    for item in items:
+        assert api_rest.serialize_model(item) == _legacy_serialize(item)
+        assert (api_rest.serialize_model(item, exclude_fields=['item_name'])
+                == _legacy_serialize(item, exclude_fields=['item_name']))
+
+
+def test_json_provider_matches_default():
+    """orjson output decodes to the same values as Flask's default provider"""
+    if response_pipeline.orjson is None:
+        print("   ⏭️ orjson not installed")
+        return
+    payload = _bin_scan_payload(20)
+    fast = response_pipeline.OrjsonProvider(app).dumps(payload)
+    default = DefaultJSONProvider(app).dumps(payload)
+    assert json.loads(fast) == json.loads(default)
+
+
+def test_compression_negotiation():
+    """Large JSON is gzipped for clients that accept it, small or unaccepted responses are not"""
+    client = app.test_client()
+    big = client.get('/_test/pipeline/big', headers={'Accept-Encoding': 'gzip'})
+    assert big.headers.get('Content-Encoding') == 'gzip', big.headers.get('Content-Encoding')
+    assert 'Accept-Encoding' in big.headers.get('Vary', '')
+
+    plain = client.get('/_test/pipeline/big')
+    assert 'Content-Encoding' not in plain.headers
+    assert json.loads(gzip.decompress(big.data)) == json.loads(plain.data)
+
+    small = client.get('/_test/pipeline/small', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in small.headers
+
+
+def benchmark():
+    """Print timings for the old and new paths"""
+    items = _bin_items(ROWS)
+    legacy_ms = _timed(lambda: [_legacy_serialize(item) for item in items])
+    compiled_ms = _timed(lambda: [api_rest.serialize_model(item) for item in items])
+    print(f"📊 serialize_model x{ROWS}: {legacy_ms:.1f} ms -> {compiled_ms:.1f} ms")
+
+    payload = _bin_scan_payload(ROWS)
+    default_ms = _timed(lambda: DefaultJSONProvider(app).dumps(payload))
+    print(f"📊 stdlib json x{ROWS} bin lines: {default_ms:.1f} ms")
+    if response_pipeline.orjson is not None:
+        fast_ms = _timed(lambda: response_pipeline.OrjsonProvider(app).dumps(payload))
+        print(f"📊 orjson      x{ROWS} bin lines: {fast_ms:.1f} ms")
+
+    body = DefaultJSONProvider(app).dumps(payload).encode('utf-8')
+    compressed = response_pipeline.compress_body(body, 'gzip')
+    print(f"📊 gzip: {len(body) / 1024:.0f} KiB -> {len(compressed) / 1024:.0f} KiB")
+
+
+def main():
+    """Run response pipeline tests and benchmark"""
+    print("🔬 Testing response pipeline")
+    print("=" * 60)
+
+    app.add_url_rule('/_test/pipeline/big', '_test_pipeline_big', lambda: jsonify(_bin_scan_payload(500)))
+    app.add_url_rule('/_test/pipeline/small', '_test_pipeline_small', lambda: jsonify({'success': True}))
+
+    tests = [test_serializer_matches_legacy, test_json_provider_matches_default, test_compression_negotiation]
+    failed = 0
+    with app.app_context():
+        for test in tests:
+            try:
+                test()
+                print(f"✅ {test.__name__}")
+            except AssertionError as e:
+                failed += 1
+                print(f"❌ {test.__name__}: {e}")
+        benchmark()
+    print(f"\n🎯 {len(tests) - failed}/{len(tests)} tests passed")
+    return failed == 0
+
+
+if __name__ == "__main__":
+    main()
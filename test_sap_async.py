@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Test script for the async SAP client (sap_async.py)
+Runs AsyncSAPIntegration and SAPIntegration against the local Service Layer
+simulator, so no real SAP server is needed
+"""
+
+import asyncio
+import logging
+import os
+import time
+
+from sap_simulator import ServiceLayerSimulator, SimulatorConfig, start_simulator_thread
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+
+def _simulator(latency_ms=0):
+    config = SimulatorConfig()
+    config.latency_ms = latency_ms
+    config.jitter_ms = config.op_latency_ms = 0
+    simulator = ServiceLayerSimulator(config)
+    server, base_url = start_simulator_thread(simulator)
+    os.environ.update({'SAP_B1_SERVER': base_url, 'SAP_B1_USERNAME': 'manager',
+                       'SAP_B1_PASSWORD': 'sim', 'SAP_B1_COMPANY_DB': 'SIM_COMPANY'})
+    return simulator, server
+
+
+def _logins(simulator):
+    return simulator.stats['by_resource'].get('POST Login', {}).get('calls', 0)
+
+
+async def _with_client(coroutine_fn):
+    from sap_async import AsyncSAPIntegration
+
+    client = AsyncSAPIntegration()
+    try:
+        return await coroutine_fn(client)
+    finally:
+        await client.close()
+
+
+def test_results_match_sync_client():
+    """Every async hot path returns what SAPIntegration returns"""
+    import app  # noqa: F401 - models (imported by sap_integration) need the app set up first
+    from sap_integration import SAPIntegration
+
+    simulator, server = _simulator()
+    try:
+        serial = next(s for s in simulator.data['serials'] if s['WhsCode'] == '7000-FG')
+        calls = [
+            ('validate_item_code', ('ITM-0002',)),
+            ('validate_item_code', ('NOPE',)),
+            ('validate_item_for_direct_transfer', ('ITM-0003',)),
+            ('get_warehouses_list', ()),
+            ('get_bin_locations_list', ('7000-FG',)),
+            ('get_po_series', ()),
+            ('get_invt_series', ()),
+            ('get_batch_number_details', ('ITM-0002',)),
+            ('get_available_serial_numbers', (serial['ItemCode'], '7000-FG')),
+            ('get_serial_current_location', (serial['DistNumber'],)),
+        ]
+
+        async def run(client):
+            return [await getattr(client, name)(*args) for name, args in calls]
+
+        async_results = asyncio.run(_with_client(run))
+        sap = SAPIntegration()
+        for (name, args), result in zip(calls, async_results):
+            assert result == getattr(sap, name)(*args), f"{name}{args} differs"
+    finally:
+        server.shutdown()
+
+
+def test_concurrent_calls_share_one_login():
+    """Concurrent requests on a fresh client log in once, not once each"""
+    simulator, server = _simulator()
+    try:
+        async def run(client):
+            return await asyncio.gather(*(client.get_po_series() for _ in range(20)))
+
+        results = asyncio.run(_with_client(run))
+        assert all(results)
+        assert _logins(simulator) == 1
+    finally:
+        server.shutdown()
+
+
+def test_expired_session_logs_in_again():
+    """A 401 from SAP triggers one new Login and the call still succeeds"""
+    simulator, server = _simulator()
+    try:
+        async def run(client):
+            await client.get_invt_series()
+            await client.client.post(f"{client.base_url}/b1s/v1/Logout")
+            return await client.get_bin_locations_list('7000-FG')
+
+        result = asyncio.run(_with_client(run))
+        assert result['success'] and result['bins']
+        assert _logins(simulator) == 2
+    finally:
+        server.shutdown()
+
+
+def test_slow_sap_is_multiplexed():
+    """30 lookups against a 300 ms SAP finish in about one round trip, not 30"""
+    simulator, server = _simulator(latency_ms=300)
+    try:
+        async def run(client):
+            await client.ensure_logged_in()
+            started = time.monotonic()
+            results = await asyncio.gather(*(client.validate_item_code(f'ITM-{i:04d}') for i in range(1, 31)))
+            return results, time.monotonic() - started
+
+        results, seconds = asyncio.run(_with_client(run))
+        assert all(r['success'] for r in results)
+        assert seconds < 3, f"took {seconds:.1f}s"
+    finally:
+        server.shutdown()
+
+
+def main():
+    """Run all async SAP client tests"""
+    print("🔬 Testing the async SAP client")
+    print("=" * 60)
+    tests = [
+        test_results_match_sync_client,
+        test_concurrent_calls_share_one_login,
+        test_expired_session_logs_in_again,
+        test_slow_sap_is_multiplexed,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__name__}: {e}")
+    print(f"\n🎯 {len(tests) - failed}/{len(tests)} tests passed")
+    return failed == 0
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Test script for SAP B1 OData $batch support
+Runs SAPIntegration.execute_batch against a local stand-in Service Layer
+session, so no real SAP server is needed
+"""
+
+import json
+import logging
+
+from sap_integration import SAPIntegration, build_batch_request, parse_batch_response
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+
+class StandInResponse:
+    """Minimal stand-in for requests.Response"""
+
+    def __init__(self, status_code, body=None, headers=None, text=None):
+        self.status_code = status_code
+        self.headers = headers or {'Content-Type': 'application/json'}
+        self.text = text if text is not None else (json.dumps(body) if body is not None else '')
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class StandInServiceLayer:
+    """
+    Local stand-in for the SAP B1 Service Layer HTTP session
+
+    Understands $batch changesets, StockTransfers POST and BinLocations GET.
+    A changeset containing a StockTransfer without lines fails as a whole,
+    like SAP rolling back the transaction.
+    """
+
+    def __init__(self, batch_enabled=True):
+        self.batch_enabled = batch_enabled
+        self.calls = []
+        self.documents = []
+        self.next_doc_entry = 1000
+
+    def _handle(self, method, path, body):
+        if method == 'POST' and path.startswith('StockTransfers'):
+            if not body or not body.get('StockTransferLines'):
+                return 400, {'error': {'code': -5002, 'message': {'value': 'No matching records found'}}}
+            self.next_doc_entry += 1
+            document = {'DocEntry': self.next_doc_entry, 'DocNum': self.next_doc_entry + 5000}
+            return 201, document
+        if method == 'GET' and path.startswith('BinLocations'):
+            bin_code = path.split("BinCode eq '")[1].split("'")[0]
+            return 200, {'value': [{'AbsEntry': len(bin_code), 'BinCode': bin_code}]}
+        return 404, {'error': {'code': -1, 'message': {'value': f'Unknown resource {path}'}}}
+
+    def _handle_batch(self, content_type, raw_body):
+        parts = []
+        for segment in raw_body.replace('\r\n', '\n').split('\n\n'):
+            for line in segment.split('\n'):
+                if line.split(' ')[0] in ('GET', 'POST', 'PATCH', 'DELETE'):
+                    parts.append({'method': line.split(' ')[0], 'path': line.split(' ', 1)[1].replace('/b1s/v1/', '', 1)})
+            stripped = segment.strip()
+            if stripped.startswith('{') and parts:
+                parts[-1]['body'] = json.loads(stripped.split('\n')[0])
+
+        atomic = 'changeset_' in raw_body
+        outcomes = [self._handle(p['method'], p['path'].replace('%20', ' '), p.get('body')) for p in parts]
+        if atomic and any(status >= 400 for status, _ in outcomes):
+            failed = next(o for o in outcomes if o[0] >= 400)
+            outcomes = [failed]
+        else:
+            self.documents.extend(body for status, body in outcomes if status == 201)
+
+        lines = ['--batchresponse_1']
+        if atomic:
+            lines += ['Content-Type: multipart/mixed;boundary=changesetresponse_1', '']
+        for index, (status, body) in enumerate(outcomes, start=1):
+            if atomic:
+                lines.append('--changesetresponse_1')
+            lines += ['Content-Type: application/http', 'Content-Transfer-Encoding: binary',
+                      f'Content-ID: {index}', '', f'HTTP/1.1 {status} X',
+                      'Content-Type: application/json', '', json.dumps(body)]
+            if not atomic:
+                lines.append('--batchresponse_1')
+        if atomic:
+            lines += ['--changesetresponse_1--', '--batchresponse_1--', '']
+        else:
+            lines[-1] = '--batchresponse_1--'
+        return StandInResponse(202, headers={'Content-Type': 'multipart/mixed;boundary=batchresponse_1'},
+                               text='\r\n'.join(lines))
+
+    def post(self, url, json=None, data=None, headers=None, timeout=None):
+        self.calls.append(('POST', url))
+        if url.endswith('/$batch'):
+            if not self.batch_enabled:
+                return StandInResponse(501, {'error': {'message': {'value': 'Not implemented'}}})
+            return self._handle_batch(headers.get('Content-Type'), data.decode('utf-8'))
+        status, body = self._handle('POST', url.split('/b1s/v1/')[1], json)
+        if status == 201:
+            self.documents.append(body)
+        return StandInResponse(status, body)
+
+    def request(self, method, url, json=None, timeout=None):
+        if method == 'POST':
+            return self.post(url, json=json, timeout=timeout)
+        self.calls.append((method, url))
+        status, body = self._handle(method, url.split('/b1s/v1/')[1], json)
+        return StandInResponse(status, body)
+
+
+def _sap_with(stand_in):
+    sap = SAPIntegration()
+    sap.base_url = 'https://stand-in:50000'
+    sap.session_id = 'stand-in-session'
+    sap.session = stand_in
+    sap._batch_supported = True
+    return sap
+
+
+def _transfer(item_code):
+    return {'FromWarehouse': '7000-FG', 'ToWarehouse': '7000-QFG',
+            'StockTransferLines': [{'ItemCode': item_code, 'Quantity': 1}]}
+
+
+def test_build_and_parse_round_trip():
+    """$batch body contains one changeset with every operation"""
+    content_type, body = build_batch_request([
+        {'method': 'POST', 'path': 'StockTransfers', 'body': _transfer('A')},
+        {'method': 'POST', 'path': 'StockTransfers', 'body': _transfer('B')},
+    ])
+    assert content_type.startswith('multipart/mixed; boundary=batch_')
+    assert body.count('Content-ID:') == 2
+    assert body.count('POST /b1s/v1/StockTransfers') == 2
+
+    response = StandInServiceLayer()._handle_batch(content_type, body)
+    results = parse_batch_response(response.headers['Content-Type'], response.text)
+    assert [r['status'] for r in results] == [201, 201]
+    assert results[0]['body']['DocEntry'] != results[1]['body']['DocEntry']
+
+
+def test_batch_posts_in_one_round_trip():
+    """Approved + rejected transfers go to SAP in a single HTTP call"""
+    stand_in = StandInServiceLayer()
+    sap = _sap_with(stand_in)
+    result = sap.execute_batch([
+        {'method': 'POST', 'path': 'StockTransfers', 'body': _transfer('A')},
+        {'method': 'POST', 'path': 'StockTransfers', 'body': _transfer('B')},
+    ])
+    assert result['success'] and result['mode'] == 'batch'
+    assert len(stand_in.calls) == 1
+    assert len(stand_in.documents) == 2
+
+
+def test_batch_changeset_is_atomic():
+    """One invalid document rolls back the whole changeset"""
+    stand_in = StandInServiceLayer()
+    sap = _sap_with(stand_in)
+    result = sap.execute_batch([
+        {'method': 'POST', 'path': 'StockTransfers', 'body': _transfer('A')},
+        {'method': 'POST', 'path': 'StockTransfers', 'body': {'StockTransferLines': []}},
+    ])
+    assert not result['success']
+    assert 'No matching records found' in result['error']
+    assert stand_in.documents == []
+
+
+def test_sequential_fallback_when_batch_unsupported():
+    """Falls back to one call per operation and remembers $batch is unavailable"""
+    stand_in = StandInServiceLayer(batch_enabled=False)
+    sap = _sap_with(stand_in)
+    result = sap.execute_batch([
+        {'method': 'POST', 'path': 'StockTransfers', 'body': _transfer('A')},
+        {'method': 'POST', 'path': 'StockTransfers', 'body': _transfer('B')},
+    ])
+    assert result['success'] and result['mode'] == 'sequential'
+    assert len(stand_in.documents) == 2
+    assert sap._batch_supported is False
+
+
+def test_bin_abs_entries_resolved_together():
+    """Bin lookups for a transfer are de-duplicated and sent as one $batch"""
+    stand_in = StandInServiceLayer()
+    sap = _sap_with(stand_in)
+    entries = sap.get_bin_abs_entries([('BIN-01', '7000-FG'), ('BIN-0002', '7000-QFG'), ('BIN-01', '7000-FG')])
+    assert entries == {('BIN-01', '7000-FG'): 6, ('BIN-0002', '7000-QFG'): 8}
+    assert len(stand_in.calls) == 1
+
+
+def main():
+    """Run all $batch tests"""
+    print("🔬 Testing SAP B1 $batch support against local stand-in Service Layer")
+    print("=" * 60)
+    tests = [
+        test_build_and_parse_round_trip,
+        test_batch_posts_in_one_round_trip,
+        test_batch_changeset_is_atomic,
+        test_sequential_fallback_when_batch_unsupported,
+        test_bin_abs_entries_resolved_together,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__name__}: {e}")
+    print(f"\n🎯 {len(tests) - failed}/{len(tests)} tests passed")
+    return failed == 0
+
+
+if __name__ == "__main__":
+    main()
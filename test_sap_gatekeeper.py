@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Test script for the SAP gatekeeper (sap_gatekeeper.py)
+Exercises the adaptive limiter and circuit breaker directly, and GatedSession
+against the local Service Layer simulator, so no real SAP server is needed
+"""
+
+import logging
+import threading
+import time
+
+import requests
+
+from sap_gatekeeper import AdaptiveLimiter, CircuitBreaker, GatedSession, SAPUnavailableError, classify, gatekeeper
+from sap_simulator import ServiceLayerSimulator, SimulatorConfig, start_simulator_thread
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+
+def test_classify_endpoints():
+    """Calls land in the right endpoint class"""
+    base = 'https://sap:50000/b1s/v1'
+    assert classify('POST', f'{base}/Login') == 'login'
+    assert classify('POST', f"{base}/SQLQueries('Get_PO_Series')/List") == 'sql'
+    assert classify('GET', f'{base}/$crossjoin(PurchaseOrders,PurchaseOrders/DocumentLines)?$filter=x') == 'sql'
+    assert classify('GET', f"{base}/Items('A')") == 'read'
+    assert classify('POST', f'{base}/StockTransfers') == 'write'
+    assert classify('POST', f'{base}/$batch') == 'write'
+
+
+def test_limiter_adapts_to_latency_and_failures():
+    """The limit grows while latency is flat, shrinks when it rises and on every drop"""
+    limiter = AdaptiveLimiter('read', 10, 2, 40)
+    for _ in range(200):
+        for _ in range(10):
+            limiter.try_acquire()
+        for _ in range(10):
+            limiter.release(0.05)
+    grown = limiter.limit
+    assert grown > 10
+
+    for _ in range(100):
+        limiter.try_acquire()
+        limiter.release(0.5)
+    slowed = limiter.limit
+    assert slowed < grown
+
+    limiter.try_acquire()
+    limiter.release(30, dropped=True)
+    assert abs(limiter.limit - max(2, slowed * 0.9)) < 1e-9
+    assert limiter.snapshot()['dropped'] == 1
+
+
+def test_limiter_queues_then_sheds():
+    """A caller over the limit waits for a slot, and is shed when none frees up in time"""
+    limiter = AdaptiveLimiter('write', 1, 1, 1)
+    assert limiter.acquire(0.1)
+    threading.Timer(0.05, limiter.release, args=(0.01,)).start()
+    assert limiter.acquire(1)  # Queued, then got the released slot
+    assert not limiter.acquire(0.05)  # Nobody releases - shed
+
+    stats = limiter.snapshot()
+    assert stats['queued'] == 2 and stats['shed'] == 1 and stats['max_wait_ms'] >= 40
+
+
+def test_breaker_opens_and_recovers():
+    """Consecutive failures open the breaker; one good trial after the cooldown closes it"""
+    breaker = CircuitBreaker(failures=3, window=20, cooldown=0.1)
+    for _ in range(3):
+        assert breaker.allow()
+        breaker.record(False)
+    assert breaker.state == 'open' and not breaker.allow()
+
+    time.sleep(0.12)
+    assert breaker.allow()  # The trial call
+    assert not breaker.allow()  # Only one trial at a time
+    breaker.record(False)
+    assert breaker.state == 'open'
+
+    time.sleep(0.12)
+    assert breaker.allow()
+    breaker.record(True)
+    assert breaker.state == 'closed' and breaker.allow()
+    assert breaker.snapshot()['opened'] == 2
+
+
+def test_gated_session_fails_fast_when_sap_struggles():
+    """503s from SAP open the circuit; later calls fail without reaching SAP"""
+    config = SimulatorConfig()
+    config.latency_ms = config.jitter_ms = config.op_latency_ms = 0
+    simulator = ServiceLayerSimulator(config)
+    server, base_url = start_simulator_thread(simulator)
+    gatekeeper.reset()
+    try:
+        session = GatedSession()
+        session.post(f"{base_url}/b1s/v1/Login", json={'UserName': 'manager', 'Password': 'sim',
+                                                       'CompanyDB': 'SIM_COMPANY'})
+        requests.post(f"{base_url}/sim/config", json={'error_rate': 1, 'error_statuses': [503]})
+        for _ in range(5):
+            assert session.get(f"{base_url}/b1s/v1/Warehouses").status_code == 503
+        assert gatekeeper.is_open()
+
+        calls = simulator.stats['requests']
+        try:
+            session.get(f"{base_url}/b1s/v1/Warehouses")
+            assert False, 'call was not refused'
+        except SAPUnavailableError as e:
+            assert e.reason == 'circuit_open'
+        assert isinstance(session.unavailable, requests.exceptions.ConnectionError)
+        assert simulator.stats['requests'] == calls
+        assert gatekeeper.metrics()['classes']['read']['dropped'] == 5
+
+        # A call the gate lets through again clears the refusal
+        requests.post(f"{base_url}/sim/config", json={'error_rate': 0})
+        gatekeeper.reset()
+        assert session.get(f"{base_url}/b1s/v1/Warehouses").status_code == 200
+        assert session.unavailable is None
+    finally:
+        gatekeeper.reset()
+        server.shutdown()
+
+
+def main():
+    """Run all SAP gatekeeper tests"""
+    print("🔬 Testing the SAP gatekeeper")
+    print("=" * 60)
+    tests = [
+        test_classify_endpoints,
+        test_limiter_adapts_to_latency_and_failures,
+        test_limiter_queues_then_sheds,
+        test_breaker_opens_and_recovers,
+        test_gated_session_fails_fast_when_sap_struggles,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__name__}: {e}")
+    print(f"\n🎯 {len(tests) - failed}/{len(tests)} tests passed")
+    return failed == 0
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Test script for the SAP B1 Service Layer simulator (sap_simulator.py)
+Serves the simulator from a background thread and talks to it over HTTP the
+way SAPIntegration does, so no real SAP server is needed
+"""
+
+import logging
+
+import requests
+
+from sap_query_manager import SAPQueryManager
+from sap_simulator import SQL_QUERIES, ServiceLayerSimulator, SimulatorConfig, build_dataset, start_simulator_thread
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+SAMPLE_PARAMS = {
+    'item_code': 'ITM-0002', 'whcode': '7000-FG', 'itemCode': 'ITM-0002', 'whCode': '7000-FG',
+    'whsCode': '7000-FG', 'series': '101', 'docNum': '5002', 'SONumber': '7001', 'Series': '201',
+    'serialNumber': 'SN0002000001', 'serial_number': 'SN0002000001', 'seriesID': '301',
+    'docEntry': '1', 'lineNum': '0'
+}
+
+
+def _simulator():
+    config = SimulatorConfig()
+    config.latency_ms = config.jitter_ms = config.op_latency_ms = 0
+    simulator = ServiceLayerSimulator(config)
+    server, base_url = start_simulator_thread(simulator)
+    session = requests.Session()
+    response = session.post(f"{base_url}/b1s/v1/Login",
+                            json={'UserName': 'manager', 'Password': 'sim', 'CompanyDB': 'SIM_COMPANY'})
+    assert response.status_code == 200, response.text
+    return simulator, server, f"{base_url}/b1s/v1", session
+
+
+def _sql(session, base, code, **params):
+    param_list = '&'.join(f"{name}='{value}'" for name, value in params.items())
+    return session.post(f"{base}/SQLQueries('{code}')/List", json={'ParamList': param_list} if params else None)
+
+
+def _transfer(item_code, quantity, from_warehouse='7000-FG', to_warehouse='7000-QFG', **line):
+    return {'FromWarehouse': from_warehouse, 'ToWarehouse': to_warehouse,
+            'StockTransferLines': [{'ItemCode': item_code, 'Quantity': quantity, 'FromWarehouseCode': from_warehouse,
+                                    'WarehouseCode': to_warehouse, **line}]}
+
+
+def test_dataset_is_deterministic():
+    """The same seed always builds the same company"""
+    assert build_dataset(7) == build_dataset(7)
+    assert build_dataset(7) != build_dataset(8)
+
+
+def test_session_required():
+    """Calls without a B1SESSION cookie are rejected like an expired session"""
+    simulator, server, base, session = _simulator()
+    try:
+        assert requests.get(f"{base}/Warehouses").status_code == 401
+        assert session.get(f"{base}/Warehouses").status_code == 200
+        session.post(f"{base}/Logout")
+        assert session.get(f"{base}/Warehouses").status_code == 401
+    finally:
+        server.shutdown()
+
+
+def test_every_required_query_is_served():
+    """Each SqlCode sap_query_manager registers answers with rows"""
+    simulator, server, base, session = _simulator()
+    try:
+        manager = SAPQueryManager('http://unused', 'manager', 'sim', 'SIM_COMPANY')
+        for query in manager.required_queries:
+            code = query['SqlCode']
+            assert code in SQL_QUERIES, f"{code} is not simulated"
+            required, _ = SQL_QUERIES[code]
+            response = _sql(session, base, code, **{name: SAMPLE_PARAMS[name] for name in required})
+            assert response.status_code == 200, f"{code}: {response.text}"
+        assert _sql(session, base, 'Get_PO_DocEntry', series='101').status_code == 400
+        assert _sql(session, base, 'Unknown_Query').status_code == 404
+    finally:
+        server.shutdown()
+
+
+def test_paging_follows_next_link():
+    """Default page size is 20 and nextLink walks the rest, maxpagesize=0 returns everything"""
+    simulator, server, base, session = _simulator()
+    try:
+        url = f"{base}/BinLocations?$filter=Warehouse eq '7000-FG'"
+        pages = []
+        while url:
+            data = session.get(url).json()
+            pages.append(data['value'])
+            url = f"{base}/{data['odata.nextLink']}" if data.get('odata.nextLink') else None
+        assert len(pages[0]) == 20
+        assert sum(len(page) for page in pages) == 40
+        everything = session.get(f"{base}/BinLocations", headers={'Prefer': 'odata.maxpagesize=0'}).json()
+        assert len(everything['value']) == 160 and 'odata.nextLink' not in everything
+    finally:
+        server.shutdown()
+
+
+def test_crossjoin_returns_open_lines():
+    """PO header and lines come back joined, with the table status codes"""
+    simulator, server, base, session = _simulator()
+    try:
+        url = (f"{base}/$crossjoin(PurchaseOrders,PurchaseOrders/DocumentLines)"
+               f"?$expand=PurchaseOrders($select=DocEntry,DocNum,DocumentStatus),"
+               f"PurchaseOrders/DocumentLines($select=LineNum,ItemCode,LineStatus,DocEntry)"
+               f"&$filter=PurchaseOrders/DocumentStatus eq PurchaseOrders/DocumentLines/LineStatus "
+               f"and PurchaseOrders/DocEntry eq PurchaseOrders/DocumentLines/DocEntry "
+               f"and PurchaseOrders/DocumentLines/DocEntry eq 1")
+        rows = session.get(url).json()['value']
+        po = simulator.data['PurchaseOrders'][0]
+        assert len(rows) == len(po['DocumentLines'])
+        assert rows[0]['PurchaseOrders'] == {'DocEntry': 1, 'DocNum': po['DocNum'], 'DocumentStatus': 'O'}
+        assert all(row['PurchaseOrders/DocumentLines']['LineStatus'] == 'O' for row in rows)
+    finally:
+        server.shutdown()
+
+
+def test_stock_transfer_moves_serial():
+    """A posted transfer moves the serial; posting it again from the old warehouse fails"""
+    simulator, server, base, session = _simulator()
+    try:
+        serial = next(s for s in simulator.data['serials'] if s['WhsCode'] == '7000-FG')
+        body = _transfer(serial['ItemCode'], 1, SerialNumbers=[{'InternalSerialNumber': serial['DistNumber']}])
+        response = session.post(f"{base}/StockTransfers", json=body)
+        assert response.status_code == 201, response.text
+        assert response.json()['DocEntry']
+
+        location = _sql(session, base, 'get_serial_current_location', serial_number=serial['DistNumber']).json()
+        assert location['value'][0]['WhsCode'] == '7000-QFG'
+        assert session.post(f"{base}/StockTransfers", json=body).status_code == 400
+    finally:
+        server.shutdown()
+
+
+def test_batch_changeset_rolls_back():
+    """A failing operation fails its whole changeset and leaves stock untouched"""
+    simulator, server, base, session = _simulator()
+    try:
+        item = next(i for i in simulator.data['Items'] if i['ManageBatchNumbers'] == 'tNO'
+                    and i['ManageSerialNumbers'] == 'tNO')
+        stock_before = [dict(s) for s in item['ItemWarehouseInfoCollection']]
+        body = '\r\n'.join([
+            '--batch_1', 'Content-Type: multipart/mixed; boundary=changeset_1', '',
+            '--changeset_1', 'Content-Type: application/http', 'Content-Transfer-Encoding: binary',
+            'Content-ID: 1', '', 'POST /b1s/v1/StockTransfers', 'Content-Type: application/json', '',
+            f'{{"FromWarehouse": "7000-FG", "ToWarehouse": "7000-QFG", "StockTransferLines": '
+            f'[{{"ItemCode": "{item["ItemCode"]}", "Quantity": 1}}]}}', '',
+            '--changeset_1', 'Content-Type: application/http', 'Content-Transfer-Encoding: binary',
+            'Content-ID: 2', '', 'POST /b1s/v1/StockTransfers', 'Content-Type: application/json', '',
+            '{"FromWarehouse": "7000-FG", "ToWarehouse": "7000-QFG", "StockTransferLines": []}', '',
+            '--changeset_1--', '--batch_1--', ''])
+        response = session.post(f"{base}/$batch", data=body,
+                                headers={'Content-Type': 'multipart/mixed; boundary=batch_1'})
+        assert response.status_code == 202
+        assert response.text.count('HTTP/1.1 ') == 1 and 'HTTP/1.1 400' in response.text
+        assert item['ItemWarehouseInfoCollection'] == stock_before
+        assert simulator.stats['by_resource']['POST StockTransfers']['calls'] == 2
+    finally:
+        server.shutdown()
+
+
+def test_error_injection_and_stats():
+    """Injected failures hit only the configured resources and are counted"""
+    simulator, server, base, session = _simulator()
+    try:
+        control = base.replace('/b1s/v1', '/sim')
+        requests.post(f"{control}/config", json={'error_rate': 1, 'error_statuses': [503],
+                                                 'error_resources': ['Warehouses']})
+        assert session.get(f"{base}/Warehouses").status_code == 503
+        assert session.get(f"{base}/Items('ITM-0001')").status_code == 200
+
+        stats = requests.get(f"{control}/stats").json()
+        assert stats['errors_injected'] == 1
+        assert stats['by_resource']['GET Warehouses'] == {'calls': 1, 'errors': 1}
+        requests.post(f"{control}/reset")
+        assert requests.get(f"{control}/stats").json()['requests'] == 0
+    finally:
+        server.shutdown()
+
+
+def main():
+    """Run all simulator tests"""
+    print("🔬 Testing the SAP B1 Service Layer simulator")
+    print("=" * 60)
+    tests = [
+        test_dataset_is_deterministic,
+        test_session_required,
+        test_every_required_query_is_served,
+        test_paging_follows_next_link,
+        test_crossjoin_returns_open_lines,
+        test_stock_transfer_moves_serial,
+        test_batch_changeset_rolls_back,
+        test_error_injection_and_stats,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__name__}: {e}")
+    print(f"\n🎯 {len(tests) - failed}/{len(tests)} tests passed")
+    return failed == 0
+
+
+if __name__ == "__main__":
+    main()
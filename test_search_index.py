@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Test and benchmark script for the shared list-page search (search_index.py)
+Checks term escaping, document-number detection and that results match the
+legacy filter, then
+generates a scratch table of SEARCH_BENCHMARK_ROWS documents (default 1,000,000)
+on the configured database and times the old ILIKE '%term%' filter against
+apply_search before and after the trigram / FULLTEXT index is built.
+The scratch table is dropped afterwards.
+"""
+
+import os
+import random
+import sys
+import time
+import logging
+
+sys.path.insert(0, '.')
+
+from sqlalchemy import Column, Integer, MetaData, String, Table, or_
+
+from app import app, db
+from sap_bulk_sync import get_dialect
+import search_index
+from search_index import SearchSpec, apply_search, escape_like
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+ROWS = int(os.environ.get('SEARCH_BENCHMARK_ROWS', '1000000'))
+INSERT_BATCH = 10000
+
+SUPPLIERS = ['Acme Components', 'Northwind Traders', 'Globex Industrial', 'Initech Supplies', 'Umbrella Logistics',
+             'Stark Fasteners', 'Wayne Packaging', 'Tyrell Electronics', 'Cyberdyne Metals', 'Soylent Foods']
+
+documents = Table(
+    'search_benchmark_documents', MetaData(),
+    Column('id', Integer, primary_key=True),
+    Column('po_number', String(20)),
+    Column('doc_number', String(30)),
+    Column('supplier_name', String(100)),
+    Column('sap_document_number', String(20))
+)
+
+BENCHMARK_SEARCH = SearchSpec(
+    columns=[documents.c.po_number, documents.c.doc_number, documents.c.supplier_name,
+             documents.c.sap_document_number],
+    prefix_columns=[documents.c.po_number, documents.c.doc_number, documents.c.sap_document_number]
+)
+
+
+def _legacy_filter(query, term):
+    """Search as the list pages did before search_index"""
+    return query.filter(or_(*[column.ilike(f'%{term}%') for column in BENCHMARK_SEARCH.columns]))
+
+
+def _generate(count):
+    rng = random.Random(42)
+    for start in range(0, count, INSERT_BATCH):
+        yield [{
+            'id': index + 1,
+            'po_number': str(4100000 + index),
+            'doc_number': f'GRPO-2026-{index + 1:07d}',
+            'supplier_name': f'{rng.choice(SUPPLIERS)} {rng.randint(1, 999)}',
+            'sap_document_number': str(2300000 + index) if index % 3 else None
+        } for index in range(start, min(start + INSERT_BATCH, count))]
+
+
+def _create_index(dialect):
+    if dialect == 'postgresql':
+        db.session.execute(db.text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        for column in BENCHMARK_SEARCH.columns:
+            db.session.execute(db.text(
+                f"CREATE INDEX idx_{documents.name}_{column.name}_trgm ON {documents.name} "
+                f"USING gin ({column.name} gin_trgm_ops)"))
+    elif dialect == 'mysql':
+        names = ', '.join(column.name for column in BENCHMARK_SEARCH.columns)
+        db.session.execute(db.text(
+            f"ALTER TABLE {documents.name} ADD FULLTEXT INDEX ft_{documents.name}_search ({names}) WITH PARSER ngram"))
+        for column in BENCHMARK_SEARCH.prefix_columns:
+            db.session.execute(db.text(f"CREATE INDEX idx_{documents.name}_{column.name} ON {documents.name} ({column.name})"))
+    else:
+        return False
+    db.session.commit()
+    search_index._fulltext_indexes.pop(documents.name, None)
+    return True
+
+
+def _timed(build, repeat=3):
+    """Best-of-N milliseconds for the first page plus the pagination count"""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        query = build(db.session.query(documents))
+        query.limit(50).all()
+        total = query.count()
+        elapsed = (time.perf_counter() - started) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best, total
+
+
+def test_escape_like():
+    """LIKE wildcards typed by the user are matched literally"""
+    assert escape_like('50%') == '50\\%'
+    assert escape_like('A_1') == 'A\\_1'
+    assert escape_like('C:\\tmp') == 'C:\\\\tmp'
+
+
+def test_document_number_detection():
+    """Scanner-shaped terms are also matched by prefix, free text is not"""
+    for term in ('GRPO-2026-0000123', '4100123', 'PL/7000/12'):
+        assert search_index.DOCUMENT_NUMBER.match(term), term
+    for term in ('Acme', 'acme components', 'GRPO 2026'):
+        assert not search_index.DOCUMENT_NUMBER.match(term), term
+
+
+def test_search_results(sample=2000):
+    """apply_search finds the same rows as the legacy filter on a small sample"""
+    for term in ('GRPO-2026-00001', '41001', 'globex', '2026-0000', 'nothing-like-this-1'):
+        legacy = {row.id for row in _legacy_filter(db.session.query(documents), term)}
+        searched = {row.id for row in apply_search(db.session.query(documents), term, BENCHMARK_SEARCH)}
+        assert searched == legacy, term
+    assert db.session.query(documents).count() == sample
+
+
+def benchmark(dialect):
+    """Print timings for the legacy and indexed searches"""
+    terms = [('document number', f'GRPO-2026-{ROWS // 2:07d}'), ('po number', str(4100000 + ROWS // 3)),
+             ('supplier text', 'northwind'), ('no match', 'zzqx-0000')]
+
+    def run(label):
+        for name, term in terms:
+            legacy_ms, legacy_total = _timed(lambda q: _legacy_filter(q, term))
+            search_ms, search_total = _timed(lambda q: apply_search(q, term, BENCHMARK_SEARCH))
+            print(f"📊 [{label}] {name:16s} legacy {legacy_ms:9.1f} ms ({legacy_total})"
+                  f" -> apply_search {search_ms:9.1f} ms ({search_total})")
+
+    run('no index')
+    if _create_index(dialect):
+        db.session.execute(db.text(f"ANALYZE {documents.name}" if dialect == 'postgresql'
+                                   else f"ANALYZE TABLE {documents.name}"))
+        run('indexed')
+    else:
+        print(f"⏭️ No trigram/FULLTEXT index on {dialect} - indexed timings skipped")
+
+
+def _load(count):
+    documents.drop(db.engine, checkfirst=True)
+    documents.create(db.engine)
+    started = time.perf_counter()
+    for batch in _generate(count):
+        db.session.execute(documents.insert(), batch)
+        db.session.commit()
+    print(f"📦 {count:,} rows generated in {time.perf_counter() - started:.1f}s")
+
+
+def main():
+    """Run search tests and the generated-dataset benchmark"""
+    print("🔬 Testing list-page search")
+    print("=" * 60)
+
+    tests = [test_escape_like, test_document_number_detection, test_search_results]
+    failed = 0
+    with app.app_context():
+        dialect = get_dialect()
+        try:
+            _load(2000)
+            for test in tests:
+                try:
+                    test()
+                    print(f"✅ {test.__name__}")
+                except AssertionError as e:
+                    failed += 1
+                    print(f"❌ {test.__name__}: {e}")
+
+            _load(ROWS)
+            benchmark(dialect)
+        finally:
+            db.session.rollback()
+            documents.drop(db.engine, checkfirst=True)
+    print(f"\n🎯 {len(tests) - failed}/{len(tests)} tests passed")
+    return failed == 0
+
+
+if __name__ == "__main__":
+    main()